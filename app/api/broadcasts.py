@@ -0,0 +1,64 @@
+"""
+📣 API Endpoints de Difusiones
+Crear, seguir y cancelar mensajes a todos los usuarios de un conjunto de empresas
+"""
+
+from fastapi import APIRouter, HTTPException, Query, Body, Header, Depends
+from typing import List, Dict, Any, Optional
+import hmac
+import logging
+
+from app.config import Config
+from app.services.broadcast_service import get_broadcast_service
+
+logger = logging.getLogger(__name__)
+router = APIRouter(prefix="/api/broadcasts", tags=["Broadcasts"])
+
+# Cabecera con el secreto que autoriza crear y cancelar difusiones
+CABECERA_SECRETO = 'X-Aca-Difusiones'
+
+def verificar_secreto(secreto: Optional[str] = Header(None, alias=CABECERA_SECRETO)):
+    """Sin DIFUSION_SECRETO configurado no se aceptan difusiones por la API"""
+    esperado = Config.DIFUSION_SECRETO
+    if not esperado:
+        raise HTTPException(status_code=403, detail="Difusiones por API deshabilitadas: falta DIFUSION_SECRETO")
+    if secreto is None or not hmac.compare_digest(secreto, esperado):
+        raise HTTPException(status_code=403, detail="Secreto de difusiones inválido")
+
+@router.post("", response_model=Dict[str, Any], dependencies=[Depends(verificar_secreto)])
+async def create_broadcast(
+    empresa_ids: List[str] = Body(..., min_length=1, description="Empresas cuyos usuarios reciben el mensaje"),
+    mensaje: str = Body(..., min_length=1, max_length=4096, description="Texto; admite {nombre} y {empresa}"),
+    creada_por: Optional[int] = Body(None, description="chat_id del admin a avisar al terminar")
+):
+    """Registra una difusión y comienza a enviarla desde esta réplica"""
+    servicio = get_broadcast_service()
+    difusion = servicio.crear(mensaje, empresa_ids, creada_por)
+    if not difusion:
+        raise HTTPException(status_code=500, detail="Error creando difusión")
+
+    # Si otra réplica la toma primero (tarea de reanudación), la difusión igual avanza
+    await servicio.iniciar(difusion['id'])
+    return servicio.obtener(difusion['id']) or difusion
+
+@router.get("", response_model=List[Dict[str, Any]])
+async def list_broadcasts(
+    limit: int = Query(10, ge=1, le=100, description="Número de difusiones a obtener")
+):
+    """Difusiones más recientes con su avance y ritmo de envío"""
+    return get_broadcast_service().listar(limit=limit)
+
+@router.get("/{difusion_id}", response_model=Dict[str, Any])
+async def get_broadcast(difusion_id: str):
+    """Avance de una difusión: enviados, bloqueados, fallidos, mensajes/s y últimos errores"""
+    difusion = get_broadcast_service().obtener(difusion_id)
+    if not difusion:
+        raise HTTPException(status_code=404, detail="Difusión no encontrada")
+    return difusion
+
+@router.post("/{difusion_id}/cancel", dependencies=[Depends(verificar_secreto)])
+async def cancel_broadcast(difusion_id: str):
+    """Detiene una difusión pendiente o en curso"""
+    if not get_broadcast_service().cancelar(difusion_id):
+        raise HTTPException(status_code=404, detail="Difusión no encontrada o ya finalizada")
+    return {"status": "success", "message": f"Difusión {difusion_id} cancelada"}
@@ -3,58 +3,104 @@
 Endpoints para visualizar y gestionar logs en el dashboard
 """
 
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from typing import List, Dict, Any, Optional
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
+import asyncio
+import csv
+import io
+import json
 import logging
 
 from app.services.conversation_logger import get_conversation_logger
+from app.services.analytics_service import get_analytics_service
+from app.services.stats_service import get_stats_service
+from app.services.live_feed import get_feed_en_vivo, EVENTOS
+from app.utils.pagination import aplicar_keyset, pagina, codificar_cursor, decodificar_cursor, CursorInvalido
+from app.utils.particiones import caliente_primero
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/conversations", tags=["Conversation Logs"])
 
+# Columnas de /recent (mismo formato que vista_conversaciones_recientes, sin su tope de 1000 filas)
+COLUMNAS_RECIENTES = (
+    'id, chat_id, usuario_nombre, usuario_username, empresa_id, mensaje, respuesta, '
+    'bot_tipo, created_at, empresas(nombre)'
+)
+
+# Columnas del export de conversaciones
+COLUMNAS_EXPORT = [
+    'id', 'created_at', 'chat_id', 'empresa_id', 'bot_tipo', 'usuario_nombre',
+    'usuario_username', 'comando', 'mensaje', 'respuesta', 'parametros', 'metadata'
+]
+
+def _responder_pagina(response: Response, filas: list, limit: int, columna_orden: str = 'created_at') -> list:
+    """Recortar la página y publicar el cursor siguiente en X-Next-Cursor"""
+    filas, siguiente = pagina(filas, limit, columna_orden)
+    if siguiente:
+        response.headers['X-Next-Cursor'] = siguiente
+    return filas
+
 @router.get("/recent", response_model=List[Dict[str, Any]])
 async def get_recent_conversations(
+    response: Response,
     limit: int = Query(50, ge=1, le=500, description="Número de conversaciones a obtener"),
     bot_type: Optional[str] = Query(None, description="Filtrar por tipo de bot (admin/production)"),
-    authorized_only: bool = Query(False, description="Solo mostrar usuarios autorizados")
+    authorized_only: bool = Query(False, description="Solo mostrar usuarios autorizados"),
+    cursor: Optional[str] = Query(None, description="Cursor de X-Next-Cursor de la página anterior")
 ):
-    """Obtiene conversaciones recientes del dashboard"""
+    """Obtiene conversaciones recientes del dashboard (paginado por cursor)"""
     try:
         conversation_logger = get_conversation_logger()
         
-        # Query base - usar vista simplificada
-        query = conversation_logger.supabase.table('vista_conversaciones_recientes')\
-            .select('*')\
-            .limit(limit)
-        
-        # Aplicar filtros
-        if bot_type:
-            query = query.eq('bot_tipo', bot_type)
-        
-        if authorized_only:
-            query = query.is_not('empresa_id', 'null')
+        def construir(desde):
+            query = conversation_logger.supabase.table('conversaciones')\
+                .select(COLUMNAS_RECIENTES)
+            
+            # Aplicar filtros
+            if bot_type:
+                query = query.eq('bot_tipo', bot_type)
+            
+            if authorized_only:
+                query = query.not_.is_('empresa_id', 'null')
+            
+            if desde:
+                query = query.gte('created_at', desde.isoformat())
+            
+            return aplicar_keyset(query, cursor).limit(limit + 1)
         
-        result = query.execute()
+        filas = []
+        for row in caliente_primero(construir, minimo=limit + 1):
+            empresa = row.pop('empresas', None) or {}
+            row['empresa_nombre'] = empresa.get('nombre') or 'Usuario No Registrado'
+            row['estado_usuario'] = 'Autorizado' if row.get('empresa_id') else 'No Autorizado'
+            filas.append(row)
         
-        return result.data if result.data else []
+        return _responder_pagina(response, filas, limit)
         
+    except CursorInvalido as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"❌ Error obteniendo conversaciones recientes: {e}")
         raise HTTPException(status_code=500, detail="Error obteniendo conversaciones")
 
 @router.get("/unauthorized", response_model=List[Dict[str, Any]])
 async def get_unauthorized_users(
+    response: Response,
     days: int = Query(7, ge=1, le=90, description="Días hacia atrás"),
-    limit: int = Query(100, ge=1, le=500, description="Límite de usuarios")
+    limit: int = Query(100, ge=1, le=500, description="Límite de usuarios"),
+    cursor: Optional[str] = Query(None, description="Cursor de X-Next-Cursor de la página anterior")
 ):
-    """Obtiene usuarios no autorizados que han intentado usar el bot"""
+    """Obtiene usuarios no autorizados que han intentado usar el bot (paginado por cursor)"""
     try:
         conversation_logger = get_conversation_logger()
-        unauthorized_users = await conversation_logger.get_unauthorized_users(days=days)
+        unauthorized_users = await conversation_logger.get_unauthorized_users(days=days, limit=limit + 1, cursor=cursor)
         
-        return unauthorized_users[:limit]
+        return _responder_pagina(response, unauthorized_users, limit, 'ultima_interaccion')
         
+    except CursorInvalido as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"❌ Error obteniendo usuarios no autorizados: {e}")
         raise HTTPException(status_code=500, detail="Error obteniendo usuarios no autorizados")
@@ -62,15 +108,20 @@ async def get_unauthorized_users(
 @router.get("/attempts/{chat_id}", response_model=List[Dict[str, Any]])
 async def get_user_access_attempts(
     chat_id: int,
-    days: int = Query(30, ge=1, le=365, description="Días hacia atrás")
+    response: Response,
+    days: int = Query(30, ge=1, le=365, description="Días hacia atrás"),
+    limit: int = Query(100, ge=1, le=500, description="Número de intentos"),
+    cursor: Optional[str] = Query(None, description="Cursor de X-Next-Cursor de la página anterior")
 ):
-    """Obtiene intentos de acceso de un usuario específico"""
+    """Obtiene intentos de acceso de un usuario específico (paginado por cursor)"""
     try:
         conversation_logger = get_conversation_logger()
-        attempts = await conversation_logger.get_access_attempts(chat_id=chat_id, days=days)
+        attempts = await conversation_logger.get_access_attempts(chat_id=chat_id, days=days, limit=limit + 1, cursor=cursor)
         
-        return attempts
+        return _responder_pagina(response, attempts, limit, 'timestamp')
         
+    except CursorInvalido as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"❌ Error obteniendo intentos de acceso para {chat_id}: {e}")
         raise HTTPException(status_code=500, detail="Error obteniendo intentos de acceso")
@@ -114,30 +165,29 @@ async def get_conversation_analytics(
         logger.error(f"❌ Error obteniendo analíticas: {e}")
         raise HTTPException(status_code=500, detail="Error obteniendo analíticas")
 
+@router.get("/analytics/hourly", response_model=List[Dict[str, Any]])
+async def get_hourly_analytics(
+    fecha: Optional[date] = Query(None, description="Día a consultar (YYYY-MM-DD, por defecto hoy)"),
+    bot_type: Optional[str] = Query(None, description="Filtrar por tipo de bot (admin/production)")
+):
+    """Obtiene mensajes, usuarios y latencias por hora de un día (rollups de bot_analytics)"""
+    try:
+        return get_analytics_service().get_filas_por_hora(fecha or datetime.now().date(), bot_type)
+        
+    except Exception as e:
+        logger.error(f"❌ Error obteniendo analíticas por hora: {e}")
+        raise HTTPException(status_code=500, detail="Error obteniendo analíticas por hora")
+
 @router.get("/daily-stats", response_model=List[Dict[str, Any]])
 async def get_daily_stats(
     start_date: Optional[date] = Query(None, description="Fecha de inicio (YYYY-MM-DD)"),
-    end_date: Optional[date] = Query(None, description="Fecha de fin (YYYY-MM-DD)")
+    end_date: Optional[date] = Query(None, description="Fecha de fin (YYYY-MM-DD)"),
+    bot_type: Optional[str] = Query(None, description="Filtrar por tipo de bot (admin/production)")
 ):
-    """Obtiene estadísticas diarias de conversaciones"""
+    """Obtiene estadísticas diarias precalculadas (una fila por bot y día)"""
     try:
         conversation_logger = get_conversation_logger()
-        
-        # Si no se proporcionan fechas, usar últimos 30 días
-        if not start_date:
-            start_date = datetime.now().date()
-        if not end_date:
-            end_date = start_date
-        
-        # Obtener datos simplificados
-        result = conversation_logger.supabase.table('conversaciones')\
-            .select('created_at, bot_tipo, chat_id, empresa_id')\
-            .gte('created_at', start_date.isoformat())\
-            .lte('created_at', end_date.isoformat())\
-            .order('created_at', desc=True)\
-            .execute()
-        
-        return result.data if result.data else []
+        return await conversation_logger.get_daily_stats(start_date, end_date, bot_type)
         
     except Exception as e:
         logger.error(f"❌ Error obteniendo estadísticas diarias: {e}")
@@ -146,22 +196,114 @@ async def get_daily_stats(
 @router.get("/user-history/{chat_id}", response_model=List[Dict[str, Any]])
 async def get_user_conversation_history(
     chat_id: int,
-    limit: int = Query(50, ge=1, le=200, description="Número de conversaciones")
+    response: Response,
+    limit: int = Query(50, ge=1, le=200, description="Número de conversaciones"),
+    cursor: Optional[str] = Query(None, description="Cursor de X-Next-Cursor de la página anterior")
 ):
-    """Obtiene historial completo de conversaciones de un usuario"""
+    """Obtiene historial completo de conversaciones de un usuario (paginado por cursor)"""
     try:
         conversation_logger = get_conversation_logger()
         history = await conversation_logger.get_user_conversation_history(
             chat_id=chat_id, 
-            limit=limit
+            limit=limit + 1,
+            cursor=cursor
         )
         
-        return history
+        return _responder_pagina(response, history, limit)
         
+    except CursorInvalido as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"❌ Error obteniendo historial de usuario {chat_id}: {e}")
         raise HTTPException(status_code=500, detail="Error obteniendo historial de usuario")
 
+@router.get("/export")
+async def export_conversations(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$", description="Formato: ndjson o csv"),
+    start_date: Optional[date] = Query(None, description="Desde (YYYY-MM-DD, incluido)"),
+    end_date: Optional[date] = Query(None, description="Hasta (YYYY-MM-DD, incluido)"),
+    bot_type: Optional[str] = Query(None, description="Filtrar por tipo de bot (admin/production)"),
+    chat_id: Optional[int] = Query(None, description="Filtrar por chat"),
+    cursor: Optional[str] = Query(None, description="Reanudar después de la fila con este _cursor"),
+    page_size: int = Query(1000, ge=100, le=5000, description="Filas por consulta a Supabase")
+):
+    """
+    Exporta conversaciones en orden cronológico, en streaming.
+    
+    Pagina `conversaciones` por (created_at, id) y escribe cada página apenas
+    llega, así que la memoria no depende del rango. Cada fila lleva `_cursor`:
+    si la descarga se corta, se reanuda pasando el último recibido.
+    """
+    if cursor:
+        try:
+            decodificar_cursor(cursor)
+        except CursorInvalido as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    
+    conversation_logger = get_conversation_logger()
+    
+    def consultar_pagina(cursor_actual: Optional[str]) -> list:
+        query = conversation_logger.supabase.table('conversaciones')\
+            .select(', '.join(COLUMNAS_EXPORT))
+        if start_date:
+            query = query.gte('created_at', start_date.isoformat())
+        if end_date:
+            query = query.lt('created_at', (end_date + timedelta(days=1)).isoformat())
+        if bot_type:
+            query = query.eq('bot_tipo', bot_type)
+        if chat_id:
+            query = query.eq('chat_id', chat_id)
+        result = aplicar_keyset(query, cursor_actual, desc=False).limit(page_size).execute()
+        return result.data or []
+    
+    async def generar():
+        cursor_actual = cursor
+        if format == 'csv':
+            yield _fila_csv(COLUMNAS_EXPORT + ['_cursor'])
+        
+        total = 0
+        while True:
+            try:
+                # En un hilo: un export largo no debe frenar a los bots
+                filas = await asyncio.to_thread(consultar_pagina, cursor_actual)
+            except Exception as e:
+                logger.error(f"❌ Error exportando conversaciones (cursor={cursor_actual}): {e}")
+                # La respuesta ya empezó: se corta y el cliente reanuda con el último _cursor
+                return
+            
+            partes = []
+            for fila in filas:
+                fila['_cursor'] = cursor_actual = codificar_cursor(fila)
+                if format == 'csv':
+                    partes.append(_fila_csv([_valor_csv(fila.get(col)) for col in COLUMNAS_EXPORT + ['_cursor']]))
+                else:
+                    partes.append(json.dumps(fila, ensure_ascii=False, default=str) + '\n')
+            if partes:
+                yield ''.join(partes)
+            
+            total += len(filas)
+            if len(filas) < page_size:
+                logger.info(f"📤 Export de conversaciones completo: {total} filas")
+                return
+    
+    media_type = 'text/csv' if format == 'csv' else 'application/x-ndjson'
+    nombre = f"conversaciones_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{format}"
+    return StreamingResponse(
+        generar(),
+        media_type=media_type,
+        headers={'Content-Disposition': f'attachment; filename="{nombre}"'}
+    )
+
+def _valor_csv(valor: Any) -> Any:
+    if isinstance(valor, (dict, list)):
+        return json.dumps(valor, ensure_ascii=False)
+    return valor
+
+def _fila_csv(valores: list) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(valores)
+    return buffer.getvalue()
+
 @router.get("/last", response_model=Dict[str, Any])
 async def get_last_conversation(
     chat_id: Optional[int] = Query(None, description="Chat ID específico para obtener su último chat")
@@ -182,40 +324,68 @@ async def get_last_conversation(
         logger.error(f"❌ Error obteniendo último chat: {e}")
         raise HTTPException(status_code=500, detail="Error obteniendo último chat")
 
+@router.get("/stream")
+async def stream_conversations(
+    request: Request,
+    bot_type: Optional[str] = Query(None, description="Filtrar por tipo de bot (admin/production)"),
+    empresa_id: Optional[str] = Query(None, description="Filtrar por empresa"),
+    events: Optional[str] = Query(None, description="Eventos separados por coma: conversacion, acceso_denegado, stats")
+):
+    """
+    Feed en vivo (Server-Sent Events) para el dashboard.
+    
+    Envía un `snapshot` inicial con el resumen (cacheado) y luego eventos
+    `conversacion`, `acceso_denegado` y `stats` (deltas) a medida que se
+    registran, sin consultar la BD. Si el cliente no lee a tiempo se
+    descartan los eventos más antiguos y se avisa con un evento `perdidos`.
+    """
+    eventos = None
+    if events:
+        eventos = {e.strip() for e in events.split(',') if e.strip()}
+        desconocidos = eventos - set(EVENTOS)
+        if desconocidos:
+            raise HTTPException(status_code=400, detail=f"Eventos desconocidos: {', '.join(sorted(desconocidos))}")
+    
+    def formatear(tipo: str, datos: Any, evento_id: Optional[int] = None) -> str:
+        cabecera = f"id: {evento_id}\n" if evento_id is not None else ''
+        return f"{cabecera}event: {tipo}\ndata: {json.dumps(datos, ensure_ascii=False, default=str)}\n\n"
+    
+    async def generar():
+        try:
+            snapshot = {'hoy': get_stats_service().get_resumen_dia()}
+        except Exception as e:
+            logger.error(f"❌ Error obteniendo snapshot del feed: {e}")
+            snapshot = {}
+        yield "retry: 5000\n\n" + formatear('snapshot', snapshot)
+        
+        suscripcion = get_feed_en_vivo().suscribir(bot_type, empresa_id, eventos)
+        try:
+            async for evento in suscripcion:
+                if await request.is_disconnected():
+                    break
+                if evento is None:
+                    yield ": heartbeat\n\n"
+                else:
+                    yield formatear(evento['tipo'], evento['datos'], evento.get('id'))
+        finally:
+            await suscripcion.aclose()
+    
+    return StreamingResponse(
+        generar(),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 @router.get("/summary")
 async def get_conversation_summary():
     """Obtiene resumen rápido para el dashboard principal"""
     try:
-        conversation_logger = get_conversation_logger()
-        
-        # Obtener estadísticas de hoy
-        today = datetime.now().date().isoformat()
-        
-        # Conversaciones de hoy
-        today_conversations = conversation_logger.supabase.table('conversaciones')\
-            .select('chat_id, empresa_id, bot_tipo')\
-            .gte('created_at', f'{today}T00:00:00')\
-            .execute()
-        
-        # Usuarios no autorizados de la última semana
-        unauthorized = await conversation_logger.get_unauthorized_users(days=7)
-        
-        # Procesar datos
-        data = today_conversations.data if today_conversations.data else []
+        stats_service = get_stats_service()
         
+        # Hoy y última semana desde rollups y conteos head-only (cacheados)
         summary = {
-            'hoy': {
-                'total_conversaciones': len(data),
-                'usuarios_unicos': len(set(conv['chat_id'] for conv in data)),
-                'usuarios_autorizados': len([conv for conv in data if conv['empresa_id']]),
-                'usuarios_no_autorizados': len([conv for conv in data if not conv['empresa_id']]),
-                'bot_admin': len([conv for conv in data if conv['bot_tipo'] == 'admin']),
-                'bot_production': len([conv for conv in data if conv['bot_tipo'] == 'production'])
-            },
-            'semana': {
-                'usuarios_no_autorizados': len(unauthorized),
-                'intentos_totales': sum(user.get('intentos_acceso', 0) for user in unauthorized)
-            }
+            'hoy': stats_service.get_resumen_dia(),
+            'semana': stats_service.get_resumen_semana()
         }
         
         return summary
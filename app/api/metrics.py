@@ -0,0 +1,70 @@
+"""
+📈 API Endpoints de Métricas
+Endpoints para inspeccionar el rendimiento de las llamadas a Supabase
+"""
+
+from fastapi import APIRouter, HTTPException, Query
+from typing import List, Dict, Any
+import logging
+
+from app.database.instrumentation import get_registro_consultas
+from app.utils.tracing import get_trazador
+from app.services.scheduler_service import get_programador
+
+logger = logging.getLogger(__name__)
+router = APIRouter(prefix="/api/metrics", tags=["Metrics"])
+
+@router.get("/supabase", response_model=Dict[str, Any])
+async def get_supabase_metrics(
+    top: int = Query(20, ge=1, le=200, description="Número de consultas a mostrar (por tiempo total)")
+):
+    """Llamadas a Supabase por tabla/operación y por handler (llamadas por update, latencias)"""
+    try:
+        return get_registro_consultas().resumen(top=top)
+
+    except Exception as e:
+        logger.error(f"❌ Error obteniendo métricas de Supabase: {e}")
+        raise HTTPException(status_code=500, detail="Error obteniendo métricas de Supabase")
+
+@router.get("/supabase/slow", response_model=List[Dict[str, Any]])
+async def get_slow_queries(
+    limit: int = Query(50, ge=1, le=200, description="Número de consultas lentas a obtener")
+):
+    """Últimas consultas que superaron SUPABASE_SLOW_QUERY_MS"""
+    try:
+        return get_registro_consultas().consultas_lentas(limit=limit)
+
+    except Exception as e:
+        logger.error(f"❌ Error obteniendo consultas lentas: {e}")
+        raise HTTPException(status_code=500, detail="Error obteniendo consultas lentas")
+
+@router.post("/supabase/reset")
+async def reset_supabase_metrics():
+    """Reinicia las métricas acumuladas de Supabase"""
+    try:
+        get_registro_consultas().reiniciar()
+        return {"status": "success", "message": "Métricas de Supabase reiniciadas"}
+
+    except Exception as e:
+        logger.error(f"❌ Error reiniciando métricas de Supabase: {e}")
+        raise HTTPException(status_code=500, detail="Error reiniciando métricas")
+
+@router.get("/tracing", response_model=Dict[str, Any])
+async def get_tracing_stats():
+    """Estado del trazado por update (muestreo, buffer y exportación)"""
+    try:
+        return get_trazador().estadisticas()
+
+    except Exception as e:
+        logger.error(f"❌ Error obteniendo estado del trazado: {e}")
+        raise HTTPException(status_code=500, detail="Error obteniendo estado del trazado")
+
+@router.get("/scheduler", response_model=List[Dict[str, Any]])
+async def get_scheduler_status():
+    """Tareas programadas de esta réplica (intervalo, ejecuciones, última duración y resultado)"""
+    try:
+        return get_programador().estado()
+
+    except Exception as e:
+        logger.error(f"❌ Error obteniendo estado del programador: {e}")
+        raise HTTPException(status_code=500, detail="Error obteniendo estado del programador")
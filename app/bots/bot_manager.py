@@ -1,8 +1,13 @@
-from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, filters, ContextTypes
+from telegram.ext import Application, ApplicationHandlerStop, CommandHandler, MessageHandler, CallbackQueryHandler, TypeHandler, filters, ContextTypes
 from telegram import Update
 from app.config import Config
 from app.bots.handlers.admin_handlers import AdminHandlers
 from app.bots.handlers.production_handlers import ProductionHandlers
+from app.database.instrumentation import instrumentar_aplicacion
+from app.bots.rate_limiter import LimitadorEnvios
+from app.security.access_filter import get_filtro_acceso
+from app.services.coordination_service import get_coordinador
+from app.services.load_service import ColaUpdates
 import logging
 import asyncio
 
@@ -15,29 +20,87 @@ class BotManager:
         self.admin_app = None
         self.production_app = None
     
-    async def initialize_bots(self):
-        """Inicializar ambos bots"""
+    async def initialize_bots(self, bots: tuple = None):
+        """
+        Inicializar los bots de este proceso
+        
+        Args:
+            bots: 'admin' y/o 'production' (por defecto Config.bots_del_proceso())
+        """
+        bots = Config.bots_del_proceso() if bots is None else bots
         try:
             # Inicializar bot admin
-            self.admin_app = Application.builder().token(Config.BOT_ADMIN_TOKEN).build()
-            self._setup_admin_handlers()
+            if "admin" in bots:
+                self.admin_app = self._builder(Config.BOT_ADMIN_TOKEN, "admin").build()
+                self._setup_admin_handlers()
+                # Con varias réplicas, los updates de chats de otra réplica se le reenvían primero
+                self._setup_reparto(self.admin_app, "admin")
+                # Chats no registrados que ya recibieron su aviso: se descartan antes de los handlers
+                self._setup_filtro_acceso(self.admin_app, "admin")
+                # Atribuir llamadas a Supabase al update/handler que las origina
+                instrumentar_aplicacion(self.admin_app, "admin")
             
             # Inicializar bot de producción
-            self.production_app = Application.builder().token(Config.BOT_PRODUCTION_TOKEN).build()
-            self._setup_production_handlers()
+            if "production" in bots:
+                self.production_app = self._builder(Config.BOT_PRODUCTION_TOKEN, "production").build()
+                self._setup_production_handlers()
+                self._setup_reparto(self.production_app, "production")
+                self._setup_filtro_acceso(self.production_app, "production")
+                instrumentar_aplicacion(self.production_app, "production")
             
-            logger.info("Bots inicializados correctamente")
+            logger.info(f"Bots inicializados correctamente: {', '.join(bots)}")
             
         except Exception as e:
             logger.error(f"Error inicializando bots: {e}")
             raise
     
+    @staticmethod
+    def _builder(token: str, bot_type: str):
+        """ApplicationBuilder con los envíos encolados según los límites de Telegram y la espera en cola medida"""
+        builder = Application.builder().token(token).update_queue(ColaUpdates(bot_type))
+        if Config.ENVIOS_LIMITADOR_ENABLED:
+            builder = builder.rate_limiter(LimitadorEnvios(bot_type))
+        return builder
+    
+    @staticmethod
+    def _setup_reparto(app: Application, bot_type: str):
+        """Handler previo (grupo -2) que reenvía el update a la réplica dueña de su chat"""
+        coordinador = get_coordinador()
+        
+        async def procesar_local(update: Update):
+            # El dueño no respondió: el update vuelve a la cola de este bot
+            await app.update_queue.put(update)
+        
+        async def repartir(update: Update, context: ContextTypes.DEFAULT_TYPE):
+            if await coordinador.repartir(bot_type, update, al_fallar=procesar_local):
+                raise ApplicationHandlerStop
+        
+        repartir._instrumentado = True
+        app.add_handler(TypeHandler(Update, repartir), group=-2)
+    
+    def _app(self, bot_type: str):
+        return self.admin_app if bot_type == "admin" else self.production_app if bot_type == "production" else None
+    
+    @staticmethod
+    def _setup_filtro_acceso(app: Application, bot_type: str):
+        """Handler previo (grupo -1) que corta los updates de chats desconocidos ya avisados"""
+        filtro = get_filtro_acceso()
+        
+        async def descartar(update: Update, context: ContextTypes.DEFAULT_TYPE):
+            await filtro.descartar_desconocidos(update, context, bot_type)
+        
+        # Corre antes de cada update: sin traza ni conteo propio (los lleva el handler real)
+        descartar._instrumentado = True
+        app.add_handler(TypeHandler(Update, descartar), group=-1)
+    
     def _setup_admin_handlers(self):
         """Configurar manejadores del bot admin"""
         # Comandos
         self.admin_app.add_handler(CommandHandler("start", AdminHandlers.start_command))
         self.admin_app.add_handler(CommandHandler("crear_empresa", AdminHandlers.crear_empresa_command))
         self.admin_app.add_handler(CommandHandler("adduser", AdminHandlers.adduser_command))
+        self.admin_app.add_handler(CommandHandler("difundir", AdminHandlers.difundir_command))
+        self.admin_app.add_handler(CommandHandler("difusiones", AdminHandlers.difusiones_command))
         
         # Callbacks
         self.admin_app.add_handler(CallbackQueryHandler(AdminHandlers.handle_callback))
@@ -90,21 +153,26 @@ class BotManager:
         ))
     
     async def start_bots(self):
-        """Iniciar ambos bots"""
+        """
+        Iniciar los bots de este proceso
+        
+        El polling lo inicia el coordinador de réplicas solo en la réplica
+        líder de cada bot; las demás reciben sus updates por /interno/updates.
+        """
         try:
             # Verificar que los bots estén inicializados
-            if not self.admin_app or not self.production_app:
+            if not self.admin_app and not self.production_app:
                 await self.initialize_bots()
             
-            # Inicializar y iniciar bot admin
-            await self.admin_app.initialize()
-            await self.admin_app.start()
-            await self.admin_app.updater.start_polling(drop_pending_updates=True)
+            bots = []
+            for bot_type in ("admin", "production"):
+                bot_app = self._app(bot_type)
+                if bot_app:
+                    await bot_app.initialize()
+                    await bot_app.start()
+                    bots.append(bot_type)
             
-            # Inicializar y iniciar bot de producción
-            await self.production_app.initialize()
-            await self.production_app.start()
-            await self.production_app.updater.start_polling(drop_pending_updates=True)
+            await get_coordinador().iniciar(bots, self._al_cambiar_liderazgo)
             
             logger.info("Bots iniciados y escuchando mensajes")
             
@@ -112,18 +180,48 @@ class BotManager:
             logger.error(f"Error iniciando bots: {e}")
             raise
     
+    async def _al_cambiar_liderazgo(self, bot_type: str, es_lider: bool):
+        """Iniciar o detener el polling del bot según el liderazgo de esta réplica"""
+        bot_app = self._app(bot_type)
+        if bot_app is None:
+            return
+        if es_lider and not bot_app.updater.running:
+            # Al tomar el polling de otra réplica se conservan los updates que quedaron pendientes
+            await bot_app.updater.start_polling(drop_pending_updates=not get_coordinador().multi_replica)
+            logger.info(f"Polling de {bot_type} iniciado en esta réplica")
+        elif not es_lider and bot_app.updater.running:
+            await bot_app.updater.stop()
+            logger.info(f"Polling de {bot_type} detenido: lo hace otra réplica")
+    
+    async def recibir_update(self, bot_type: str, datos: dict) -> bool:
+        """
+        Encolar un update reenviado por la réplica líder
+        
+        Returns:
+            False si este proceso no ejecuta el bot
+        """
+        bot_app = self._app(bot_type)
+        if bot_app is None or not bot_app.running:
+            return False
+        update = Update.de_json(datos, bot_app.bot)
+        get_coordinador().marcar_recibido(bot_type, update.update_id)
+        await bot_app.update_queue.put(update)
+        return True
+    
     async def stop_bots(self):
-        """Detener ambos bots"""
+        """Detener los bots de este proceso"""
         try:
-            if self.admin_app:
-                await self.admin_app.updater.stop()
-                await self.admin_app.stop()
-                await self.admin_app.shutdown()
+            for bot_app in (self.admin_app, self.production_app):
+                if bot_app and bot_app.updater.running:
+                    await bot_app.updater.stop()
+            
+            # Sin polling ya no hay dos getUpdates a la vez: otra réplica lo retoma sin esperar el lease
+            await get_coordinador().detener()
             
-            if self.production_app:
-                await self.production_app.updater.stop()
-                await self.production_app.stop()
-                await self.production_app.shutdown()
+            for bot_app in (self.admin_app, self.production_app):
+                if bot_app:
+                    await bot_app.stop()
+                    await bot_app.shutdown()
             
             logger.info("Bots detenidos correctamente")
             
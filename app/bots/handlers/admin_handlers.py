@@ -1,9 +1,13 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 from app.security.auth import security
+from app.security.access_filter import get_filtro_acceso
+from app.security.permissions import get_permisos
 from app.database.supabase import supabase
 from app.config import Config
 from app.decorators.conversation_logging import log_admin_conversation, log_admin_action, log_unauthorized_access
+from app.services.stats_service import get_stats_service
+from app.services.broadcast_service import get_broadcast_service
 import logging
 
 logger = logging.getLogger(__name__)
@@ -48,7 +52,7 @@ class AdminHandlers:
         await AdminHandlers._show_main_menu(update.message)
     
     @staticmethod
-    @log_unauthorized_access()
+    @log_unauthorized_access("admin")
     async def _handle_unauthorized_admin(update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Manejar intentos no autorizados al bot admin"""
         # Crear botón de contacto directo
@@ -186,6 +190,10 @@ class AdminHandlers:
                         'activo': True
                     }).execute()
             
+            # Sus mensajes ya no se rechazan por la caché de chats desconocidos
+            get_filtro_acceso().olvidar(user_chat_id)
+            get_permisos().invalidar(user_chat_id)
+            
             # Mensaje de confirmación
             await update.message.reply_text(
                 mensaje +
@@ -212,6 +220,114 @@ class AdminHandlers:
                 f"Error: {str(e)}"
             )
     
+    @staticmethod
+    @log_admin_action("difundir")
+    async def difundir_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """
+        Enviar un mensaje a todos los usuarios de una o más empresas
+        Formato: /difundir RUT[,RUT...]|todas MENSAJE
+        """
+        chat_id = update.effective_chat.id
+        
+        if not security.is_admin(chat_id):
+            await update.message.reply_text("🚫 No tienes permisos de administrador.")
+            return
+        
+        # El texto crudo conserva los saltos de línea del mensaje (context.args no)
+        partes = (update.message.text or '').split(None, 2)
+        if len(partes) < 3:
+            await update.message.reply_text(
+                "❌ *Formato incorrecto*\n\n"
+                "Usa: `/difundir RUT[,RUT...] MENSAJE` o `/difundir todas MENSAJE`\n\n"
+                "*Ejemplo*: `/difundir 76142021-6 Hola {nombre}, ya está disponible el reporte mensual de {empresa}`\n\n"
+                "💡 `{nombre}` y `{empresa}` se reemplazan para cada usuario",
+                parse_mode='Markdown'
+            )
+            return
+        
+        destino, mensaje = partes[1], partes[2]
+        try:
+            query = supabase.table('empresas').select('id, rut').eq('activo', True)
+            if destino.lower() != 'todas':
+                ruts = [r.strip() for r in destino.split(',') if r.strip()]
+                query = query.in_('rut', ruts)
+            empresas = query.execute().data or []
+            
+            if destino.lower() != 'todas':
+                faltantes = set(ruts) - {e['rut'] for e in empresas}
+                if faltantes:
+                    await update.message.reply_text(
+                        f"❌ *Empresas no encontradas*\n\nRUT: `{', '.join(sorted(faltantes))}`",
+                        parse_mode='Markdown'
+                    )
+                    return
+            if not empresas:
+                await update.message.reply_text("❌ No hay empresas activas")
+                return
+            
+            servicio = get_broadcast_service()
+            difusion = servicio.crear(mensaje, [e['id'] for e in empresas], creada_por=chat_id)
+            if not difusion:
+                await update.message.reply_text("❌ Error al registrar la difusión")
+                return
+            await servicio.iniciar(difusion['id'])
+            
+            await update.message.reply_text(
+                f"📣 *Difusión iniciada*\n\n"
+                f"🆔 `{difusion['id']}`\n"
+                f"🏢 Empresas: {len(empresas)}\n\n"
+                f"Te avisaré al terminar. Avance: `/difusiones {difusion['id']}`",
+                parse_mode='Markdown'
+            )
+            
+        except Exception as e:
+            logger.error(f"Error iniciando difusión: {e}")
+            await update.message.reply_text(f"❌ Error al iniciar la difusión: {str(e)}")
+    
+    @staticmethod
+    @log_admin_action("difusiones")
+    async def difusiones_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """
+        Avance de las difusiones
+        Formato: /difusiones [ID] [cancelar]
+        """
+        chat_id = update.effective_chat.id
+        
+        if not security.is_admin(chat_id):
+            await update.message.reply_text("🚫 No tienes permisos de administrador.")
+            return
+        
+        servicio = get_broadcast_service()
+        args = context.args or []
+        
+        if len(args) >= 2 and args[1].lower() == 'cancelar':
+            cancelada = servicio.cancelar(args[0])
+            await update.message.reply_text(
+                "🛑 Difusión cancelada" if cancelada else "❌ Difusión no encontrada o ya finalizada"
+            )
+            return
+        
+        difusiones = [servicio.obtener(args[0])] if args else servicio.listar(limit=5)
+        difusiones = [d for d in difusiones if d]
+        if not difusiones:
+            await update.message.reply_text("📣 No hay difusiones")
+            return
+        
+        iconos = {'pendiente': '⏳', 'en_curso': '📤', 'completada': '✅', 'cancelada': '🛑'}
+        texto = "📣 Difusiones\n\n"
+        for d in difusiones:
+            texto += (
+                f"{iconos.get(d['estado'], '❓')} {d['id']}\n"
+                f"   {d['mensaje'][:60]}\n"
+                f"   ✅ {d['enviados']}  🚫 {d['bloqueados']}  ❌ {d['fallidos']}"
+                f"  ⚡ {d['mensajes_por_segundo'] or 0}/s\n"
+            )
+            if args:
+                for error in (d.get('ultimos_errores') or [])[-5:]:
+                    texto += f"   • {error['chat_id']}: {error['error'][:80]}\n"
+            texto += "\n"
+        await update.message.reply_text(texto)
+    
     @staticmethod
     @log_admin_conversation
     async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -369,23 +485,14 @@ class AdminHandlers:
     async def _show_stats(query):
         """Mostrar estadísticas del sistema"""
         try:
-            # Contar empresas
-            empresas_response = supabase.client.table('empresas').select('id', count='exact').eq('activo', True).execute()
-            empresas_count = empresas_response.count if hasattr(empresas_response, 'count') else 0
-            
-            # Contar usuarios
-            usuarios_response = supabase.client.table('usuarios').select('id', count='exact').eq('activo', True).execute()
-            usuarios_count = usuarios_response.count if hasattr(usuarios_response, 'count') else 0
-            
-            # Contar conversaciones
-            conv_response = supabase.client.table('conversaciones').select('id', count='exact').execute()
-            conv_count = conv_response.count if hasattr(conv_response, 'count') else 0
+            # Conteos head-only + rollups, cacheados (ver StatsService)
+            stats = get_stats_service().get_stats_sistema()
             
             text = (
                 "📊 **Estadísticas del Sistema**\n\n"
-                f"🏢 **Empresas activas:** {empresas_count}\n"
-                f"👥 **Usuarios registrados:** {usuarios_count}\n"
-                f"💬 **Conversaciones totales:** {conv_count}\n\n"
+                f"🏢 **Empresas activas:** {stats['empresas_activas']}\n"
+                f"👥 **Usuarios registrados:** {stats['usuarios_activos']}\n"
+                f"💬 **Conversaciones totales:** {stats['conversaciones_totales']}\n\n"
                 "Última actualización: Ahora"
             )
             
@@ -620,19 +727,15 @@ class AdminHandlers:
         try:
             from datetime import datetime
             
-            empresas_count = supabase.table('empresas').select('id', count='exact').execute()
-            usuarios_count = supabase.table('usuarios').select('id', count='exact').execute()
-            conversaciones_count = supabase.table('conversaciones').select('id', count='exact').execute()
-            
-            hoy = datetime.now().date().isoformat()
-            conversaciones_hoy = supabase.table('conversaciones').select('id', count='exact').gte('created_at', hoy).execute()
+            stats = get_stats_service().get_stats_sistema()
+            actualizado = datetime.fromisoformat(stats['actualizado'])
             
             texto = f"📈 *Estadísticas del Sistema*\n\n"
-            texto += f"🏢 Empresas: {empresas_count.count}\n"
-            texto += f"👥 Usuarios: {usuarios_count.count}\n"
-            texto += f"💬 Conversaciones: {conversaciones_count.count}\n"
-            texto += f"📅 Hoy: {conversaciones_hoy.count}\n\n"
-            texto += f"🕐 Actualizado: {datetime.now().strftime('%H:%M:%S')}"
+            texto += f"🏢 Empresas: {stats['empresas_activas']}\n"
+            texto += f"👥 Usuarios: {stats['usuarios_activos']}\n"
+            texto += f"💬 Conversaciones: {stats['conversaciones_totales']}\n"
+            texto += f"📅 Hoy: {stats['conversaciones_hoy']}\n\n"
+            texto += f"🕐 Actualizado: {actualizado.strftime('%H:%M:%S')}"
             
             keyboard = [[InlineKeyboardButton("🔙 Volver", callback_data="back_to_menu")]]
             await query.edit_message_text(texto, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='Markdown')
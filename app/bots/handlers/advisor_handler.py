@@ -3,6 +3,7 @@
 Analista de Consultas Q&A financiero-contable
 """
 
+import asyncio
 import logging
 from datetime import datetime
 from typing import Optional, Dict, Any, List
@@ -15,6 +16,9 @@ from app.database.supabase import supabase
 from app.services.session_manager import get_session_manager
 from app.services.ai_service import get_ai_service
 from app.services.openai_assistant_service import get_assistant_service
+from app.services.document_index_service import get_document_index_service
+from app.services.financial_metrics_service import get_financial_metrics_service, cuentas_en_pregunta
+from app.services.load_service import get_controlador_carga, MODO_ASESOR
 from app.config import Config
 
 logger = logging.getLogger(__name__)
@@ -473,7 +477,10 @@ class AdvisorHandler:
     ) -> str:
         """
         Procesar pregunta con PolicyGate y AI.
-        Usa OpenAI Assistants si hay PDFs procesados, sino usa método tradicional.
+        Responde preguntas numéricas desde las series precalculadas; si no, usa
+        pasajes del índice local, luego OpenAI Assistants si hay PDFs
+        procesados, y si no el método tradicional. Bajo sobrecarga responde
+        solo con cifras y metadatos, sin llamar a OpenAI.
         
         Args:
             chat_id: Chat ID del usuario
@@ -492,7 +499,59 @@ class AdvisorHandler:
         
         logger.info(f"🔍 Procesando pregunta para empresa {empresa_id}: '{pregunta[:50]}...'")
         
+        if get_controlador_carga().degradado(MODO_ASESOR):
+            logger.info("🚦 Asesor en modo degradado: respuesta con metadatos")
+            return await AdvisorHandler._respuesta_metadatos(chat_id, empresa_id, pregunta)
+        
         try:
+            # Obtener historial de conversación
+            qa_history = session_data.get('qa_history', [])
+            historial = [{'mensaje': q.get('pregunta', '')} for q in qa_history[-5:]]
+            
+            # Preguntas numéricas: cifras precalculadas, el LLM solo redacta
+            cuentas = cuentas_en_pregunta(pregunta)
+            if cuentas:
+                cifras = await asyncio.to_thread(get_financial_metrics_service().resumen, empresa_id, cuentas)
+                if cifras:
+                    logger.info(f"📈 Usando cifras precalculadas ({', '.join(cifras)})")
+                    
+                    result = await get_ai_service().answer_as_aca_qa(
+                        pregunta=pregunta,
+                        empresa_nombre=empresa_nombre,
+                        reportes_financieros=[],
+                        reportes_cfo=[],
+                        historial=historial,
+                        cifras=cifras
+                    )
+                    
+                    respuesta = result.get('respuesta', 'No pude procesar tu consulta.')
+                    if result.get('requiere_ticket', False):
+                        respuesta += "\n\n🎫 _Esta solicitud ha sido marcada para revisión del equipo._"
+                    return respuesta
+            
+            # Índice local: pasajes relevantes de los PDFs y una completion simple
+            pasajes = await asyncio.to_thread(get_document_index_service().buscar, empresa_id, pregunta)
+            
+            if pasajes:
+                logger.info(f"🔎 Usando índice local ({len(pasajes)} pasajes)")
+                
+                result = await get_ai_service().answer_as_aca_qa(
+                    pregunta=pregunta,
+                    empresa_nombre=empresa_nombre,
+                    reportes_financieros=[],
+                    reportes_cfo=[],
+                    historial=historial,
+                    pasajes=pasajes
+                )
+                
+                respuesta = result.get('respuesta', 'No pude procesar tu consulta.')
+                if result.get('requiere_ticket', False):
+                    respuesta += "\n\n🎫 _Esta solicitud ha sido marcada para revisión del equipo._"
+                
+                documentos = {p['archivo_id'] for p in pasajes}
+                respuesta += f"\n\n📎 _Basado en {len(documentos)} documento(s)_"
+                return respuesta
+            
             # Verificar si la empresa tiene PDFs procesados en OpenAI
             archivos_openai = await assistant_service.get_assistant_files_count(empresa_id)
             
@@ -546,10 +605,6 @@ class AdvisorHandler:
                 limit=limit_reportes
             )
             
-            # Obtener historial de conversación
-            qa_history = session_data.get('qa_history', [])
-            historial = [{'mensaje': q.get('pregunta', '')} for q in qa_history[-5:]]
-            
             logger.info(f"📊 Contexto: {len(reportes_financieros)} reportes financieros, {len(reportes_cfo)} reportes CFO")
             
             # Llamar a AI con rol ACA_QA
@@ -577,6 +632,46 @@ class AdvisorHandler:
             logger.error(f"❌ Error procesando pregunta: {e}")
             return "Lo siento, hubo un error al consultar la información. Por favor, intenta de nuevo."
     
+    @staticmethod
+    async def _respuesta_metadatos(chat_id: int, empresa_id: str, pregunta: str) -> str:
+        """
+        Respuesta reducida sin LLM (modo degradado): cifras precalculadas de
+        las cuentas mencionadas y los reportes más recientes disponibles
+        """
+        def monto(valor):
+            return 'N/A' if valor is None else f"${valor:,.0f}".replace(',', '.')
+        
+        try:
+            cuentas = cuentas_en_pregunta(pregunta)
+            cifras = await asyncio.to_thread(get_financial_metrics_service().resumen, empresa_id, cuentas) if cuentas else {}
+            reportes = await asyncio.to_thread(
+                supabase.get_reportes_financieros, empresa_id=empresa_id, chat_id=chat_id, limit=5
+            )
+        except Exception as e:
+            logger.error(f"❌ Error armando respuesta con metadatos: {e}")
+            cifras, reportes = {}, []
+        
+        lineas = ["⏳ _Hay mucha demanda en este momento, te respondo con los datos disponibles sin análisis._"]
+        
+        for cuenta, datos in cifras.items():
+            anual = datos['variacion_anual']
+            linea = f"• *{escape_markdown(cuenta)}* ({anual['periodo']}): {monto(anual['actual'])}"
+            if anual.get('variacion_pct') is not None:
+                linea += f" ({anual['variacion_pct']:+.1f}% vs año anterior)"
+            lineas.append(linea)
+        
+        if reportes:
+            lineas.append("\n📂 *Reportes más recientes:*")
+            for reporte in reportes:
+                nombre = reporte.get('nombre_original') or reporte.get('nombre_archivo') or 'Archivo'
+                periodo = f" ({reporte['periodo']})" if reporte.get('periodo') else ""
+                lineas.append(f"• {escape_markdown(nombre)}{periodo}")
+        elif not cifras:
+            lineas.append("No encontré cifras ni reportes para responder ahora.")
+        
+        lineas.append("\n🔁 _Vuelve a preguntar en unos minutos para un análisis completo._")
+        return "\n".join(lineas)
+    
     @staticmethod
     def _detect_forbidden_action(message: str) -> bool:
         """Detectar si el mensaje solicita una acción prohibida"""
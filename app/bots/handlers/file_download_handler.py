@@ -7,8 +7,10 @@ from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 from app.security.auth import security
 from app.database.supabase import supabase
+from app.database.projections import ARCHIVO_MENU
 from app.services.session_manager import get_session_manager
 from app.services.storage_service import get_storage_service
+from app.services.catalog_service import get_catalog_service
 from app.services.ai_service import get_ai_service
 from app.services.conversation_logger import get_conversation_logger
 from app.utils.file_types import (
@@ -20,11 +22,15 @@ from app.utils.file_types import (
     validar_subtipo
 )
 from app.decorators.conversation_logging import log_production_conversation
+from app.utils.tracing import trazar
 from datetime import datetime, timedelta
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Períodos con archivos que se ofrecen como botones (el resto con "Otro mes")
+MAX_BOTONES_PERIODO = 8
+
 def escape_markdown(text):
     """Escapar caracteres especiales para Markdown"""
     if not text:
@@ -268,7 +274,8 @@ class FileDownloadHandler:
             await FileDownloadHandler._ask_subtipo(message, categoria)
         elif falta_periodo:
             session_manager.update_session(chat_id=chat_id, estado='esperando_periodo')
-            await FileDownloadHandler._ask_periodo(message)
+            periodos = await FileDownloadHandler._periodos_disponibles(chat_id, session_data)
+            await FileDownloadHandler._ask_periodo(message, periodos)
         elif falta_empresa:
             # ✅ Preguntar empresa al FINAL, solo si tiene múltiples empresas
             await FileDownloadHandler._ask_empresa(message, empresas, intent)
@@ -351,23 +358,75 @@ class FileDownloadHandler:
             raise
     
     @staticmethod
-    async def _ask_periodo(message_or_query):
-        """Preguntar período del archivo"""
-        current_month = datetime.now().strftime("%Y-%m")
-        last_month = (datetime.now().replace(day=1) - timedelta(days=1)).strftime("%Y-%m")
-        
-        text = "📅 **¿Para qué período necesitas los archivos?**\n\nSelecciona una opción:"
-        
-        keyboard = [
-            [
-                InlineKeyboardButton(f"🟢 Actual ({current_month})", callback_data="download_periodo_actual"),
-                InlineKeyboardButton(f"🟡 Anterior ({last_month})", callback_data="download_periodo_anterior")
-            ],
-            [
-                InlineKeyboardButton("📅 Otro mes", callback_data="download_periodo_otro"),
+    async def _periodos_disponibles(chat_id: int, session_data: dict):
+        """
+        Períodos con archivos para la categoría y subtipo de la sesión.
+        
+        Si aún no se eligió empresa se consideran todas las del usuario
+        (la empresa se pregunta al final). None si el catálogo no está disponible.
+        """
+        if session_data.get('empresa_id'):
+            empresa_ids = [session_data['empresa_id']]
+        else:
+            empresa_ids = [e['id'] for e in await FileDownloadHandler._get_user_empresas(chat_id)]
+        return get_catalog_service().periodos_disponibles(
+            empresa_ids,
+            categoria=session_data.get('categoria'),
+            subtipo=session_data.get('subtipo')
+        )
+    
+    @staticmethod
+    async def _ask_periodo(message_or_query, periodos: list = None):
+        """
+        Preguntar período del archivo
+        
+        Args:
+            periodos: Períodos con archivos (del catálogo). Si es None se ofrecen
+                      el mes actual, el anterior y "Otro mes".
+        """
+        if periodos is None:
+            current_month = datetime.now().strftime("%Y-%m")
+            last_month = (datetime.now().replace(day=1) - timedelta(days=1)).strftime("%Y-%m")
+            
+            text = "📅 **¿Para qué período necesitas los archivos?**\n\nSelecciona una opción:"
+            
+            keyboard = [
+                [
+                    InlineKeyboardButton(f"🟢 Actual ({current_month})", callback_data="download_periodo_actual"),
+                    InlineKeyboardButton(f"🟡 Anterior ({last_month})", callback_data="download_periodo_anterior")
+                ],
+                [
+                    InlineKeyboardButton("📅 Otro mes", callback_data="download_periodo_otro"),
+                    InlineKeyboardButton("❌ Cancelar", callback_data="download_cancelar")
+                ]
+            ]
+        elif not periodos:
+            text = "📭 **No hay archivos de este tipo todavía.**\n\n¿Quieres buscar en otra categoría?"
+            
+            keyboard = [[
+                InlineKeyboardButton("🔙 Volver", callback_data="download_back_categoria"),
                 InlineKeyboardButton("❌ Cancelar", callback_data="download_cancelar")
+            ]]
+        else:
+            from app.utils.file_types import organizar_botones_en_columnas
+            current_month = datetime.now().strftime("%Y-%m")
+            
+            text = "📅 **¿Para qué período necesitas los archivos?**\n\nSolo se muestran períodos con archivos:"
+            
+            botones = [
+                InlineKeyboardButton(
+                    f"🟢 {periodo}" if periodo == current_month else f"📅 {periodo}",
+                    callback_data=f"download_periodo_{periodo}"
+                )
+                for periodo in periodos[:MAX_BOTONES_PERIODO]
             ]
-        ]
+            keyboard = organizar_botones_en_columnas(botones, columnas=2)
+            
+            # Períodos más antiguos: se escriben y los interpreta la IA
+            ultima_fila = [InlineKeyboardButton("❌ Cancelar", callback_data="download_cancelar")]
+            if len(periodos) > MAX_BOTONES_PERIODO:
+                ultima_fila.insert(0, InlineKeyboardButton("📅 Otro mes", callback_data="download_periodo_otro"))
+            keyboard.append(ultima_fila)
         reply_markup = InlineKeyboardMarkup(keyboard)
         
         # Detectar si es Message o CallbackQuery
@@ -377,6 +436,7 @@ class FileDownloadHandler:
             await message_or_query.reply_text(text, reply_markup=reply_markup, parse_mode='Markdown')
     
     @staticmethod
+    @trazar()
     async def _buscar_archivos(
         empresa_id: str,
         categoria: str,
@@ -391,8 +451,14 @@ class FileDownloadHandler:
             logger.info(f"  • subtipo: {subtipo}")
             logger.info(f"  • periodo: {periodo}")
             
+            archivos = get_catalog_service().buscar(empresa_id, categoria, subtipo, periodo)
+            if archivos is not None:
+                logger.info(f"🗂️ RESULTADOS (catálogo): {len(archivos)} archivo(s) encontrado(s)")
+                return archivos
+            
+            # Catálogo no disponible: consultar la BD
             query = supabase.table('archivos')\
-                .select('*')\
+                .select(ARCHIVO_MENU.select)\
                 .eq('empresa_id', empresa_id)\
                 .eq('activo', True)
             
@@ -413,7 +479,7 @@ class FileDownloadHandler:
                 for idx, archivo in enumerate(result.data, 1):
                     logger.info(f"  Archivo {idx}: {archivo.get('nombre_original', 'Sin nombre')} - Período: {archivo.get('periodo', 'N/A')}")
             
-            return result.data if result.data else []
+            return ARCHIVO_MENU.filas(result.data)
             
         except Exception as e:
             logger.error(f"Error buscando archivos: {e}")
@@ -486,8 +552,8 @@ class FileDownloadHandler:
             archivo_id = archivo.get('id')
             nombre = escape_markdown(archivo.get('nombre_original', archivo.get('nombre_archivo', 'Sin nombre')))
             
-            # Regenerar URL firmada
-            url = await storage_service.get_file_url(archivo_id, regenerate=True) if archivo_id else archivo.get('url_archivo', '')
+            # URL firmada (una vigente por al menos media hora sale de la caché)
+            url = await storage_service.get_file_url(archivo_id) if archivo_id else archivo.get('url_archivo', '')
             
             logger.info(f"📄 Mostrando archivo único: {nombre}, URL generada: {url is not None}")
             
@@ -758,7 +824,8 @@ class FileDownloadHandler:
                 estado='esperando_periodo',
                 data=session.get('data', {})  # Mantener categoría y subtipo
             )
-            await FileDownloadHandler._ask_periodo(query)
+            periodos = await FileDownloadHandler._periodos_disponibles(chat_id, session.get('data', {}))
+            await FileDownloadHandler._ask_periodo(query, periodos)
             return
         
         # Volver al menú principal (cuando no se encontraron archivos)
@@ -895,7 +962,8 @@ class FileDownloadHandler:
                 estado='esperando_periodo',
                 data=session_data
             )
-            await FileDownloadHandler._ask_periodo(query)
+            periodos = await FileDownloadHandler._periodos_disponibles(chat_id, session_data)
+            await FileDownloadHandler._ask_periodo(query, periodos)
         
         # Seleccionar período
         elif callback_data.startswith("download_periodo_"):
@@ -938,6 +1006,20 @@ class FileDownloadHandler:
             logger.info(f"🏢 Usuario tiene {len(empresas)} empresa(s)")
             logger.info(f"📋 session_data actual: empresa_id={session_data.get('empresa_id')}, categoria={session_data.get('categoria')}, subtipo={session_data.get('subtipo')}, periodo={periodo}")
             
+            if len(empresas) > 1 and not session_data.get('empresa_id'):
+                # Ofrecer solo las empresas con archivos para lo elegido (si el catálogo responde)
+                catalogo = get_catalog_service()
+                con_archivos = [
+                    e for e in empresas
+                    if catalogo.buscar(e['id'], session_data.get('categoria'), session_data.get('subtipo'), periodo)
+                ]
+                if len(con_archivos) == 1:
+                    session_data['empresa_id'] = con_archivos[0]['id']
+                    session_data['empresa_nombre'] = con_archivos[0]['nombre']
+                    logger.info(f"🗂️ Única empresa con archivos para {periodo}: {con_archivos[0]['nombre']}")
+                elif con_archivos:
+                    empresas = con_archivos
+            
             if len(empresas) > 1 and not session_data.get('empresa_id'):
                 # Usuario tiene múltiples empresas y no ha seleccionado una
                 logger.info(f"✅ Usuario tiene {len(empresas)} empresas, preguntando cuál seleccionar")
@@ -976,7 +1058,7 @@ class FileDownloadHandler:
         """Enviar un archivo individual al usuario"""
         try:
             storage_service = get_storage_service()
-            url = await storage_service.get_file_url(archivo_id, regenerate=True)
+            url = await storage_service.get_file_url(archivo_id)
             
             if not url:
                 await query.answer("❌ No se pudo obtener el archivo", show_alert=True)
@@ -1029,7 +1111,7 @@ class FileDownloadHandler:
             # Obtener información de todos los archivos
             for idx, archivo_id in enumerate(archivos_ids[:8], 1):  # Máximo 8 archivos
                 try:
-                    url = await storage_service.get_file_url(archivo_id, regenerate=True)
+                    url = await storage_service.get_file_url(archivo_id)
                     if url:
                         file_info = supabase.table('archivos').select('nombre_original, nombre_archivo').eq('id', archivo_id).execute()
                         nombre = "Archivo"
@@ -13,6 +13,7 @@ from app.services.storage_service import get_storage_service
 from app.services.ai_service import get_ai_service
 from app.services.conversation_logger import get_conversation_logger
 from app.services.openai_assistant_service import get_assistant_service
+from app.services.document_index_service import get_document_index_service
 from app.utils.file_types import (
     get_botones_categorias,
     get_botones_subtipos,
@@ -674,6 +675,12 @@ class FileUploadHandler:
                     except Exception as e:
                         logger.error(f"❌ Error subiendo a OpenAI: {e}")
                 
+                # Indexar texto del PDF para el Asesor IA (en segundo plano)
+                if extension == '.pdf':
+                    get_document_index_service().indexar_en_segundo_plano(
+                        empresa_id, archivo_result, bytes(file_bytes)
+                    )
+                
                 # Limpiar sesión
                 session_manager.clear_session(chat_id)
                 
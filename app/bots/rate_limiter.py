@@ -0,0 +1,301 @@
+"""
+🚦 Limitador de Envíos a Telegram
+Colas por chat con token buckets, fusión de ediciones y pausas por flood wait (BaseRateLimiter de PTB)
+"""
+
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Callable, Coroutine, Deque, Dict, Optional, Tuple, Union
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+from app.config import Config
+from app.utils.metrics import get_registro_metricas
+from app.utils.tracing import span
+
+logger = logging.getLogger(__name__)
+
+registro = get_registro_metricas()
+ESPERA_COLA = registro.histograma(
+    'aca_telegram_send_queue_ms', 'Espera de un envío a Telegram en su cola antes de salir', ('bot', 'metodo'),
+    buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+)
+ENVIOS_EN_COLA = registro.medidor(
+    'aca_telegram_send_queue_depth', 'Envíos a Telegram esperando turno', ('bot',)
+)
+EDICIONES_FUSIONADAS = registro.contador(
+    'aca_telegram_edits_coalesced_total', 'Ediciones reemplazadas por una más nueva del mismo mensaje antes de salir',
+    ('bot',)
+)
+FLOOD_WAITS = registro.contador(
+    'aca_telegram_flood_wait_total', 'Respuestas 429 (RetryAfter) de la API de Telegram', ('bot',)
+)
+
+# Ediciones: si hay una pendiente del mismo mensaje, solo importa la última
+METODOS_EDICION = frozenset({
+    'editMessageText', 'editMessageCaption', 'editMessageReplyMarkup', 'editMessageMedia',
+})
+
+# Sin chat_id o de larga duración: no pasan por las colas
+METODOS_SIN_COLA = frozenset({'getUpdates'})
+
+# Con más colas que esto se descartan las inactivas
+MAX_COLAS_INACTIVAS = 1024
+
+Resultado = Union[bool, Dict[str, Any], list]
+
+
+class _Cubeta:
+    """Token bucket: `tasa` fichas por segundo hasta `capacidad`"""
+
+    __slots__ = ('tasa', 'capacidad', 'fichas', 'actualizado')
+
+    def __init__(self, tasa: float, capacidad: float):
+        self.tasa = tasa
+        self.capacidad = max(1.0, capacidad)
+        self.fichas = self.capacidad
+        self.actualizado = time.monotonic()
+
+    def _recargar(self):
+        ahora = time.monotonic()
+        self.fichas = min(self.capacidad, self.fichas + (ahora - self.actualizado) * self.tasa)
+        self.actualizado = ahora
+
+    def llena(self) -> bool:
+        self._recargar()
+        return self.fichas >= self.capacidad
+
+    async def adquirir(self):
+        while True:
+            self._recargar()
+            if self.fichas >= 1:
+                self.fichas -= 1
+                return
+            await asyncio.sleep((1 - self.fichas) / self.tasa)
+
+
+class _Envio:
+    """Un request en la cola de su chat"""
+
+    __slots__ = ('clave', 'turno', 'resultado')
+
+    def __init__(self, clave: Optional[Tuple]):
+        loop = asyncio.get_running_loop()
+        self.clave = clave
+        # True: es su turno; False: otra edición del mismo mensaje tomó su lugar
+        self.turno: asyncio.Future = loop.create_future()
+        # Compartido con las ediciones que este envío reemplazó
+        self.resultado: asyncio.Future = loop.create_future()
+        self.resultado.add_done_callback(lambda f: f.cancelled() or f.exception())
+
+    def resolver(self, resultado: Any = None, error: BaseException = None):
+        if self.resultado.done():
+            return
+        if isinstance(error, asyncio.CancelledError):
+            self.resultado.cancel()
+        elif error is not None:
+            self.resultado.set_exception(error)
+        else:
+            self.resultado.set_result(resultado)
+
+
+class _ColaChat:
+    __slots__ = ('cubeta', 'pendientes', 'ocupada')
+
+    def __init__(self, cubeta: _Cubeta):
+        self.cubeta = cubeta
+        self.pendientes: Deque[_Envio] = deque()
+        self.ocupada = False
+
+
+class LimitadorEnvios(BaseRateLimiter[int]):
+    """
+    Ordena los envíos de un Application respetando los límites de la Bot API.
+
+    Cada chat tiene una cola FIFO (los mensajes salen en orden) con su propio
+    token bucket: ENVIOS_CHAT_POR_SEGUNDO con ráfagas de ENVIOS_CHAT_RAFAGA en
+    chats privados y ENVIOS_GRUPO_POR_MINUTO en grupos. Al salir, cada envío
+    toma además una ficha del bucket global del bot (ENVIOS_POR_SEGUNDO).
+
+    Una edición de un mensaje que ya tiene otra edición esperando en la cola
+    toma su lugar; ambos llamadores reciben el resultado de la última. Un 429
+    pausa todos los envíos del bot durante `retry_after` y el envío se
+    reintenta hasta ENVIOS_REINTENTOS_429 veces.
+
+    El request lo ejecuta la misma tarea que llamó a reply_text/edit_*, así
+    que sus spans siguen en la traza del update.
+    """
+
+    def __init__(self, bot: str):
+        self.bot = bot
+        self._global = _Cubeta(Config.ENVIOS_POR_SEGUNDO, Config.ENVIOS_POR_SEGUNDO)
+        self._lock_global = asyncio.Lock()
+        self._colas: Dict[Union[int, str], _ColaChat] = {}
+        self._en_cola = 0
+        self._pausa_hasta = 0.0
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        self._colas.clear()
+
+    # ============================================
+    # COLAS
+    # ============================================
+
+    def _cola(self, chat_id: Union[int, str]) -> _ColaChat:
+        cola = self._colas.get(chat_id)
+        if cola is None:
+            if len(self._colas) > MAX_COLAS_INACTIVAS:
+                self._podar()
+            if isinstance(chat_id, str) or chat_id < 0:
+                por_minuto = Config.ENVIOS_GRUPO_POR_MINUTO
+                cubeta = _Cubeta(por_minuto / 60, min(por_minuto, Config.ENVIOS_CHAT_RAFAGA))
+            else:
+                cubeta = _Cubeta(Config.ENVIOS_CHAT_POR_SEGUNDO, Config.ENVIOS_CHAT_RAFAGA)
+            cola = self._colas[chat_id] = _ColaChat(cubeta)
+        return cola
+
+    def _podar(self):
+        """Descartar colas sin envíos y con el bucket lleno (no cambia ningún límite)"""
+        for chat_id, cola in list(self._colas.items()):
+            if not cola.ocupada and not cola.pendientes and cola.cubeta.llena():
+                del self._colas[chat_id]
+
+    def _actualizar_profundidad(self, delta: int):
+        self._en_cola += delta
+        ENVIOS_EN_COLA.set(self._en_cola, bot=self.bot)
+
+    def _siguiente(self, cola: _ColaChat):
+        """Dar el turno al próximo envío vivo de la cola"""
+        while cola.pendientes:
+            siguiente = cola.pendientes.popleft()
+            if not siguiente.turno.done():
+                siguiente.turno.set_result(True)
+                return
+        cola.ocupada = False
+
+    def _fusionar(self, cola: _ColaChat, envio: _Envio) -> bool:
+        """Reemplazar en su lugar una edición pendiente del mismo mensaje"""
+        for posicion, anterior in enumerate(cola.pendientes):
+            if anterior.clave == envio.clave and not anterior.turno.done():
+                cola.pendientes[posicion] = envio
+                envio.resultado = anterior.resultado
+                anterior.turno.set_result(False)
+                EDICIONES_FUSIONADAS.inc(bot=self.bot)
+                return True
+        return False
+
+    async def _esperar_turno(self, cola: _ColaChat, envio: _Envio) -> bool:
+        """Esperar el turno en la cola; False si otra edición tomó su lugar"""
+        if not cola.ocupada and not cola.pendientes:
+            cola.ocupada = True
+            return True
+
+        if not (envio.clave and self._fusionar(cola, envio)):
+            cola.pendientes.append(envio)
+        self._actualizar_profundidad(1)
+        try:
+            return await envio.turno
+        except asyncio.CancelledError as e:
+            if envio in cola.pendientes:
+                cola.pendientes.remove(envio)
+                # Las ediciones que reemplazó ya no van a salir
+                envio.resolver(error=e)
+            elif envio.turno.done() and not envio.turno.cancelled() and envio.turno.result():
+                # Se le dio el turno justo al cancelarse: pasarlo al siguiente
+                envio.resolver(error=e)
+                self._siguiente(cola)
+            raise
+        finally:
+            self._actualizar_profundidad(-1)
+
+    # ============================================
+    # ENVÍO
+    # ============================================
+
+    async def _esperar_pausa(self):
+        while (restante := self._pausa_hasta - time.monotonic()) > 0:
+            await asyncio.sleep(restante)
+
+    async def _enviar(
+        self,
+        callback: Callable[..., Coroutine[Any, Any, Resultado]],
+        args: Any,
+        kwargs: Dict[str, Any],
+        max_reintentos: int,
+        usa_global: bool
+    ) -> Resultado:
+        for intento in range(max_reintentos + 1):
+            await self._esperar_pausa()
+            if usa_global:
+                async with self._lock_global:
+                    await self._global.adquirir()
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                FLOOD_WAITS.inc(bot=self.bot)
+                if intento == max_reintentos:
+                    logger.error(f"❌ Telegram ({self.bot}): límite alcanzado tras {max_reintentos} reintentos")
+                    raise
+                espera = e.retry_after.total_seconds() if hasattr(e.retry_after, 'total_seconds') else e.retry_after
+                # Pausa para todo el bot: no se sabe si el 429 fue por el chat o global
+                self._pausa_hasta = max(self._pausa_hasta, time.monotonic() + float(espera) + 0.1)
+                logger.warning(f"⚠️ Telegram ({self.bot}): flood wait de {espera}s, reintento {intento + 1}")
+
+    async def process_request(
+        self,
+        callback: Callable[..., Coroutine[Any, Any, Resultado]],
+        args: Any,
+        kwargs: Dict[str, Any],
+        endpoint: str,
+        data: Dict[str, Any],
+        rate_limit_args: Optional[int],
+    ) -> Resultado:
+        max_reintentos = rate_limit_args if rate_limit_args is not None else Config.ENVIOS_REINTENTOS_429
+        chat_id = data.get('chat_id')
+
+        if endpoint in METODOS_SIN_COLA:
+            return await callback(*args, **kwargs)
+        if chat_id is None:
+            # answerCallbackQuery, getFile, ediciones inline...: solo respetan las pausas por 429
+            return await self._enviar(callback, args, kwargs, max_reintentos, usa_global=False)
+
+        try:
+            chat_id = int(chat_id)
+        except (TypeError, ValueError):
+            pass
+
+        clave = (endpoint, data.get('message_id')) if endpoint in METODOS_EDICION and data.get('message_id') else None
+        cola = self._cola(chat_id)
+        envio = _Envio(clave)
+        encolado = time.perf_counter()
+
+        with span('telegram.cola', bot=self.bot, metodo=endpoint):
+            es_turno = await self._esperar_turno(cola, envio)
+            if es_turno:
+                try:
+                    await cola.cubeta.adquirir()
+                except BaseException as e:
+                    envio.resolver(error=e)
+                    self._siguiente(cola)
+                    raise
+        if not es_turno:
+            # Una edición más nueva del mismo mensaje sale en lugar de esta
+            return await asyncio.shield(envio.resultado)
+
+        ESPERA_COLA.observar((time.perf_counter() - encolado) * 1000, bot=self.bot, metodo=endpoint)
+        try:
+            resultado = await self._enviar(callback, args, kwargs, max_reintentos, usa_global=True)
+        except BaseException as e:
+            envio.resolver(error=e)
+            raise
+        else:
+            envio.resolver(resultado)
+            return resultado
+        finally:
+            self._siguiente(cola)
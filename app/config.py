@@ -25,6 +25,101 @@ class Config:
     ENVIRONMENT = os.getenv("ENVIRONMENT", "development")
     DEBUG = os.getenv("DEBUG", "true").lower() == "true"
     
+    # Observabilidad
+    SUPABASE_SLOW_QUERY_MS = int(os.getenv("SUPABASE_SLOW_QUERY_MS", "500"))
+    TRACING_EXPORTER = os.getenv("TRACING_EXPORTER", "none")  # none | jsonl | otlp
+    TRACING_JSONL_PATH = os.getenv("TRACING_JSONL_PATH", "logs/trazas.jsonl")
+    TRACING_OTLP_ENDPOINT = os.getenv("TRACING_OTLP_ENDPOINT", "")
+    TRACING_SAMPLE_RATE = float(os.getenv("TRACING_SAMPLE_RATE", "0.1"))
+    TRACING_SLOW_MS = int(os.getenv("TRACING_SLOW_MS", "2000"))
+    TRACING_BUFFER_SIZE = int(os.getenv("TRACING_BUFFER_SIZE", "1000"))
+    ANALYTICS_FLUSH_SECONDS = int(os.getenv("ANALYTICS_FLUSH_SECONDS", "60"))
+    STATS_CACHE_SECONDS = int(os.getenv("STATS_CACHE_SECONDS", "30"))
+    LIVE_FEED_BUFFER_SIZE = int(os.getenv("LIVE_FEED_BUFFER_SIZE", "500"))
+    LIVE_FEED_STATS_SECONDS = float(os.getenv("LIVE_FEED_STATS_SECONDS", "5"))
+    CATALOGO_TTL_SECONDS = int(os.getenv("CATALOGO_TTL_SECONDS", "300"))
+    
+    # Retención de conversaciones (particiones mensuales)
+    CONVERSACIONES_DIAS_CALIENTES = int(os.getenv("CONVERSACIONES_DIAS_CALIENTES", "31"))
+    CONVERSACIONES_RETENCION_MESES = int(os.getenv("CONVERSACIONES_RETENCION_MESES", "6"))
+    CONVERSACIONES_ARCHIVO_CARPETA = os.getenv("CONVERSACIONES_ARCHIVO_CARPETA", "archivo/conversaciones")
+    
+    # Tareas programadas de mantenimiento
+    SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "true").lower() == "true"
+    SCHEDULER_JITTER = float(os.getenv("SCHEDULER_JITTER", "0.1"))
+    SCHEDULER_SESIONES_SECONDS = int(os.getenv("SCHEDULER_SESIONES_SECONDS", "300"))
+    SCHEDULER_RETENCION_SECONDS = int(os.getenv("SCHEDULER_RETENCION_SECONDS", "86400"))
+    SCHEDULER_CONCILIACION_SECONDS = int(os.getenv("SCHEDULER_CONCILIACION_SECONDS", "86400"))
+    CONCILIACION_ELIMINAR_HUERFANOS = os.getenv("CONCILIACION_ELIMINAR_HUERFANOS", "false").lower() == "true"
+    CONCILIACION_GRACIA_HORAS = int(os.getenv("CONCILIACION_GRACIA_HORAS", "24"))
+    
+    # Índice local de documentos (Asesor IA)
+    INDICE_DOCUMENTOS_ENABLED = os.getenv("INDICE_DOCUMENTOS_ENABLED", "true").lower() == "true"
+    INDICE_DOCUMENTOS_DIR = os.getenv("INDICE_DOCUMENTOS_DIR", "data/indices")
+    INDICE_DOCUMENTOS_CARPETA = os.getenv("INDICE_DOCUMENTOS_CARPETA", "indices")
+    INDICE_DOCUMENTOS_WORKERS = int(os.getenv("INDICE_DOCUMENTOS_WORKERS", "2"))
+    INDICE_DOCUMENTOS_PASAJES = int(os.getenv("INDICE_DOCUMENTOS_PASAJES", "6"))
+    METRICAS_TTL_SECONDS = int(os.getenv("METRICAS_TTL_SECONDS", "300"))
+    
+    # Envíos a Telegram (límites de la Bot API)
+    ENVIOS_LIMITADOR_ENABLED = os.getenv("ENVIOS_LIMITADOR_ENABLED", "true").lower() == "true"
+    ENVIOS_POR_SEGUNDO = float(os.getenv("ENVIOS_POR_SEGUNDO", "25"))
+    ENVIOS_CHAT_POR_SEGUNDO = float(os.getenv("ENVIOS_CHAT_POR_SEGUNDO", "1"))
+    ENVIOS_CHAT_RAFAGA = int(os.getenv("ENVIOS_CHAT_RAFAGA", "3"))
+    ENVIOS_GRUPO_POR_MINUTO = int(os.getenv("ENVIOS_GRUPO_POR_MINUTO", "20"))
+    ENVIOS_REINTENTOS_429 = int(os.getenv("ENVIOS_REINTENTOS_429", "3"))
+    
+    # Difusiones del bot admin
+    DIFUSION_POR_SEGUNDO = float(os.getenv("DIFUSION_POR_SEGUNDO", "20"))
+    DIFUSION_PAGINA = int(os.getenv("DIFUSION_PAGINA", "200"))
+    DIFUSION_LEASE_SECONDS = int(os.getenv("DIFUSION_LEASE_SECONDS", "120"))
+    DIFUSION_SECRETO = os.getenv("DIFUSION_SECRETO", "")  # cabecera X-Aca-Difusiones de POST /api/broadcasts
+    
+    # Chats no registrados (caché negativa e intentos agregados)
+    ACCESO_NEGATIVO_TTL_SECONDS = int(os.getenv("ACCESO_NEGATIVO_TTL_SECONDS", "300"))
+    ACCESO_NEGADO_RESPUESTA_SECONDS = int(os.getenv("ACCESO_NEGADO_RESPUESTA_SECONDS", "600"))
+    ACCESO_NEGADO_FLUSH_SECONDS = int(os.getenv("ACCESO_NEGADO_FLUSH_SECONDS", "60"))
+    
+    # Permisos por usuario (snapshot en memoria invalidado por versión)
+    PERMISOS_TTL_SECONDS = int(os.getenv("PERMISOS_TTL_SECONDS", "300"))
+    PERMISOS_VERSION_SECONDS = float(os.getenv("PERMISOS_VERSION_SECONDS", "5"))
+    
+    # Topología de procesos: todo (API + bots en un proceso) | api | bots (ver run_supervisor.py)
+    PROCESO_ROL = os.getenv("PROCESO_ROL", "todo")
+    PROCESO_BOTS = tuple(b.strip() for b in os.getenv("PROCESO_BOTS", "admin,production").split(",") if b.strip())
+    SUPERVISOR_API_WORKERS = int(os.getenv("SUPERVISOR_API_WORKERS", "2"))
+    SUPERVISOR_PUERTO_BOTS = int(os.getenv("SUPERVISOR_PUERTO_BOTS", "8100"))
+    SUPERVISOR_GRACIA_SECONDS = int(os.getenv("SUPERVISOR_GRACIA_SECONDS", "20"))
+    SUPERVISOR_REPORTE_SECONDS = int(os.getenv("SUPERVISOR_REPORTE_SECONDS", "60"))
+    SUPERVISOR_ESTADO_PATH = os.getenv("SUPERVISOR_ESTADO_PATH", "data/supervisor.json")
+    
+    # Varias réplicas de los bots: memoria (una réplica) | supabase (líder por lease + reparto por chat_id)
+    COORDINACION_BACKEND = os.getenv("COORDINACION_BACKEND", "memoria")
+    COORDINACION_URL = os.getenv("COORDINACION_URL", "")  # URL de esta réplica alcanzable desde las demás
+    COORDINACION_SECRETO = os.getenv("COORDINACION_SECRETO", "")
+    COORDINACION_LATIDO_SECONDS = float(os.getenv("COORDINACION_LATIDO_SECONDS", "5"))
+    COORDINACION_LEASE_SECONDS = float(os.getenv("COORDINACION_LEASE_SECONDS", "15"))
+    COORDINACION_NODOS_VIRTUALES = int(os.getenv("COORDINACION_NODOS_VIRTUALES", "64"))
+    
+    # Caché de los servicios: memoria (LRU en el proceso) | redis (servidor con protocolo Redis compartido)
+    CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memoria")
+    CACHE_MAX_ENTRADAS = int(os.getenv("CACHE_MAX_ENTRADAS", "20000"))
+    CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0")
+    CACHE_REDIS_TIMEOUT_SECONDS = float(os.getenv("CACHE_REDIS_TIMEOUT_SECONDS", "0.5"))
+    CACHE_PREFIJO = os.getenv("CACHE_PREFIJO", "aca:")
+    CACHE_SESIONES_TTL_SECONDS = int(os.getenv("CACHE_SESIONES_TTL_SECONDS", "300"))
+    CACHE_URLS_TTL_SECONDS = int(os.getenv("CACHE_URLS_TTL_SECONDS", "1800"))
+    CACHE_IA_TTL_SECONDS = int(os.getenv("CACHE_IA_TTL_SECONDS", "86400"))
+    
+    # Control de carga: sobre estos umbrales se responde en modo degradado (reglas, metadatos, registro diferido)
+    CARGA_ENABLED = os.getenv("CARGA_ENABLED", "true").lower() == "true"
+    CARGA_MAX_EN_CURSO = int(os.getenv("CARGA_MAX_EN_CURSO", "25"))
+    CARGA_ESPERA_MAX_MS = float(os.getenv("CARGA_ESPERA_MAX_MS", "3000"))
+    CARGA_OPENAI_MAX_MS = float(os.getenv("CARGA_OPENAI_MAX_MS", "8000"))
+    CARGA_SUPABASE_MAX_MS = float(os.getenv("CARGA_SUPABASE_MAX_MS", "1500"))
+    CARGA_RECUPERACION_SECONDS = float(os.getenv("CARGA_RECUPERACION_SECONDS", "30"))
+    CARGA_REGISTRO_DIFERIDO_MAX = int(os.getenv("CARGA_REGISTRO_DIFERIDO_MAX", "5000"))
+    
     @classmethod
     def validate(cls):
         """Validar que todas las variables requeridas estén configuradas"""
@@ -46,5 +141,10 @@ class Config:
             raise ValueError(f"Variables de entorno faltantes: {', '.join(missing_vars)}")
         
         return True
+    
+    @classmethod
+    def bots_del_proceso(cls) -> tuple:
+        """Bots que inicia este proceso (ninguno en un worker de API)"""
+        return () if cls.PROCESO_ROL == "api" else cls.PROCESO_BOTS
 
 
@@ -0,0 +1,496 @@
+"""
+🔬 Instrumentación de llamadas a Supabase
+Mide cada consulta PostgREST, RPC y operación de Storage y la atribuye al update y handler que la originó
+"""
+
+import json
+import time
+import logging
+import threading
+from collections import deque, defaultdict
+from contextvars import ContextVar
+from functools import wraps
+from typing import Any, Callable, Dict, List, Optional
+
+from app.config import Config
+from app.utils.metrics import Histograma, BUCKETS_CONTEO
+from app.services.metrics_service import UPDATES_PROCESADOS, UPDATES_EN_CURSO
+from app.services.load_service import get_controlador_carga
+from app.utils.tracing import span, iniciar_traza, terminar_traza, trazar_request_telegram
+
+logger = logging.getLogger(__name__)
+
+# Métodos del query builder que definen la operación
+OPERACIONES = {'select', 'insert', 'update', 'upsert', 'delete'}
+
+# Métodos del query builder que agregan filtros (se registra solo la columna, nunca el valor)
+FILTROS = {
+    'eq', 'neq', 'gt', 'gte', 'lt', 'lte', 'in_', 'is_', 'is_not', 'like', 'ilike',
+    'match', 'contains', 'contained_by', 'or_', 'filter', 'text_search', 'range'
+}
+
+# Métodos de un bucket de Storage que hacen una llamada de red
+OPERACIONES_STORAGE = {
+    'upload', 'download', 'update', 'remove', 'list', 'move', 'copy',
+    'create_signed_url', 'create_signed_urls'
+}
+
+# Atribución cuando la llamada no ocurre dentro de un handler de Telegram (API, startup, jobs)
+SIN_HANDLER = 'sin_update'
+
+
+class ContextoUpdate:
+    """Datos del update de Telegram que se está procesando en la tarea actual"""
+
+    def __init__(self, update_id: Optional[int], bot_type: str, handler: str):
+        self.update_id = update_id
+        self.bot_type = bot_type
+        self.handler = handler
+        self.llamadas = 0
+        self.latencia_ms = 0.0
+
+
+_contexto_update: ContextVar[Optional[ContextoUpdate]] = ContextVar('contexto_update', default=None)
+
+
+def get_contexto_update() -> Optional[ContextoUpdate]:
+    """Obtener el contexto del update en curso (None fuera de un handler)"""
+    return _contexto_update.get()
+
+
+class RegistroConsultas:
+    """Agrega las llamadas a Supabase por tabla/operación y por handler"""
+
+    def __init__(self, umbral_lento_ms: Optional[int] = None, max_lentas: int = 200):
+        self.umbral_lento_ms = umbral_lento_ms if umbral_lento_ms is not None else Config.SUPABASE_SLOW_QUERY_MS
+        self._max_lentas = max_lentas
+        self._lock = threading.Lock()
+        self.reiniciar()
+
+    def reiniciar(self):
+        """Borrar todas las métricas acumuladas"""
+        with self._lock:
+            self._latencias: Dict[str, Histograma] = defaultdict(Histograma)
+            self._por_consulta: Dict[str, Dict[str, Any]] = defaultdict(
+                lambda: {'llamadas': 0, 'errores': 0, 'filas': 0, 'bytes': 0}
+            )
+            self._por_handler: Dict[str, Dict[str, Any]] = defaultdict(
+                lambda: {'llamadas': 0, 'updates': 0, 'errores': 0, 'filas': 0, 'bytes': 0}
+            )
+            self._llamadas_por_update: Dict[str, Histograma] = defaultdict(lambda: Histograma(BUCKETS_CONTEO))
+            self._latencia_por_update: Dict[str, Histograma] = defaultdict(Histograma)
+            self._lentas = deque(maxlen=self._max_lentas)
+            self.total_llamadas = 0
+            self.total_errores = 0
+            self.desde = time.time()
+
+    def registrar_llamada(
+        self,
+        tabla: str,
+        operacion: str,
+        filtros: List[str],
+        filas: int,
+        bytes_payload: int,
+        latencia_ms: float,
+        error: Optional[str] = None
+    ):
+        """
+        Registrar una llamada a Supabase.
+
+        Args:
+            tabla: Tabla, función RPC ('rpc:nombre') o bucket ('storage:nombre')
+            operacion: select, insert, update, upsert, delete, rpc u operación de Storage
+            filtros: Filtros aplicados en formato 'operador:columna'
+            filas: Filas devueltas
+            bytes_payload: Bytes enviados + recibidos (JSON serializado o archivo)
+            latencia_ms: Duración de la llamada
+            error: Tipo de error si la llamada falló
+        """
+        contexto = _contexto_update.get()
+        handler = contexto.handler if contexto else SIN_HANDLER
+        clave = f"{tabla}:{operacion}"
+
+        if contexto:
+            contexto.llamadas += 1
+            contexto.latencia_ms += latencia_ms
+
+        # Las descargas de Storage tardan según el tamaño del archivo: no son señal de saturación
+        if not tabla.startswith('storage:'):
+            get_controlador_carga().observar_dependencia('supabase', latencia_ms)
+
+        with self._lock:
+            self.total_llamadas += 1
+            consulta = self._por_consulta[clave]
+            consulta['llamadas'] += 1
+            consulta['filas'] += filas
+            consulta['bytes'] += bytes_payload
+
+            por_handler = self._por_handler[handler]
+            por_handler['llamadas'] += 1
+            por_handler['filas'] += filas
+            por_handler['bytes'] += bytes_payload
+
+            if error:
+                self.total_errores += 1
+                consulta['errores'] += 1
+                por_handler['errores'] += 1
+
+        self._latencias[clave].observar(latencia_ms)
+
+        if latencia_ms >= self.umbral_lento_ms:
+            lenta = {
+                'timestamp': time.time(),
+                'tabla': tabla,
+                'operacion': operacion,
+                'filtros': filtros,
+                'filas': filas,
+                'bytes': bytes_payload,
+                'latencia_ms': round(latencia_ms, 1),
+                'handler': handler,
+                'update_id': contexto.update_id if contexto else None,
+                'error': error
+            }
+            with self._lock:
+                self._lentas.append(lenta)
+            logger.warning(
+                f"🐢 Consulta lenta ({latencia_ms:.0f} ms): {operacion} {tabla} "
+                f"filtros={filtros} filas={filas} handler={handler} "
+                f"update={lenta['update_id']}"
+            )
+
+    def registrar_update(self, contexto: ContextoUpdate):
+        """Cerrar un update: registrar cuántas llamadas y cuánto tiempo en Supabase consumió"""
+        with self._lock:
+            self._por_handler[contexto.handler]['updates'] += 1
+        self._llamadas_por_update[contexto.handler].observar(contexto.llamadas)
+        self._latencia_por_update[contexto.handler].observar(contexto.latencia_ms)
+
+    def resumen(self, top: int = 20) -> Dict[str, Any]:
+        """
+        Resumen serializable para el endpoint de métricas.
+
+        Args:
+            top: Cantidad máxima de consultas a incluir (ordenadas por tiempo total)
+
+        Returns:
+            Diccionario con totales, consultas, handlers y umbral de consultas lentas
+        """
+        with self._lock:
+            por_consulta = {k: dict(v) for k, v in self._por_consulta.items()}
+            por_handler = {k: dict(v) for k, v in self._por_handler.items()}
+
+        consultas = []
+        for clave, datos in por_consulta.items():
+            tabla, operacion = clave.rsplit(':', 1)
+            latencia = self._latencias[clave]
+            consultas.append({
+                'tabla': tabla,
+                'operacion': operacion,
+                **datos,
+                'latencia_total_ms': round(latencia.suma, 1),
+                'latencia_ms': latencia.resumen()
+            })
+        consultas.sort(key=lambda c: c['latencia_total_ms'], reverse=True)
+
+        handlers = {}
+        for handler, datos in por_handler.items():
+            updates = datos['updates']
+            handlers[handler] = {
+                **datos,
+                'llamadas_por_update': round(datos['llamadas'] / updates, 2) if updates else None,
+                'distribucion_llamadas_por_update': (
+                    self._llamadas_por_update[handler].resumen() if updates else None
+                ),
+                'latencia_supabase_por_update_ms': (
+                    self._latencia_por_update[handler].resumen() if updates else None
+                )
+            }
+
+        return {
+            'desde': self.desde,
+            'total_llamadas': self.total_llamadas,
+            'total_errores': self.total_errores,
+            'umbral_lento_ms': self.umbral_lento_ms,
+            'consultas_lentas': len(self._lentas),
+            'consultas': consultas[:top],
+            'handlers': handlers
+        }
+
+    def latencias_por_consulta(self) -> List[tuple]:
+        """Lista de (tabla, operacion, Histograma de latencia, errores) para exponer en /metrics"""
+        with self._lock:
+            errores = {k: v['errores'] for k, v in self._por_consulta.items()}
+        resultado = []
+        for clave, histograma in list(self._latencias.items()):
+            tabla, operacion = clave.rsplit(':', 1)
+            resultado.append((tabla, operacion, histograma, errores.get(clave, 0)))
+        return resultado
+
+    def consultas_lentas(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """Últimas consultas que superaron el umbral (más recientes primero)"""
+        with self._lock:
+            lentas = list(self._lentas)
+        return list(reversed(lentas))[:limit]
+
+
+def _medir_bytes(valor: Any) -> int:
+    """Tamaño aproximado en bytes de un payload o respuesta"""
+    if valor is None:
+        return 0
+    if isinstance(valor, (bytes, bytearray)):
+        return len(valor)
+    try:
+        return len(json.dumps(valor, default=str))
+    except Exception:
+        return 0
+
+
+def _contar_filas(data: Any) -> int:
+    if isinstance(data, list):
+        return len(data)
+    return 0 if data is None else 1
+
+
+class _ConsultaInstrumentada:
+    """Proxy del query builder de postgrest que mide la llamada al ejecutar"""
+
+    def __init__(self, builder, tabla: str, operacion: str = 'select'):
+        self._builder = builder
+        self._tabla = tabla
+        self._operacion = operacion
+        self._filtros: List[str] = []
+        self._bytes_envio = 0
+        self._negar = False
+
+    def _continuar(self, resultado):
+        # postgrest devuelve el mismo builder o uno nuevo; en ambos casos seguimos midiendo
+        if resultado is self._builder or hasattr(resultado, 'execute'):
+            self._builder = resultado
+            return self
+        return resultado
+
+    def _anotar(self, nombre: str, args: tuple, kwargs: dict):
+        if nombre in OPERACIONES:
+            self._operacion = nombre
+            payload = args[0] if args else kwargs.get('json')
+            if nombre != 'select' and payload is not None:
+                self._bytes_envio = _medir_bytes(payload)
+        elif nombre in FILTROS:
+            if nombre == 'match' and args and isinstance(args[0], dict):
+                columnas = list(args[0].keys())
+            else:
+                columnas = [args[0]] if args and isinstance(args[0], str) else []
+            prefijo = 'not.' if self._negar else ''
+            for columna in columnas or ['']:
+                self._filtros.append(f"{prefijo}{nombre.rstrip('_')}:{columna}")
+            self._negar = False
+
+    def __getattr__(self, nombre: str):
+        atributo = getattr(self._builder, nombre)
+
+        if nombre == 'execute':
+            return self._execute
+        if nombre == 'not_':
+            self._negar = True
+            return self._continuar(atributo)
+        if not callable(atributo):
+            return self._continuar(atributo) if hasattr(atributo, 'execute') else atributo
+
+        def llamada(*args, **kwargs):
+            resultado = atributo(*args, **kwargs)
+            self._anotar(nombre, args, kwargs)
+            return self._continuar(resultado)
+
+        return llamada
+
+    def _execute(self, *args, **kwargs):
+        inicio = time.perf_counter()
+        respuesta = None
+        error = None
+        try:
+            with span(f"supabase.{self._operacion}", tabla=self._tabla, filtros=','.join(self._filtros)):
+                respuesta = self._builder.execute(*args, **kwargs)
+            return respuesta
+        except Exception as e:
+            error = type(e).__name__
+            raise
+        finally:
+            data = getattr(respuesta, 'data', None)
+            get_registro_consultas().registrar_llamada(
+                tabla=self._tabla,
+                operacion=self._operacion,
+                filtros=self._filtros,
+                filas=_contar_filas(data),
+                bytes_payload=self._bytes_envio + _medir_bytes(data),
+                latencia_ms=(time.perf_counter() - inicio) * 1000,
+                error=error
+            )
+
+
+class _BucketInstrumentado:
+    """Proxy de un bucket de Storage que mide las operaciones de red"""
+
+    def __init__(self, bucket, nombre: str):
+        self._bucket = bucket
+        self._nombre = nombre
+
+    def __getattr__(self, nombre: str):
+        atributo = getattr(self._bucket, nombre)
+        if nombre not in OPERACIONES_STORAGE or not callable(atributo):
+            return atributo
+
+        def llamada(*args, **kwargs):
+            inicio = time.perf_counter()
+            resultado = None
+            error = None
+            try:
+                with span(f"storage.{nombre}", bucket=self._nombre):
+                    resultado = atributo(*args, **kwargs)
+                return resultado
+            except Exception as e:
+                error = type(e).__name__
+                raise
+            finally:
+                enviado = kwargs.get('file') if nombre in ('upload', 'update') else None
+                if enviado is None and nombre in ('upload', 'update') and len(args) > 1:
+                    enviado = args[1]
+                recibido = resultado if isinstance(resultado, (bytes, bytearray)) else None
+                get_registro_consultas().registrar_llamada(
+                    tabla=f"storage:{self._nombre}",
+                    operacion=nombre,
+                    filtros=[],
+                    filas=0,
+                    bytes_payload=_medir_bytes(enviado) + _medir_bytes(recibido),
+                    latencia_ms=(time.perf_counter() - inicio) * 1000,
+                    error=error
+                )
+
+        return llamada
+
+
+class _StorageInstrumentado:
+    """Proxy del cliente de Storage"""
+
+    def __init__(self, storage):
+        self._storage = storage
+
+    def from_(self, bucket: str) -> _BucketInstrumentado:
+        return _BucketInstrumentado(self._storage.from_(bucket), bucket)
+
+    def __getattr__(self, nombre: str):
+        return getattr(self._storage, nombre)
+
+
+class ClienteInstrumentado:
+    """
+    Envoltura del `Client` de supabase-py.
+
+    Expone la misma interfaz (`table`, `from_`, `rpc`, `storage`, ...) y
+    registra cada llamada en el registro de consultas.
+    """
+
+    def __init__(self, cliente):
+        self._cliente = cliente
+        self._storage = None
+
+    @property
+    def cliente_original(self):
+        return self._cliente
+
+    def table(self, nombre: str) -> _ConsultaInstrumentada:
+        return _ConsultaInstrumentada(self._cliente.table(nombre), nombre)
+
+    def from_(self, nombre: str) -> _ConsultaInstrumentada:
+        return self.table(nombre)
+
+    def rpc(self, funcion: str, *args, **kwargs) -> _ConsultaInstrumentada:
+        return _ConsultaInstrumentada(self._cliente.rpc(funcion, *args, **kwargs), f"rpc:{funcion}", 'rpc')
+
+    @property
+    def storage(self) -> _StorageInstrumentado:
+        if self._storage is None:
+            self._storage = _StorageInstrumentado(self._cliente.storage)
+        return self._storage
+
+    def __getattr__(self, nombre: str):
+        return getattr(self._cliente, nombre)
+
+
+def instrumentar_cliente(cliente):
+    """Envolver un cliente de Supabase (idempotente)"""
+    if isinstance(cliente, ClienteInstrumentado):
+        return cliente
+    return ClienteInstrumentado(cliente)
+
+
+def _nombre_handler(callback: Callable) -> str:
+    nombre = getattr(callback, '__qualname__', None) or getattr(callback, '__name__', repr(callback))
+    return nombre.split('.<locals>.')[-1]
+
+
+def _envolver_callback(callback: Callable, bot_type: str) -> Callable:
+    nombre = _nombre_handler(callback)
+
+    @wraps(callback)
+    async def wrapper(update, context, *args, **kwargs):
+        contexto = ContextoUpdate(getattr(update, 'update_id', None), bot_type, nombre)
+        token = _contexto_update.set(contexto)
+        chat = getattr(update, 'effective_chat', None)
+        traza = iniciar_traza(
+            'telegram.update',
+            update_id=contexto.update_id,
+            chat_id=chat.id if chat else None,
+            bot=bot_type,
+            handler=nombre
+        )
+        UPDATES_EN_CURSO.inc(bot=bot_type)
+        get_controlador_carga().entrar()
+        error = None
+        try:
+            return await callback(update, context, *args, **kwargs)
+        except Exception as e:
+            error = type(e).__name__
+            raise
+        finally:
+            terminar_traza(traza, error)
+            _contexto_update.reset(token)
+            UPDATES_EN_CURSO.dec(bot=bot_type)
+            get_controlador_carga().salir()
+            UPDATES_PROCESADOS.inc(bot=bot_type, handler=nombre)
+            get_registro_consultas().registrar_update(contexto)
+
+    wrapper._instrumentado = True
+    return wrapper
+
+
+def instrumentar_aplicacion(application, bot_type: str):
+    """
+    Envolver los callbacks de todos los handlers registrados en un Application
+    para que las llamadas a Supabase se atribuyan al update y handler, y
+    trazar las llamadas a la API de Telegram que hace el bot.
+
+    Args:
+        application: Application de python-telegram-bot con handlers ya registrados
+        bot_type: Tipo de bot ('admin' o 'production')
+    """
+    total = 0
+    for handlers in application.handlers.values():
+        for handler in handlers:
+            if getattr(handler.callback, '_instrumentado', False):
+                continue
+            handler.callback = _envolver_callback(handler.callback, bot_type)
+            total += 1
+    trazar_request_telegram(application.bot.request)
+    logger.info(f"🔬 Instrumentados {total} handlers del bot {bot_type}")
+
+
+# Instancia global
+_registro_consultas = None
+
+
+def get_registro_consultas() -> RegistroConsultas:
+    """Obtener instancia del registro de consultas"""
+    global _registro_consultas
+    if _registro_consultas is None:
+        _registro_consultas = RegistroConsultas()
+    return _registro_consultas
@@ -0,0 +1,116 @@
+"""
+🎯 Proyecciones de lectura
+Columnas nombradas por caso de uso (en vez de select('*')) y filas compactas con __slots__
+"""
+
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+class FilaCompacta:
+    """
+    Fila de una proyección: un slot por columna, sin diccionario por instancia.
+
+    Se lee igual que los dict que devuelve supabase-py (`fila['id']`,
+    `fila.get('periodo')`, `'id' in fila`, `dict(fila)`), así que los
+    llamadores existentes no cambian. Una columna fuera de la proyección se
+    comporta como una clave ausente.
+    """
+
+    __slots__ = ()
+    _columnas: Tuple[str, ...] = ()
+
+    def __init__(self, datos: Dict[str, Any]):
+        for columna in self._columnas:
+            setattr(self, columna, datos.get(columna))
+
+    def __getitem__(self, columna: str) -> Any:
+        if columna not in self._columnas:
+            raise KeyError(columna)
+        return getattr(self, columna)
+
+    def get(self, columna: str, default: Any = None) -> Any:
+        return getattr(self, columna) if columna in self._columnas else default
+
+    def __contains__(self, columna: object) -> bool:
+        return columna in self._columnas
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._columnas)
+
+    def __len__(self) -> int:
+        return len(self._columnas)
+
+    def keys(self) -> Tuple[str, ...]:
+        return self._columnas
+
+    def items(self) -> List[Tuple[str, Any]]:
+        return [(columna, getattr(self, columna)) for columna in self._columnas]
+
+    def __eq__(self, otro: object) -> bool:
+        if isinstance(otro, (FilaCompacta, dict)):
+            return dict(self.items()) == dict(otro.items())
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({dict(self.items())!r})"
+
+
+class Proyeccion:
+    """Columnas que un caso de uso lee de una tabla"""
+
+    __slots__ = ('tabla', 'nombre', 'columnas', 'select', '_fila')
+
+    def __init__(self, tabla: str, nombre: str, columnas: Iterable[str]):
+        self.tabla = tabla
+        self.nombre = nombre
+        self.columnas = tuple(columnas)
+        # Texto para .select() de PostgREST
+        self.select = ', '.join(self.columnas)
+        self._fila = type(nombre, (FilaCompacta,), {'__slots__': self.columnas, '_columnas': self.columnas})
+
+    def fila(self, datos: Optional[Dict[str, Any]]) -> Optional[FilaCompacta]:
+        """Fila compacta a partir de un dict de PostgREST (None si no hay datos)"""
+        return self._fila(datos) if datos else None
+
+    def filas(self, datos: Optional[List[Dict[str, Any]]]) -> List[FilaCompacta]:
+        """Filas compactas de result.data"""
+        return [self._fila(d) for d in datos or []]
+
+
+# ============================================
+# PROYECCIONES POR CASO DE USO
+# ============================================
+
+# Autenticación: rol y empresa legacy del usuario
+USUARIO_AUTH = Proyeccion('usuarios', 'UsuarioAuth', ('id', 'chat_id', 'nombre', 'rol', 'empresa_id'))
+
+# Estado del wizard: sin timestamps de auditoría
+SESION_ACTIVA = Proyeccion(
+    'sesiones_conversacion', 'SesionActiva',
+    ('id', 'chat_id', 'intent', 'estado', 'data', 'archivo_temp_id', 'expires_at')
+)
+
+# Listado de archivos en el menú de descarga
+ARCHIVO_MENU = Proyeccion(
+    'archivos', 'ArchivoMenu',
+    ('id', 'nombre_original', 'nombre_archivo', 'categoria', 'subtipo', 'periodo', 'url_archivo')
+)
+
+# Catálogo en memoria del asistente de descarga (menú + orden)
+ARCHIVO_CATALOGO = Proyeccion('archivos', 'ArchivoCatalogo', ARCHIVO_MENU.columnas + ('created_at',))
+
+# Contexto del asesor IA: descripción y metadata, sin URLs ni rutas
+ARCHIVO_ASESOR = Proyeccion(
+    'archivos', 'ArchivoAsesor',
+    ('id', 'nombre_original', 'nombre_archivo', 'subtipo', 'periodo', 'descripcion',
+     'descripcion_personalizada', 'metadata')
+)
+
+# Firma de URLs y descarga desde Storage
+ARCHIVO_FIRMA = Proyeccion('archivos', 'ArchivoFirma', ('storage_path', 'url_archivo'))
+
+# Eliminación: copias en Storage y OpenAI (y catálogo de la empresa)
+ARCHIVO_BORRADO = Proyeccion('archivos', 'ArchivoBorrado', ('empresa_id', 'storage_path', 'openai_file_id'))
+
+# Series de cifras financieras del asesor
+METRICA_SERIE = Proyeccion('metricas_financieras', 'MetricaSerie', ('periodo', 'cuenta', 'monto'))
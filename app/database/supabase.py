@@ -1,38 +1,56 @@
-from supabase import create_client, Client
+import threading
+from typing import TYPE_CHECKING
 from app.config import Config
+from app.database.instrumentation import instrumentar_cliente
+from app.database.projections import USUARIO_AUTH, ARCHIVO_ASESOR
+from app.utils.coalescencia import coalescer
 import logging
 
+if TYPE_CHECKING:
+    from supabase import Client
+
 logger = logging.getLogger(__name__)
 
 class SupabaseManager:
     _instance = None
-    _client: Client = None
+    _client: 'Client' = None
+    _lock = threading.Lock()
     
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super(SupabaseManager, cls).__new__(cls)
         return cls._instance
     
-    def __init__(self):
-        if self._client is None:
-            # ✅ Usar SERVICE_KEY para operaciones de backend (bypasea RLS)
-            self._client = create_client(Config.SUPABASE_URL, Config.SUPABASE_SERVICE_KEY)
-    
     @property
-    def client(self) -> Client:
+    def client(self) -> 'Client':
+        # ⏳ El cliente (y el paquete supabase) se cargan en el primer uso, no al importar
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    from supabase import create_client
+                    # ✅ Usar SERVICE_KEY para operaciones de backend (bypasea RLS)
+                    # 🔬 Cliente instrumentado: mide cada consulta, RPC y operación de Storage
+                    self._client = instrumentar_cliente(create_client(Config.SUPABASE_URL, Config.SUPABASE_SERVICE_KEY))
         return self._client
     
     def table(self, table_name: str):
         """Acceso directo a tablas"""
-        return self._client.table(table_name)
+        return self.client.table(table_name)
     
-    def get_user_by_chat_id(self, chat_id: int):
-        """Obtener usuario por chat_id con validación de seguridad"""
+    def get_user_by_chat_id(self, chat_id: int, lanzar_errores: bool = False):
+        """
+        Obtener usuario por chat_id con validación de seguridad
+        
+        Args:
+            lanzar_errores: Propagar errores de la consulta (para distinguir "no existe" de "no se pudo consultar")
+        """
         try:
-            response = self._client.table('usuarios').select('*').eq('chat_id', chat_id).eq('activo', True).execute()
-            return response.data[0] if response.data else None
+            response = self.client.table('usuarios').select(USUARIO_AUTH.select).eq('chat_id', chat_id).eq('activo', True).execute()
+            return USUARIO_AUTH.fila(response.data[0]) if response.data else None
         except Exception as e:
             logger.error(f"Error obteniendo usuario por chat_id {chat_id}: {e}")
+            if lanzar_errores:
+                raise
             return None
     
     def get_user_empresas(self, chat_id: int):
@@ -46,52 +64,12 @@ class SupabaseManager:
             Lista de empresas asociadas al usuario:
             [{'id': 'uuid', 'nombre': 'Nombre', 'rut': '12345678-9', 'rol': 'user'}, ...]
         """
+        # Import tardío: app.security.permissions depende de este módulo
+        from app.security.permissions import get_permisos
         try:
-            # Obtener usuario primero
-            user = self.get_user_by_chat_id(chat_id)
-            if not user:
-                return []
-            
-            usuario_id = user['id']
-            
-            # Consultar tabla usuarios_empresas con join a empresas
-            response = self._client.table('usuarios_empresas')\
-                .select('empresa_id, rol, empresas(id, nombre, rut, activo)')\
-                .eq('usuario_id', usuario_id)\
-                .eq('activo', True)\
-                .execute()
-            
-            empresas = []
-            if response.data:
-                for rel in response.data:
-                    empresa_info = rel.get('empresas', {}) if rel.get('empresas') else {}
-                    # Verificar que la empresa esté activa
-                    if empresa_info.get('activo', False):
-                        empresas.append({
-                            'id': rel['empresa_id'],
-                            'nombre': empresa_info.get('nombre', ''),
-                            'rut': empresa_info.get('rut', ''),
-                            'rol': rel.get('rol', 'user')
-                        })
-            
-            # Si no hay empresas en usuarios_empresas, usar empresa_id legacy (compatibilidad)
-            if not empresas and user.get('empresa_id'):
-                empresa_legacy = self._client.table('empresas')\
-                    .select('*')\
-                    .eq('id', user['empresa_id'])\
-                    .eq('activo', True)\
-                    .execute()
-                
-                if empresa_legacy.data:
-                    empresas.append({
-                        'id': empresa_legacy.data[0]['id'],
-                        'nombre': empresa_legacy.data[0]['nombre'],
-                        'rut': empresa_legacy.data[0].get('rut', ''),
-                        'rol': user.get('rol', 'user')
-                    })
-            
-            return empresas
-            
+            # Snapshot de permisos (usuario + usuarios_empresas + empresas en una consulta)
+            permisos = get_permisos().obtener(chat_id)
+            return permisos.copia_empresas() if permisos else []
         except Exception as e:
             logger.error(f"Error obteniendo empresas del usuario {chat_id}: {e}")
             return []
@@ -107,10 +85,11 @@ class SupabaseManager:
         Returns:
             True si el usuario tiene acceso, False en caso contrario
         """
+        # Import tardío: app.security.permissions depende de este módulo
+        from app.security.permissions import get_permisos
         try:
-            empresas = self.get_user_empresas(chat_id)
-            empresa_ids = [e['id'] for e in empresas]
-            return empresa_id in empresa_ids
+            permisos = get_permisos().obtener(chat_id)
+            return bool(permisos and permisos.tiene_acceso(empresa_id))
         except Exception as e:
             logger.error(f"Error validando acceso de usuario {chat_id} a empresa {empresa_id}: {e}")
             return False
@@ -125,7 +104,7 @@ class SupabaseManager:
                 'respuesta': respuesta,
                 'tipo': tipo
             }
-            self._client.table('conversaciones').insert(data).execute()
+            self.client.table('conversaciones').insert(data).execute()
         except Exception as e:
             logger.error(f"Error registrando conversación: {e}")
     
@@ -147,7 +126,7 @@ class SupabaseManager:
                 logger.warning(f"Usuario {chat_id} intentó acceder a empresa {empresa_id} sin permisos")
                 return []
             
-            response = self._client.table(table_name).select('*').eq('empresa_id', empresa_id).execute()
+            response = self.client.table(table_name).select('*').eq('empresa_id', empresa_id).execute()
             return response.data
         except Exception as e:
             logger.error(f"Error obteniendo datos de {table_name} para empresa {empresa_id}: {e}")
@@ -162,7 +141,7 @@ class SupabaseManager:
                 'nombre': nombre,
                 'activo': True
             }
-            empresa_response = self._client.table('empresas').insert(empresa_data).execute()
+            empresa_response = self.client.table('empresas').insert(empresa_data).execute()
             
             if empresa_response.data:
                 empresa_id = empresa_response.data[0]['id']
@@ -175,7 +154,7 @@ class SupabaseManager:
                     'rol': 'admin',
                     'activo': True
                 }
-                self._client.table('usuarios').insert(usuario_data).execute()
+                self.client.table('usuarios').insert(usuario_data).execute()
                 
                 return empresa_id
             return None
@@ -183,10 +162,11 @@ class SupabaseManager:
             logger.error(f"Error creando empresa: {e}")
             return None
 
+    @coalescer('reportes_mensuales')
     def get_reportes_mensuales(self, empresa_id, anio=None, mes=None):
-        """Obtener reportes mensuales de una empresa"""
+        """Obtener reportes mensuales de una empresa (consultas idénticas concurrentes comparten la query)"""
         try:
-            query = self._client.table('reportes_mensuales').select('*').eq('empresa_id', empresa_id)
+            query = self.client.table('reportes_mensuales').select('*').eq('empresa_id', empresa_id)
             
             if anio:
                 query = query.eq('anio', anio)
@@ -202,7 +182,7 @@ class SupabaseManager:
     def get_archivos_reporte(self, reporte_id):
         """Obtener archivos adjuntos de un reporte"""
         try:
-            result = self._client.table('archivos_reportes').select('*').eq('reporte_id', reporte_id).execute()
+            result = self.client.table('archivos_reportes').select('*').eq('reporte_id', reporte_id).execute()
             return result.data
         except Exception as e:
             logger.error(f"Error obteniendo archivos del reporte: {e}")
@@ -211,7 +191,7 @@ class SupabaseManager:
     def get_comentarios_reporte(self, reporte_id):
         """Obtener comentarios de un reporte"""
         try:
-            result = self._client.table('comentarios_reportes').select('*').eq('reporte_id', reporte_id).execute()
+            result = self.client.table('comentarios_reportes').select('*').eq('reporte_id', reporte_id).execute()
             return result.data
         except Exception as e:
             logger.error(f"Error obteniendo comentarios del reporte: {e}")
@@ -220,7 +200,7 @@ class SupabaseManager:
     def get_info_compania(self, empresa_id, categoria=None):
         """Obtener información de compañía por categoría"""
         try:
-            query = self._client.table('info_compania').select('*').eq('empresa_id', empresa_id).eq('estado', 'activo')
+            query = self.client.table('info_compania').select('*').eq('empresa_id', empresa_id).eq('estado', 'activo')
             
             if categoria:
                 query = query.eq('categoria', categoria)
@@ -234,7 +214,7 @@ class SupabaseManager:
     def get_archivos_info_compania(self, info_id):
         """Obtener archivos adjuntos de información de compañía"""
         try:
-            result = self._client.table('archivos_info_compania').select('*').eq('info_id', info_id).execute()
+            result = self.client.table('archivos_info_compania').select('*').eq('info_id', info_id).execute()
             return result.data
         except Exception as e:
             logger.error(f"Error obteniendo archivos de información: {e}")
@@ -254,7 +234,7 @@ class SupabaseManager:
                 'estado': 'borrador'
             }
             
-            result = self._client.table('reportes_mensuales').insert(data).execute()
+            result = self.client.table('reportes_mensuales').insert(data).execute()
             return result.data[0] if result.data else None
         except Exception as e:
             logger.error(f"Error creando reporte mensual: {e}")
@@ -271,7 +251,7 @@ class SupabaseManager:
                 'descripcion': descripcion
             }
             
-            result = self._client.table('archivos_reportes').insert(data).execute()
+            result = self.client.table('archivos_reportes').insert(data).execute()
             return result.data[0] if result.data else None
         except Exception as e:
             logger.error(f"Error agregando archivo al reporte: {e}")
@@ -287,7 +267,7 @@ class SupabaseManager:
                 'tipo_comentario': tipo_comentario
             }
             
-            result = self._client.table('comentarios_reportes').insert(data).execute()
+            result = self.client.table('comentarios_reportes').insert(data).execute()
             return result.data[0] if result.data else None
         except Exception as e:
             logger.error(f"Error agregando comentario al reporte: {e}")
@@ -313,8 +293,8 @@ class SupabaseManager:
                 return []
             
             # Buscar reportes financieros (reportes mensuales, estados financieros, f29, etc.)
-            query = self._client.table('archivos')\
-                .select('*')\
+            query = self.client.table('archivos')\
+                .select(ARCHIVO_ASESOR.select)\
                 .eq('empresa_id', empresa_id)\
                 .eq('categoria', 'financiero')\
                 .eq('activo', True)
@@ -329,7 +309,7 @@ class SupabaseManager:
             result = query.order('periodo', desc=True).order('created_at', desc=True).limit(limit).execute()
             
             logger.info(f"📊 get_reportes_financieros: {len(result.data)} reportes encontrados para empresa {empresa_id}")
-            return result.data
+            return ARCHIVO_ASESOR.filas(result.data)
         except Exception as e:
             logger.error(f"Error obteniendo reportes financieros: {e}")
             return []
@@ -353,8 +333,8 @@ class SupabaseManager:
                 return []
             
             # Buscar archivos ejecutivos/CFO
-            query = self._client.table('archivos')\
-                .select('*')\
+            query = self.client.table('archivos')\
+                .select(ARCHIVO_ASESOR.select)\
                 .eq('empresa_id', empresa_id)\
                 .eq('activo', True)
             
@@ -364,7 +344,7 @@ class SupabaseManager:
             reportes_cfo = []
             keywords = ['cfo', 'performance', 'monthly', 'ejecutivo', 'resumen', 'consolidado', 'dashboard']
             
-            for archivo in result.data:
+            for archivo in ARCHIVO_ASESOR.filas(result.data):
                 nombre = (archivo.get('nombre_original') or archivo.get('nombre_archivo') or '').lower()
                 descripcion = (archivo.get('descripcion_personalizada') or archivo.get('descripcion') or '').lower()
                 subtipo = (archivo.get('subtipo') or '').lower()
@@ -395,19 +375,25 @@ class SupabaseManager:
         """
         try:
             # Obtener metadata del archivo
-            archivo = self._client.table('archivos').select('*').eq('id', archivo_id).execute()
+            archivo = self.client.table('archivos')\
+                .select(f"{ARCHIVO_ASESOR.select}, url_archivo, empresa_id")\
+                .eq('id', archivo_id)\
+                .execute()
             if not archivo.data:
                 return None
             
             archivo_data = archivo.data[0]
-            # Por ahora retornamos metadata. En el futuro podríamos leer el contenido del archivo
+            # Texto extraído del PDF si está en el índice local de la empresa
+            from app.services.document_index_service import get_document_index_service
+            texto = get_document_index_service().texto_archivo(archivo_data.get('empresa_id'), archivo_id)
             return {
                 'nombre': archivo_data.get('nombre_original') or archivo_data.get('nombre_archivo'),
                 'periodo': archivo_data.get('periodo'),
                 'subtipo': archivo_data.get('subtipo'),
                 'descripcion': archivo_data.get('descripcion_personalizada') or archivo_data.get('descripcion'),
                 'metadata': archivo_data.get('metadata', {}),
-                'url': archivo_data.get('url_archivo')
+                'url': archivo_data.get('url_archivo'),
+                'texto': texto
             }
         except Exception as e:
             logger.error(f"Error obteniendo contenido de archivo: {e}")
@@ -12,6 +12,8 @@ from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 
 from app.services.conversation_logger import get_conversation_logger
+from app.services.metrics_service import observar_handler
+from app.security.access_filter import get_filtro_acceso
 
 logger = logging.getLogger(__name__)
 
@@ -65,19 +67,23 @@ def log_conversation(bot_type: str = "production"):
             finally:
                 # Calcular tiempo de respuesta
                 response_time_ms = int((time.time() - start_time) * 1000)
+                observar_handler(bot_type, handler_func.__qualname__, response_time_ms, error=error_message is not None)
                 
-                # Registrar conversación en background
-                asyncio.create_task(
-                    conversation_logger.log_message(
-                        update=update,
-                        response_text=response_text,
-                        bot_type=bot_type,
-                        command=command,
-                        parameters=parameters,
-                        response_time_ms=response_time_ms,
-                        error=error_message
+                # Registrar conversación en background (los chats no registrados ya
+                # quedaron en los intentos agregados). Sin return aquí: el resultado
+                # o la excepción del handler deben llegar a PTB
+                if not (update.effective_chat and get_filtro_acceso().es_desconocido(update.effective_chat.id)):
+                    asyncio.create_task(
+                        conversation_logger.log_message(
+                            update=update,
+                            response_text=response_text,
+                            bot_type=bot_type,
+                            command=command,
+                            parameters=parameters,
+                            response_time_ms=response_time_ms,
+                            error=error_message
+                        )
                     )
-                )
         
         return wrapper
     return decorator
@@ -153,23 +159,20 @@ def log_admin_action(action: str):
         return wrapper
     return decorator
 
-def log_unauthorized_access():
+def log_unauthorized_access(bot_type: str = "production"):
     """
     Decorator para manejar y registrar accesos no autorizados
+    
+    El intento se suma a los contadores agregados del filtro de acceso (sin
+    escribir en la BD por mensaje) y el aviso se envía a lo más una vez por
+    ventana de ACCESO_NEGADO_RESPUESTA_SECONDS por chat.
     """
     def decorator(handler_func: Callable):
         @wraps(handler_func)
         async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE, *args, **kwargs):
-            conversation_logger = get_conversation_logger()
-            
             # Registrar intento de acceso no autorizado
-            await conversation_logger.log_message(
-                update=update,
-                response_text="Acceso denegado - Usuario no autorizado",
-                bot_type="production",
-                has_access=False,
-                error="Usuario no registrado en el sistema"
-            )
+            if not get_filtro_acceso().registrar_intento(update, bot_type):
+                return None
             
             # Crear botón de contacto directo
             keyboard = [
@@ -3,17 +3,30 @@
 Main simplificado con funciones reutilizables
 """
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Body, Header
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
+import os
 import logging
 from typing import Dict, Any
 
 from app.config import Config
-from app.bots.bot_manager import bot_manager
 from app.utils.helpers import setup_logging
 from app.database.supabase import get_supabase_client
 from app.api.conversation_logs import router as conversation_router
+from app.api.metrics import router as metrics_router
+from app.api.broadcasts import router as broadcasts_router
+from app.services.metrics_service import exponer_metricas, iniciar_monitor_event_loop, detener_monitor_event_loop
+from app.utils.tracing import get_trazador
+from app.services.analytics_service import get_analytics_service
+from app.services.retention_service import get_retention_service
+from app.services.scheduler_service import get_programador, registrar_tareas_mantenimiento
+from app.services.document_index_service import get_document_index_service
+from app.services.broadcast_service import get_broadcast_service
+from app.security.access_filter import get_filtro_acceso
+from app.services.coordination_service import CABECERA_SECRETO, get_coordinador
+from app.services.load_service import get_controlador_carga
 
 # Configurar logging
 setup_logging()
@@ -37,12 +50,46 @@ app.add_middleware(
 
 # Incluir routers de APIs
 app.include_router(conversation_router)
+app.include_router(metrics_router)
+app.include_router(broadcasts_router)
 
 
 # ============================================
 # FUNCIONES DE INICIALIZACIÓN
 # ============================================
 
+def get_bot_manager():
+    """
+    Obtener el gestor de bots
+    
+    telegram.ext y los módulos de handlers se importan aquí, en el primer uso,
+    para que importar app.main (uvicorn, tests, scripts) no los cargue.
+    """
+    from app.bots.bot_manager import bot_manager
+    return bot_manager
+
+
+def estado_bots() -> Dict[str, str]:
+    """Estado de cada bot visto desde este proceso"""
+    bot_manager = get_bot_manager()
+    estados = {}
+    for nombre, bot_app in (("admin", bot_manager.admin_app), ("production", bot_manager.production_app)):
+        if nombre not in Config.bots_del_proceso():
+            # Lo ejecuta otro proceso del supervisor
+            estados[nombre] = "otro_proceso"
+        elif bot_app and bot_app.updater.running:
+            estados[nombre] = "running"
+        else:
+            # Sin polling pero procesando los updates que le reenvía la réplica líder
+            estados[nombre] = "follower" if bot_app and bot_app.running else "stopped"
+    return estados
+
+
+def exigir_bots():
+    """Los endpoints de control de bots solo aplican en procesos que los ejecutan"""
+    if not Config.bots_del_proceso():
+        raise HTTPException(status_code=409, detail="Este proceso no ejecuta bots (PROCESO_ROL=api)")
+
 def validate_configuration() -> bool:
     """
     Validar que todas las variables de entorno requeridas estén configuradas
@@ -73,7 +120,7 @@ async def initialize_bots() -> bool:
         Exception: Si hay error al inicializar
     """
     try:
-        await bot_manager.initialize_bots()
+        await get_bot_manager().initialize_bots()
         logger.info("✅ Bots inicializados correctamente")
         return True
     except Exception as e:
@@ -92,7 +139,7 @@ async def start_bots() -> bool:
         Exception: Si hay error al iniciar
     """
     try:
-        await bot_manager.start_bots()
+        await get_bot_manager().start_bots()
         logger.info("✅ Bots iniciados y escuchando mensajes")
         return True
     except Exception as e:
@@ -108,7 +155,7 @@ async def stop_bots() -> bool:
         True si se detuvieron correctamente
     """
     try:
-        await bot_manager.stop_bots()
+        await get_bot_manager().stop_bots()
         logger.info("✅ Bots detenidos correctamente")
         return True
     except Exception as e:
@@ -145,15 +192,30 @@ async def startup_event():
         # 1. Validar configuración
         validate_configuration()
         
+        # Medir lag del event loop desde el arranque
+        iniciar_monitor_event_loop()
+        
         # 2. Verificar conexión con Supabase
         if not check_supabase_connection():
             logger.warning("⚠️ No se pudo verificar conexión con Supabase")
         
-        # 3. Inicializar bots
-        await initialize_bots()
+        # 3-4. Inicializar e iniciar los bots de este proceso (un worker de API no tiene)
+        if Config.bots_del_proceso():
+            await initialize_bots()
+            await start_bots()
+        else:
+            logger.info("🌐 Worker de API: los bots corren en sus propios procesos (run_supervisor.py)")
         
-        # 4. Iniciar bots
-        await start_bots()
+        # 5. Tareas programadas (rollups, sesiones expiradas, retención, conciliación)
+        programador = get_programador()
+        registrar_tareas_mantenimiento(programador)
+        programador.iniciar()
+        
+        # 6. Particiones mensuales de conversaciones por adelantado
+        try:
+            get_retention_service().asegurar_particiones()
+        except Exception as e:
+            logger.warning(f"⚠️ No se pudieron asegurar las particiones de conversaciones: {e}")
         
         logger.info("🚀 ACA 4.0 iniciado correctamente")
         
@@ -166,7 +228,16 @@ async def startup_event():
 async def shutdown_event():
     """Evento de cierre de la aplicación"""
     try:
+        # Las difusiones en curso se liberan antes de detener el bot que las envía
+        await get_broadcast_service().detener()
         await stop_bots()
+        await detener_monitor_event_loop()
+        await get_programador().detener()
+        # Guardar los rollups que quedaron en memoria
+        get_analytics_service().vaciar()
+        get_filtro_acceso().vaciar()
+        get_trazador().detener()
+        get_document_index_service().cerrar()
         logger.info("👋 ACA 4.0 cerrado correctamente")
     except Exception as e:
         logger.error(f"❌ Error en shutdown: {e}")
@@ -201,18 +272,15 @@ async def health_check() -> Dict[str, Any]:
         Estado de salud del sistema y bots
     """
     try:
-        # Verificar estado de bots
-        admin_running = bot_manager.admin_app and bot_manager.admin_app.updater.running if bot_manager.admin_app else False
-        production_running = bot_manager.production_app and bot_manager.production_app.updater.running if bot_manager.production_app else False
-        
         # Verificar Supabase
         supabase_status = check_supabase_connection()
         
         return {
             "status": "healthy",
-            "bots": {
-                "admin": "running" if admin_running else "stopped",
-                "production": "running" if production_running else "stopped"
+            "bots": estado_bots(),
+            "proceso": {
+                "rol": Config.PROCESO_ROL,
+                "pid": os.getpid()
             },
             "database": {
                 "supabase": "connected" if supabase_status else "disconnected"
@@ -230,6 +298,22 @@ async def health_check() -> Dict[str, Any]:
         }
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics() -> PlainTextResponse:
+    """
+    Métricas en formato Prometheus
+    
+    Returns:
+        Throughput y latencia de handlers, updates en curso, sesiones activas,
+        caches, latencias de OpenAI/Supabase, RSS y lag del event loop
+    """
+    try:
+        return PlainTextResponse(exponer_metricas(), media_type="text/plain; version=0.0.4; charset=utf-8")
+    except Exception as e:
+        logger.error(f"Error exponiendo métricas: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.get("/status")
 async def get_status() -> Dict[str, Any]:
     """
@@ -239,11 +323,15 @@ async def get_status() -> Dict[str, Any]:
         Estado completo del sistema
     """
     try:
+        from app.supervisor import leer_estado
         return {
-            "bots": {
-                "admin": "running" if bot_manager.admin_app else "stopped",
-                "production": "running" if bot_manager.production_app else "stopped"
-            },
+            "bots": estado_bots(),
+            # RSS, reinicios y estado de cada proceso (solo con run_supervisor.py)
+            "procesos": leer_estado(),
+            # Líder y réplicas de cada bot (varias réplicas con COORDINACION_BACKEND=supabase)
+            "coordinacion": get_coordinador().estado() if Config.bots_del_proceso() else None,
+            # Señales de saturación y modos degradados activos
+            "carga": get_controlador_carga().estado(),
             "config": {
                 "environment": Config.ENVIRONMENT,
                 "debug": Config.DEBUG
@@ -269,6 +357,7 @@ async def start_bots_endpoint() -> Dict[str, str]:
     Returns:
         Mensaje de confirmación
     """
+    exigir_bots()
     try:
         await start_bots()
         return {"message": "Bots iniciados correctamente"}
@@ -285,6 +374,7 @@ async def stop_bots_endpoint() -> Dict[str, str]:
     Returns:
         Mensaje de confirmación
     """
+    exigir_bots()
     try:
         await stop_bots()
         return {"message": "Bots detenidos correctamente"}
@@ -301,6 +391,7 @@ async def restart_bots_endpoint() -> Dict[str, str]:
     Returns:
         Mensaje de confirmación
     """
+    exigir_bots()
     try:
         await stop_bots()
         await initialize_bots()
@@ -311,6 +402,29 @@ async def restart_bots_endpoint() -> Dict[str, str]:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# ============================================
+# COORDINACIÓN ENTRE RÉPLICAS
+# ============================================
+
+@app.post("/interno/updates/{bot}")
+async def recibir_update_endpoint(
+    bot: str,
+    datos: Dict[str, Any] = Body(...),
+    secreto: str = Header(None, alias=CABECERA_SECRETO)
+) -> Dict[str, str]:
+    """
+    Recibir un update que la réplica líder reenvía a esta (dueña de su chat)
+    
+    Returns:
+        Confirmación; 403 sin el secreto compartido, 404 si este proceso no ejecuta el bot
+    """
+    if not get_coordinador().secreto_valido(secreto):
+        raise HTTPException(status_code=403, detail="Secreto de coordinación inválido")
+    if bot not in Config.bots_del_proceso() or not await get_bot_manager().recibir_update(bot, datos):
+        raise HTTPException(status_code=404, detail=f"Este proceso no ejecuta el bot {bot}")
+    return {"status": "queued"}
+
+
 # ============================================
 # FUNCIÓN PRINCIPAL PARA EJECUCIÓN DIRECTA
 # ============================================
@@ -0,0 +1,263 @@
+"""
+🚧 Filtro de Accesos No Autorizados
+Caché negativa de chat_ids no registrados, respuestas limitadas por chat e intentos agregados en memoria
+"""
+
+import time
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Any, Dict, Optional
+
+from app.config import Config
+from app.database.supabase import get_supabase_client
+from app.services.analytics_service import get_analytics_service
+from app.services.metrics_service import registrar_cache
+from app.utils.metrics import get_registro_metricas
+
+if TYPE_CHECKING:
+    from telegram import Update
+    from telegram.ext import ContextTypes
+
+logger = logging.getLogger(__name__)
+
+registro = get_registro_metricas()
+INTENTOS_NO_AUTORIZADOS = registro.contador(
+    'aca_unauthorized_attempts_total', 'Mensajes de chats no registrados por desenlace (respondido, descartado)',
+    ('bot', 'desenlace')
+)
+
+# Con más chats que esto, los más antiguos salen de la caché (y los nuevos no se agregan a los pendientes)
+MAX_DESCONOCIDOS = 50000
+MAX_PENDIENTES = 10000
+
+# Largo máximo del último mensaje guardado por chat
+MAX_MENSAJE = 500
+
+
+class _Intentos:
+    """Intentos pendientes de un chat desde el último vaciado"""
+
+    __slots__ = ('cantidad', 'primer_intento', 'ultimo_intento', 'mensaje', 'bot_tipo',
+                 'user_id', 'first_name', 'last_name', 'username')
+
+    def __init__(self):
+        self.cantidad = 0
+        self.primer_intento: Optional[str] = None
+        self.ultimo_intento: Optional[str] = None
+        self.mensaje: Optional[str] = None
+        self.bot_tipo: Optional[str] = None
+        self.user_id: Optional[int] = None
+        self.first_name: Optional[str] = None
+        self.last_name: Optional[str] = None
+        self.username: Optional[str] = None
+
+    def combinar(self, otro: '_Intentos'):
+        """Sumar intentos más antiguos (se usa para devolver un lote que no se pudo guardar)"""
+        self.cantidad += otro.cantidad
+        self.primer_intento = otro.primer_intento or self.primer_intento
+        for campo in ('mensaje', 'bot_tipo', 'user_id', 'first_name', 'last_name', 'username'):
+            if getattr(self, campo) is None:
+                setattr(self, campo, getattr(otro, campo))
+
+
+class AccessFilter:
+    """
+    Camino barato para los chats que no son usuarios registrados.
+
+    - Caché negativa: un chat_id sin usuario activo se recuerda durante
+      ACCESO_NEGATIVO_TTL_SECONDS y `validate_user`, `is_admin` y el logger de
+      conversaciones lo rechazan sin consultar `usuarios`. /adduser lo olvida
+      en esta réplica (y en todas con CACHE_BACKEND=redis, por el aviso de
+      invalidación de permisos); en las demás, al cambiar la versión de
+      permisos (app/security/permissions.py) o al vencer el TTL.
+    - Intentos agregados: cada mensaje suma a un contador en memoria por chat
+      y `vaciar` (tarea programada 'intentos_acceso') guarda todos los chats
+      en un RPC: una fila de intentos_acceso_negado por chat y vaciado con su
+      `cantidad`, en vez de una fila (y una conversación) por mensaje.
+    - Respuestas limitadas: un chat desconocido recibe el mensaje de acceso
+      denegado a lo más una vez cada ACCESO_NEGADO_RESPUESTA_SECONDS; el resto
+      de sus updates se descarta antes de los handlers.
+    """
+
+    def __init__(self, ttl_segundos: int = None, respuesta_segundos: int = None):
+        self.ttl_segundos = ttl_segundos if ttl_segundos is not None else Config.ACCESO_NEGATIVO_TTL_SECONDS
+        self.respuesta_segundos = respuesta_segundos if respuesta_segundos is not None \
+            else Config.ACCESO_NEGADO_RESPUESTA_SECONDS
+        # chat_id -> [vence, última respuesta]; los más antiguos salen primero al superar MAX_DESCONOCIDOS
+        self._desconocidos: 'OrderedDict[int, list]' = OrderedDict()
+        self._pendientes: Dict[int, _Intentos] = {}
+        self._lock = threading.Lock()
+
+    # ============================================
+    # CACHÉ NEGATIVA
+    # ============================================
+
+    def es_desconocido(self, chat_id: int) -> bool:
+        """True si el chat no tiene usuario activo (según una consulta de hace menos del TTL)"""
+        with self._lock:
+            entrada = self._desconocidos.get(chat_id)
+            # Una entrada vencida se conserva por la hora de su última respuesta
+            vigente = entrada is not None and entrada[0] > time.monotonic()
+        registrar_cache('acceso_negativo', vigente)
+        return vigente
+
+    def marcar_desconocido(self, chat_id: int):
+        """Recordar que el chat no es un usuario registrado (nunca los admins de configuración)"""
+        if not self.ttl_segundos or chat_id == Config.ADMIN_CHAT_ID:
+            return
+        with self._lock:
+            entrada = self._desconocidos.pop(chat_id, None)
+            ultima_respuesta = entrada[1] if entrada else 0.0
+            self._desconocidos[chat_id] = [time.monotonic() + self.ttl_segundos, ultima_respuesta]
+            while len(self._desconocidos) > MAX_DESCONOCIDOS:
+                self._desconocidos.popitem(last=False)
+
+    def olvidar(self, chat_id: int):
+        """El chat pasó a ser usuario (p. ej. /adduser)"""
+        with self._lock:
+            self._desconocidos.pop(chat_id, None)
+
+    def expirar_todos(self):
+        """Vencer toda la caché negativa (cambiaron los usuarios); se conserva la hora de la última respuesta"""
+        with self._lock:
+            for entrada in self._desconocidos.values():
+                entrada[0] = 0.0
+
+    def _puede_responder(self, chat_id: int) -> bool:
+        """Reservar la respuesta de acceso denegado del chat si ya le toca"""
+        ahora = time.monotonic()
+        with self._lock:
+            entrada = self._desconocidos.get(chat_id)
+            if entrada is None:
+                return True
+            if ahora - entrada[1] < self.respuesta_segundos:
+                return False
+            entrada[1] = ahora
+            return True
+
+    # ============================================
+    # INTENTOS
+    # ============================================
+
+    def registrar_intento(self, update: 'Update', bot_type: str) -> bool:
+        """
+        Sumar un intento del chat (en memoria).
+
+        Returns:
+            True si corresponde responderle el mensaje de acceso denegado
+        """
+        chat_id = update.effective_chat.id
+        user = update.effective_user
+        message = update.effective_message
+        ahora = datetime.now(timezone.utc).isoformat()
+
+        with self._lock:
+            intentos = self._pendientes.get(chat_id)
+            if intentos is None and len(self._pendientes) < MAX_PENDIENTES:
+                intentos = self._pendientes[chat_id] = _Intentos()
+                intentos.primer_intento = ahora
+            if intentos is not None:
+                intentos.cantidad += 1
+                intentos.ultimo_intento = ahora
+                intentos.bot_tipo = bot_type
+                if message:
+                    texto = message.text or message.caption or "[Archivo/Media]"
+                    intentos.mensaje = texto[:MAX_MENSAJE]
+                if user:
+                    intentos.user_id = user.id
+                    intentos.first_name = user.first_name
+                    intentos.last_name = user.last_name
+                    intentos.username = user.username
+
+        get_analytics_service().registrar(bot_type=bot_type, chat_id=chat_id, has_access=False, command=None)
+        responder = self._puede_responder(chat_id)
+        INTENTOS_NO_AUTORIZADOS.inc(bot=bot_type, desenlace='respondido' if responder else 'descartado')
+        return responder
+
+    async def descartar_desconocidos(self, update: 'Update', context: 'ContextTypes.DEFAULT_TYPE', bot_type: str):
+        """
+        Handler previo (grupo -1): un chat desconocido que ya recibió su
+        respuesta no llega a los handlers (ni a sesiones, ni a logging).
+        """
+        chat = update.effective_chat
+        if chat is None or not self.es_desconocido(chat.id):
+            return
+        with self._lock:
+            entrada = self._desconocidos.get(chat.id)
+            respondido = entrada is not None and time.monotonic() - entrada[1] < self.respuesta_segundos
+        if respondido:
+            from telegram.ext import ApplicationHandlerStop
+            self.registrar_intento(update, bot_type)
+            if update.callback_query:
+                try:
+                    await update.callback_query.answer()
+                except Exception:
+                    pass
+            raise ApplicationHandlerStop
+
+    def vaciar(self) -> int:
+        """
+        Guardar los intentos pendientes en usuarios_detalle e intentos_acceso_negado.
+
+        Returns:
+            Cantidad de chats guardados
+        """
+        with self._lock:
+            pendientes, self._pendientes = self._pendientes, {}
+        if not pendientes:
+            return 0
+
+        lote = [
+            {
+                'chat_id': chat_id,
+                'cantidad': i.cantidad,
+                'primer_intento': i.primer_intento,
+                'ultimo_intento': i.ultimo_intento,
+                'mensaje': i.mensaje,
+                'bot_tipo': i.bot_tipo,
+                'user_id': i.user_id,
+                'first_name': i.first_name,
+                'last_name': i.last_name,
+                'username': i.username,
+            }
+            for chat_id, i in pendientes.items()
+        ]
+        try:
+            get_supabase_client().client.rpc('registrar_intentos_acceso', {'p_intentos': lote}).execute()
+        except Exception as e:
+            logger.error(f"❌ Error guardando intentos de acceso de {len(lote)} chats: {e}")
+            # Devolver el lote para reintentar en el próximo ciclo
+            with self._lock:
+                for chat_id, intentos in pendientes.items():
+                    actual = self._pendientes.get(chat_id)
+                    if actual is None:
+                        self._pendientes[chat_id] = intentos
+                    else:
+                        actual.combinar(intentos)
+            return 0
+
+        logger.info(f"🚧 Intentos de acceso guardados: {len(lote)} chats, {sum(i['cantidad'] for i in lote)} mensajes")
+        return len(lote)
+
+    def estado(self) -> Dict[str, Any]:
+        """Tamaño de la caché negativa y de los intentos pendientes"""
+        with self._lock:
+            return {
+                'desconocidos': len(self._desconocidos),
+                'chats_pendientes': len(self._pendientes),
+                'intentos_pendientes': sum(i.cantidad for i in self._pendientes.values())
+            }
+
+
+# Instancia global
+_filtro_acceso = None
+
+
+def get_filtro_acceso() -> AccessFilter:
+    """Obtener instancia del filtro de accesos no autorizados"""
+    global _filtro_acceso
+    if _filtro_acceso is None:
+        _filtro_acceso = AccessFilter()
+    return _filtro_acceso
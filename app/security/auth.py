@@ -3,7 +3,11 @@ Módulo de autenticación y seguridad para ACA 3.0
 """
 
 import logging
+from typing import Optional
 from app.database.supabase import supabase
+from app.security.access_filter import get_filtro_acceso
+from app.security.permissions import ROLES_SUBIDA, PermisosUsuario, get_permisos
+from app.utils.tracing import trazar
 
 logger = logging.getLogger(__name__)
 
@@ -15,6 +19,7 @@ class SecurityManager:
         from app.config import Config
         self.admin_chat_ids = [Config.ADMIN_CHAT_ID] if Config.ADMIN_CHAT_ID else [123456789]
     
+    @trazar()
     def validate_user(self, chat_id: int):
         """
         Validar usuario y obtener sus datos (soporte multiempresa)
@@ -35,16 +40,17 @@ class SecurityManager:
             }
         """
         try:
-            user = supabase.get_user_by_chat_id(chat_id)
+            permisos = self._obtener_permisos(chat_id)
             
-            if not user:
+            if not permisos:
                 return {
                     'valid': False,
                     'message': "❌ Usuario no registrado. Contacta al administrador para registrarte."
                 }
             
-            # Obtener todas las empresas del usuario (multiempresa)
-            empresas = supabase.get_user_empresas(chat_id)
+            # Todas las empresas del usuario (multiempresa), desde el snapshot
+            empresas = permisos.copia_empresas()
+            user = permisos.usuario
             
             if not empresas:
                 return {
@@ -76,6 +82,29 @@ class SecurityManager:
                 'message': "❌ Error de validación. Intenta nuevamente."
             }
     
+    def _obtener_permisos(self, chat_id: int) -> Optional[PermisosUsuario]:
+        """
+        Snapshot de permisos del usuario (una consulta por TTL/versión, el resto en memoria)
+        
+        Raises:
+            Exception: si no se pudo consultar la BD
+        """
+        if get_filtro_acceso().es_desconocido(chat_id):
+            return None
+        permisos = get_permisos().obtener(chat_id)
+        if permisos is None:
+            # Los próximos mensajes del chat se rechazan sin consultar la BD
+            get_filtro_acceso().marcar_desconocido(chat_id)
+        return permisos
+    
+    def _permisos(self, chat_id: int) -> Optional[PermisosUsuario]:
+        """Snapshot de permisos; None si no es usuario o si la BD falló (se deniega)"""
+        try:
+            return self._obtener_permisos(chat_id)
+        except Exception as e:
+            logger.error(f"Error obteniendo permisos de usuario {chat_id}: {e}")
+            return None
+    
     def user_has_access_to_empresa(self, chat_id: int, empresa_id: str) -> bool:
         """
         Validar si un usuario tiene acceso a una empresa específica
@@ -87,7 +116,8 @@ class SecurityManager:
         Returns:
             True si el usuario tiene acceso, False en caso contrario
         """
-        return supabase.user_has_access_to_empresa(chat_id, empresa_id)
+        permisos = self._permisos(chat_id)
+        return bool(permisos and permisos.tiene_acceso(empresa_id))
     
     def get_user_empresas(self, chat_id: int):
         """
@@ -99,7 +129,8 @@ class SecurityManager:
         Returns:
             Lista de empresas: [{'id': uuid, 'nombre': str, 'rut': str, 'rol': str}, ...]
         """
-        return supabase.get_user_empresas(chat_id)
+        permisos = self._permisos(chat_id)
+        return permisos.copia_empresas() if permisos else []
     
     def is_admin(self, chat_id: int):
         """Verificar si el usuario es administrador (super_admin o admin legacy)"""
@@ -108,14 +139,8 @@ class SecurityManager:
             return True
         
         # Verificar si tiene rol super_admin en la BD
-        try:
-            user = supabase.get_user_by_chat_id(chat_id)
-            if user and user.get('rol') == 'super_admin':
-                return True
-        except:
-            pass
-        
-        return False
+        permisos = self._permisos(chat_id)
+        return bool(permisos and permisos.es_super_admin)
     
     def is_super_admin(self, chat_id: int) -> bool:
         """
@@ -132,14 +157,8 @@ class SecurityManager:
             return True
         
         # Verificar rol en BD
-        try:
-            user = supabase.get_user_by_chat_id(chat_id)
-            if user and user.get('rol') == 'super_admin':
-                return True
-        except:
-            pass
-        
-        return False
+        permisos = self._permisos(chat_id)
+        return bool(permisos and permisos.es_super_admin)
     
     def get_user_role_in_empresa(self, chat_id: int, empresa_id: str) -> str:
         """
@@ -152,15 +171,8 @@ class SecurityManager:
         Returns:
             Rol del usuario en la empresa: 'super_admin', 'gestor', 'usuario' o None
         """
-        try:
-            empresas = supabase.get_user_empresas(chat_id)
-            for empresa in empresas:
-                if empresa['id'] == empresa_id:
-                    return empresa.get('rol', 'usuario')
-            return None
-        except Exception as e:
-            logger.error(f"Error obteniendo rol de usuario {chat_id} en empresa {empresa_id}: {e}")
-            return None
+        permisos = self._permisos(chat_id)
+        return permisos.rol_en(empresa_id) if permisos else None
     
     def can_upload_files(self, chat_id: int, empresa_id: str = None) -> bool:
         """
@@ -177,20 +189,16 @@ class SecurityManager:
         if self.is_super_admin(chat_id):
             return True
         
+        permisos = self._permisos(chat_id)
+        if not permisos:
+            return False
+        
         # Si se especifica empresa, verificar rol en esa empresa
         if empresa_id:
-            rol = self.get_user_role_in_empresa(chat_id, empresa_id)
-            return rol in ['super_admin', 'gestor']
+            return permisos.rol_en(empresa_id) in ROLES_SUBIDA
         
         # Si no se especifica empresa, verificar si tiene al menos una empresa con permiso
-        try:
-            empresas = supabase.get_user_empresas(chat_id)
-            for empresa in empresas:
-                if empresa.get('rol') in ['super_admin', 'gestor']:
-                    return True
-            return False
-        except:
-            return False
+        return permisos.puede_subir
     
     def can_download_files(self, chat_id: int, empresa_id: str = None) -> bool:
         """
@@ -209,11 +217,8 @@ class SecurityManager:
             return self.user_has_access_to_empresa(chat_id, empresa_id)
         
         # Si no se especifica empresa, verificar que tenga al menos una empresa
-        try:
-            empresas = supabase.get_user_empresas(chat_id)
-            return len(empresas) > 0
-        except:
-            return False
+        permisos = self._permisos(chat_id)
+        return bool(permisos and permisos.empresas)
     
     def can_manage_empresas(self, chat_id: int) -> bool:
         """
@@ -230,14 +235,8 @@ class SecurityManager:
             return True
         
         # Verificar si tiene rol gestor en alguna empresa
-        try:
-            empresas = supabase.get_user_empresas(chat_id)
-            for empresa in empresas:
-                if empresa.get('rol') == 'gestor':
-                    return True
-            return False
-        except:
-            return False
+        permisos = self._permisos(chat_id)
+        return bool(permisos and permisos.puede_gestionar)
     
     def log_security_event(self, chat_id: int, event_type: str, description: str):
         """Registrar evento de seguridad"""
@@ -0,0 +1,210 @@
+"""
+🔑 Permisos por Usuario
+Snapshot del rol global y el rol por empresa de cada usuario en la caché de servicios, invalidado por versión
+"""
+
+import time
+import uuid
+import logging
+import threading
+from typing import Any, Dict, List, Optional
+
+from app.config import Config
+from app.database.projections import USUARIO_AUTH
+from app.database.supabase import get_supabase_client
+from app.security.access_filter import get_filtro_acceso
+from app.services.cache_service import BackendCache, clave_cache, get_cache
+from app.services.metrics_service import registrar_cache
+
+logger = logging.getLogger(__name__)
+
+# Usuario con sus relaciones y empresas en una sola consulta
+COLUMNAS_PERMISOS = (
+    USUARIO_AUTH.select + ', usuarios_empresas(empresa_id, rol, activo, empresas(id, nombre, rut, activo))'
+)
+
+ROLES_SUBIDA = ('super_admin', 'gestor')
+
+# Canal de la caché por el que se avisan las invalidaciones a todas las réplicas
+CANAL_PERMISOS = 'permisos'
+
+
+class PermisosUsuario:
+    """Rol global, empresas y rol por empresa de un usuario activo"""
+
+    __slots__ = ('usuario', 'empresas', 'roles', 'es_super_admin', 'puede_subir', 'puede_gestionar')
+
+    def __init__(self, usuario, empresas: List[Dict[str, Any]]):
+        self.usuario = usuario
+        # Mismo formato y orden que SupabaseManager.get_user_empresas (la primera es la principal)
+        self.empresas = empresas
+        self.roles: Dict[str, str] = {e['id']: e.get('rol') or 'usuario' for e in empresas}
+        self.es_super_admin = usuario.get('rol') == 'super_admin'
+        self.puede_subir = any(rol in ROLES_SUBIDA for rol in self.roles.values())
+        self.puede_gestionar = 'gestor' in self.roles.values()
+
+    def copia_empresas(self) -> List[Dict[str, Any]]:
+        """Empresas para el llamador (el snapshot es compartido entre handlers)"""
+        return [dict(empresa) for empresa in self.empresas]
+
+    def rol_en(self, empresa_id: str) -> Optional[str]:
+        return self.roles.get(empresa_id)
+
+    def tiene_acceso(self, empresa_id: str) -> bool:
+        return empresa_id in self.roles
+
+
+class PermissionCache:
+    """
+    Snapshots de permisos por chat_id.
+
+    Un snapshot se arma con una consulta (usuario + usuarios_empresas +
+    empresas), se guarda en la caché de servicios (LRU del proceso o Redis
+    compartido, según CACHE_BACKEND) y responde todas las verificaciones de
+    rol sin ir a la BD. Los triggers de la migración 014 incrementan
+    `version_permisos` en cada cambio de usuarios, usuarios_empresas o
+    empresas; esta caché lee la versión a lo más cada
+    PERMISOS_VERSION_SECONDS y la incluye en la clave, así que un cambio deja
+    atrás todos los snapshots (y vence la caché negativa de chats
+    desconocidos, por si el cambio fue un usuario nuevo).
+    PERMISOS_TTL_SECONDS acota la edad de un snapshot si la versión no se
+    puede leer. `invalidar` se avisa por el canal 'permisos' a todas las
+    réplicas.
+    """
+
+    def __init__(self, ttl_segundos: int = None, intervalo_version: float = None, cache: BackendCache = None):
+        self.supabase = get_supabase_client()
+        self.ttl_segundos = ttl_segundos if ttl_segundos is not None else Config.PERMISOS_TTL_SECONDS
+        self.intervalo_version = intervalo_version if intervalo_version is not None \
+            else Config.PERMISOS_VERSION_SECONDS
+        self.cache = cache or get_cache()
+        self._version: Optional[int] = None
+        self._version_leida = 0.0
+        # Cambia al invalidar todos los snapshots (parte de la clave, como la versión)
+        self._generacion = '0'
+        self._lock = threading.Lock()
+        self.cache.suscribir(CANAL_PERMISOS, self._al_invalidar)
+
+    # ============================================
+    # VERSIÓN
+    # ============================================
+
+    def _leer_version(self) -> Optional[int]:
+        result = self.supabase.table('version_permisos').select('version').eq('id', 1).limit(1).execute()
+        return result.data[0]['version'] if result.data else None
+
+    def _verificar_version(self):
+        ahora = time.monotonic()
+        with self._lock:
+            if ahora - self._version_leida < self.intervalo_version:
+                return
+            # Una sola lectura por intervalo aunque lleguen varias verificaciones juntas
+            self._version_leida = ahora
+        try:
+            version = self._leer_version()
+        except Exception as e:
+            logger.warning(f"⚠️ No se pudo leer la versión de permisos: {e}")
+            return
+        with self._lock:
+            anterior, self._version = self._version, version
+            if anterior is None or anterior == version:
+                return
+        get_filtro_acceso().expirar_todos()
+        logger.info(f"🔑 Permisos cambiaron (versión {anterior} → {version}): snapshots descartados")
+
+    def _clave(self, chat_id: int) -> str:
+        return clave_cache('permisos', self._version or 0, self._generacion, chat_id)
+
+    # ============================================
+    # SNAPSHOTS
+    # ============================================
+
+    def _cargar(self, chat_id: int) -> Optional[PermisosUsuario]:
+        result = self.supabase.table('usuarios')\
+            .select(COLUMNAS_PERMISOS)\
+            .eq('chat_id', chat_id)\
+            .eq('activo', True)\
+            .limit(1)\
+            .execute()
+        if not result.data:
+            return None
+
+        fila = result.data[0]
+        relaciones = fila.get('usuarios_empresas') or []
+        empresas = []
+        for rel in relaciones:
+            empresa = rel.get('empresas') or {}
+            if rel.get('activo') and empresa.get('activo', False):
+                empresas.append({
+                    'id': rel['empresa_id'],
+                    'nombre': empresa.get('nombre', ''),
+                    'rut': empresa.get('rut', ''),
+                    'rol': rel.get('rol', 'user')
+                })
+
+        # Sin relaciones: empresa legacy de usuarios.empresa_id (compatibilidad)
+        if not empresas and fila.get('empresa_id'):
+            legacy = self.supabase.table('empresas')\
+                .select('id, nombre, rut')\
+                .eq('id', fila['empresa_id'])\
+                .eq('activo', True)\
+                .execute()
+            if legacy.data:
+                empresas.append({
+                    'id': legacy.data[0]['id'],
+                    'nombre': legacy.data[0]['nombre'],
+                    'rut': legacy.data[0].get('rut', ''),
+                    'rol': fila.get('rol', 'user')
+                })
+        return PermisosUsuario(USUARIO_AUTH.fila(fila), empresas)
+
+    def obtener(self, chat_id: int) -> Optional[PermisosUsuario]:
+        """
+        Permisos del usuario (None si no es un usuario activo).
+
+        Raises:
+            Exception: si no se pudo consultar la BD (no se confunde con "no registrado")
+        """
+        self._verificar_version()
+        clave = self._clave(chat_id)
+        cacheado = self.cache.obtener(clave)
+        if cacheado is not None:
+            registrar_cache('permisos', True)
+            return PermisosUsuario(USUARIO_AUTH.fila(cacheado['usuario']), cacheado['empresas'])
+
+        registrar_cache('permisos', False)
+        permisos = self._cargar(chat_id)
+        if permisos is not None and self.ttl_segundos > 0:
+            self.cache.guardar(clave, {'usuario': dict(permisos.usuario), 'empresas': permisos.empresas},
+                               ttl=self.ttl_segundos)
+        return permisos
+
+    def invalidar(self, chat_id: Optional[int] = None):
+        """Descartar el snapshot de un usuario (o todos) en todas las réplicas"""
+        if chat_id is None:
+            self.cache.publicar(CANAL_PERMISOS, {'generacion': uuid.uuid4().hex[:8]})
+            return
+        self.cache.borrar(self._clave(chat_id))
+        self.cache.publicar(CANAL_PERMISOS, {'chat_id': chat_id})
+
+    def _al_invalidar(self, mensaje: Dict[str, Any]):
+        """Aviso de invalidación (de esta réplica o de otra)"""
+        if mensaje.get('generacion'):
+            with self._lock:
+                self._generacion = mensaje['generacion']
+        elif mensaje.get('chat_id') is not None:
+            # Con LRU por réplica el snapshot también puede estar aquí; el chat deja de ser desconocido
+            self.cache.borrar(self._clave(mensaje['chat_id']))
+            get_filtro_acceso().olvidar(mensaje['chat_id'])
+
+
+# Instancia global
+_permission_cache = None
+
+
+def get_permisos() -> PermissionCache:
+    """Obtener instancia de la caché de permisos"""
+    global _permission_cache
+    if _permission_cache is None:
+        _permission_cache = PermissionCache()
+    return _permission_cache
@@ -3,21 +3,46 @@
 Extrae intención de mensajes naturales para descarga de archivos
 """
 
+import re
+import hashlib
 import json
 import logging
 from typing import Dict, Any, Optional, List
 from app.config import Config
 from app.utils.file_types import get_todos_subtipos, get_categoria_nombre, get_subtipo_nombre
+from app.utils.tracing import trazar
+from app.services.cache_service import clave_cache, get_cache
+from app.services.metrics_service import registrar_cache
+from app.utils.coalescencia import coalescer
+from app.services.load_service import get_controlador_carga, MODO_INTENCION
 from datetime import datetime, timedelta
 
 logger = logging.getLogger(__name__)
 
+# Reglas para reconocer el tipo de archivo sin IA (modo degradado): patrón -> (categoría, subtipo)
+REGLAS_SUBTIPO = (
+    (r'estatuto', ('legal', 'estatutos_empresa')),
+    (r'\bpoder(es)?\b', ('legal', 'poderes')),
+    (r'\bci\b|c[ée]dula', ('legal', 'ci')),
+    (r'\brut\b', ('legal', 'rut')),
+    (r'reporte|informe mensual', ('financiero', 'reporte_mensual')),
+    (r'estados? financieros?|balance', ('financiero', 'estados_financieros')),
+    (r'carpeta tributaria', ('financiero', 'carpeta_tributaria')),
+    (r'\bf\s?-?29\b|formulario 29', ('financiero', 'f29')),
+    (r'\bf\s?-?22\b|formulario 22', ('financiero', 'f22')),
+)
+REGLAS_CATEGORIA = (
+    (r'legal', 'legal'),
+    (r'financier|tributari|contable', 'financiero'),
+)
+
 class AIService:
     """Servicio para integración con OpenAI"""
     
     def __init__(self):
         self.openai_key = Config.OPENAI_API_KEY
         self.client = None
+        self.cache = get_cache()
         
         # Log de diagnóstico
         key_status = f"presente ({self.openai_key[:8]}...)" if self.openai_key else "NO configurada"
@@ -29,7 +54,8 @@ class AIService:
                 import openai
                 logger.info(f"📦 openai version: {openai.__version__}")
                 from openai import AsyncOpenAI
-                self.client = AsyncOpenAI(api_key=self.openai_key)
+                from app.services.metrics_service import instrumentar_openai
+                self.client = instrumentar_openai(AsyncOpenAI(api_key=self.openai_key))
                 logger.info(f"✅ OpenAI AIService inicializado - client: {type(self.client)}")
             except ImportError as e:
                 logger.error(f"❌ openai NO INSTALADO: {e}")
@@ -40,6 +66,43 @@ class AIService:
         else:
             logger.warning("⚠️ OPENAI_API_KEY no configurada")
     
+    async def _completar_json(self, system: str, prompt: str, temperature: float,
+                              model: str = "gpt-4o-mini", cachear: bool = True) -> Any:
+        """
+        Completion en modo JSON con caché compartida.
+        
+        La clave es el hash de modelo, mensajes y temperatura: el mismo prompt
+        (que ya incluye la fecha) reutiliza la respuesta durante
+        CACHE_IA_TTL_SECONDS. Solo para extracciones deterministas (intención,
+        período); las respuestas sobre datos de la empresa usan cachear=False
+        para no servir cifras viejas tras una carga.
+        """
+        clave = None
+        if cachear and Config.CACHE_IA_TTL_SECONDS > 0:
+            huella = hashlib.sha256(
+                json.dumps([model, system, prompt, temperature], ensure_ascii=False).encode('utf-8')
+            ).hexdigest()
+            clave = clave_cache('ia', huella)
+            guardado = self.cache.obtener(clave)
+            registrar_cache('ia', guardado is not None)
+            if guardado is not None:
+                return guardado
+        
+        response = await self.client.chat.completions.create(
+            model=model,
+            messages=[
+                {"role": "system", "content": system},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=temperature,
+            response_format={"type": "json_object"}
+        )
+        result = json.loads(response.choices[0].message.content)
+        if clave:
+            self.cache.guardar(clave, result, ttl=Config.CACHE_IA_TTL_SECONDS)
+        return result
+    
+    @trazar()
     async def extract_file_intent(
         self,
         mensaje: str,
@@ -65,6 +128,10 @@ class AIService:
                 "confianza": 0.85
             }
         """
+        # Bajo sobrecarga (cola o OpenAI lentos) se responde al instante con reglas
+        if get_controlador_carga().degradado(MODO_INTENCION):
+            return self.extract_file_intent_reglas(mensaje, empresas_usuario)
+        
         if not self.client:
             return {"confianza": 0.0}  # Sin IA disponible
         
@@ -77,26 +144,13 @@ class AIService:
                 mensaje, empresas_usuario, historial, sesion_activa, tipos_validos
             )
             
-            # Llamar a OpenAI
-            response = await self.client.chat.completions.create(
-                model="gpt-4o-mini",  # Modelo económico
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "Eres un asistente que extrae información de solicitudes de archivos. Responde SOLO en JSON válido."
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                temperature=0.3,  # Bajo para respuestas consistentes
-                response_format={"type": "json_object"}
+            # Llamar a OpenAI (o reutilizar la respuesta de un prompt idéntico)
+            result = await self._completar_json(
+                "Eres un asistente que extrae información de solicitudes de archivos. Responde SOLO en JSON válido.",
+                prompt,
+                temperature=0.3  # Bajo para respuestas consistentes
             )
             
-            # Parsear respuesta
-            result = json.loads(response.choices[0].message.content)
-            
             # Validar y normalizar resultado
             return self._validate_and_normalize_result(result, empresas_usuario)
             
@@ -104,6 +158,50 @@ class AIService:
             logger.error(f"❌ Error extrayendo intención con IA: {e}")
             return {"confianza": 0.0}  # Fallback: sin confianza
     
+    def extract_file_intent_reglas(
+        self,
+        mensaje: str,
+        empresas_usuario: List[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """
+        Extraer la intención de descarga con palabras clave, sin IA (modo degradado)
+        
+        Reconoce subtipo, categoría, período (_parse_periodo_manual) y empresa
+        por nombre. Solo con categoría, subtipo y período la confianza alcanza
+        para el flujo directo; si falta algo, el flujo estructurado lo pregunta.
+        
+        Returns:
+            Mismo formato que extract_file_intent
+        """
+        texto = mensaje.lower()
+        categoria, subtipo = None, None
+        
+        for patron, (cat, sub) in REGLAS_SUBTIPO:
+            if re.search(patron, texto):
+                categoria, subtipo = cat, sub
+                break
+        if not categoria:
+            for patron, cat in REGLAS_CATEGORIA:
+                if re.search(patron, texto):
+                    categoria = cat
+                    break
+        
+        periodo_info = self._parse_periodo_manual(mensaje)
+        periodo = periodo_info['periodo'] if periodo_info else None
+        
+        empresa = next(
+            (e['nombre'] for e in empresas_usuario if e.get('nombre') and e['nombre'].lower() in texto), None
+        )
+        
+        result = {
+            "categoria": categoria,
+            "subtipo": subtipo,
+            "empresa": empresa,
+            "periodo": periodo,
+            "confianza": 0.8 if categoria and subtipo and periodo else 0.4 if categoria else 0.0
+        }
+        return self._validate_and_normalize_result(result, empresas_usuario)
+    
     async def extract_periodo_from_text(
         self,
         texto: str,
@@ -180,26 +278,13 @@ Responde SOLO en JSON con este formato:
     "interpretacion": "explicación breve"
 }}"""
             
-            # Llamar a OpenAI
-            response = await self.client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "Eres un asistente que extrae períodos de fechas de texto en lenguaje natural. Responde SOLO en JSON válido."
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                temperature=0.2,  # Muy bajo para fechas precisas
-                response_format={"type": "json_object"}
+            # Llamar a OpenAI (o reutilizar la respuesta de un prompt idéntico)
+            result = await self._completar_json(
+                "Eres un asistente que extrae períodos de fechas de texto en lenguaje natural. Responde SOLO en JSON válido.",
+                prompt,
+                temperature=0.2  # Muy bajo para fechas precisas
             )
             
-            # Parsear respuesta
-            result = json.loads(response.choices[0].message.content)
-            
             # Validar formato YYYY-MM
             periodo = result.get('periodo')
             if periodo:
@@ -519,26 +604,14 @@ Responde en formato JSON:
     "fuentes_usadas": ["reporte_mensual_2024-05", "reporte_cfo_2024"]
 }}"""
             
-            # Llamar a OpenAI
-            response = await self.client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "Eres un asistente financiero experto. Responde preguntas usando SOLO la información proporcionada en los reportes. Si no puedes responder, indica claramente que necesitas más información."
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
+            # Llamar a OpenAI (sin caché: la respuesta depende de reportes que cambian)
+            result = await self._completar_json(
+                "Eres un asistente financiero experto. Responde preguntas usando SOLO la información proporcionada en los reportes. Si no puedes responder, indica claramente que necesitas más información.",
+                prompt,
                 temperature=0.3,
-                response_format={"type": "json_object"}
+                cachear=False
             )
             
-            # Parsear respuesta
-            result = json.loads(response.choices[0].message.content)
-            
             # Validar estructura
             if not isinstance(result, dict):
                 return {
@@ -569,23 +642,31 @@ Responde en formato JSON:
                 "fuentes_usadas": []
             }
     
+    @coalescer('asesor_respuesta')
     async def answer_as_aca_qa(
         self,
         pregunta: str,
         empresa_nombre: str,
         reportes_financieros: List[Dict],
         reportes_cfo: List[Dict],
-        historial: Optional[List[Dict]] = None
+        historial: Optional[List[Dict]] = None,
+        pasajes: Optional[List[Dict]] = None,
+        cifras: Optional[Dict[str, Dict]] = None
     ) -> Dict[str, Any]:
         """
         Responder pregunta usando el rol ACA_QA (Analista de Consultas Q&A)
         
+        Las consultas rápidas idénticas (misma empresa, pregunta, historial y
+        contexto) que llegan a la vez comparten una sola llamada a OpenAI.
+        
         Args:
             pregunta: Pregunta del usuario
             empresa_nombre: Nombre de la empresa activa
             reportes_financieros: Lista de reportes financieros disponibles
             reportes_cfo: Lista de reportes CFO disponibles
             historial: Historial de conversación (opcional)
+            pasajes: Pasajes del índice local de documentos (opcional, reemplaza a los reportes)
+            cifras: Series precalculadas por cuenta (opcional, reemplaza a pasajes y reportes)
         
         Returns:
             {
@@ -634,8 +715,13 @@ Responde siempre en español, de forma clara y concisa."""
             }
         
         try:
-            # Construir contexto de reportes
-            contexto_reportes = self._build_reportes_context(reportes_financieros, reportes_cfo)
+            # Construir contexto: cifras precalculadas, pasajes del índice local o metadatos de reportes
+            if cifras:
+                contexto_reportes = self._build_cifras_context(cifras)
+            elif pasajes:
+                contexto_reportes = self._build_pasajes_context(pasajes)
+            else:
+                contexto_reportes = self._build_reportes_context(reportes_financieros, reportes_cfo)
             
             # Construir historial de conversación
             historial_texto = ""
@@ -746,6 +832,37 @@ Si la pregunta requiere una acción (pagar, transferir, cerrar período, etc.),
             contexto = "No hay reportes disponibles."
         
         return contexto
+    
+    def _build_cifras_context(self, cifras: Dict[str, Dict]) -> str:
+        """Construir texto de contexto a partir de series precalculadas (el LLM solo las redacta)"""
+        def monto(valor):
+            return 'N/A' if valor is None else f"${valor:,.0f}".replace(',', '.')
+        
+        def pct(valor):
+            return 'N/A' if valor is None else f"{valor:+.1f}%"
+        
+        contexto = "\n=== CIFRAS CALCULADAS (usar tal cual, no recalcular) ===\n"
+        for cuenta, datos in cifras.items():
+            anual = datos['variacion_anual']
+            acum = datos['acumulado']
+            tend = datos['tendencia']
+            contexto += f"\n- Cuenta: {cuenta} (último período: {datos['ultimo_periodo']})\n"
+            contexto += f"  {anual['periodo']}: {monto(anual['actual'])} vs año anterior {monto(anual['anterior'])} ({pct(anual['variacion_pct'])})\n"
+            contexto += f"  Acumulado {acum['anio']} a {acum['hasta']}: {monto(acum['acumulado'])} vs {monto(acum['anterior'])} ({pct(acum['variacion_pct'])})\n"
+            if tend['pendiente_mensual'] is not None:
+                contexto += f"  Tendencia {tend['meses']} meses: {monto(tend['pendiente_mensual'])} por mes, promedio {monto(tend['promedio'])}, cambio {pct(tend['cambio_pct'])}\n"
+            contexto += "  Mes a mes: " + ", ".join(f"{p} {monto(m)}" for p, m in datos['ultimos_meses']) + "\n"
+        return contexto
+    
+    def _build_pasajes_context(self, pasajes: List[Dict]) -> str:
+        """Construir texto de contexto a partir de pasajes de documentos"""
+        contexto = "\n=== EXTRACTOS DE DOCUMENTOS ===\n"
+        for pasaje in pasajes:
+            nombre = pasaje.get('nombre') or 'Sin nombre'
+            periodo = pasaje.get('periodo') or 'N/A'
+            contexto += f"\n- Documento: {nombre} (Periodo: {periodo}, página {pasaje.get('pagina')})\n"
+            contexto += f"{pasaje.get('texto', '')}\n"
+        return contexto
 
 # Instancia global
 _ai_service = None
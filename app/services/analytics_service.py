@@ -0,0 +1,257 @@
+"""
+📊 Servicio de Analíticas (rollups en bot_analytics)
+Acumula mensajes, usuarios y latencias por bot/día/hora en memoria y los suma en bot_analytics por lotes
+"""
+
+import logging
+import threading
+from datetime import datetime, timedelta, date
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.database.supabase import get_supabase_client
+from app.utils.metrics import Histograma, BUCKETS_LATENCIA_MS
+
+logger = logging.getLogger(__name__)
+
+# Fila de bot_analytics con el total del día
+HORA_DIA = -1
+
+
+class _Acumulado:
+    """Eventos pendientes de una (fecha, hora, bot)"""
+
+    __slots__ = ('mensajes', 'autorizados', 'no_autorizados', 'comandos', 'errores',
+                 'chat_ids', 'chat_ids_no_autorizados', 'latencia')
+
+    def __init__(self):
+        self.mensajes = 0
+        self.autorizados = 0
+        self.no_autorizados = 0
+        self.comandos = 0
+        self.errores = 0
+        self.chat_ids = set()
+        self.chat_ids_no_autorizados = set()
+        self.latencia = Histograma(BUCKETS_LATENCIA_MS)
+
+    def combinar(self, otro: '_Acumulado'):
+        """Sumar otro acumulado (se usa para devolver un lote que no se pudo guardar)"""
+        self.mensajes += otro.mensajes
+        self.autorizados += otro.autorizados
+        self.no_autorizados += otro.no_autorizados
+        self.comandos += otro.comandos
+        self.errores += otro.errores
+        self.chat_ids |= otro.chat_ids
+        self.chat_ids_no_autorizados |= otro.chat_ids_no_autorizados
+        conteos = [a + b for a, b in zip(self.latencia.conteos(), otro.latencia.conteos())]
+        self.latencia = Histograma.desde_conteos(conteos, self.latencia.suma + otro.latencia.suma, BUCKETS_LATENCIA_MS)
+
+
+class AnalyticsService:
+    """
+    Rollups incrementales de conversaciones.
+
+    `registrar` es O(1) y no toca la BD; `vaciar` (tarea programada
+    'rollups_analytics') envía un RPC `acumular_bot_analytics` por cada
+    (fecha, hora, bot) con eventos pendientes, que suma a la fila de la hora
+    y a la del día. Las lecturas leen solo las
+    filas precalculadas (una por bot y día).
+    """
+
+    def __init__(self):
+        self.supabase = get_supabase_client()
+        self._pendientes: Dict[Tuple[str, int, str], _Acumulado] = {}
+        self._lock = threading.Lock()
+
+    # ============================================
+    # ESCRITURA
+    # ============================================
+
+    def registrar(
+        self,
+        bot_type: str,
+        chat_id: Optional[int],
+        has_access: bool,
+        response_time_ms: Optional[int] = None,
+        error: Optional[str] = None,
+        command: Optional[str] = None,
+        momento: Optional[datetime] = None
+    ):
+        """Registrar un mensaje procesado (en memoria)"""
+        momento = momento or datetime.now()
+        clave = (momento.date().isoformat(), momento.hour, bot_type)
+
+        with self._lock:
+            acumulado = self._pendientes.get(clave)
+            if acumulado is None:
+                acumulado = self._pendientes[clave] = _Acumulado()
+            acumulado.mensajes += 1
+            if has_access:
+                acumulado.autorizados += 1
+            else:
+                acumulado.no_autorizados += 1
+                if chat_id is not None:
+                    acumulado.chat_ids_no_autorizados.add(chat_id)
+            if chat_id is not None:
+                acumulado.chat_ids.add(chat_id)
+            if command:
+                acumulado.comandos += 1
+            if error:
+                acumulado.errores += 1
+            # Dentro del lock: tras el cambio de lote en vaciar, la latencia se perdería con el lote enviado
+            if response_time_ms is not None:
+                acumulado.latencia.observar(response_time_ms)
+
+    def vaciar(self) -> int:
+        """
+        Sumar los eventos pendientes en bot_analytics.
+
+        Returns:
+            Cantidad de períodos (fecha, hora, bot) guardados
+        """
+        with self._lock:
+            pendientes, self._pendientes = self._pendientes, {}
+
+        guardados = 0
+        for (fecha, hora, bot_tipo), acumulado in pendientes.items():
+            try:
+                self.supabase.client.rpc('acumular_bot_analytics', {
+                    'p_fecha': fecha,
+                    'p_hora': hora,
+                    'p_bot_tipo': bot_tipo,
+                    'p_mensajes': acumulado.mensajes,
+                    'p_autorizados': acumulado.autorizados,
+                    'p_no_autorizados': acumulado.no_autorizados,
+                    'p_comandos': acumulado.comandos,
+                    'p_errores': acumulado.errores,
+                    'p_chat_ids': sorted(acumulado.chat_ids),
+                    'p_chat_ids_no_autorizados': sorted(acumulado.chat_ids_no_autorizados),
+                    'p_latencia_conteo': acumulado.latencia.total,
+                    'p_latencia_suma_ms': int(acumulado.latencia.suma),
+                    'p_latencia_buckets': acumulado.latencia.conteos()
+                }).execute()
+                guardados += 1
+            except Exception as e:
+                logger.error(f"❌ Error guardando rollup {fecha} {hora}h {bot_tipo}: {e}")
+                # Devolver el lote para reintentar en el próximo ciclo
+                with self._lock:
+                    actual = self._pendientes.setdefault((fecha, hora, bot_tipo), _Acumulado())
+                    actual.combinar(acumulado)
+
+        if guardados:
+            logger.info(f"📊 Rollups de analíticas guardados: {guardados} períodos")
+        return guardados
+
+    # ============================================
+    # LECTURA
+    # ============================================
+
+    @staticmethod
+    def _con_percentiles(fila: Dict[str, Any]) -> Dict[str, Any]:
+        histograma = Histograma.desde_conteos(
+            fila.get('latencia_buckets') or [], fila.get('latencia_suma_ms') or 0, BUCKETS_LATENCIA_MS
+        )
+        resultado = {k: v for k, v in fila.items() if k != 'latencia_buckets'}
+        resultado['latencia_p50_ms'] = histograma.percentil(50) if histograma.total else None
+        resultado['latencia_p95_ms'] = histograma.percentil(95) if histograma.total else None
+        resultado['latencia_p99_ms'] = histograma.percentil(99) if histograma.total else None
+        return resultado
+
+    def _leer_filas_diarias(
+        self,
+        desde: date,
+        hasta: Optional[date] = None,
+        bot_type: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        query = self.supabase.table('bot_analytics')\
+            .select('*')\
+            .eq('hora', HORA_DIA)\
+            .gte('fecha', desde.isoformat())
+        if hasta:
+            query = query.lte('fecha', hasta.isoformat())
+        if bot_type:
+            query = query.eq('bot_tipo', bot_type)
+        result = query.order('fecha', desc=True).execute()
+        return result.data or []
+
+    def get_filas_diarias(
+        self,
+        desde: date,
+        hasta: Optional[date] = None,
+        bot_type: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """Filas de total diario entre dos fechas (incluidas)"""
+        return [self._con_percentiles(fila) for fila in self._leer_filas_diarias(desde, hasta, bot_type)]
+
+    def get_filas_por_hora(self, fecha: date, bot_type: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Filas por hora de un día"""
+        query = self.supabase.table('bot_analytics')\
+            .select('*')\
+            .eq('fecha', fecha.isoformat())\
+            .gte('hora', 0)
+        if bot_type:
+            query = query.eq('bot_tipo', bot_type)
+        result = query.order('hora').execute()
+        return [self._con_percentiles(fila) for fila in result.data or []]
+
+    def get_resumen(self, days: int = 30) -> Dict[str, Any]:
+        """
+        Totales de los últimos N días a partir de las filas diarias.
+
+        Los usuarios únicos por bot son la suma de los únicos diarios
+        (un usuario activo varios días cuenta una vez por día).
+        """
+        desde = (datetime.now() - timedelta(days=days - 1)).date()
+        filas = self._leer_filas_diarias(desde)
+
+        analytics = {
+            'desde': desde.isoformat(),
+            'total_mensajes': 0,
+            'mensajes_autorizados': 0,
+            'mensajes_no_autorizados': 0,
+            'errores': 0,
+            'por_bot': {},
+            'por_dia': [self._con_percentiles(fila) for fila in filas]
+        }
+        buckets_por_bot: Dict[str, List[int]] = {}
+
+        for fila in filas:
+            analytics['total_mensajes'] += fila.get('total_mensajes') or 0
+            analytics['mensajes_autorizados'] += fila.get('mensajes_autorizados') or 0
+            analytics['mensajes_no_autorizados'] += fila.get('mensajes_no_autorizados') or 0
+            analytics['errores'] += fila.get('errores_count') or 0
+
+            por_bot = analytics['por_bot'].setdefault(fila['bot_tipo'], {
+                'mensajes': 0,
+                'usuarios_dia': 0,
+                'no_autorizados_dia': 0,
+                'latencia_suma_ms': 0
+            })
+            por_bot['mensajes'] += fila.get('total_mensajes') or 0
+            por_bot['usuarios_dia'] += fila.get('usuarios_unicos') or 0
+            por_bot['no_autorizados_dia'] += fila.get('usuarios_no_autorizados') or 0
+            por_bot['latencia_suma_ms'] += fila.get('latencia_suma_ms') or 0
+
+            # Percentiles del período: sumar los buckets diarios
+            buckets = buckets_por_bot.setdefault(fila['bot_tipo'], [0] * (len(BUCKETS_LATENCIA_MS) + 1))
+            for i, conteo in enumerate((fila.get('latencia_buckets') or [])[:len(buckets)]):
+                buckets[i] += conteo or 0
+
+        for bot_tipo, por_bot in analytics['por_bot'].items():
+            histograma = Histograma.desde_conteos(
+                buckets_por_bot.get(bot_tipo, []), por_bot.pop('latencia_suma_ms'), BUCKETS_LATENCIA_MS
+            )
+            por_bot['latencia'] = histograma.resumen() if histograma.total else None
+
+        return analytics
+
+
+# Instancia global
+_analytics_service = None
+
+
+def get_analytics_service() -> AnalyticsService:
+    """Obtener instancia del servicio de analíticas"""
+    global _analytics_service
+    if _analytics_service is None:
+        _analytics_service = AnalyticsService()
+    return _analytics_service
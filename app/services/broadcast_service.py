@@ -0,0 +1,407 @@
+"""
+📣 Servicio de Difusiones
+Envía un mensaje a todos los usuarios de un conjunto de empresas por el bot de producción, con avance persistido y reanudable
+"""
+
+import os
+import time
+import uuid
+import socket
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.config import Config
+from app.database.supabase import get_supabase_client
+from app.utils.metrics import get_registro_metricas
+from app.utils.pagination import aplicar_keyset, pagina
+
+logger = logging.getLogger(__name__)
+
+registro = get_registro_metricas()
+MENSAJES_DIFUSION = registro.contador(
+    'aca_broadcast_messages_total', 'Mensajes de difusiones por resultado (enviado, bloqueado, fallido)',
+    ('resultado',)
+)
+RITMO_DIFUSION = registro.medidor(
+    'aca_broadcast_rate_per_second', 'Mensajes por segundo de la última página de cada difusión', ('difusion',)
+)
+
+ESTADOS_ACTIVOS = ('pendiente', 'en_curso')
+
+# Destinatarios: usuarios activos con una relación activa con alguna de las empresas
+COLUMNAS_AUDIENCIA = 'id, chat_id, nombre, usuarios_empresas!inner(empresa_id, empresas(nombre))'
+
+COLUMNAS_DIFUSION = (
+    'id, mensaje, empresa_ids, creada_por, estado, cursor, enviados, bloqueados, fallidos, '
+    'ultimos_errores, iniciada_at, finalizada_at, created_at'
+)
+
+# Errores guardados por difusión para diagnosticar sin revisar los logs
+MAX_ERRORES_GUARDADOS = 20
+
+
+def _ahora() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _iso(momento: datetime) -> str:
+    return momento.strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+
+
+def personalizar(mensaje: str, destinatario: Dict[str, Any]) -> str:
+    """Reemplazar {nombre} y {empresa} (empresas del usuario dentro de la difusión)"""
+    empresas = sorted({
+        (rel.get('empresas') or {}).get('nombre') or ''
+        for rel in destinatario.get('usuarios_empresas') or []
+    } - {''})
+    return mensaje\
+        .replace('{nombre}', (destinatario.get('nombre') or '').split(' ')[0])\
+        .replace('{empresa}', ', '.join(empresas))
+
+
+class BroadcastService:
+    """
+    Difusiones del bot admin a los usuarios de `usuarios_empresas`.
+
+    - La audiencia se recorre por páginas de DIFUSION_PAGINA usuarios
+      ordenados por (chat_id, id); un usuario de varias empresas recibe un
+      solo mensaje.
+    - Los envíos salen a DIFUSION_POR_SEGUNDO por el bot de producción (y su
+      limitador), por debajo del límite global para que las respuestas a los
+      usuarios no esperen detrás de la difusión.
+    - Tras cada página se guardan el cursor, los contadores y el lease. Si la
+      réplica cae, otra la retoma cuando vence el lease desde el cursor
+      guardado: a lo más se repite la página en curso.
+    - Al terminar se avisa al admin que la creó por el bot admin.
+    """
+
+    def __init__(self, por_segundo: float = None, tamano_pagina: int = None):
+        self.supabase = get_supabase_client()
+        self.por_segundo = por_segundo or Config.DIFUSION_POR_SEGUNDO
+        self.tamano_pagina = tamano_pagina or Config.DIFUSION_PAGINA
+        self.duenio = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._tareas: Dict[str, asyncio.Task] = {}
+
+    # ============================================
+    # CREACIÓN Y CONSULTA
+    # ============================================
+
+    def crear(self, mensaje: str, empresa_ids: List[str], creada_por: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """Registrar una difusión pendiente"""
+        try:
+            result = self.supabase.table('difusiones').insert({
+                'mensaje': mensaje,
+                'empresa_ids': list(dict.fromkeys(empresa_ids)),
+                'creada_por': creada_por,
+                'estado': 'pendiente'
+            }).execute()
+            return result.data[0] if result.data else None
+        except Exception as e:
+            logger.error(f"❌ Error creando difusión: {e}")
+            return None
+
+    def obtener(self, difusion_id: str) -> Optional[Dict[str, Any]]:
+        """Difusión con su ritmo de envío"""
+        try:
+            result = self.supabase.table('difusiones')\
+                .select(COLUMNAS_DIFUSION)\
+                .eq('id', difusion_id)\
+                .limit(1)\
+                .execute()
+        except Exception as e:
+            logger.error(f"❌ Error obteniendo difusión {difusion_id}: {e}")
+            return None
+        return self._con_ritmo(result.data[0]) if result.data else None
+
+    def listar(self, limit: int = 10) -> List[Dict[str, Any]]:
+        """Difusiones más recientes"""
+        try:
+            result = self.supabase.table('difusiones')\
+                .select(COLUMNAS_DIFUSION)\
+                .order('created_at', desc=True)\
+                .limit(limit)\
+                .execute()
+            return [self._con_ritmo(d) for d in result.data or []]
+        except Exception as e:
+            logger.error(f"❌ Error listando difusiones: {e}")
+            return []
+
+    @staticmethod
+    def _con_ritmo(difusion: Dict[str, Any]) -> Dict[str, Any]:
+        procesados = (difusion.get('enviados') or 0) + (difusion.get('bloqueados') or 0) + (difusion.get('fallidos') or 0)
+        difusion['procesados'] = procesados
+        difusion['mensajes_por_segundo'] = None
+        if difusion.get('iniciada_at'):
+            inicio = datetime.fromisoformat(difusion['iniciada_at'].replace('Z', '+00:00'))
+            fin = datetime.fromisoformat(difusion['finalizada_at'].replace('Z', '+00:00')) \
+                if difusion.get('finalizada_at') else _ahora()
+            segundos = (fin - inicio).total_seconds()
+            if segundos > 0:
+                difusion['mensajes_por_segundo'] = round(procesados / segundos, 2)
+        return difusion
+
+    def cancelar(self, difusion_id: str) -> bool:
+        """Detener una difusión; lo ya enviado queda contado"""
+        try:
+            result = self.supabase.table('difusiones')\
+                .update({'estado': 'cancelada', 'finalizada_at': _iso(_ahora()), 'lease_hasta': None})\
+                .eq('id', difusion_id)\
+                .in_('estado', list(ESTADOS_ACTIVOS))\
+                .execute()
+        except Exception as e:
+            logger.error(f"❌ Error cancelando difusión {difusion_id}: {e}")
+            return False
+        tarea = self._tareas.get(difusion_id)
+        if tarea:
+            tarea.cancel()
+        return bool(result.data)
+
+    # ============================================
+    # EJECUCIÓN
+    # ============================================
+
+    def _tomar(self, difusion_id: str) -> Optional[Dict[str, Any]]:
+        """Reservar la difusión para esta réplica si nadie la tiene (lease vencido o sin lease)"""
+        ahora = _ahora()
+        try:
+            result = self.supabase.table('difusiones')\
+                .update({
+                    'estado': 'en_curso',
+                    'duenio': self.duenio,
+                    'lease_hasta': _iso(ahora + timedelta(seconds=Config.DIFUSION_LEASE_SECONDS)),
+                    'updated_at': _iso(ahora)
+                })\
+                .eq('id', difusion_id)\
+                .in_('estado', list(ESTADOS_ACTIVOS))\
+                .or_(f'lease_hasta.is.null,lease_hasta.lt."{_iso(ahora)}"')\
+                .execute()
+        except Exception as e:
+            logger.error(f"❌ No se pudo reservar la difusión {difusion_id}: {e}")
+            return None
+        return result.data[0] if result.data else None
+
+    async def iniciar(self, difusion_id: str) -> bool:
+        """Lanzar el envío en segundo plano si esta réplica obtiene la difusión"""
+        if difusion_id in self._tareas:
+            return True
+        if "production" not in Config.bots_del_proceso():
+            # Queda pendiente: la toma el proceso del bot de producción en su próxima reanudación
+            return False
+        difusion = await asyncio.to_thread(self._tomar, difusion_id)
+        if not difusion:
+            return False
+        tarea = asyncio.create_task(self._ejecutar(difusion), name=f"difusion:{difusion_id}")
+        self._tareas[difusion_id] = tarea
+        tarea.add_done_callback(lambda _: self._tareas.pop(difusion_id, None))
+        return True
+
+    def _por_reanudar(self) -> List[str]:
+        result = self.supabase.table('difusiones')\
+            .select('id')\
+            .in_('estado', list(ESTADOS_ACTIVOS))\
+            .or_(f'lease_hasta.is.null,lease_hasta.lt."{_iso(_ahora())}"')\
+            .execute()
+        return [d['id'] for d in result.data or [] if d['id'] not in self._tareas]
+
+    async def reanudar(self) -> int:
+        """Retomar las difusiones pendientes o abandonadas por otra réplica (tarea programada)"""
+        try:
+            ids = await asyncio.to_thread(self._por_reanudar)
+        except Exception as e:
+            logger.error(f"❌ Error buscando difusiones por reanudar: {e}")
+            return 0
+        reanudadas = 0
+        for difusion_id in ids:
+            reanudadas += await self.iniciar(difusion_id)
+        return reanudadas
+
+    def _audiencia(self, empresa_ids: List[str], cursor: Optional[str]) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        query = self.supabase.table('usuarios')\
+            .select(COLUMNAS_AUDIENCIA)\
+            .eq('activo', True)\
+            .in_('usuarios_empresas.empresa_id', empresa_ids)\
+            .eq('usuarios_empresas.activo', True)
+        result = aplicar_keyset(query, cursor, columna_orden='chat_id', desc=False)\
+            .limit(self.tamano_pagina + 1)\
+            .execute()
+        return pagina(result.data or [], self.tamano_pagina, columna_orden='chat_id')
+
+    async def _enviar(self, bot, chat_id: int, texto: str) -> Tuple[str, Optional[str]]:
+        """Enviar un mensaje; (resultado, error)"""
+        from telegram.error import BadRequest, Forbidden, RetryAfter, TelegramError
+        for intento in range(2):
+            try:
+                await bot.send_message(chat_id=chat_id, text=texto)
+                return 'enviado', None
+            except Forbidden as e:
+                return 'bloqueado', str(e)
+            except RetryAfter as e:
+                # Solo llega aquí sin limitador (o si agotó sus reintentos)
+                if intento:
+                    return 'fallido', str(e)
+                espera = e.retry_after.total_seconds() if hasattr(e.retry_after, 'total_seconds') else e.retry_after
+                await asyncio.sleep(float(espera))
+            except BadRequest as e:
+                # "Chat not found": el usuario nunca abrió el bot
+                return ('bloqueado' if 'chat not found' in str(e).lower() else 'fallido'), str(e)
+            except TelegramError as e:
+                return 'fallido', str(e)
+        return 'fallido', None
+
+    async def _enviar_pagina(self, bot, mensaje: str, destinatarios: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Enviar una página a DIFUSION_POR_SEGUNDO; contadores y errores de la página"""
+        contadores = {'enviado': 0, 'bloqueado': 0, 'fallido': 0}
+        errores: List[Dict[str, Any]] = []
+        intervalo = 1 / self.por_segundo
+        inicio = time.monotonic()
+
+        async def uno(posicion: int, destinatario: Dict[str, Any]):
+            # Salidas espaciadas; el limitador del bot sigue aplicando los límites globales
+            espera = inicio + posicion * intervalo - time.monotonic()
+            if espera > 0:
+                await asyncio.sleep(espera)
+            resultado, error = await self._enviar(bot, destinatario['chat_id'], personalizar(mensaje, destinatario))
+            contadores[resultado] += 1
+            MENSAJES_DIFUSION.inc(resultado=resultado)
+            if error and len(errores) < MAX_ERRORES_GUARDADOS:
+                errores.append({'chat_id': destinatario['chat_id'], 'resultado': resultado, 'error': error[:200]})
+
+        await asyncio.gather(*(uno(i, d) for i, d in enumerate(destinatarios)))
+        contadores['segundos'] = time.monotonic() - inicio
+        contadores['errores'] = errores
+        return contadores
+
+    def _guardar_avance(self, difusion: Dict[str, Any], cursor: Optional[str], terminada: bool) -> bool:
+        """Guardar el avance y renovar el lease; False si la difusión se canceló o pasó a otra réplica"""
+        ahora = _ahora()
+        cambios = {
+            'cursor': cursor,
+            'enviados': difusion['enviados'],
+            'bloqueados': difusion['bloqueados'],
+            'fallidos': difusion['fallidos'],
+            'ultimos_errores': difusion['ultimos_errores'][-MAX_ERRORES_GUARDADOS:],
+            'lease_hasta': None if terminada else _iso(ahora + timedelta(seconds=Config.DIFUSION_LEASE_SECONDS)),
+            'updated_at': _iso(ahora)
+        }
+        if terminada:
+            cambios.update({'estado': 'completada', 'finalizada_at': _iso(ahora)})
+        result = self.supabase.table('difusiones')\
+            .update(cambios)\
+            .eq('id', difusion['id'])\
+            .eq('estado', 'en_curso')\
+            .eq('duenio', self.duenio)\
+            .execute()
+        return bool(result.data)
+
+    async def _ejecutar(self, difusion: Dict[str, Any]):
+        from app.bots.bot_manager import bot_manager
+
+        difusion_id = difusion['id']
+        if not bot_manager.production_app:
+            logger.error(f"❌ Difusión {difusion_id}: el bot de producción no está inicializado")
+            return
+        bot = bot_manager.production_app.bot
+
+        if not difusion.get('iniciada_at'):
+            difusion['iniciada_at'] = _iso(_ahora())
+            await asyncio.to_thread(
+                lambda: self.supabase.table('difusiones')
+                .update({'iniciada_at': difusion['iniciada_at']}).eq('id', difusion_id).execute()
+            )
+        for campo in ('enviados', 'bloqueados', 'fallidos'):
+            difusion[campo] = difusion.get(campo) or 0
+        difusion['ultimos_errores'] = list(difusion.get('ultimos_errores') or [])
+        cursor = difusion.get('cursor')
+        logger.info(f"📣 Difusión {difusion_id} {'reanudada' if cursor else 'iniciada'} en {self.duenio}")
+
+        try:
+            while True:
+                destinatarios, siguiente = await asyncio.to_thread(
+                    self._audiencia, difusion['empresa_ids'], cursor
+                )
+                resultado = await self._enviar_pagina(bot, difusion['mensaje'], destinatarios)
+                difusion['enviados'] += resultado['enviado']
+                difusion['bloqueados'] += resultado['bloqueado']
+                difusion['fallidos'] += resultado['fallido']
+                difusion['ultimos_errores'].extend(resultado['errores'])
+                if resultado['segundos'] > 0:
+                    RITMO_DIFUSION.set(len(destinatarios) / resultado['segundos'], difusion=difusion_id)
+
+                cursor = siguiente or cursor
+                terminada = siguiente is None
+                if not await asyncio.to_thread(self._guardar_avance, difusion, cursor, terminada):
+                    logger.warning(f"⚠️ Difusión {difusion_id} cancelada o tomada por otra réplica")
+                    return
+                if terminada:
+                    break
+        except asyncio.CancelledError:
+            logger.info(f"🛑 Difusión {difusion_id} detenida en esta réplica")
+            raise
+        except Exception as e:
+            # El lease vence y otra réplica (o esta) la retoma desde el último cursor
+            logger.error(f"❌ Error en difusión {difusion_id}: {e}")
+            return
+
+        logger.info(
+            f"✅ Difusión {difusion_id} completada: {difusion['enviados']} enviados, "
+            f"{difusion['bloqueados']} bloqueados, {difusion['fallidos']} fallidos"
+        )
+        await self._avisar_admin(difusion)
+
+    async def _avisar_admin(self, difusion: Dict[str, Any]):
+        """Resumen final al admin que creó la difusión"""
+        from app.bots.bot_manager import bot_manager
+
+        if not difusion.get('creada_por'):
+            return
+        resumen = self._con_ritmo(dict(difusion, finalizada_at=_iso(_ahora())))
+        texto = (
+            f"📣 Difusión {difusion['id'][:8]} completada\n\n"
+            f"✅ Enviados: {difusion['enviados']}\n"
+            f"🚫 Bloqueados: {difusion['bloqueados']}\n"
+            f"❌ Fallidos: {difusion['fallidos']}\n"
+            f"⚡ {resumen['mensajes_por_segundo'] or 0} mensajes/s"
+        )
+        try:
+            if bot_manager.admin_app:
+                await bot_manager.admin_app.bot.send_message(chat_id=difusion['creada_por'], text=texto)
+            else:
+                # El bot admin corre en otro proceso (run_supervisor.py): enviar solo con su token
+                from telegram import Bot
+                async with Bot(Config.BOT_ADMIN_TOKEN) as bot:
+                    await bot.send_message(chat_id=difusion['creada_por'], text=texto)
+        except Exception as e:
+            logger.warning(f"⚠️ No se pudo avisar al admin de la difusión {difusion['id']}: {e}")
+
+    async def detener(self):
+        """Detener los envíos de esta réplica y liberar sus leases para que otra los retome"""
+        tareas = list(self._tareas.values())
+        if not tareas:
+            return
+        for tarea in tareas:
+            tarea.cancel()
+        await asyncio.gather(*tareas, return_exceptions=True)
+        try:
+            await asyncio.to_thread(
+                lambda: self.supabase.table('difusiones')
+                .update({'lease_hasta': None})
+                .eq('duenio', self.duenio)
+                .eq('estado', 'en_curso')
+                .execute()
+            )
+        except Exception as e:
+            logger.warning(f"⚠️ No se pudieron liberar las difusiones de esta réplica: {e}")
+
+
+# Instancia global
+_broadcast_service = None
+
+
+def get_broadcast_service() -> BroadcastService:
+    """Obtener instancia del servicio de difusiones"""
+    global _broadcast_service
+    if _broadcast_service is None:
+        _broadcast_service = BroadcastService()
+    return _broadcast_service
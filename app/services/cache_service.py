@@ -0,0 +1,529 @@
+"""
+🧊 Caché Compartida
+Backend de caché intercambiable: LRU en el proceso (una réplica) o servidor con protocolo Redis (varias réplicas)
+"""
+
+import json
+import time
+import socket
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import unquote, urlparse
+
+from app.config import Config
+from app.utils.metrics import get_registro_metricas
+
+logger = logging.getLogger(__name__)
+
+registro = get_registro_metricas()
+ERRORES_CACHE = registro.contador(
+    'aca_cache_backend_errors_total', 'Operaciones de caché que fallaron (se tratan como fallo de caché)', ('backend',)
+)
+
+# Entre avisos de error del servidor de caché en el log
+AVISO_ERROR_SECONDS = 30.0
+
+
+def _codificar(valor: Any) -> str:
+    # sort_keys: dos valores iguales se codifican igual (comparar_y_guardar compara el texto)
+    return json.dumps(valor, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+
+
+def _decodificar(texto: Optional[str]) -> Any:
+    return json.loads(texto) if texto is not None else None
+
+
+# ============================================
+# INTERFAZ
+# ============================================
+
+class BackendCache:
+    """
+    Operaciones de caché de los servicios.
+
+    Los valores se guardan como JSON en los dos backends: quien lee recibe
+    siempre una copia (mutarla no altera la caché) y un valor que funciona
+    con la LRU funciona igual con Redis. `None` significa "no está"; para
+    recordar una ausencia se guarda un envoltorio (p. ej. {'sesion': None}).
+    Un error del servidor se registra y se trata como fallo de caché: los
+    servicios vuelven a la BD, nunca fallan por la caché.
+    """
+
+    nombre = 'base'
+
+    def obtener(self, clave: str) -> Any:
+        raise NotImplementedError
+
+    def guardar(self, clave: str, valor: Any, ttl: Optional[float] = None):
+        raise NotImplementedError
+
+    def borrar(self, *claves: str) -> int:
+        raise NotImplementedError
+
+    def obtener_varios(self, claves: List[str]) -> List[Any]:
+        """Valores en el mismo orden que las claves (None las que no están)"""
+        raise NotImplementedError
+
+    def guardar_varios(self, valores: Dict[str, Any], ttl: Optional[float] = None):
+        raise NotImplementedError
+
+    def comparar_y_guardar(self, clave: str, esperado: Any, nuevo: Any, ttl: Optional[float] = None) -> bool:
+        """Guardar `nuevo` solo si el valor actual es `esperado` (None: solo si la clave no existe)"""
+        raise NotImplementedError
+
+    def publicar(self, canal: str, mensaje: Any):
+        """Avisar a los suscriptores del canal (en todas las réplicas con Redis)"""
+        raise NotImplementedError
+
+    def suscribir(self, canal: str, funcion: Callable[[Any], None]):
+        """Llamar a `funcion(mensaje)` con cada publicación del canal"""
+        raise NotImplementedError
+
+    def cerrar(self):
+        pass
+
+    def estado(self) -> Dict[str, Any]:
+        return {'backend': self.nombre}
+
+
+# ============================================
+# LRU EN EL PROCESO
+# ============================================
+
+class CacheLRU(BackendCache):
+    """Caché en memoria del proceso con TTL por clave y desalojo LRU al superar `max_entradas`"""
+
+    nombre = 'memoria'
+
+    def __init__(self, max_entradas: int = None):
+        self.max_entradas = max_entradas or Config.CACHE_MAX_ENTRADAS
+        # clave -> (vence o None, JSON); la más recientemente usada al final
+        self._datos: 'OrderedDict[str, tuple]' = OrderedDict()
+        self._suscriptores: Dict[str, List[Callable[[Any], None]]] = {}
+        self._lock = threading.Lock()
+        self.desalojadas = 0
+
+    def _leer(self, clave: str, ahora: float) -> Optional[str]:
+        entrada = self._datos.get(clave)
+        if entrada is None:
+            return None
+        if entrada[0] is not None and entrada[0] <= ahora:
+            del self._datos[clave]
+            return None
+        self._datos.move_to_end(clave)
+        return entrada[1]
+
+    def _escribir(self, clave: str, texto: str, ttl: Optional[float], ahora: float):
+        self._datos[clave] = (ahora + ttl if ttl else None, texto)
+        self._datos.move_to_end(clave)
+        while len(self._datos) > self.max_entradas:
+            self._datos.popitem(last=False)
+            self.desalojadas += 1
+
+    def obtener(self, clave: str) -> Any:
+        with self._lock:
+            texto = self._leer(clave, time.monotonic())
+        return _decodificar(texto)
+
+    def guardar(self, clave: str, valor: Any, ttl: Optional[float] = None):
+        texto = _codificar(valor)
+        with self._lock:
+            self._escribir(clave, texto, ttl, time.monotonic())
+
+    def borrar(self, *claves: str) -> int:
+        with self._lock:
+            return sum(self._datos.pop(clave, None) is not None for clave in claves)
+
+    def obtener_varios(self, claves: List[str]) -> List[Any]:
+        ahora = time.monotonic()
+        with self._lock:
+            textos = [self._leer(clave, ahora) for clave in claves]
+        return [_decodificar(t) for t in textos]
+
+    def guardar_varios(self, valores: Dict[str, Any], ttl: Optional[float] = None):
+        textos = {clave: _codificar(valor) for clave, valor in valores.items()}
+        ahora = time.monotonic()
+        with self._lock:
+            for clave, texto in textos.items():
+                self._escribir(clave, texto, ttl, ahora)
+
+    def comparar_y_guardar(self, clave: str, esperado: Any, nuevo: Any, ttl: Optional[float] = None) -> bool:
+        texto_esperado = _codificar(esperado) if esperado is not None else None
+        texto_nuevo = _codificar(nuevo)
+        ahora = time.monotonic()
+        with self._lock:
+            if self._leer(clave, ahora) != texto_esperado:
+                return False
+            self._escribir(clave, texto_nuevo, ttl, ahora)
+            return True
+
+    def publicar(self, canal: str, mensaje: Any):
+        with self._lock:
+            funciones = list(self._suscriptores.get(canal, ()))
+        # Mismo formato que por Redis: el suscriptor recibe una copia decodificada
+        texto = _codificar(mensaje)
+        for funcion in funciones:
+            try:
+                funcion(_decodificar(texto))
+            except Exception as e:
+                logger.error(f"❌ Error en suscriptor de caché '{canal}': {e}")
+
+    def suscribir(self, canal: str, funcion: Callable[[Any], None]):
+        with self._lock:
+            self._suscriptores.setdefault(canal, []).append(funcion)
+
+    def estado(self) -> Dict[str, Any]:
+        with self._lock:
+            return {'backend': self.nombre, 'entradas': len(self._datos),
+                    'max_entradas': self.max_entradas, 'desalojadas': self.desalojadas}
+
+
+# ============================================
+# PROTOCOLO REDIS (RESP2)
+# ============================================
+
+class ErrorRedis(Exception):
+    """Respuesta de error del servidor (-ERR ...)"""
+
+
+class _ConexionRESP:
+    """Una conexión al servidor: comandos como arreglos de bulk strings y lectura de respuestas RESP2"""
+
+    def __init__(self, host: str, puerto: int, clave: Optional[str], db: int, timeout: float):
+        self.sock = socket.create_connection((host, puerto), timeout=timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.lector = self.sock.makefile('rb')
+        if clave:
+            self.comando('AUTH', clave)
+        if db:
+            self.comando('SELECT', db)
+
+    @staticmethod
+    def codificar(*argumentos) -> bytes:
+        partes = [b'*%d\r\n' % len(argumentos)]
+        for argumento in argumentos:
+            dato = argumento if isinstance(argumento, bytes) else str(argumento).encode('utf-8')
+            partes.append(b'$%d\r\n%s\r\n' % (len(dato), dato))
+        return b''.join(partes)
+
+    def leer(self) -> Any:
+        linea = self.lector.readline()
+        if not linea:
+            raise ConnectionError("El servidor de caché cerró la conexión")
+        tipo, resto = linea[:1], linea[1:-2]
+        if tipo == b'+':
+            return resto.decode('utf-8')
+        if tipo == b'-':
+            raise ErrorRedis(resto.decode('utf-8'))
+        if tipo == b':':
+            return int(resto)
+        if tipo == b'$':
+            largo = int(resto)
+            if largo < 0:
+                return None
+            dato = self.lector.read(largo + 2)
+            return dato[:-2].decode('utf-8')
+        if tipo == b'*':
+            largo = int(resto)
+            return None if largo < 0 else [self.leer() for _ in range(largo)]
+        raise ErrorRedis(f"Respuesta RESP no reconocida: {linea[:20]!r}")
+
+    def enviar(self, *argumentos):
+        self.sock.sendall(self.codificar(*argumentos))
+
+    def comando(self, *argumentos) -> Any:
+        self.enviar(*argumentos)
+        return self.leer()
+
+    def tuberia(self, comandos: List[tuple]) -> List[Any]:
+        """Enviar todos los comandos juntos y leer sus respuestas (un solo viaje de red)"""
+        self.sock.sendall(b''.join(self.codificar(*c) for c in comandos))
+        respuestas, error = [], None
+        for _ in comandos:
+            # Leer todas las respuestas aunque alguna sea error: la conexión queda alineada
+            try:
+                respuestas.append(self.leer())
+            except ErrorRedis as e:
+                error = error or e
+                respuestas.append(None)
+        if error:
+            raise error
+        return respuestas
+
+    def cerrar(self):
+        try:
+            # shutdown primero: despierta a un hilo bloqueado en readline (que retiene el lock del
+            # lector); cerrar el lector antes esperaría ese lock para siempre
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        try:
+            self.sock.close()
+            self.lector.close()
+        except OSError:
+            pass
+
+
+# Guardar solo si el valor actual es ARGV[1] ('' = la clave no existe); ARGV[3] = TTL en ms (0 sin TTL)
+SCRIPT_CAS = """
+local actual = redis.call('GET', KEYS[1])
+if (ARGV[1] == '' and not actual) or actual == ARGV[1] then
+    if ARGV[3] == '0' then
+        redis.call('SET', KEYS[1], ARGV[2])
+    else
+        redis.call('SET', KEYS[1], ARGV[2], 'PX', ARGV[3])
+    end
+    return 1
+end
+return 0
+"""
+
+
+class CacheRedis(BackendCache):
+    """
+    Cliente mínimo del protocolo Redis (RESP2) sobre sockets de la stdlib.
+
+    Sirve con Redis, Valkey, KeyDB o cualquier servidor compatible, incluido
+    uno local (redis://localhost:6379/0). Las claves llevan CACHE_PREFIJO
+    para compartir el servidor con otras aplicaciones. Las conexiones se
+    reutilizan desde un pool; la suscripción usa una conexión propia y un
+    hilo que reconecta si se corta.
+    """
+
+    nombre = 'redis'
+
+    def __init__(self, url: str = None, prefijo: str = None, timeout: float = None):
+        url = urlparse(url or Config.CACHE_REDIS_URL)
+        self.host = url.hostname or 'localhost'
+        self.puerto = url.port or 6379
+        self.clave = unquote(url.password) if url.password else None
+        self.db = int(url.path.lstrip('/') or 0)
+        self.prefijo = Config.CACHE_PREFIJO if prefijo is None else prefijo
+        self.timeout = timeout if timeout is not None else Config.CACHE_REDIS_TIMEOUT_SECONDS
+        self._libres: List[_ConexionRESP] = []
+        self._lock = threading.Lock()
+        self._suscriptores: Dict[str, List[Callable[[Any], None]]] = {}
+        self._conexion_suscripcion: Optional[_ConexionRESP] = None
+        self._hilo_suscripcion: Optional[threading.Thread] = None
+        self._cerrado = False
+        self._ultimo_aviso = 0.0
+
+    # ============================================
+    # CONEXIONES
+    # ============================================
+
+    def _conectar(self) -> _ConexionRESP:
+        return _ConexionRESP(self.host, self.puerto, self.clave, self.db, self.timeout)
+
+    @contextmanager
+    def _conexion(self):
+        with self._lock:
+            conexion = self._libres.pop() if self._libres else None
+        conexion = conexion or self._conectar()
+        sana = False
+        try:
+            yield conexion
+            sana = True
+        except ErrorRedis:
+            # El servidor respondió: la conexión sigue alineada con el protocolo
+            sana = True
+            raise
+        finally:
+            if sana:
+                with self._lock:
+                    self._libres.append(conexion)
+            else:
+                # Conexión en estado desconocido (timeout, corte): no vuelve al pool
+                conexion.cerrar()
+
+    def _fallo(self, operacion: str, error: Exception):
+        ERRORES_CACHE.inc(backend=self.nombre)
+        ahora = time.monotonic()
+        if ahora - self._ultimo_aviso >= AVISO_ERROR_SECONDS:
+            self._ultimo_aviso = ahora
+            logger.warning(f"⚠️ Caché {self.host}:{self.puerto} no disponible ({operacion}): {error}")
+
+    def _k(self, clave: str) -> str:
+        return self.prefijo + clave
+
+    @staticmethod
+    def _ms(ttl: Optional[float]) -> int:
+        return max(1, int(ttl * 1000)) if ttl else 0
+
+    # ============================================
+    # OPERACIONES
+    # ============================================
+
+    def obtener(self, clave: str) -> Any:
+        try:
+            with self._conexion() as conexion:
+                return _decodificar(conexion.comando('GET', self._k(clave)))
+        except (OSError, ConnectionError, ErrorRedis) as e:
+            self._fallo('GET', e)
+            return None
+
+    def guardar(self, clave: str, valor: Any, ttl: Optional[float] = None):
+        comando = ('SET', self._k(clave), _codificar(valor)) + (('PX', self._ms(ttl)) if ttl else ())
+        try:
+            with self._conexion() as conexion:
+                conexion.comando(*comando)
+        except (OSError, ConnectionError, ErrorRedis) as e:
+            self._fallo('SET', e)
+
+    def borrar(self, *claves: str) -> int:
+        if not claves:
+            return 0
+        try:
+            with self._conexion() as conexion:
+                return conexion.comando('DEL', *(self._k(c) for c in claves))
+        except (OSError, ConnectionError, ErrorRedis) as e:
+            self._fallo('DEL', e)
+            return 0
+
+    def obtener_varios(self, claves: List[str]) -> List[Any]:
+        if not claves:
+            return []
+        try:
+            with self._conexion() as conexion:
+                return [_decodificar(t) for t in conexion.comando('MGET', *(self._k(c) for c in claves))]
+        except (OSError, ConnectionError, ErrorRedis) as e:
+            self._fallo('MGET', e)
+            return [None] * len(claves)
+
+    def guardar_varios(self, valores: Dict[str, Any], ttl: Optional[float] = None):
+        if not valores:
+            return
+        if ttl:
+            # MSET no admite TTL: un SET PX por clave en una sola tubería
+            comandos = [('SET', self._k(c), _codificar(v), 'PX', self._ms(ttl)) for c, v in valores.items()]
+        else:
+            argumentos = []
+            for clave, valor in valores.items():
+                argumentos.extend((self._k(clave), _codificar(valor)))
+            comandos = [('MSET', *argumentos)]
+        try:
+            with self._conexion() as conexion:
+                conexion.tuberia(comandos)
+        except (OSError, ConnectionError, ErrorRedis) as e:
+            self._fallo('MSET', e)
+
+    def comparar_y_guardar(self, clave: str, esperado: Any, nuevo: Any, ttl: Optional[float] = None) -> bool:
+        texto_esperado = _codificar(esperado) if esperado is not None else ''
+        try:
+            with self._conexion() as conexion:
+                return conexion.comando(
+                    'EVAL', SCRIPT_CAS, 1, self._k(clave), texto_esperado, _codificar(nuevo), self._ms(ttl)
+                ) == 1
+        except (OSError, ConnectionError, ErrorRedis) as e:
+            self._fallo('EVAL', e)
+            return False
+
+    # ============================================
+    # PUB/SUB
+    # ============================================
+
+    def publicar(self, canal: str, mensaje: Any):
+        try:
+            with self._conexion() as conexion:
+                conexion.comando('PUBLISH', self._k(canal), _codificar(mensaje))
+        except (OSError, ConnectionError, ErrorRedis) as e:
+            self._fallo('PUBLISH', e)
+
+    def suscribir(self, canal: str, funcion: Callable[[Any], None]):
+        with self._lock:
+            nuevo = canal not in self._suscriptores
+            self._suscriptores.setdefault(canal, []).append(funcion)
+            if self._hilo_suscripcion is None:
+                self._hilo_suscripcion = threading.Thread(
+                    target=self._escuchar, name="cache-suscripcion", daemon=True
+                )
+                self._hilo_suscripcion.start()
+                return
+            if nuevo and self._conexion_suscripcion is not None:
+                try:
+                    self._conexion_suscripcion.enviar('SUBSCRIBE', self._k(canal))
+                except OSError as e:
+                    # El hilo reconecta y se vuelve a suscribir a todos los canales
+                    self._fallo('SUBSCRIBE', e)
+
+    def _escuchar(self):
+        espera = 1.0
+        while not self._cerrado:
+            try:
+                conexion = self._conectar()
+                # Bloquear en la lectura: los mensajes pueden tardar
+                conexion.sock.settimeout(None)
+                with self._lock:
+                    if self._cerrado:
+                        conexion.cerrar()
+                        break
+                    self._conexion_suscripcion = conexion
+                    conexion.enviar('SUBSCRIBE', *(self._k(c) for c in self._suscriptores))
+                espera = 1.0
+                while not self._cerrado:
+                    respuesta = conexion.leer()
+                    if not isinstance(respuesta, list) or len(respuesta) != 3 or respuesta[0] != 'message':
+                        continue
+                    canal = respuesta[1][len(self.prefijo):]
+                    with self._lock:
+                        funciones = list(self._suscriptores.get(canal, ()))
+                    for funcion in funciones:
+                        try:
+                            funcion(_decodificar(respuesta[2]))
+                        except Exception as e:
+                            logger.error(f"❌ Error en suscriptor de caché '{canal}': {e}")
+            except (OSError, ConnectionError, ErrorRedis, ValueError) as e:
+                if self._cerrado:
+                    break
+                self._fallo('SUBSCRIBE', e)
+                time.sleep(espera)
+                espera = min(30.0, espera * 2)
+
+    def cerrar(self):
+        self._cerrado = True
+        with self._lock:
+            conexiones, self._libres = self._libres, []
+            if self._conexion_suscripcion is not None:
+                conexiones.append(self._conexion_suscripcion)
+                self._conexion_suscripcion = None
+        for conexion in conexiones:
+            conexion.cerrar()
+        if self._hilo_suscripcion is not None:
+            self._hilo_suscripcion.join(timeout=2.0)
+
+    def estado(self) -> Dict[str, Any]:
+        return {'backend': self.nombre, 'servidor': f"{self.host}:{self.puerto}/{self.db}",
+                'conexiones_libres': len(self._libres), 'canales': sorted(self._suscriptores)}
+
+
+BACKENDS = {
+    'memoria': CacheLRU,
+    'redis': CacheRedis,
+}
+
+
+def crear_cache(nombre: str = None) -> BackendCache:
+    nombre = nombre or Config.CACHE_BACKEND
+    if nombre not in BACKENDS:
+        raise ValueError(f"CACHE_BACKEND desconocido: {nombre} (opciones: {', '.join(BACKENDS)})")
+    return BACKENDS[nombre]()
+
+
+def clave_cache(*partes: Any) -> str:
+    """Clave con partes separadas por ':' (p. ej. clave_cache('sesion', chat_id))"""
+    return ':'.join(str(p) for p in partes)
+
+
+# Instancia global
+_cache = None
+
+
+def get_cache() -> BackendCache:
+    """Obtener instancia del backend de caché"""
+    global _cache
+    if _cache is None:
+        _cache = crear_cache()
+    return _cache
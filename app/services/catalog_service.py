@@ -0,0 +1,200 @@
+"""
+🗂️ Catálogo de Documentos por Empresa
+Índice en memoria categoría → subtipo → período → archivos para el asistente de descarga
+"""
+
+import time
+import logging
+import threading
+from typing import Any, Dict, Iterable, List, Optional
+
+from app.config import Config
+from app.database.projections import ARCHIVO_CATALOGO
+from app.database.supabase import get_supabase_client
+from app.services.metrics_service import registrar_cache
+from app.utils.pagination import aplicar_keyset, pagina
+
+logger = logging.getLogger(__name__)
+
+TAMANO_PAGINA = 1000
+
+
+class CatalogoEmpresa:
+    """Archivos activos de una empresa indexados por categoría, subtipo y período"""
+
+    __slots__ = ('empresa_id', 'cargado', 'archivos', 'indice')
+
+    def __init__(self, empresa_id: str):
+        self.empresa_id = empresa_id
+        self.cargado = time.time()
+        self.archivos: Dict[str, Any] = {}
+        self.indice: Dict[Optional[str], Dict[Optional[str], Dict[Optional[str], List[str]]]] = {}
+
+    def agregar(self, fila):
+        self.archivos[fila['id']] = fila
+        periodos = self.indice.setdefault(fila.get('categoria'), {}).setdefault(fila.get('subtipo'), {})
+        periodos.setdefault(fila.get('periodo'), []).append(fila['id'])
+
+    def quitar(self, archivo_id: str) -> bool:
+        fila = self.archivos.pop(archivo_id, None)
+        if fila is None:
+            return False
+        subtipos = self.indice.get(fila.get('categoria'), {})
+        periodos = subtipos.get(fila.get('subtipo'), {})
+        ids = periodos.get(fila.get('periodo'), [])
+        if archivo_id in ids:
+            ids.remove(archivo_id)
+        # Sin entradas vacías: un período sin archivos no se ofrece
+        if not ids:
+            periodos.pop(fila.get('periodo'), None)
+        if not periodos:
+            subtipos.pop(fila.get('subtipo'), None)
+        if not subtipos:
+            self.indice.pop(fila.get('categoria'), None)
+        return True
+
+    def _listas(self, categoria: Optional[str], subtipo: Optional[str]):
+        for cat, subtipos in self.indice.items():
+            if categoria and cat != categoria:
+                continue
+            for sub, periodos in subtipos.items():
+                if subtipo and sub != subtipo:
+                    continue
+                yield periodos
+
+    def periodos(self, categoria: Optional[str] = None, subtipo: Optional[str] = None) -> set:
+        """Períodos con al menos un archivo (mismos filtros que _buscar_archivos)"""
+        return {p for periodos in self._listas(categoria, subtipo) for p in periodos if p}
+
+    def buscar(self, categoria: Optional[str] = None, subtipo: Optional[str] = None,
+               periodo: Optional[str] = None) -> List[Any]:
+        """Archivos que cumplen los filtros, del más reciente al más antiguo"""
+        filas = []
+        for periodos in self._listas(categoria, subtipo):
+            for per, ids in periodos.items():
+                if periodo and per != periodo:
+                    continue
+                filas.extend(self.archivos[i] for i in ids)
+        return sorted(filas, key=lambda f: f.get('created_at') or '', reverse=True)
+
+
+class CatalogService:
+    """
+    Catálogos por empresa compartidos entre requests.
+
+    Se construyen al primer uso y se actualizan en el mismo proceso al subir
+    (`registrar_subida`) o eliminar (`registrar_baja`) archivos. Los cambios de
+    otras réplicas o hechos directo en la BD se ven al vencer
+    CATALOGO_TTL_SECONDS, cuando el catálogo se vuelve a leer.
+    """
+
+    def __init__(self, ttl_segundos: int = None):
+        self.supabase = get_supabase_client()
+        self.ttl_segundos = ttl_segundos if ttl_segundos is not None else Config.CATALOGO_TTL_SECONDS
+        self._catalogos: Dict[str, CatalogoEmpresa] = {}
+        self._lock = threading.Lock()
+
+    def _cargar(self, empresa_id: str) -> CatalogoEmpresa:
+        catalogo = CatalogoEmpresa(empresa_id)
+        cursor = None
+        while True:
+            query = self.supabase.table('archivos')\
+                .select(ARCHIVO_CATALOGO.select)\
+                .eq('empresa_id', empresa_id)\
+                .eq('activo', True)
+            result = aplicar_keyset(query, cursor).limit(TAMANO_PAGINA + 1).execute()
+            bloque, cursor = pagina(result.data or [], TAMANO_PAGINA)
+            for fila in ARCHIVO_CATALOGO.filas(bloque):
+                catalogo.agregar(fila)
+            if not cursor:
+                break
+        logger.info(f"🗂️ Catálogo de empresa {empresa_id} cargado: {len(catalogo.archivos)} archivos")
+        return catalogo
+
+    def get_catalogo(self, empresa_id: str) -> Optional[CatalogoEmpresa]:
+        """Catálogo vigente de una empresa (None si no se pudo leer)"""
+        with self._lock:
+            catalogo = self._catalogos.get(empresa_id)
+        if catalogo and time.time() - catalogo.cargado < self.ttl_segundos:
+            registrar_cache('catalogo', True)
+            return catalogo
+
+        registrar_cache('catalogo', False)
+        try:
+            catalogo = self._cargar(empresa_id)
+        except Exception as e:
+            logger.error(f"❌ Error cargando catálogo de empresa {empresa_id}: {e}")
+            return None
+        with self._lock:
+            self._catalogos[empresa_id] = catalogo
+        return catalogo
+
+    def periodos_disponibles(
+        self,
+        empresa_ids: Iterable[str],
+        categoria: Optional[str] = None,
+        subtipo: Optional[str] = None
+    ) -> Optional[List[str]]:
+        """
+        Períodos con archivos en alguna de las empresas, del más reciente al más antiguo.
+
+        Returns:
+            Lista de períodos AAAA-MM, o None si algún catálogo no está disponible
+        """
+        periodos = set()
+        for empresa_id in empresa_ids:
+            catalogo = self.get_catalogo(empresa_id)
+            if catalogo is None:
+                return None
+            with self._lock:
+                periodos |= catalogo.periodos(categoria, subtipo)
+        return sorted(periodos, reverse=True)
+
+    def buscar(
+        self,
+        empresa_id: str,
+        categoria: Optional[str] = None,
+        subtipo: Optional[str] = None,
+        periodo: Optional[str] = None
+    ) -> Optional[List[Any]]:
+        """Archivos de una empresa desde memoria (None si el catálogo no está disponible)"""
+        catalogo = self.get_catalogo(empresa_id)
+        if catalogo is None:
+            return None
+        with self._lock:
+            return catalogo.buscar(categoria, subtipo, periodo)
+
+    def registrar_subida(self, archivo: Dict[str, Any]):
+        """Agregar un archivo recién subido al catálogo de su empresa (si está cargado)"""
+        empresa_id = archivo.get('empresa_id')
+        with self._lock:
+            catalogo = self._catalogos.get(empresa_id)
+            if catalogo is not None:
+                catalogo.agregar(ARCHIVO_CATALOGO.fila(archivo))
+
+    def registrar_baja(self, empresa_id: Optional[str], archivo_id: str):
+        """Quitar un archivo eliminado del catálogo de su empresa"""
+        with self._lock:
+            catalogo = self._catalogos.get(empresa_id)
+            if catalogo is not None:
+                catalogo.quitar(archivo_id)
+
+    def invalidar(self, empresa_id: Optional[str] = None):
+        """Descartar el catálogo de una empresa (o todos)"""
+        with self._lock:
+            if empresa_id is None:
+                self._catalogos.clear()
+            else:
+                self._catalogos.pop(empresa_id, None)
+
+
+# Instancia global
+_catalog_service = None
+
+
+def get_catalog_service() -> CatalogService:
+    """Obtener instancia del servicio de catálogo"""
+    global _catalog_service
+    if _catalog_service is None:
+        _catalog_service = CatalogService()
+    return _catalog_service
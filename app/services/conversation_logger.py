@@ -3,34 +3,79 @@
 Registra todas las interacciones con los bots de Telegram
 """
 
+import asyncio
 import logging
 import json
-from datetime import datetime
-from typing import Optional, Dict, Any
-from telegram import Update, User
+from collections import deque
+from datetime import datetime, date, timedelta
+from typing import TYPE_CHECKING, Optional, Dict, Any, Tuple
+from app.config import Config
 from app.database.supabase import get_supabase_client
+from app.services.analytics_service import get_analytics_service
+from app.services.live_feed import get_feed_en_vivo
+from app.services.load_service import get_controlador_carga, MODO_REGISTRO
+from app.security.access_filter import get_filtro_acceso
+from app.utils.pagination import aplicar_keyset, CursorInvalido
+from app.utils.particiones import caliente_primero
+
+if TYPE_CHECKING:
+    from telegram import Update
 
 logger = logging.getLogger(__name__)
 
 class ConversationLogger:
-    """Servicio para registrar conversaciones de Telegram"""
+    """
+    Servicio para registrar conversaciones de Telegram
+    
+    Bajo sobrecarga (cola o Supabase lentos) los registros se guardan en
+    memoria, hasta CARGA_REGISTRO_DIFERIDO_MAX (se descartan los más
+    antiguos), y se escriben cuando el controlador de carga sale del modo
+    degradado.
+    """
     
     def __init__(self):
-        from supabase import create_client
-        from app.config import Config
-        # Usar service key para operaciones de logging (evitar RLS)
-        self.supabase = create_client(Config.SUPABASE_URL, Config.SUPABASE_SERVICE_KEY)
+        # Mismo cliente (service key, instrumentado) que el resto del backend, sin abrir un segundo pool
+        self.supabase = get_supabase_client().client
+        self._diferidos = deque(maxlen=Config.CARGA_REGISTRO_DIFERIDO_MAX)
+        self.descartados = 0
+        self._tarea_diferidos: Optional[asyncio.Task] = None
+    
+    def pendientes(self) -> int:
+        """Registros diferidos que aún no se escriben"""
+        return len(self._diferidos)
+    
+    def _diferir(self, registro: Dict[str, Any]):
+        if len(self._diferidos) == self._diferidos.maxlen:
+            self.descartados += 1
+        self._diferidos.append(registro)
+    
+    def _programar_diferidos(self):
+        """Escribir los registros diferidos en segundo plano (una tarea a la vez)"""
+        if self._diferidos and (self._tarea_diferidos is None or self._tarea_diferidos.done()):
+            self._tarea_diferidos = asyncio.create_task(self._escribir_diferidos())
+    
+    async def _escribir_diferidos(self):
+        escritos = 0
+        while self._diferidos and not get_controlador_carga().degradado(MODO_REGISTRO):
+            await self.log_message(**self._diferidos.popleft(), diferible=False)
+            escritos += 1
+            # Ceder el loop entre escrituras: los updates nuevos van primero
+            await asyncio.sleep(0)
+        if escritos:
+            logger.info(f"💬 {escritos} conversaciones diferidas registradas ({len(self._diferidos)} pendientes)")
     
     async def log_message(
         self,
-        update: Update,
+        update: 'Update',
         response_text: str = None,
         bot_type: str = "production",
         command: str = None,
         parameters: Dict[str, Any] = None,
         response_time_ms: int = None,
         error: str = None,
-        has_access: bool = None
+        has_access: bool = None,
+        diferible: bool = True,
+        momento: datetime = None
     ) -> Optional[str]:
         """
         Registra un mensaje y su respuesta en la base de datos (TODOS los usuarios)
@@ -44,18 +89,55 @@ class ConversationLogger:
             response_time_ms: Tiempo de respuesta en milisegundos
             error: Mensaje de error si ocurrió
             has_access: Si el usuario tiene acceso autorizado (None = detectar automáticamente)
+            diferible: Si False se escribe aunque haya sobrecarga (al vaciar los diferidos)
+            momento: Cuándo ocurrió (los diferidos conservan su hora en bot_analytics)
             
         Returns:
-            ID de la conversación registrada
+            ID de la conversación registrada (None si quedó diferida)
         """
+        if diferible:
+            if get_controlador_carga().degradado(MODO_REGISTRO):
+                self._diferir({
+                    'update': update, 'response_text': response_text, 'bot_type': bot_type,
+                    'command': command, 'parameters': parameters, 'response_time_ms': response_time_ms,
+                    'error': error, 'has_access': has_access, 'momento': datetime.now()
+                })
+                return None
+            self._programar_diferidos()
+        
         try:
             # Extraer información completa del usuario y mensaje
             user_data = self._extract_user_data(update)
             message_data = self._extract_message_data(update)
             
             # Detectar si tiene acceso si no se especifica
+            empresa_id = None
             if has_access is None:
-                has_access = await self._check_user_access(user_data["chat_id"])
+                has_access, empresa_id = await self._get_user_access(user_data["chat_id"])
+            
+            # Rollup incremental en bot_analytics (en memoria, se guarda por lotes)
+            get_analytics_service().registrar(
+                bot_type=bot_type,
+                chat_id=user_data['chat_id'],
+                has_access=has_access,
+                response_time_ms=response_time_ms,
+                error=error,
+                command=command,
+                momento=momento
+            )
+            
+            # Feed en vivo del dashboard (SSE)
+            get_feed_en_vivo().publicar_conversacion(
+                bot_type=bot_type,
+                user_data=user_data,
+                mensaje=message_data['text'],
+                respuesta=response_text or error,
+                has_access=has_access,
+                empresa_id=empresa_id,
+                command=command,
+                response_time_ms=response_time_ms,
+                error=error
+            )
             
             # Insertar usando función SQL simplificada (orden corregido)
             result = self.supabase.rpc(
@@ -131,9 +213,9 @@ class ConversationLogger:
             logger.error(f"❌ Error en fallback de conversación: {e}")
             return None
     
-    def _extract_user_data(self, update: Update) -> Dict[str, Any]:
+    def _extract_user_data(self, update: 'Update') -> Dict[str, Any]:
         """Extrae datos COMPLETOS del usuario de Telegram"""
-        user: User = update.effective_user
+        user = update.effective_user
         
         return {
             "chat_id": update.effective_chat.id,
@@ -148,20 +230,30 @@ class ConversationLogger:
     
     async def _check_user_access(self, chat_id: int) -> bool:
         """Verifica si un usuario tiene acceso autorizado"""
+        has_access, _ = await self._get_user_access(chat_id)
+        return has_access
+    
+    async def _get_user_access(self, chat_id: int) -> Tuple[bool, Optional[str]]:
+        """Verifica acceso y devuelve la empresa principal del usuario (para el feed en vivo)"""
+        if get_filtro_acceso().es_desconocido(chat_id):
+            return False, None
+        
         try:
             result = self.supabase.table('usuarios')\
-                .select('id')\
+                .select('id, empresa_id')\
                 .eq('chat_id', chat_id)\
                 .eq('activo', True)\
                 .execute()
             
-            return len(result.data) > 0 if result.data else False
+            if result.data:
+                return True, result.data[0].get('empresa_id')
+            return False, None
             
         except Exception as e:
             logger.error(f"❌ Error verificando acceso usuario {chat_id}: {e}")
-            return False
+            return False, None
     
-    def _extract_message_data(self, update: Update) -> Dict[str, Any]:
+    def _extract_message_data(self, update: 'Update') -> Dict[str, Any]:
         """Extrae datos del mensaje"""
         message = update.effective_message
         
@@ -172,76 +264,53 @@ class ConversationLogger:
             "chat_type": update.effective_chat.type if update.effective_chat else "private"
         }
     
-    async def get_user_conversation_history(
-        self, 
-        chat_id: int, 
-        limit: int = 50
-    ) -> list:
-        """Obtiene historial de conversaciones de un usuario"""
+    async def get_daily_stats(self, start_date: date = None, end_date: date = None, bot_type: str = None) -> list:
+        """Obtiene estadísticas diarias precalculadas (bot_analytics)"""
         try:
-            result = self.supabase.table('conversaciones')\
-                .select('*')\
-                .eq('chat_id', chat_id)\
-                .order('created_at', desc=True)\
-                .limit(limit)\
-                .execute()
-            
-            return result.data if result.data else []
+            start_date = start_date or datetime.now().date()
+            return get_analytics_service().get_filas_diarias(start_date, end_date or start_date, bot_type)
             
         except Exception as e:
-            logger.error(f"❌ Error obteniendo historial: {e}")
+            logger.error(f"❌ Error obteniendo estadísticas: {e}")
             return []
     
-    async def get_daily_stats(self, date: str = None) -> Dict[str, Any]:
-        """Obtiene estadísticas diarias de conversaciones"""
+    async def get_unauthorized_users(self, days: int = 7, limit: int = 100, cursor: str = None) -> list:
+        """Obtiene usuarios NO AUTORIZADOS activos en los últimos N días (más recientes primero)"""
         try:
-            target_date = date or datetime.now().strftime('%Y-%m-%d')
-            
-            # Generar estadísticas si no existen
-            self.supabase.rpc('generar_estadisticas_bot', {'fecha_target': target_date}).execute()
+            desde = (datetime.now() - timedelta(days=days)).isoformat()
+            query = self.supabase.table('usuarios_detalle')\
+                .select('id, chat_id, user_id, first_name, last_name, username, intentos_acceso, '
+                        'total_mensajes, primera_interaccion, ultima_interaccion, tipo_acceso')\
+                .in_('tipo_acceso', ['no_autorizado', 'bloqueado'])\
+                .gte('ultima_interaccion', desde)
             
-            # Obtener estadísticas
-            result = self.supabase.table('bot_analytics')\
-                .select('*')\
-                .eq('fecha', target_date)\
-                .execute()
-            
-            return result.data if result.data else []
-            
-        except Exception as e:
-            logger.error(f"❌ Error obteniendo estadísticas: {e}")
-            return {}
-    
-    async def get_unauthorized_users(self, days: int = 7) -> list:
-        """Obtiene usuarios NO AUTORIZADOS de los últimos N días"""
-        try:
-            # Usar la vista simplificada
-            result = self.supabase.table('vista_usuarios_sin_acceso')\
-                .select('*')\
-                .order('intentos_acceso', desc=True)\
-                .limit(100)\
-                .execute()
+            result = aplicar_keyset(query, cursor, 'ultima_interaccion').limit(limit).execute()
             
             return result.data if result.data else []
             
+        except CursorInvalido:
+            raise
         except Exception as e:
             logger.error(f"❌ Error obteniendo usuarios no autorizados: {e}")
             return []
     
-    async def get_access_attempts(self, chat_id: int = None, days: int = 7) -> list:
-        """Obtiene intentos de acceso negado"""
+    async def get_access_attempts(self, chat_id: int = None, days: int = 7, limit: int = 100, cursor: str = None) -> list:
+        """Obtiene intentos de acceso negado (más recientes primero)"""
         try:
+            desde = (datetime.now() - timedelta(days=days)).isoformat()
             query = self.supabase.table('intentos_acceso_negado')\
                 .select('*')\
-                .gte('timestamp', f'now() - interval \'{days} days\'')
+                .gte('timestamp', desde)
             
             if chat_id:
                 query = query.eq('chat_id', chat_id)
                 
-            result = query.order('timestamp', desc=True).execute()
+            result = aplicar_keyset(query, cursor, 'timestamp').limit(limit).execute()
             
             return result.data if result.data else []
             
+        except CursorInvalido:
+            raise
         except Exception as e:
             logger.error(f"❌ Error obteniendo intentos de acceso: {e}")
             return []
@@ -269,65 +338,30 @@ class ConversationLogger:
             return False
     
     async def get_conversation_analytics(self, days: int = 30) -> Dict[str, Any]:
-        """Obtiene analíticas completas de conversaciones"""
+        """Obtiene analíticas de conversaciones desde los rollups diarios de bot_analytics"""
         try:
-            # Usar consulta más simple
-            result = self.supabase.table('vista_conversaciones_recientes')\
-                .select('*')\
-                .limit(1000)\
-                .execute()
-            
-            if not result.data:
-                return {}
-                
-            # Procesar datos para dashboard
-            analytics = {
-                'total_usuarios_unicos': set(),
-                'total_mensajes': 0,
-                'mensajes_autorizados': 0,
-                'mensajes_no_autorizados': 0,
-                'usuarios_no_autorizados_unicos': set(),
-                'por_bot': {},
-                'por_dia': []
-            }
-            
-            for row in result.data:
-                analytics['total_mensajes'] += row['total_mensajes']
-                analytics['mensajes_autorizados'] += row['mensajes_autorizados']
-                analytics['mensajes_no_autorizados'] += row['mensajes_no_autorizados']
-                
-                bot_tipo = row['bot_tipo']
-                if bot_tipo not in analytics['por_bot']:
-                    analytics['por_bot'][bot_tipo] = {
-                        'mensajes': 0,
-                        'usuarios': 0,
-                        'no_autorizados': 0
-                    }
-                
-                analytics['por_bot'][bot_tipo]['mensajes'] += row['total_mensajes']
-                analytics['por_bot'][bot_tipo]['usuarios'] += row['usuarios_unicos']
-                analytics['por_bot'][bot_tipo]['no_autorizados'] += row['usuarios_no_autorizados']
-                
-                analytics['por_dia'].append(row)
-            
-            return analytics
+            return get_analytics_service().get_resumen(days=days)
             
         except Exception as e:
             logger.error(f"❌ Error obteniendo analíticas: {e}")
             return {}
     
-    async def get_user_conversation_history(self, chat_id: int, limit: int = 50) -> list:
-        """Obtiene historial de conversaciones de un usuario específico"""
+    async def get_user_conversation_history(self, chat_id: int, limit: int = 50, cursor: str = None) -> list:
+        """Obtiene historial de conversaciones de un usuario específico (más recientes primero)"""
         try:
-            result = self.supabase.table('conversaciones')\
-                .select('*')\
-                .eq('chat_id', chat_id)\
-                .order('created_at', desc=True)\
-                .limit(limit)\
-                .execute()
-            
-            return result.data if result.data else []
-            
+            def construir(desde):
+                query = self.supabase.table('conversaciones')\
+                    .select('*')\
+                    .eq('chat_id', chat_id)
+                if desde:
+                    query = query.gte('created_at', desde.isoformat())
+                return aplicar_keyset(query, cursor).limit(limit)
+            
+            # Particiones calientes primero; solo si no llenan la página se leen las anteriores
+            return caliente_primero(construir, minimo=limit)
+            
+        except CursorInvalido:
+            raise
         except Exception as e:
             logger.error(f"❌ Error obteniendo historial de usuario {chat_id}: {e}")
             return []
@@ -344,19 +378,22 @@ class ConversationLogger:
             Diccionario con los datos de la última conversación o None si no hay conversaciones
         """
         try:
-            query = self.supabase.table('conversaciones')\
-                .select('*')\
-                .order('created_at', desc=True)\
-                .limit(1)
-            
-            if chat_id:
-                query = query.eq('chat_id', chat_id)
-            
-            result = query.execute()
-            
-            if result.data and len(result.data) > 0:
-                logger.info(f"✅ Último chat recuperado: ID {result.data[0].get('id')}")
-                return result.data[0]
+            def construir(desde):
+                query = self.supabase.table('conversaciones')\
+                    .select('*')\
+                    .order('created_at', desc=True)\
+                    .limit(1)
+                if chat_id:
+                    query = query.eq('chat_id', chat_id)
+                if desde:
+                    query = query.gte('created_at', desde.isoformat())
+                return query
+            
+            filas = caliente_primero(construir)
+            
+            if filas:
+                logger.info(f"✅ Último chat recuperado: ID {filas[0].get('id')}")
+                return filas[0]
             
             return None
             
@@ -365,9 +402,13 @@ class ConversationLogger:
             return None
 
 
-# Instancia global del logger
-conversation_logger = ConversationLogger()
+# Instancia global
+_conversation_logger = None
+
 
 def get_conversation_logger() -> ConversationLogger:
-    """Función helper para obtener la instancia del logger"""
-    return conversation_logger
\ No newline at end of file
+    """Obtener instancia del logger de conversaciones"""
+    global _conversation_logger
+    if _conversation_logger is None:
+        _conversation_logger = ConversationLogger()
+    return _conversation_logger
\ No newline at end of file
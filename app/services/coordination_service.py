@@ -0,0 +1,489 @@
+"""
+🛰️ Coordinación entre Réplicas
+Un líder por bot hace polling a Telegram y reparte cada update a la réplica dueña de su chat_id (hash consistente)
+"""
+
+import os
+import hmac
+import time
+import uuid
+import socket
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, List, Optional, Sequence
+
+from app.config import Config
+from app.database.supabase import get_supabase_client
+from app.utils.hash_consistente import AnilloHash
+from app.utils.metrics import get_registro_metricas
+
+if TYPE_CHECKING:
+    from telegram import Update
+
+logger = logging.getLogger(__name__)
+
+registro = get_registro_metricas()
+UPDATES_REPARTIDOS = registro.contador(
+    'aca_replica_updates_total', 'Updates por destino (local, reenviado, respaldo_local si el dueño no respondió)',
+    ('bot', 'destino')
+)
+ES_LIDER = registro.medidor(
+    'aca_replica_leader', 'Esta réplica hace polling del bot (1) o no (0)', ('bot',)
+)
+REPLICAS_ACTIVAS = registro.medidor(
+    'aca_replica_members', 'Réplicas vivas que procesan updates del bot', ('bot',)
+)
+
+# Cabecera con el secreto compartido para /interno/updates
+CABECERA_SECRETO = 'X-Aca-Coordinacion'
+
+# update_ids reenviados recientemente (por bot): la réplica que los recibe no los vuelve a repartir
+MAX_RECIBIDOS = 10000
+
+# El reenvío corre fuera del handler: si el dueño no responde en este plazo, el update se procesa aquí
+TIMEOUT_REENVIO_SECONDS = 2.0
+
+
+# ============================================
+# BACKENDS DE COORDINACIÓN
+# ============================================
+
+class BackendCoordinacion:
+    """
+    Membresía y liderazgo compartidos entre réplicas.
+
+    Un backend guarda, para cada réplica, su último latido (y su URL interna)
+    y, para cada recurso, un lease de liderazgo con época creciente: la
+    época solo sube cuando cambia el líder, así un líder antiguo puede
+    detectar que lo reemplazaron.
+    """
+
+    def latido(self, replica: str, url: str, bots: Sequence[str], ttl_segundos: float) -> List[Dict[str, Any]]:
+        """Registrar el latido y devolver las réplicas vivas: [{'replica', 'url', 'bots'}, ...]"""
+        raise NotImplementedError
+
+    def tomar_liderazgo(self, recurso: str, replica: str, lease_segundos: float) -> Optional[int]:
+        """Tomar o renovar el lease del recurso; época si esta réplica es líder, None si no"""
+        raise NotImplementedError
+
+    def liberar_liderazgo(self, recurso: str, replica: str):
+        raise NotImplementedError
+
+    def retirar(self, replica: str):
+        """Quitar la réplica de la membresía (cierre ordenado)"""
+        raise NotImplementedError
+
+
+class BackendMemoria(BackendCoordinacion):
+    """Backend en memoria del proceso: una sola réplica (o varias instancias en tests)"""
+
+    def __init__(self):
+        self._replicas: Dict[str, Dict[str, Any]] = {}
+        self._lideres: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def latido(self, replica: str, url: str, bots: Sequence[str], ttl_segundos: float) -> List[Dict[str, Any]]:
+        ahora = time.monotonic()
+        with self._lock:
+            self._replicas[replica] = {'replica': replica, 'url': url, 'bots': list(bots), 'latido': ahora}
+            return [
+                {k: v for k, v in r.items() if k != 'latido'}
+                for r in sorted(self._replicas.values(), key=lambda r: r['replica'])
+                if ahora - r['latido'] <= ttl_segundos
+            ]
+
+    def tomar_liderazgo(self, recurso: str, replica: str, lease_segundos: float) -> Optional[int]:
+        ahora = time.monotonic()
+        with self._lock:
+            lider = self._lideres.get(recurso)
+            if lider is None:
+                lider = self._lideres[recurso] = {'lider': replica, 'epoca': 1, 'lease_hasta': 0.0}
+            elif lider['lider'] != replica:
+                if lider['lease_hasta'] >= ahora:
+                    return None
+                lider['lider'] = replica
+                lider['epoca'] += 1
+            lider['lease_hasta'] = ahora + lease_segundos
+            return lider['epoca']
+
+    def liberar_liderazgo(self, recurso: str, replica: str):
+        with self._lock:
+            lider = self._lideres.get(recurso)
+            if lider and lider['lider'] == replica:
+                lider['lease_hasta'] = 0.0
+
+    def retirar(self, replica: str):
+        with self._lock:
+            self._replicas.pop(replica, None)
+
+
+class BackendSupabase(BackendCoordinacion):
+    """
+    Backend sobre Postgres (migración 015): tablas replicas y liderazgo.
+
+    Como en tomar_tarea_programada, PostgREST no mantiene la sesión entre
+    llamadas: el lease vive en la tabla y un advisory lock de transacción
+    serializa la decisión entre réplicas.
+    """
+
+    def latido(self, replica: str, url: str, bots: Sequence[str], ttl_segundos: float) -> List[Dict[str, Any]]:
+        result = get_supabase_client().client.rpc('latido_replica', {
+            'p_replica': replica,
+            'p_url': url,
+            'p_bots': list(bots),
+            'p_ttl_segundos': max(1, int(ttl_segundos))
+        }).execute()
+        return [{'replica': r['replica'], 'url': r['url'], 'bots': r['bots'] or []} for r in result.data or []]
+
+    def tomar_liderazgo(self, recurso: str, replica: str, lease_segundos: float) -> Optional[int]:
+        result = get_supabase_client().client.rpc('tomar_liderazgo', {
+            'p_recurso': recurso,
+            'p_replica': replica,
+            'p_lease_segundos': max(1, int(lease_segundos))
+        }).execute()
+        return result.data or None
+
+    def liberar_liderazgo(self, recurso: str, replica: str):
+        get_supabase_client().client.rpc('liberar_liderazgo', {
+            'p_recurso': recurso,
+            'p_replica': replica
+        }).execute()
+
+    def retirar(self, replica: str):
+        get_supabase_client().client.table('replicas').delete().eq('replica', replica).execute()
+
+
+BACKENDS = {
+    'memoria': BackendMemoria,
+    'supabase': BackendSupabase,
+}
+
+
+def crear_backend(nombre: str = None) -> BackendCoordinacion:
+    nombre = nombre or Config.COORDINACION_BACKEND
+    if nombre not in BACKENDS:
+        raise ValueError(f"COORDINACION_BACKEND desconocido: {nombre} (opciones: {', '.join(BACKENDS)})")
+    return BACKENDS[nombre]()
+
+
+# ============================================
+# COORDINADOR
+# ============================================
+
+class ReplicaCoordinator:
+    """
+    Coordina varias réplicas que ejecutan los mismos bots.
+
+    - Liderazgo: cada COORDINACION_LATIDO_SECONDS la réplica registra su
+      latido y toma o renueva el lease 'polling:<bot>' de cada bot que
+      ejecuta. Solo el líder hace polling (Telegram no admite dos getUpdates
+      del mismo token); si el líder cae, su lease vence tras
+      COORDINACION_LEASE_SECONDS y otra réplica empieza a hacer polling.
+    - Reparto: el líder pasa cada update por `repartir` (handler del grupo -2,
+      antes del filtro de accesos). El dueño del chat es el nodo del anillo de
+      hash consistente formado por las réplicas vivas del bot; si no es esta
+      réplica, el update se reenvía por HTTP a su /interno/updates/<bot>. Así
+      el estado en memoria por chat (permisos, caché negativa, limitador de
+      envíos) vive en una sola réplica y sumar réplicas suma capacidad.
+    - El reenvío corre en una tarea aparte para no frenar los updates que
+      esperan en la cola del líder. Si el dueño no responde en
+      TIMEOUT_REENVIO_SECONDS, el update vuelve a la cola local: se pierde la
+      afinidad de ese mensaje, no el mensaje.
+    - Sin COORDINACION_SECRETO las demás réplicas rechazarían el reenvío:
+      no se reenvía y el líder procesa todos los chats.
+
+    Con el backend 'memoria' (por defecto) hay una sola réplica: es líder de
+    todos sus bots y procesa todos los chats, como sin coordinación.
+    """
+
+    def __init__(
+        self,
+        backend: BackendCoordinacion = None,
+        replica: str = None,
+        url: str = None,
+        latido_segundos: float = None,
+        lease_segundos: float = None,
+        nodos_virtuales: int = None
+    ):
+        self.backend = backend or crear_backend()
+        self.replica = replica or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.url = (url if url is not None else Config.COORDINACION_URL) or \
+            f"http://{socket.gethostname()}:{os.getenv('PORT', '8000')}"
+        self.latido_segundos = latido_segundos if latido_segundos is not None else Config.COORDINACION_LATIDO_SECONDS
+        self.lease_segundos = lease_segundos if lease_segundos is not None else Config.COORDINACION_LEASE_SECONDS
+        self.nodos_virtuales = nodos_virtuales or Config.COORDINACION_NODOS_VIRTUALES
+        self.bots: tuple = ()
+        self._epocas: Dict[str, Optional[int]] = {}
+        self._renovado: Dict[str, float] = {}
+        self._anillos: Dict[str, AnilloHash] = {}
+        self._urls: Dict[str, str] = {}
+        self._recibidos: 'OrderedDict[tuple, None]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._ciclo: Optional[asyncio.Task] = None
+        self._al_cambiar: Optional[Callable[[str, bool], Awaitable[None]]] = None
+        self._cliente = None
+        self._reenvios: set = set()
+
+    @property
+    def multi_replica(self) -> bool:
+        return not isinstance(self.backend, BackendMemoria)
+
+    # ============================================
+    # LIDERAZGO Y MEMBRESÍA
+    # ============================================
+
+    def es_lider(self, bot: str) -> bool:
+        return self._epocas.get(bot) is not None
+
+    def revisar(self) -> Dict[str, bool]:
+        """
+        Latido y liderazgo de cada bot (síncrono: corre en un hilo).
+
+        Returns:
+            {bot: es_lider} de los bots cuyo liderazgo cambió en esta revisión
+        """
+        try:
+            vivas = self.backend.latido(self.replica, self.url, self.bots, self.lease_segundos)
+            self._actualizar_anillos(vivas)
+        except Exception as e:
+            # Se conserva el último anillo conocido
+            logger.error(f"❌ Error registrando latido de réplica: {e}")
+
+        cambios = {}
+        for bot in self.bots:
+            era_lider = self.es_lider(bot)
+            try:
+                epoca = self.backend.tomar_liderazgo(f"polling:{bot}", self.replica, self.lease_segundos)
+                if epoca is not None:
+                    self._renovado[bot] = time.monotonic()
+            except Exception as e:
+                logger.error(f"❌ Error renovando liderazgo de {bot}: {e}")
+                # Sin respuesta de la BD el lease sigue siendo nuestro hasta que vence
+                vigente = era_lider and time.monotonic() - self._renovado.get(bot, 0.0) < self.lease_segundos
+                epoca = self._epocas.get(bot) if vigente else None
+
+            self._epocas[bot] = epoca
+            ES_LIDER.set(1 if epoca is not None else 0, bot=bot)
+            if (epoca is not None) != era_lider:
+                cambios[bot] = epoca is not None
+                if epoca is not None:
+                    logger.info(f"🛰️ Réplica {self.replica} es líder de {bot} (época {epoca})")
+                else:
+                    logger.warning(f"🛰️ Réplica {self.replica} dejó de ser líder de {bot}")
+        return cambios
+
+    def _actualizar_anillos(self, vivas: List[Dict[str, Any]]):
+        anillos = {}
+        urls = {r['replica']: r['url'] for r in vivas}
+        for bot in self.bots:
+            miembros = {r['replica'] for r in vivas if bot in r['bots']}
+            # Esta réplica siempre procesa su bot, aunque su latido aún no sea visible
+            miembros.add(self.replica)
+            anterior = self._anillos.get(bot)
+            if anterior is not None and set(anterior.nodos) == miembros:
+                anillos[bot] = anterior
+                continue
+            anillos[bot] = AnilloHash(miembros, self.nodos_virtuales)
+            REPLICAS_ACTIVAS.set(len(miembros), bot=bot)
+            if anterior is not None:
+                logger.info(f"🛰️ Réplicas de {bot}: {len(anterior)} → {len(miembros)}")
+        with self._lock:
+            self._anillos = anillos
+            self._urls = urls
+
+    def duenio(self, bot: str, chat_id: int) -> str:
+        """Réplica que procesa los updates del chat"""
+        anillo = self._anillos.get(bot)
+        return (anillo.nodo(chat_id) if anillo else None) or self.replica
+
+    # ============================================
+    # REPARTO DE UPDATES
+    # ============================================
+
+    def marcar_recibido(self, bot: str, update_id: int):
+        """Update llegado por /interno/updates: se procesa aquí sin volver a repartirlo"""
+        with self._lock:
+            self._recibidos[(bot, update_id)] = None
+            while len(self._recibidos) > MAX_RECIBIDOS:
+                self._recibidos.popitem(last=False)
+
+    def _fue_recibido(self, bot: str, update_id: int) -> bool:
+        with self._lock:
+            if (bot, update_id) not in self._recibidos:
+                return False
+            del self._recibidos[(bot, update_id)]
+            return True
+
+    async def repartir(
+        self,
+        bot: str,
+        update: 'Update',
+        al_fallar: Callable[['Update'], Awaitable[None]] = None
+    ) -> bool:
+        """
+        Reenviar el update a la réplica dueña de su chat (en segundo plano).
+
+        Args:
+            bot: Bot que recibió el update
+            update: Update de Telegram
+            al_fallar: Corrutina que devuelve el update a la cola local si el dueño no lo acepta
+
+        Returns:
+            True si el update sale de esta réplica (el llamador debe cortar los handlers)
+        """
+        chat = update.effective_chat
+        if chat is None or self._fue_recibido(bot, update.update_id):
+            UPDATES_REPARTIDOS.inc(bot=bot, destino='local')
+            return False
+
+        duenio = self.duenio(bot, chat.id)
+        url = self._urls.get(duenio)
+        if duenio == self.replica or not url or not Config.COORDINACION_SECRETO or al_fallar is None:
+            UPDATES_REPARTIDOS.inc(bot=bot, destino='local')
+            return False
+
+        tarea = asyncio.create_task(self._reenviar_o_devolver(url, bot, update, al_fallar))
+        self._reenvios.add(tarea)
+        tarea.add_done_callback(self._reenvios.discard)
+        return True
+
+    async def _reenviar_o_devolver(
+        self,
+        url: str,
+        bot: str,
+        update: 'Update',
+        al_fallar: Callable[['Update'], Awaitable[None]]
+    ):
+        if await self._reenviar(url, bot, update.to_dict()):
+            UPDATES_REPARTIDOS.inc(bot=bot, destino='reenviado')
+            return
+        UPDATES_REPARTIDOS.inc(bot=bot, destino='respaldo_local')
+        try:
+            # Marcado como recibido: al volver a pasar por repartir se procesa aquí
+            self.marcar_recibido(bot, update.update_id)
+            await al_fallar(update)
+        except Exception as e:
+            logger.error(f"❌ No se pudo procesar localmente el update {update.update_id}: {e}")
+
+    async def _reenviar(self, url: str, bot: str, datos: Dict[str, Any]) -> bool:
+        if self._cliente is None:
+            import httpx
+            self._cliente = httpx.AsyncClient(timeout=TIMEOUT_REENVIO_SECONDS)
+        try:
+            respuesta = await asyncio.wait_for(
+                self._cliente.post(
+                    f"{url.rstrip('/')}/interno/updates/{bot}",
+                    json=datos,
+                    headers={CABECERA_SECRETO: Config.COORDINACION_SECRETO}
+                ),
+                TIMEOUT_REENVIO_SECONDS
+            )
+            if respuesta.status_code < 300:
+                return True
+            logger.warning(f"⚠️ Réplica {url} rechazó el update {datos.get('update_id')}: HTTP {respuesta.status_code}")
+        except Exception as e:
+            logger.warning(f"⚠️ No se pudo reenviar el update {datos.get('update_id')} a {url}: {e!r}")
+        return False
+
+    @staticmethod
+    def secreto_valido(secreto: Optional[str]) -> bool:
+        """Sin COORDINACION_SECRETO configurado no se aceptan updates reenviados"""
+        esperado = Config.COORDINACION_SECRETO
+        return bool(esperado) and secreto is not None and hmac.compare_digest(secreto, esperado)
+
+    # ============================================
+    # CICLO DE VIDA
+    # ============================================
+
+    async def iniciar(self, bots: Sequence[str], al_cambiar: Callable[[str, bool], Awaitable[None]]):
+        """
+        Primera revisión (el líder empieza el polling antes de volver) y ciclo de latidos.
+
+        Args:
+            bots: Bots que ejecuta esta réplica
+            al_cambiar: Corrutina (bot, es_lider) que inicia o detiene el polling
+        """
+        if self._ciclo is not None:
+            return
+        self.bots = tuple(bots)
+        self._al_cambiar = al_cambiar
+        if self.multi_replica and not Config.COORDINACION_SECRETO:
+            logger.warning("⚠️ COORDINACION_SECRETO vacío: reenvío entre réplicas desactivado, "
+                           "la réplica líder procesará todos los chats")
+        await self._aplicar(await asyncio.to_thread(self.revisar))
+        self._ciclo = asyncio.create_task(self._ciclo_latidos(), name="coordinacion-replicas")
+        logger.info(f"🛰️ Coordinación iniciada: réplica {self.replica} ({self.url}), backend {type(self.backend).__name__}")
+
+    async def _aplicar(self, cambios: Dict[str, bool]):
+        for bot, lider in cambios.items():
+            try:
+                await self._al_cambiar(bot, lider)
+            except Exception as e:
+                logger.error(f"❌ Error aplicando liderazgo de {bot}: {e}")
+
+    async def _ciclo_latidos(self):
+        while True:
+            await asyncio.sleep(self.latido_segundos)
+            await self._aplicar(await asyncio.to_thread(self.revisar))
+
+    async def detener(self):
+        """Detener los latidos y liberar los leases para que otra réplica tome el polling de inmediato"""
+        if self._ciclo is not None:
+            self._ciclo.cancel()
+            try:
+                await self._ciclo
+            except asyncio.CancelledError:
+                pass
+            self._ciclo = None
+
+        def liberar():
+            for bot in self.bots:
+                if self.es_lider(bot):
+                    try:
+                        self.backend.liberar_liderazgo(f"polling:{bot}", self.replica)
+                    except Exception as e:
+                        logger.warning(f"⚠️ No se pudo liberar el liderazgo de {bot}: {e}")
+                self._epocas[bot] = None
+                ES_LIDER.set(0, bot=bot)
+            try:
+                self.backend.retirar(self.replica)
+            except Exception as e:
+                logger.warning(f"⚠️ No se pudo retirar la réplica: {e}")
+
+        await asyncio.to_thread(liberar)
+        # Los reenvíos en curso terminan (o vuelven a la cola local) antes de cerrar el cliente
+        if self._reenvios:
+            await asyncio.gather(*self._reenvios, return_exceptions=True)
+        if self._cliente is not None:
+            await self._cliente.aclose()
+            self._cliente = None
+
+    def estado(self) -> Dict[str, Any]:
+        """Liderazgo y réplicas de cada bot (para /status)"""
+        return {
+            'replica': self.replica,
+            'url': self.url,
+            'backend': type(self.backend).__name__,
+            'bots': {
+                bot: {
+                    'lider': self.es_lider(bot),
+                    'epoca': self._epocas.get(bot),
+                    'replicas': self._anillos[bot].nodos if bot in self._anillos else [self.replica]
+                }
+                for bot in self.bots
+            }
+        }
+
+
+# Instancia global
+_coordinador = None
+
+
+def get_coordinador() -> ReplicaCoordinator:
+    """Obtener instancia del coordinador de réplicas"""
+    global _coordinador
+    if _coordinador is None:
+        _coordinador = ReplicaCoordinator()
+    return _coordinador
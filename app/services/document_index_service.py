@@ -0,0 +1,361 @@
+"""
+🔎 Índice Local de Documentos
+Texto de los PDFs de cada empresa en SQLite FTS5 para que el Asesor IA recupere pasajes sin Assistants
+"""
+
+import re
+import time
+import asyncio
+import hashlib
+import logging
+import sqlite3
+import threading
+import importlib.util
+import multiprocessing
+from contextlib import closing
+from datetime import datetime
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from app.config import Config
+from app.database.supabase import get_supabase_client
+from app.services.financial_metrics_service import SUBTIPOS_METRICAS, get_financial_metrics_service
+from app.utils.metrics import get_registro_metricas
+from app.utils.pdf_text import extraer_pasajes
+
+logger = logging.getLogger(__name__)
+
+registro = get_registro_metricas()
+BUSQUEDA_MS = registro.histograma(
+    'aca_document_index_search_ms', 'Duración de búsquedas en el índice local de documentos', (),
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 1000)
+)
+ARCHIVOS_INDEXADOS = registro.contador(
+    'aca_document_index_files_total', 'PDFs procesados por el índice local', ('resultado',)
+)
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS documentos (
+    archivo_id TEXT PRIMARY KEY,
+    nombre TEXT,
+    periodo TEXT,
+    subtipo TEXT,
+    sha256 TEXT NOT NULL,
+    total_pasajes INTEGER NOT NULL,
+    indexado_at TEXT NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS pasajes USING fts5(
+    texto,
+    archivo_id UNINDEXED,
+    pagina UNINDEXED,
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+"""
+
+# Palabras que no discriminan entre pasajes
+STOPWORDS = frozenset("""
+cual cuales cuando cuanto cuanta cuantos cuantas como donde que quien para por con sin sobre entre desde hasta
+los las del una uno unos unas este esta esto estos estas ese esa eso esos esas mes año anio hay tiene tengo tenemos
+fue fueron ser son era eran esta estan muy mas menos pero tambien del nos les sus mis tus cómo cuál cuánto qué
+""".split())
+
+_PALABRAS = re.compile(r'\w+', re.UNICODE)
+
+
+def consulta_fts(pregunta: str, max_terminos: int = 12) -> Optional[str]:
+    """
+    Expresión MATCH de FTS5 a partir de una pregunta en lenguaje natural.
+
+    Cada palabra útil se busca como prefijo sin el plural ("ingresos" → ingreso*)
+    y los términos se combinan con OR; bm25 premia los pasajes con más coincidencias.
+    """
+    terminos = []
+    for palabra in _PALABRAS.findall((pregunta or '').lower()):
+        if len(palabra) < 3 or palabra in STOPWORDS or palabra.isdigit() and len(palabra) < 4:
+            continue
+        if len(palabra) > 4 and palabra.endswith('es'):
+            palabra = palabra[:-2]
+        elif len(palabra) > 4 and palabra.endswith('s'):
+            palabra = palabra[:-1]
+        termino = f'"{palabra}"*'
+        if termino not in terminos:
+            terminos.append(termino)
+    return ' OR '.join(terminos[:max_terminos]) or None
+
+
+class DocumentIndexService:
+    """
+    Un archivo SQLite por empresa con el texto de sus PDFs en pasajes.
+
+    La extracción corre una sola vez por archivo (se omite si el sha256 no
+    cambió) en un pool de procesos, fuera del event loop. La base local se
+    respalda en Storage después de cada cambio y una réplica sin copia local
+    la descarga al primer uso; si dos réplicas indexan la misma empresa a la
+    vez, gana la última en subir (un backfill lo corrige).
+    """
+
+    def __init__(self, directorio: str = None):
+        self.supabase = get_supabase_client().client
+        self.bucket_name = Config.SUPABASE_STORAGE_BUCKET
+        self.directorio = Path(directorio or Config.INDICE_DOCUMENTOS_DIR)
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._locks_empresa: Dict[str, threading.Lock] = {}
+        self._revisadas: Set[str] = set()
+        self._tareas: Set[asyncio.Task] = set()
+        self._habilitado: Optional[bool] = None
+
+    # ============================================
+    # DISPONIBILIDAD Y RECURSOS
+    # ============================================
+
+    @property
+    def habilitado(self) -> bool:
+        """Índice activo en configuración y con pypdf instalado"""
+        if self._habilitado is None:
+            self._habilitado = Config.INDICE_DOCUMENTOS_ENABLED
+            if self._habilitado and importlib.util.find_spec('pypdf') is None:
+                logger.warning("⚠️ pypdf no está instalado: índice local de documentos deshabilitado")
+                self._habilitado = False
+        return self._habilitado
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                # spawn: los hijos no heredan el event loop ni los clientes HTTP del proceso
+                self._pool = ProcessPoolExecutor(
+                    max_workers=Config.INDICE_DOCUMENTOS_WORKERS,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+            return self._pool
+
+    def _lock_empresa(self, empresa_id: str) -> threading.Lock:
+        with self._lock:
+            return self._locks_empresa.setdefault(empresa_id, threading.Lock())
+
+    def _ruta_local(self, empresa_id: str) -> Path:
+        return self.directorio / f"{empresa_id}.sqlite3"
+
+    def _ruta_storage(self, empresa_id: str) -> str:
+        return f"{Config.INDICE_DOCUMENTOS_CARPETA}/{empresa_id}.sqlite3"
+
+    def _conectar(self, empresa_id: str) -> sqlite3.Connection:
+        ruta = self._ruta_local(empresa_id)
+        ruta.parent.mkdir(parents=True, exist_ok=True)
+        conexion = sqlite3.connect(ruta)
+        conexion.executescript(ESQUEMA)
+        return conexion
+
+    def _asegurar_local(self, empresa_id: str) -> bool:
+        """Traer la copia de Storage la primera vez que esta réplica usa la empresa"""
+        ruta = self._ruta_local(empresa_id)
+        if ruta.exists():
+            return True
+        with self._lock_empresa(empresa_id):
+            if ruta.exists() or empresa_id in self._revisadas:
+                return ruta.exists()
+            self._revisadas.add(empresa_id)
+            try:
+                contenido = self.supabase.storage.from_(self.bucket_name).download(self._ruta_storage(empresa_id))
+            except Exception as e:
+                logger.info(f"📭 Sin índice en Storage para empresa {empresa_id}: {e}")
+                return False
+            ruta.parent.mkdir(parents=True, exist_ok=True)
+            temporal = ruta.with_suffix('.descarga')
+            temporal.write_bytes(contenido)
+            temporal.replace(ruta)
+            logger.info(f"📥 Índice de empresa {empresa_id} descargado de Storage")
+            return True
+
+    def _publicar(self, empresa_id: str):
+        """Respaldar la base local en Storage (se llama con el lock de la empresa tomado)"""
+        try:
+            self.supabase.storage.from_(self.bucket_name).upload(
+                self._ruta_storage(empresa_id),
+                self._ruta_local(empresa_id).read_bytes(),
+                file_options={'content-type': 'application/vnd.sqlite3', 'upsert': 'true'}
+            )
+        except Exception as e:
+            logger.error(f"❌ Error subiendo índice de empresa {empresa_id} a Storage: {e}")
+
+    # ============================================
+    # ESCRITURA
+    # ============================================
+
+    def _ya_indexado(self, empresa_id: str, archivo_id: str, sha256: str) -> bool:
+        if not self._asegurar_local(empresa_id):
+            return False
+        with self._lock_empresa(empresa_id), closing(self._conectar(empresa_id)) as conexion:
+            fila = conexion.execute(
+                "SELECT sha256 FROM documentos WHERE archivo_id = ?", (archivo_id,)
+            ).fetchone()
+        return bool(fila) and fila[0] == sha256
+
+    def guardar_pasajes(
+        self,
+        empresa_id: str,
+        archivo: Dict[str, Any],
+        pasajes: List[Tuple[int, str]],
+        sha256: str,
+        publicar: bool = True
+    ):
+        """Reemplazar los pasajes de un archivo en el índice de su empresa"""
+        archivo_id = str(archivo['id'])
+        with self._lock_empresa(empresa_id):
+            with closing(self._conectar(empresa_id)) as conexion, conexion:
+                conexion.execute("DELETE FROM pasajes WHERE archivo_id = ?", (archivo_id,))
+                conexion.executemany(
+                    "INSERT INTO pasajes (texto, archivo_id, pagina) VALUES (?, ?, ?)",
+                    [(texto, archivo_id, pagina) for pagina, texto in pasajes]
+                )
+                conexion.execute(
+                    "INSERT OR REPLACE INTO documentos "
+                    "(archivo_id, nombre, periodo, subtipo, sha256, total_pasajes, indexado_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (archivo_id, archivo.get('nombre_original') or archivo.get('nombre_archivo'),
+                     archivo.get('periodo'), archivo.get('subtipo'), sha256, len(pasajes),
+                     datetime.now().isoformat())
+                )
+            if publicar:
+                self._publicar(empresa_id)
+
+    async def indexar_archivo(self, empresa_id: str, archivo: Dict[str, Any], pdf_bytes: bytes) -> int:
+        """
+        Extraer e indexar un PDF de la empresa (y sus cifras, si es un reporte o F29).
+
+        Returns:
+            Pasajes indexados (0 si ya estaba al día, no hay texto o falló)
+        """
+        if not self.habilitado or not empresa_id:
+            return 0
+
+        sha256 = hashlib.sha256(pdf_bytes).hexdigest()
+        if await asyncio.to_thread(self._ya_indexado, empresa_id, str(archivo['id']), sha256):
+            ARCHIVOS_INDEXADOS.inc(resultado='sin_cambios')
+            return 0
+
+        inicio = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            pasajes = await loop.run_in_executor(self._get_pool(), extraer_pasajes, pdf_bytes)
+            await asyncio.to_thread(self.guardar_pasajes, empresa_id, archivo, pasajes, sha256)
+        except Exception as e:
+            logger.error(f"❌ Error indexando archivo {archivo.get('id')}: {e}")
+            ARCHIVOS_INDEXADOS.inc(resultado='error')
+            return 0
+
+        # Tablas de reportes y F29 → cifras por cuenta para preguntas numéricas
+        if pasajes and archivo.get('subtipo') in SUBTIPOS_METRICAS:
+            await asyncio.to_thread(
+                get_financial_metrics_service().registrar_documento,
+                empresa_id, archivo, [texto for _, texto in pasajes]
+            )
+
+        ARCHIVOS_INDEXADOS.inc(resultado='ok' if pasajes else 'sin_texto')
+        logger.info(
+            f"🔎 Archivo {archivo.get('id')} indexado: {len(pasajes)} pasajes "
+            f"en {(time.perf_counter() - inicio) * 1000:.0f}ms"
+        )
+        return len(pasajes)
+
+    def indexar_en_segundo_plano(self, empresa_id: str, archivo: Dict[str, Any], pdf_bytes: bytes):
+        """Programar la indexación sin bloquear la respuesta al usuario"""
+        if not self.habilitado or not empresa_id:
+            return
+        tarea = asyncio.create_task(self.indexar_archivo(empresa_id, archivo, pdf_bytes))
+        # Referencia fuerte hasta que termine (el loop solo guarda referencias débiles)
+        self._tareas.add(tarea)
+        tarea.add_done_callback(self._tareas.discard)
+
+    def quitar_archivo(self, empresa_id: Optional[str], archivo_id: str):
+        """Eliminar un archivo del índice de su empresa"""
+        if not empresa_id or not self._asegurar_local(empresa_id):
+            return
+        try:
+            with self._lock_empresa(empresa_id):
+                with closing(self._conectar(empresa_id)) as conexion, conexion:
+                    borrados = conexion.execute(
+                        "DELETE FROM documentos WHERE archivo_id = ?", (str(archivo_id),)
+                    ).rowcount
+                    conexion.execute("DELETE FROM pasajes WHERE archivo_id = ?", (str(archivo_id),))
+                if borrados:
+                    self._publicar(empresa_id)
+        except Exception as e:
+            logger.error(f"❌ Error quitando archivo {archivo_id} del índice: {e}")
+
+    # ============================================
+    # LECTURA
+    # ============================================
+
+    def buscar(self, empresa_id: str, pregunta: str, limite: int = None) -> List[Dict[str, Any]]:
+        """
+        Pasajes más relevantes para la pregunta, del mejor al peor (bm25).
+
+        Returns:
+            Lista de {archivo_id, pagina, texto, nombre, periodo, subtipo}; vacía si no hay índice
+        """
+        consulta = consulta_fts(pregunta)
+        if not consulta or not empresa_id or not self._asegurar_local(empresa_id):
+            return []
+
+        inicio = time.perf_counter()
+        try:
+            with closing(self._conectar(empresa_id)) as conexion:
+                filas = conexion.execute(
+                    """
+                    SELECT pasajes.archivo_id, pasajes.pagina, pasajes.texto, d.nombre, d.periodo, d.subtipo
+                    FROM pasajes JOIN documentos d ON d.archivo_id = pasajes.archivo_id
+                    WHERE pasajes MATCH ?
+                    ORDER BY bm25(pasajes)
+                    LIMIT ?
+                    """,
+                    (consulta, limite or Config.INDICE_DOCUMENTOS_PASAJES)
+                ).fetchall()
+        except Exception as e:
+            logger.error(f"❌ Error buscando en índice de empresa {empresa_id}: {e}")
+            return []
+        finally:
+            BUSQUEDA_MS.observar((time.perf_counter() - inicio) * 1000)
+
+        columnas = ('archivo_id', 'pagina', 'texto', 'nombre', 'periodo', 'subtipo')
+        return [dict(zip(columnas, fila)) for fila in filas]
+
+    def texto_archivo(self, empresa_id: Optional[str], archivo_id: str) -> Optional[str]:
+        """Texto indexado de un archivo (None si no está en el índice)"""
+        if not empresa_id or not self._asegurar_local(empresa_id):
+            return None
+        with closing(self._conectar(empresa_id)) as conexion:
+            filas = conexion.execute(
+                "SELECT texto FROM pasajes WHERE archivo_id = ? ORDER BY rowid", (str(archivo_id),)
+            ).fetchall()
+        return '\n\n'.join(f[0] for f in filas) if filas else None
+
+    def estado(self, empresa_id: str) -> Dict[str, Any]:
+        """Documentos, pasajes y tamaño del índice de una empresa"""
+        if not self._asegurar_local(empresa_id):
+            return {'documentos': 0, 'pasajes': 0, 'bytes': 0}
+        with closing(self._conectar(empresa_id)) as conexion:
+            documentos, pasajes = conexion.execute(
+                "SELECT COUNT(*), COALESCE(SUM(total_pasajes), 0) FROM documentos"
+            ).fetchone()
+        return {'documentos': documentos, 'pasajes': pasajes, 'bytes': self._ruta_local(empresa_id).stat().st_size}
+
+    def cerrar(self):
+        """Detener el pool de extracción (shutdown de la app)"""
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+# Instancia global
+_document_index_service = None
+
+
+def get_document_index_service() -> DocumentIndexService:
+    """Obtener instancia del servicio de índice de documentos"""
+    global _document_index_service
+    if _document_index_service is None:
+        _document_index_service = DocumentIndexService()
+    return _document_index_service
@@ -0,0 +1,202 @@
+"""
+📈 Servicio de Métricas Financieras
+Cifras por empresa, período y cuenta extraídas de los documentos, y sus series para el Asesor IA
+"""
+
+import re
+import time
+import logging
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.config import Config
+from app.database.projections import METRICA_SERIE
+from app.database.supabase import get_supabase_client
+from app.services.metrics_service import registrar_cache
+from app.utils.financial_series import Serie, acumulado, tendencia, variacion_anual
+from app.utils.financial_tables import extraer_cifras, normalizar_etiqueta
+
+logger = logging.getLogger(__name__)
+
+# Documentos cuyas tablas se convierten en cifras
+SUBTIPOS_METRICAS = ('reporte_mensual', 'estados_financieros', 'f29')
+
+# Una empresa con 3 años de 16 cuentas tiene ~600 filas
+MAX_FILAS_EMPRESA = 10000
+
+# Palabras de la pregunta (sin tildes) → cuentas que consulta
+PREGUNTA_CUENTAS = {
+    'venta': ('ventas',), 'ingreso': ('ventas',), 'factur': ('ventas',),
+    'costo': ('costo_ventas',), 'margen': ('margen_bruto',),
+    'gasto': ('gastos_administracion',), 'remuneracion': ('remuneraciones',), 'sueldo': ('remuneraciones',),
+    'resultado operacional': ('resultado_operacional',), 'ebitda': ('ebitda',),
+    'utilidad': ('utilidad_neta',), 'ganancia': ('utilidad_neta',), 'perdida': ('utilidad_neta',),
+    'caja': ('caja',), 'efectivo': ('caja',),
+    'activo': ('total_activos',), 'pasivo': ('total_pasivos',), 'patrimonio': ('patrimonio',),
+    'iva': ('iva_debito', 'iva_credito'), 'debito fiscal': ('iva_debito',), 'credito fiscal': ('iva_credito',),
+    'ppm': ('ppm',), 'impuesto': ('total_a_pagar',), 'f29': ('total_a_pagar',),
+}
+
+# La pregunta pide cifras (no una explicación de un documento)
+INTENCION_NUMERICA = (
+    'evolu', 'tendencia', 'crec', 'cayo', 'cayeron', 'bajo', 'bajaron', 'subio', 'subieron', 'acumulad',
+    'compar', 'variacion', 'cuanto', 'cuanta', 'total', 'ano anterior', 'mes a mes', 'monto', 'cifra',
+)
+
+
+def cuentas_en_pregunta(pregunta: str) -> List[str]:
+    """Cuentas que una pregunta numérica consulta (vacía si la pregunta no pide cifras)"""
+    texto = f" {normalizar_etiqueta(pregunta or '')} "
+    # Coincidencias al inicio de palabra: "iva" no debe calzar con "positiva"
+    if not any(f' {intencion}' in texto for intencion in INTENCION_NUMERICA):
+        return []
+    cuentas = []
+    for palabra, asociadas in PREGUNTA_CUENTAS.items():
+        if f' {palabra}' in texto:
+            cuentas.extend(c for c in asociadas if c not in cuentas)
+    return cuentas
+
+
+class FinancialMetricsService:
+    """
+    Escribe las cifras de cada documento en `metricas_financieras` y sirve
+    series mensuales por empresa desde memoria.
+
+    Las series de una empresa se leen en una consulta al primer uso y se
+    descartan al registrar o quitar un documento de esa empresa; los cambios
+    hechos por otras réplicas se ven al vencer METRICAS_TTL_SECONDS.
+    """
+
+    def __init__(self, ttl_segundos: int = None):
+        self.supabase = get_supabase_client()
+        self.ttl_segundos = ttl_segundos if ttl_segundos is not None else Config.METRICAS_TTL_SECONDS
+        self._series: Dict[str, Tuple[float, Dict[str, Serie]]] = {}
+        self._lock = threading.Lock()
+
+    # ============================================
+    # INGESTA
+    # ============================================
+
+    def registrar_documento(self, empresa_id: str, archivo: Dict[str, Any], textos: Iterable[str]) -> int:
+        """
+        Extraer las cifras de un documento y guardarlas para su período.
+
+        Returns:
+            Cantidad de cuentas guardadas
+        """
+        periodo = archivo.get('periodo') or ''
+        if archivo.get('subtipo') not in SUBTIPOS_METRICAS or not re.fullmatch(r'\d{4}-\d{2}', periodo):
+            return 0
+
+        cifras = extraer_cifras(textos)
+        if not cifras:
+            return 0
+
+        filas = [
+            {
+                'empresa_id': empresa_id,
+                'periodo': periodo,
+                'cuenta': cuenta,
+                'monto': round(monto, 2),
+                'archivo_id': archivo.get('id'),
+                'fuente': archivo.get('subtipo'),
+                'etiqueta': etiqueta,
+            }
+            for cuenta, (monto, etiqueta) in cifras.items()
+        ]
+        try:
+            self.supabase.table('metricas_financieras')\
+                .upsert(filas, on_conflict='empresa_id,cuenta,periodo')\
+                .execute()
+        except Exception as e:
+            logger.error(f"❌ Error guardando cifras del archivo {archivo.get('id')}: {e}")
+            return 0
+
+        self.invalidar(empresa_id)
+        logger.info(f"📈 {len(filas)} cifras de {periodo} guardadas para empresa {empresa_id}")
+        return len(filas)
+
+    def quitar_archivo(self, empresa_id: Optional[str], archivo_id: str):
+        """Eliminar las cifras que aportó un archivo dado de baja"""
+        try:
+            self.supabase.table('metricas_financieras').delete().eq('archivo_id', archivo_id).execute()
+        except Exception as e:
+            logger.error(f"❌ Error eliminando cifras del archivo {archivo_id}: {e}")
+        self.invalidar(empresa_id)
+
+    # ============================================
+    # SERIES
+    # ============================================
+
+    def _cargar(self, empresa_id: str) -> Dict[str, Serie]:
+        result = self.supabase.table('metricas_financieras')\
+            .select(METRICA_SERIE.select)\
+            .eq('empresa_id', empresa_id)\
+            .order('periodo')\
+            .limit(MAX_FILAS_EMPRESA)\
+            .execute()
+        puntos: Dict[str, List[Tuple[str, float]]] = {}
+        for fila in METRICA_SERIE.filas(result.data):
+            puntos.setdefault(fila['cuenta'], []).append((fila['periodo'], fila['monto']))
+        return {cuenta: Serie(cuenta, valores) for cuenta, valores in puntos.items()}
+
+    def get_series(self, empresa_id: str) -> Optional[Dict[str, Serie]]:
+        """Series de la empresa por cuenta (None si no se pudieron leer)"""
+        with self._lock:
+            cacheadas = self._series.get(empresa_id)
+        if cacheadas and time.time() - cacheadas[0] < self.ttl_segundos:
+            registrar_cache('metricas', True)
+            return cacheadas[1]
+
+        registrar_cache('metricas', False)
+        try:
+            series = self._cargar(empresa_id)
+        except Exception as e:
+            logger.error(f"❌ Error cargando cifras de empresa {empresa_id}: {e}")
+            return None
+        with self._lock:
+            self._series[empresa_id] = (time.time(), series)
+        return series
+
+    def resumen(self, empresa_id: str, cuentas: Iterable[str], anio: int = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Cifras precalculadas de las cuentas pedidas para que el LLM solo las redacte.
+
+        Returns:
+            {cuenta: {ultimo_periodo, variacion_anual, acumulado, tendencia, ultimos_meses}};
+            vacío si la empresa no tiene cifras de esas cuentas
+        """
+        series = self.get_series(empresa_id) or {}
+        resumen = {}
+        for cuenta in cuentas:
+            serie = series.get(cuenta)
+            if serie is None or not len(serie):
+                continue
+            resumen[cuenta] = {
+                'ultimo_periodo': serie.ultimo_periodo,
+                'variacion_anual': variacion_anual(serie),
+                'acumulado': acumulado(serie, anio),
+                'tendencia': tendencia(serie, 12),
+                'ultimos_meses': serie.ultimos(12),
+            }
+        return resumen
+
+    def invalidar(self, empresa_id: Optional[str] = None):
+        """Descartar las series de una empresa (o todas)"""
+        with self._lock:
+            if empresa_id is None:
+                self._series.clear()
+            else:
+                self._series.pop(empresa_id, None)
+
+
+# Instancia global
+_financial_metrics_service = None
+
+
+def get_financial_metrics_service() -> FinancialMetricsService:
+    """Obtener instancia del servicio de métricas financieras"""
+    global _financial_metrics_service
+    if _financial_metrics_service is None:
+        _financial_metrics_service = FinancialMetricsService()
+    return _financial_metrics_service
@@ -0,0 +1,203 @@
+"""
+📡 Feed en vivo de conversaciones
+Publica conversaciones, accesos denegados y deltas de estadísticas a suscriptores SSE del dashboard
+"""
+
+import asyncio
+import logging
+from collections import deque
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, Optional, Set
+
+from app.config import Config
+from app.utils.metrics import get_registro_metricas
+
+logger = logging.getLogger(__name__)
+
+EVENTOS = ('conversacion', 'acceso_denegado', 'stats')
+
+SUSCRIPTORES = get_registro_metricas().medidor(
+    'aca_live_feed_subscribers', 'Suscriptores conectados al feed en vivo'
+)
+EVENTOS_PERDIDOS = get_registro_metricas().contador(
+    'aca_live_feed_dropped_total', 'Eventos descartados por buffer lleno de un suscriptor'
+)
+
+
+class Suscriptor:
+    """Un cliente conectado con su buffer acotado y sus filtros"""
+
+    def __init__(
+        self,
+        max_eventos: int,
+        bot_type: Optional[str] = None,
+        empresa_id: Optional[str] = None,
+        eventos: Optional[Set[str]] = None
+    ):
+        self.bot_type = bot_type
+        self.empresa_id = empresa_id
+        self.eventos = eventos or set(EVENTOS)
+        self._buffer: deque = deque(maxlen=max_eventos)
+        self._hay_eventos = asyncio.Event()
+        self.perdidos = 0
+
+    def acepta(self, tipo: str, datos: Dict[str, Any]) -> bool:
+        if tipo not in self.eventos:
+            return False
+        if tipo == 'stats':
+            return True
+        if self.bot_type and datos.get('bot_tipo') != self.bot_type:
+            return False
+        if self.empresa_id and datos.get('empresa_id') != self.empresa_id:
+            return False
+        return True
+
+    def entregar(self, evento: Dict[str, Any]):
+        # deque con maxlen descarta el más antiguo: un cliente lento no frena a nadie
+        if len(self._buffer) == self._buffer.maxlen:
+            self.perdidos += 1
+            EVENTOS_PERDIDOS.inc()
+        self._buffer.append(evento)
+        self._hay_eventos.set()
+
+    async def siguiente(self, timeout: float) -> Optional[Dict[str, Any]]:
+        """Próximo evento, o None si pasó `timeout` sin eventos (para heartbeats)"""
+        if not self._buffer:
+            self._hay_eventos.clear()
+            try:
+                await asyncio.wait_for(self._hay_eventos.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+        if self.perdidos:
+            perdidos, self.perdidos = self.perdidos, 0
+            return {'tipo': 'perdidos', 'datos': {'eventos': perdidos}}
+        return self._buffer.popleft() if self._buffer else None
+
+
+class FeedEnVivo:
+    """
+    Pub/sub en proceso alimentado por ConversationLogger.log_message.
+
+    Publicar es O(suscriptores) y no toca la BD. Las estadísticas se envían
+    como deltas acumulados cada `intervalo_stats` segundos, solo si hubo eventos.
+    """
+
+    def __init__(self, max_eventos: int = None, intervalo_stats: float = None):
+        self.max_eventos = max_eventos or Config.LIVE_FEED_BUFFER_SIZE
+        self.intervalo_stats = intervalo_stats or Config.LIVE_FEED_STATS_SECONDS
+        self._suscriptores: Set[Suscriptor] = set()
+        self._delta = self._delta_vacio()
+        self._tarea_stats: Optional[asyncio.Task] = None
+        self._secuencia = 0
+
+    @staticmethod
+    def _delta_vacio() -> Dict[str, Any]:
+        return {'mensajes': 0, 'autorizados': 0, 'no_autorizados': 0, 'errores': 0, 'por_bot': {}}
+
+    @property
+    def total_suscriptores(self) -> int:
+        return len(self._suscriptores)
+
+    def _publicar(self, tipo: str, datos: Dict[str, Any]):
+        if not self._suscriptores:
+            return
+        self._secuencia += 1
+        evento = {'id': self._secuencia, 'tipo': tipo, 'datos': datos}
+        for suscriptor in list(self._suscriptores):
+            if suscriptor.acepta(tipo, datos):
+                suscriptor.entregar(evento)
+
+    def publicar_conversacion(
+        self,
+        bot_type: str,
+        user_data: Dict[str, Any],
+        mensaje: str,
+        respuesta: Optional[str],
+        has_access: bool,
+        empresa_id: Optional[str] = None,
+        command: Optional[str] = None,
+        response_time_ms: Optional[int] = None,
+        error: Optional[str] = None
+    ):
+        """Publicar un mensaje recién registrado (y el acceso denegado si corresponde)"""
+        delta = self._delta
+        delta['mensajes'] += 1
+        delta['autorizados' if has_access else 'no_autorizados'] += 1
+        if error:
+            delta['errores'] += 1
+        delta['por_bot'][bot_type] = delta['por_bot'].get(bot_type, 0) + 1
+
+        if not self._suscriptores:
+            return
+
+        datos = {
+            'timestamp': datetime.now().isoformat(),
+            'bot_tipo': bot_type,
+            'chat_id': user_data.get('chat_id'),
+            'usuario_nombre': f"{user_data.get('first_name') or ''} {user_data.get('last_name') or ''}".strip(),
+            'usuario_username': user_data.get('username'),
+            'empresa_id': empresa_id,
+            'estado_usuario': 'Autorizado' if has_access else 'No Autorizado',
+            'mensaje': mensaje,
+            'respuesta': respuesta,
+            'comando': command,
+            'response_time_ms': response_time_ms,
+            'error': error
+        }
+        self._publicar('conversacion', datos)
+        if not has_access:
+            self._publicar('acceso_denegado', {
+                'timestamp': datos['timestamp'],
+                'bot_tipo': bot_type,
+                'chat_id': datos['chat_id'],
+                'usuario_nombre': datos['usuario_nombre'],
+                'usuario_username': datos['usuario_username'],
+                'empresa_id': None,
+                'mensaje': mensaje
+            })
+
+    async def _ciclo_stats(self):
+        while self._suscriptores:
+            await asyncio.sleep(self.intervalo_stats)
+            delta, self._delta = self._delta, self._delta_vacio()
+            if delta['mensajes']:
+                self._publicar('stats', {'timestamp': datetime.now().isoformat(), 'delta': delta})
+
+    async def suscribir(
+        self,
+        bot_type: Optional[str] = None,
+        empresa_id: Optional[str] = None,
+        eventos: Optional[Set[str]] = None,
+        heartbeat: float = 15.0
+    ) -> AsyncIterator[Optional[Dict[str, Any]]]:
+        """
+        Iterar eventos para un suscriptor; produce None cada `heartbeat`
+        segundos sin eventos. Al cerrar el iterador se desuscribe.
+        """
+        suscriptor = Suscriptor(self.max_eventos, bot_type, empresa_id, eventos)
+        self._suscriptores.add(suscriptor)
+        SUSCRIPTORES.set(len(self._suscriptores))
+        if self._tarea_stats is None or self._tarea_stats.done():
+            self._delta = self._delta_vacio()
+            self._tarea_stats = asyncio.create_task(self._ciclo_stats())
+        logger.info(f"📡 Suscriptor conectado al feed ({len(self._suscriptores)} activos)")
+
+        try:
+            while True:
+                yield await suscriptor.siguiente(heartbeat)
+        finally:
+            self._suscriptores.discard(suscriptor)
+            SUSCRIPTORES.set(len(self._suscriptores))
+            logger.info(f"📡 Suscriptor desconectado del feed ({len(self._suscriptores)} activos)")
+
+
+# Instancia global
+_feed_en_vivo = None
+
+
+def get_feed_en_vivo() -> FeedEnVivo:
+    """Obtener instancia del feed en vivo"""
+    global _feed_en_vivo
+    if _feed_en_vivo is None:
+        _feed_en_vivo = FeedEnVivo()
+    return _feed_en_vivo
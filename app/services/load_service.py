@@ -0,0 +1,220 @@
+"""
+🚦 Control de Carga
+Detecta saturación (updates en curso, espera en cola, latencia de OpenAI y Supabase) y activa modos degradados
+"""
+
+import time
+import asyncio
+import logging
+import threading
+from collections import deque
+from typing import Any, Dict, Optional
+
+from app.config import Config
+from app.utils.metrics import get_registro_metricas
+
+logger = logging.getLogger(__name__)
+
+registro = get_registro_metricas()
+ESPERA_COLA = registro.histograma(
+    'aca_update_queue_wait_ms', 'Tiempo de los updates en la cola antes de procesarse', ('bot',),
+    buckets=(10, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+)
+MODO_DEGRADADO = registro.medidor(
+    'aca_load_degraded_mode', 'Modos degradados activos (1) por sobrecarga', ('modo',)
+)
+RESPUESTAS_DEGRADADAS = registro.contador(
+    'aca_load_shed_total', 'Operaciones resueltas en modo degradado', ('modo',)
+)
+
+# Modos degradados y las señales que los activan
+MODO_INTENCION = 'intencion'  # reglas en vez de extract_file_intent
+MODO_ASESOR = 'asesor'        # respuesta con metadatos en vez de Assistants/completions
+MODO_REGISTRO = 'registro'    # registro de conversaciones diferido
+MODOS = (MODO_INTENCION, MODO_ASESOR, MODO_REGISTRO)
+
+# Vida media de las señales suavizadas: sin nuevas observaciones decaen solas
+VIDA_MEDIA_SENAL_SECONDS = 10.0
+ALFA_SENAL = 0.3
+
+
+class Senal:
+    """Media móvil exponencial que además decae con el tiempo sin observaciones"""
+
+    def __init__(self, vida_media: float = VIDA_MEDIA_SENAL_SECONDS, alfa: float = ALFA_SENAL):
+        self.vida_media = vida_media
+        self.alfa = alfa
+        self._valor = 0.0
+        self._instante = time.monotonic()
+
+    def _decaer(self, ahora: float) -> float:
+        return self._valor * 0.5 ** ((ahora - self._instante) / self.vida_media)
+
+    def observar(self, valor: float):
+        ahora = time.monotonic()
+        actual = self._decaer(ahora)
+        self._valor = actual + self.alfa * (valor - actual)
+        self._instante = ahora
+
+    def valor(self) -> float:
+        return self._decaer(time.monotonic())
+
+
+class ControladorCarga:
+    """
+    Decide cuándo responder con menos trabajo para no acumular esperas.
+
+    Señales: updates en cola o en proceso, espera en la cola (medida por
+    ColaUpdates), y latencia de chat.completions y de Supabase. Superar un
+    umbral activa los modos que alivian esa dependencia; un modo sigue
+    activo `recuperacion_segundos` después de la última vez que una señal lo
+    pidió, para no oscilar entre respuestas completas y reducidas.
+    """
+
+    def __init__(
+        self,
+        habilitado: bool = None,
+        max_en_curso: int = None,
+        espera_max_ms: float = None,
+        openai_max_ms: float = None,
+        supabase_max_ms: float = None,
+        recuperacion_segundos: float = None
+    ):
+        self.habilitado = Config.CARGA_ENABLED if habilitado is None else habilitado
+        self.max_en_curso = max_en_curso or Config.CARGA_MAX_EN_CURSO
+        self.espera_max_ms = espera_max_ms or Config.CARGA_ESPERA_MAX_MS
+        self.openai_max_ms = openai_max_ms or Config.CARGA_OPENAI_MAX_MS
+        self.supabase_max_ms = supabase_max_ms or Config.CARGA_SUPABASE_MAX_MS
+        self.recuperacion_segundos = (Config.CARGA_RECUPERACION_SECONDS
+                                      if recuperacion_segundos is None else recuperacion_segundos)
+        self.espera = Senal()
+        self.latencias = {'openai': Senal(), 'supabase': Senal()}
+        self._en_proceso = 0
+        self._colas = []
+        self._activo_hasta: Dict[str, float] = {modo: 0.0 for modo in MODOS}
+        self._lock = threading.Lock()
+
+    # ============================================
+    # SEÑALES
+    # ============================================
+
+    def registrar_cola(self, cola: 'ColaUpdates'):
+        with self._lock:
+            self._colas.append(cola)
+
+    def entrar(self):
+        with self._lock:
+            self._en_proceso += 1
+
+    def salir(self):
+        with self._lock:
+            self._en_proceso = max(0, self._en_proceso - 1)
+
+    def _en_curso(self) -> int:
+        return self._en_proceso + sum(cola.qsize() for cola in self._colas)
+
+    def en_curso(self) -> int:
+        """Updates en proceso más los que esperan en las colas"""
+        with self._lock:
+            return self._en_curso()
+
+    def observar_espera(self, bot_type: str, espera_ms: float):
+        ESPERA_COLA.observar(espera_ms, bot=bot_type)
+        with self._lock:
+            self.espera.observar(espera_ms)
+
+    def observar_dependencia(self, dependencia: str, latencia_ms: float):
+        """Latencia de una llamada a 'openai' o 'supabase' (se llama también desde hilos)"""
+        senal = self.latencias.get(dependencia)
+        if senal is not None:
+            with self._lock:
+                senal.observar(latencia_ms)
+
+    # ============================================
+    # DECISIÓN
+    # ============================================
+
+    def degradado(self, modo: str) -> bool:
+        """Si la operación debe resolverse en su modo degradado ahora"""
+        if not self.habilitado:
+            return False
+        ahora = time.monotonic()
+        with self._lock:
+            for nombre, pedido in self._evaluar().items():
+                if pedido:
+                    if self._activo_hasta[nombre] <= ahora:
+                        logger.warning(f"🚦 Sobrecarga: modo degradado '{nombre}' activado ({self._resumen()})")
+                    self._activo_hasta[nombre] = ahora + self.recuperacion_segundos
+                MODO_DEGRADADO.set(1 if self._activo_hasta[nombre] > ahora else 0, modo=nombre)
+            activo = self._activo_hasta.get(modo, 0.0) > ahora
+        if activo:
+            RESPUESTAS_DEGRADADAS.inc(modo=modo)
+        return activo
+
+    def _evaluar(self) -> Dict[str, bool]:
+        """Modos que piden las señales ahora (con el lock tomado)"""
+        saturado = self._en_curso() > self.max_en_curso or self.espera.valor() > self.espera_max_ms
+        openai_lento = self.latencias['openai'].valor() > self.openai_max_ms
+        supabase_lento = self.latencias['supabase'].valor() > self.supabase_max_ms
+        return {
+            MODO_INTENCION: saturado or openai_lento,
+            MODO_ASESOR: saturado or openai_lento,
+            MODO_REGISTRO: saturado or supabase_lento,
+        }
+
+    def _resumen(self) -> str:
+        return (f"en curso {self._en_curso()}, "
+                f"espera {self.espera.valor():.0f} ms, "
+                f"openai {self.latencias['openai'].valor():.0f} ms, "
+                f"supabase {self.latencias['supabase'].valor():.0f} ms")
+
+    def estado(self) -> Dict[str, Any]:
+        ahora = time.monotonic()
+        with self._lock:
+            return {
+                'habilitado': self.habilitado,
+                'en_curso': self._en_curso(),
+                'espera_ms': round(self.espera.valor(), 1),
+                'latencia_ms': {nombre: round(s.valor(), 1) for nombre, s in self.latencias.items()},
+                'modos': [modo for modo, hasta in self._activo_hasta.items() if hasta > ahora],
+            }
+
+
+class ColaUpdates(asyncio.Queue):
+    """
+    Cola de updates de un Application que mide cuánto espera cada uno.
+
+    Con el procesamiento secuencial de python-telegram-bot, un handler lento
+    deja a los siguientes esperando aquí: esa espera es la señal más directa
+    de saturación. Se pasa con ApplicationBuilder.update_queue().
+    """
+
+    def __init__(self, bot_type: str, controlador: Optional[ControladorCarga] = None):
+        super().__init__()
+        self.bot_type = bot_type
+        self.controlador = controlador or get_controlador_carga()
+        self._entradas = deque()
+        self.controlador.registrar_cola(self)
+
+    def _put(self, item):
+        super()._put(item)
+        self._entradas.append(time.monotonic())
+
+    def _get(self):
+        item = super()._get()
+        if self._entradas:
+            espera_ms = (time.monotonic() - self._entradas.popleft()) * 1000
+            self.controlador.observar_espera(self.bot_type, espera_ms)
+        return item
+
+
+# Instancia global
+_controlador_carga = None
+
+
+def get_controlador_carga() -> ControladorCarga:
+    """Obtener instancia del controlador de carga"""
+    global _controlador_carga
+    if _controlador_carga is None:
+        _controlador_carga = ControladorCarga()
+    return _controlador_carga
@@ -0,0 +1,276 @@
+"""
+📊 Servicio de Métricas (Prometheus)
+Métricas de bots, handlers y dependencias, más los colectores que se calculan al exponer /metrics
+"""
+
+import sys
+import time
+import asyncio
+import inspect
+import logging
+import resource
+from datetime import datetime
+from typing import List, Optional
+
+from app.utils.metrics import get_registro_metricas, formatear_etiquetas, formatear_histograma
+from app.utils.tracing import span
+from app.services.load_service import get_controlador_carga
+
+logger = logging.getLogger(__name__)
+
+registro = get_registro_metricas()
+
+# ============================================
+# MÉTRICAS
+# ============================================
+
+UPDATES_PROCESADOS = registro.contador(
+    'aca_telegram_updates_total', 'Updates de Telegram procesados por bot y handler', ('bot', 'handler')
+)
+UPDATES_EN_CURSO = registro.medidor(
+    'aca_telegram_updates_in_flight', 'Updates de Telegram en proceso', ('bot',)
+)
+LATENCIA_HANDLER = registro.histograma(
+    'aca_handler_response_time_ms', 'Tiempo de respuesta de handlers (response_time_ms de log_conversation)',
+    ('bot', 'handler')
+)
+ERRORES_HANDLER = registro.contador(
+    'aca_handler_errors_total', 'Handlers que terminaron con excepción', ('bot', 'handler')
+)
+LATENCIA_OPENAI = registro.histograma(
+    'aca_openai_request_duration_ms', 'Duración de llamadas a OpenAI', ('operacion',)
+)
+ERRORES_OPENAI = registro.contador(
+    'aca_openai_errors_total', 'Llamadas a OpenAI con error', ('operacion',)
+)
+CONSULTAS_CACHE = registro.contador(
+    'aca_cache_requests_total', 'Consultas a caches en memoria', ('cache', 'resultado')
+)
+LAG_EVENT_LOOP = registro.histograma(
+    'aca_event_loop_lag_ms', 'Retraso del event loop respecto a un sleep programado', (),
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+)
+ULTIMO_LAG_EVENT_LOOP = registro.medidor(
+    'aca_event_loop_lag_last_ms', 'Último retraso medido del event loop'
+)
+
+# Cada cuánto se vuelve a contar la tabla de sesiones (evita una consulta por scrape)
+SESIONES_TTL_SEGUNDOS = 30
+INTERVALO_MONITOR_LOOP_SEGUNDOS = 0.5
+
+
+def observar_handler(bot_type: str, handler: str, response_time_ms: float, error: bool = False):
+    """Registrar la latencia (y error) de un handler"""
+    LATENCIA_HANDLER.observar(response_time_ms, bot=bot_type, handler=handler)
+    if error:
+        ERRORES_HANDLER.inc(bot=bot_type, handler=handler)
+
+
+def registrar_cache(cache: str, acierto: bool):
+    """Registrar un hit/miss de una cache en memoria"""
+    CONSULTAS_CACHE.inc(cache=cache, resultado='hit' if acierto else 'miss')
+
+
+# ============================================
+# INSTRUMENTACIÓN DE OPENAI
+# ============================================
+
+class _RecursoOpenAIInstrumentado:
+    """Proxy de un recurso de AsyncOpenAI que mide las corrutinas que devuelve"""
+
+    def __init__(self, recurso, ruta: str):
+        self._recurso = recurso
+        self._ruta = ruta
+
+    def __getattr__(self, nombre: str):
+        atributo = getattr(self._recurso, nombre)
+        ruta = f"{self._ruta}.{nombre}" if self._ruta else nombre
+
+        if callable(atributo):
+            def llamada(*args, **kwargs):
+                resultado = atributo(*args, **kwargs)
+                if inspect.iscoroutine(resultado):
+                    return self._medir(resultado, ruta)
+                return resultado
+            return llamada
+
+        if type(atributo).__module__.startswith('openai.resources'):
+            return _RecursoOpenAIInstrumentado(atributo, ruta)
+        return atributo
+
+    @staticmethod
+    async def _medir(corrutina, operacion: str):
+        inicio = time.perf_counter()
+        try:
+            with span(f"openai.{operacion}"):
+                return await corrutina
+        except Exception:
+            ERRORES_OPENAI.inc(operacion=operacion)
+            raise
+        finally:
+            latencia_ms = (time.perf_counter() - inicio) * 1000
+            LATENCIA_OPENAI.observar(latencia_ms, operacion=operacion)
+            # Solo las completions miden la salud de OpenAI (un run de Assistants tarda por diseño)
+            if operacion == 'chat.completions.create':
+                get_controlador_carga().observar_dependencia('openai', latencia_ms)
+
+
+def instrumentar_openai(cliente):
+    """
+    Envolver un cliente AsyncOpenAI para medir cada llamada.
+
+    La operación se etiqueta con la ruta del recurso, p. ej.
+    'chat.completions.create' o 'beta.threads.runs.create_and_poll'.
+    """
+    if cliente is None or isinstance(cliente, _RecursoOpenAIInstrumentado):
+        return cliente
+    return _RecursoOpenAIInstrumentado(cliente, '')
+
+
+# ============================================
+# EVENT LOOP
+# ============================================
+
+_tarea_monitor_loop: Optional[asyncio.Task] = None
+
+
+async def _monitorear_event_loop(intervalo: float):
+    loop = asyncio.get_running_loop()
+    while True:
+        inicio = loop.time()
+        await asyncio.sleep(intervalo)
+        lag_ms = max(0.0, (loop.time() - inicio - intervalo) * 1000)
+        LAG_EVENT_LOOP.observar(lag_ms)
+        ULTIMO_LAG_EVENT_LOOP.set(lag_ms)
+
+
+def iniciar_monitor_event_loop(intervalo: float = INTERVALO_MONITOR_LOOP_SEGUNDOS):
+    """Iniciar la tarea que mide el lag del event loop (idempotente)"""
+    global _tarea_monitor_loop
+    if _tarea_monitor_loop is None or _tarea_monitor_loop.done():
+        _tarea_monitor_loop = asyncio.create_task(_monitorear_event_loop(intervalo))
+        logger.info("📊 Monitor de event loop iniciado")
+
+
+async def detener_monitor_event_loop():
+    """Detener la tarea de monitoreo del event loop"""
+    global _tarea_monitor_loop
+    if _tarea_monitor_loop and not _tarea_monitor_loop.done():
+        _tarea_monitor_loop.cancel()
+        try:
+            await _tarea_monitor_loop
+        except asyncio.CancelledError:
+            pass
+    _tarea_monitor_loop = None
+
+
+# ============================================
+# COLECTORES (se calculan al exponer)
+# ============================================
+
+def _rss_actual_bytes() -> Optional[int]:
+    """RSS actual desde /proc (solo Linux)"""
+    try:
+        with open('/proc/self/statm') as f:
+            paginas = int(f.read().split()[1])
+        return paginas * resource.getpagesize()
+    except Exception:
+        return None
+
+
+def _colector_proceso() -> List[str]:
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    maxrss_bytes = maxrss if sys.platform == 'darwin' else maxrss * 1024
+    rss = _rss_actual_bytes()
+
+    lineas = [
+        "# HELP aca_process_resident_memory_bytes RSS actual del proceso",
+        "# TYPE aca_process_resident_memory_bytes gauge",
+        f"aca_process_resident_memory_bytes {rss if rss is not None else maxrss_bytes}",
+        "# HELP aca_process_max_resident_memory_bytes RSS máximo del proceso",
+        "# TYPE aca_process_max_resident_memory_bytes gauge",
+        f"aca_process_max_resident_memory_bytes {maxrss_bytes}",
+    ]
+    return lineas
+
+
+def _colector_cache() -> List[str]:
+    caches = {}
+    for (cache, resultado), valor in CONSULTAS_CACHE.valores().items():
+        caches.setdefault(cache, {'hit': 0, 'miss': 0})[resultado] = valor
+
+    lineas = [
+        "# HELP aca_cache_hit_ratio Proporción de aciertos por cache",
+        "# TYPE aca_cache_hit_ratio gauge",
+    ]
+    for cache, conteo in sorted(caches.items()):
+        total = conteo['hit'] + conteo['miss']
+        ratio = conteo['hit'] / total if total else 0
+        lineas.append(f"aca_cache_hit_ratio{formatear_etiquetas({'cache': cache})} {round(ratio, 4)}")
+    return lineas
+
+
+def _colector_supabase() -> List[str]:
+    from app.database.instrumentation import get_registro_consultas
+
+    consultas = get_registro_consultas().latencias_por_consulta()
+    lineas = [
+        "# HELP aca_supabase_request_duration_ms Duración de llamadas a Supabase (tablas, RPC y Storage)",
+        "# TYPE aca_supabase_request_duration_ms histogram",
+    ]
+    for tabla, operacion, histograma, _ in consultas:
+        lineas.extend(formatear_histograma(
+            'aca_supabase_request_duration_ms', histograma, {'tabla': tabla, 'operacion': operacion}
+        ))
+
+    lineas += [
+        "# HELP aca_supabase_errors_total Llamadas a Supabase con error",
+        "# TYPE aca_supabase_errors_total counter",
+    ]
+    for tabla, operacion, _, errores in consultas:
+        etiquetas = formatear_etiquetas({'tabla': tabla, 'operacion': operacion})
+        lineas.append(f"aca_supabase_errors_total{etiquetas} {errores}")
+    return lineas
+
+
+_sesiones_cache = {'valor': None, 'timestamp': 0.0}
+
+
+def _contar_sesiones_activas() -> Optional[int]:
+    ahora = time.time()
+    if ahora - _sesiones_cache['timestamp'] < SESIONES_TTL_SEGUNDOS:
+        return _sesiones_cache['valor']
+
+    _sesiones_cache['timestamp'] = ahora
+    try:
+        from app.database.supabase import get_supabase_client
+        result = get_supabase_client().table('sesiones_conversacion')\
+            .select('id', count='exact', head=True)\
+            .gt('expires_at', datetime.now().isoformat())\
+            .execute()
+        _sesiones_cache['valor'] = result.count or 0
+    except Exception as e:
+        logger.error(f"❌ Error contando sesiones activas: {e}")
+    return _sesiones_cache['valor']
+
+
+def _colector_sesiones() -> List[str]:
+    activas = _contar_sesiones_activas()
+    if activas is None:
+        return []
+    return [
+        "# HELP aca_sessions_active Sesiones conversacionales no expiradas",
+        "# TYPE aca_sessions_active gauge",
+        f"aca_sessions_active {activas}",
+    ]
+
+
+registro.agregar_colector(_colector_proceso)
+registro.agregar_colector(_colector_cache)
+registro.agregar_colector(_colector_supabase)
+registro.agregar_colector(_colector_sesiones)
+
+
+def exponer_metricas() -> str:
+    """Texto completo para /metrics"""
+    return registro.exponer()
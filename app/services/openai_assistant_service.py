@@ -61,7 +61,8 @@ class OpenAIAssistantService:
                 import openai
                 logger.info(f"📦 openai version: {openai.__version__}")
                 from openai import AsyncOpenAI
-                self.client = AsyncOpenAI(api_key=self.api_key)
+                from app.services.metrics_service import instrumentar_openai
+                self.client = instrumentar_openai(AsyncOpenAI(api_key=self.api_key))
                 logger.info(f"✅ OpenAI Assistant Service OK - client: {type(self.client)}")
             except ImportError as e:
                 logger.error(f"❌ openai NO INSTALADO: {e}")
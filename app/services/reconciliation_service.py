@@ -0,0 +1,177 @@
+"""
+🧾 Servicio de Conciliación de Archivos
+Detecta objetos de Storage y archivos de OpenAI sin registro activo en `archivos` (y registros sin su objeto)
+"""
+
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Set
+
+from app.config import Config
+from app.database.supabase import get_supabase_client
+from app.utils.metrics import get_registro_metricas
+from app.utils.pagination import aplicar_keyset, pagina
+
+logger = logging.getLogger(__name__)
+
+HUERFANOS = get_registro_metricas().medidor(
+    'aca_reconciliation_orphans', 'Huérfanos encontrados en la última conciliación', ('destino', 'tipo')
+)
+
+CARPETA_UPLOADS = 'uploads'
+TAMANO_PAGINA = 1000
+
+
+def _fecha(valor: Any) -> Optional[datetime]:
+    if isinstance(valor, (int, float)):
+        return datetime.fromtimestamp(valor, tz=timezone.utc)
+    if isinstance(valor, str):
+        try:
+            return datetime.fromisoformat(valor.replace('Z', '+00:00'))
+        except ValueError:
+            return None
+    return None
+
+
+class ReconciliationService:
+    """
+    Conciliación entre `archivos` y sus copias en Storage y OpenAI.
+
+    Un objeto es huérfano si ningún archivo activo lo referencia y es más
+    antiguo que CONCILIACION_GRACIA_HORAS (evita carreras con subidas en curso).
+    Solo se eliminan con CONCILIACION_ELIMINAR_HUERFANOS=true; si no, se
+    reportan en el log y en la métrica aca_reconciliation_orphans. Los
+    registros cuyo objeto ya no existe solo se reportan.
+    """
+
+    def __init__(self, eliminar: bool = None, gracia_horas: int = None):
+        self.supabase = get_supabase_client()
+        self.bucket_name = Config.SUPABASE_STORAGE_BUCKET
+        self.eliminar = Config.CONCILIACION_ELIMINAR_HUERFANOS if eliminar is None else eliminar
+        self.gracia = timedelta(hours=Config.CONCILIACION_GRACIA_HORAS if gracia_horas is None else gracia_horas)
+
+    def _leer_archivos_activos(self) -> List[Dict[str, Any]]:
+        filas = []
+        cursor = None
+        while True:
+            query = self.supabase.table('archivos')\
+                .select('id, storage_path, openai_file_id, created_at')\
+                .eq('activo', True)
+            result = aplicar_keyset(query, cursor, desc=False).limit(TAMANO_PAGINA + 1).execute()
+            bloque, cursor = pagina(result.data or [], TAMANO_PAGINA)
+            filas.extend(bloque)
+            if not cursor:
+                return filas
+
+    def _listar_carpeta(self, bucket, carpeta: str) -> List[Dict[str, Any]]:
+        elementos = []
+        offset = 0
+        while True:
+            bloque = bucket.list(carpeta, {'limit': TAMANO_PAGINA, 'offset': offset}) or []
+            elementos.extend(bloque)
+            if len(bloque) < TAMANO_PAGINA:
+                return elementos
+            offset += TAMANO_PAGINA
+
+    def _listar_storage(self) -> Dict[str, Optional[datetime]]:
+        """Objetos bajo uploads/<chat_id>/ con su fecha de creación"""
+        bucket = self.supabase.client.storage.from_(self.bucket_name)
+        objetos = {}
+        for carpeta in self._listar_carpeta(bucket, CARPETA_UPLOADS):
+            # Las carpetas no tienen id
+            if carpeta.get('id') is not None:
+                continue
+            ruta_carpeta = f"{CARPETA_UPLOADS}/{carpeta['name']}"
+            for objeto in self._listar_carpeta(bucket, ruta_carpeta):
+                if objeto.get('id') is not None:
+                    objetos[f"{ruta_carpeta}/{objeto['name']}"] = _fecha(objeto.get('created_at'))
+        return objetos
+
+    def _vencido(self, creado: Optional[datetime]) -> bool:
+        return creado is None or creado < datetime.now(timezone.utc) - self.gracia
+
+    def conciliar_storage(self, archivos: List[Dict[str, Any]] = None) -> Dict[str, int]:
+        """Conciliar el bucket con los archivos activos"""
+        archivos = archivos if archivos is not None else self._leer_archivos_activos()
+        referenciados: Set[str] = {a['storage_path'] for a in archivos if a.get('storage_path')}
+        objetos = self._listar_storage()
+
+        huerfanos = [ruta for ruta, creado in objetos.items() if ruta not in referenciados and self._vencido(creado)]
+        faltantes = [a['id'] for a in archivos if a.get('storage_path') and a['storage_path'] not in objetos]
+
+        eliminados = 0
+        if huerfanos and self.eliminar:
+            bucket = self.supabase.client.storage.from_(self.bucket_name)
+            for inicio in range(0, len(huerfanos), 100):
+                lote = huerfanos[inicio:inicio + 100]
+                bucket.remove(lote)
+                eliminados += len(lote)
+
+        for ruta in huerfanos[:20]:
+            logger.warning(f"⚠️ Objeto de Storage sin archivo activo: {ruta}")
+        for archivo_id in faltantes[:20]:
+            logger.warning(f"⚠️ Archivo {archivo_id} sin objeto en Storage")
+
+        HUERFANOS.set(len(huerfanos), destino='storage', tipo='objeto')
+        HUERFANOS.set(len(faltantes), destino='storage', tipo='registro')
+        return {'objetos': len(objetos), 'huerfanos': len(huerfanos), 'eliminados': eliminados,
+                'registros_sin_objeto': len(faltantes)}
+
+    async def conciliar_openai(self, archivos: List[Dict[str, Any]] = None) -> Dict[str, int]:
+        """Conciliar los archivos 'assistants' de OpenAI con los archivos activos"""
+        from app.services.openai_assistant_service import get_assistant_service
+        assistant_service = get_assistant_service()
+        if not assistant_service.client:
+            return {}
+
+        if archivos is None:
+            archivos = await asyncio.to_thread(self._leer_archivos_activos)
+        referenciados = {a['openai_file_id'] for a in archivos if a.get('openai_file_id')}
+
+        existentes = set()
+        huerfanos = []
+        async for archivo in assistant_service.client.files.list(purpose='assistants'):
+            existentes.add(archivo.id)
+            if archivo.id not in referenciados and self._vencido(_fecha(archivo.created_at)):
+                huerfanos.append(archivo.id)
+        faltantes = [a['id'] for a in archivos if a.get('openai_file_id') and a['openai_file_id'] not in existentes]
+
+        eliminados = 0
+        if self.eliminar:
+            for file_id in huerfanos:
+                if await assistant_service.delete_file_from_openai(file_id):
+                    eliminados += 1
+
+        for file_id in huerfanos[:20]:
+            logger.warning(f"⚠️ Archivo de OpenAI sin archivo activo: {file_id}")
+        for archivo_id in faltantes[:20]:
+            logger.warning(f"⚠️ Archivo {archivo_id} con openai_file_id inexistente en OpenAI")
+
+        HUERFANOS.set(len(huerfanos), destino='openai', tipo='objeto')
+        HUERFANOS.set(len(faltantes), destino='openai', tipo='registro')
+        return {'archivos': len(existentes), 'huerfanos': len(huerfanos), 'eliminados': eliminados,
+                'registros_sin_objeto': len(faltantes)}
+
+    async def conciliar(self) -> Dict[str, Any]:
+        """Conciliar Storage y OpenAI leyendo `archivos` una sola vez"""
+        archivos = await asyncio.to_thread(self._leer_archivos_activos)
+        resumen = {'storage': await asyncio.to_thread(self.conciliar_storage, archivos)}
+        try:
+            resumen['openai'] = await self.conciliar_openai(archivos)
+        except Exception as e:
+            logger.error(f"❌ Error conciliando archivos de OpenAI: {e}")
+            resumen['openai'] = {'error': str(e)}
+        return resumen
+
+
+# Instancia global
+_reconciliation_service = None
+
+
+def get_reconciliation_service() -> ReconciliationService:
+    """Obtener instancia del servicio de conciliación"""
+    global _reconciliation_service
+    if _reconciliation_service is None:
+        _reconciliation_service = ReconciliationService()
+    return _reconciliation_service
@@ -0,0 +1,238 @@
+"""
+🗄️ Servicio de Retención de Conversaciones
+Archiva las particiones mensuales vencidas de conversaciones como gzip NDJSON en Storage y las rehidrata para auditorías
+"""
+
+import io
+import gzip
+import json
+import hashlib
+import logging
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional
+
+from app.config import Config
+from app.database.supabase import get_supabase_client
+from app.utils.pagination import aplicar_keyset, pagina
+from app.utils.particiones import TABLA_CONVERSACIONES, inicio_mes, sumar_meses, nombre_particion
+
+logger = logging.getLogger(__name__)
+
+TAMANO_PAGINA = 1000
+TAMANO_LOTE_REHIDRATAR = 500
+
+
+class RetentionService:
+    """
+    Ciclo de vida de las particiones de `conversaciones`.
+
+    - `asegurar_particiones`: crea por adelantado las particiones de los próximos meses
+    - `archivar_vencidas`: cada mes más antiguo que CONVERSACIONES_RETENCION_MESES se
+      exporta a `<carpeta>/<año>/conversaciones_AAAA_MM.ndjson.gz`, se verifica el
+      archivo subido (sha256) y recién entonces se elimina la partición
+    - `rehidratar`: vuelve a cargar un mes archivado en su partición
+    """
+
+    def __init__(self, retencion_meses: int = None, carpeta: str = None):
+        self.supabase = get_supabase_client()
+        self.retencion_meses = max(1, retencion_meses or Config.CONVERSACIONES_RETENCION_MESES)
+        self.carpeta = (carpeta or Config.CONVERSACIONES_ARCHIVO_CARPETA).strip('/')
+        self.bucket_name = Config.SUPABASE_STORAGE_BUCKET
+
+    @property
+    def _bucket(self):
+        return self.supabase.client.storage.from_(self.bucket_name)
+
+    def ruta_archivo(self, mes: date) -> str:
+        """Ruta en el bucket del archivo de un mes"""
+        return f"{self.carpeta}/{mes.year:04d}/{nombre_particion(mes)}.ndjson.gz"
+
+    # ============================================
+    # PARTICIONES
+    # ============================================
+
+    def asegurar_particiones(self, meses_adelante: int = 3) -> int:
+        """Crear las particiones del mes actual y los siguientes (idempotente)"""
+        result = self.supabase.client.rpc(
+            'asegurar_particiones_conversaciones', {'p_meses_adelante': meses_adelante}
+        ).execute()
+        creadas = result.data or 0
+        if creadas:
+            logger.info(f"🗂️ Particiones de conversaciones creadas: {creadas}")
+        return creadas
+
+    def listar_particiones(self) -> List[Dict[str, Any]]:
+        """Particiones mensuales con filas estimadas y tamaño en bytes"""
+        result = self.supabase.client.rpc('listar_particiones_conversaciones').execute()
+        particiones = []
+        for fila in result.data or []:
+            fila['mes'] = date.fromisoformat(fila['mes'])
+            particiones.append(fila)
+        return particiones
+
+    def particiones_vencidas(self, hoy: Optional[date] = None) -> List[Dict[str, Any]]:
+        """Particiones de meses anteriores a la ventana de retención"""
+        limite = sumar_meses(inicio_mes(hoy or date.today()), -self.retencion_meses)
+        return [p for p in self.listar_particiones() if p['mes'] < limite]
+
+    def get_archivados(self) -> List[Dict[str, Any]]:
+        """Meses archivados en Storage según el catálogo"""
+        result = self.supabase.table('conversaciones_archivo')\
+            .select('*')\
+            .order('mes', desc=True)\
+            .execute()
+        return result.data or []
+
+    # ============================================
+    # ARCHIVO
+    # ============================================
+
+    def _exportar_mes(self, mes: date) -> tuple:
+        """
+        Comprimir un mes completo en memoria (gzip NDJSON, orden cronológico).
+
+        Lee a través de `conversaciones` acotado al mes: PostgreSQL poda al
+        resto de las particiones y no depende de que PostgREST conozca la
+        partición por nombre.
+        """
+        desde = mes.isoformat()
+        hasta = sumar_meses(mes, 1).isoformat()
+        buffer = io.BytesIO()
+        filas = 0
+        cursor = None
+        with gzip.GzipFile(fileobj=buffer, mode='wb', mtime=0) as salida:
+            while True:
+                query = self.supabase.table(TABLA_CONVERSACIONES)\
+                    .select('*')\
+                    .gte('created_at', desde)\
+                    .lt('created_at', hasta)
+                result = aplicar_keyset(query, cursor, desc=False).limit(TAMANO_PAGINA + 1).execute()
+                bloque, cursor = pagina(result.data or [], TAMANO_PAGINA)
+                for fila in bloque:
+                    salida.write(json.dumps(fila, ensure_ascii=False, default=str).encode('utf-8'))
+                    salida.write(b'\n')
+                filas += len(bloque)
+                if not cursor:
+                    break
+        return buffer.getvalue(), filas
+
+    def archivar_particion(self, particion: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Archivar una partición y eliminarla de la BD.
+
+        Returns:
+            Fila del catálogo o None si algo falló (la partición queda intacta)
+        """
+        nombre = particion['particion']
+        mes = particion['mes']
+        ruta = self.ruta_archivo(mes)
+        try:
+            contenido, filas = self._exportar_mes(mes)
+            sha256 = hashlib.sha256(contenido).hexdigest()
+
+            self._bucket.upload(
+                path=ruta,
+                file=contenido,
+                file_options={'content-type': 'application/gzip', 'upsert': 'true'}
+            )
+            if hashlib.sha256(self._bucket.download(ruta)).hexdigest() != sha256:
+                logger.error(f"❌ El archivo subido de {nombre} no coincide; no se elimina la partición")
+                return None
+
+            registro = {
+                'mes': mes.isoformat(),
+                'particion': nombre,
+                'storage_path': ruta,
+                'filas': filas,
+                'bytes': len(contenido),
+                'sha256': sha256,
+                'archivado_at': datetime.now().isoformat(),
+                'rehidratado_at': None
+            }
+            self.supabase.table('conversaciones_archivo').upsert(registro, on_conflict='mes').execute()
+
+            eliminada = self.supabase.client.rpc('eliminar_particion_conversaciones', {
+                'p_particion': nombre,
+                'p_filas_esperadas': filas
+            }).execute()
+            if not eliminada.data:
+                logger.warning(f"⚠️ {nombre} cambió durante el archivo; se reintentará en el próximo ciclo")
+                return None
+
+            logger.info(f"🗄️ {nombre} archivada en {ruta} ({filas} filas, {len(contenido)} bytes)")
+            return registro
+
+        except Exception as e:
+            logger.error(f"❌ Error archivando {nombre}: {e}")
+            return None
+
+    def archivar_vencidas(self, dry_run: bool = False, hoy: Optional[date] = None) -> List[Dict[str, Any]]:
+        """
+        Archivar todas las particiones fuera de la ventana de retención.
+
+        Returns:
+            Particiones archivadas (o las que se archivarían con dry_run)
+        """
+        vencidas = self.particiones_vencidas(hoy)
+        if dry_run:
+            return vencidas
+
+        archivadas = []
+        for particion in vencidas:
+            registro = self.archivar_particion(particion)
+            if registro:
+                archivadas.append(registro)
+        return archivadas
+
+    # ============================================
+    # REHIDRATACIÓN
+    # ============================================
+
+    def rehidratar(self, mes: date) -> int:
+        """
+        Volver a cargar un mes archivado en su partición (para auditorías).
+
+        El mes queda visible para todas las consultas y se vuelve a archivar en
+        el próximo ciclo de retención si sigue fuera de la ventana.
+
+        Returns:
+            Filas cargadas
+        """
+        mes = inicio_mes(mes)
+        catalogo = self.supabase.table('conversaciones_archivo')\
+            .select('*')\
+            .eq('mes', mes.isoformat())\
+            .execute()
+        if not catalogo.data:
+            raise ValueError(f"No hay archivo de conversaciones para {mes.strftime('%Y-%m')}")
+        registro = catalogo.data[0]
+
+        contenido = self._bucket.download(registro['storage_path'])
+        if hashlib.sha256(contenido).hexdigest() != registro['sha256']:
+            raise ValueError(f"El archivo {registro['storage_path']} no coincide con su sha256")
+
+        self.supabase.client.rpc('crear_particion_conversaciones', {'p_mes': mes.isoformat()}).execute()
+
+        filas = [json.loads(linea) for linea in gzip.decompress(contenido).splitlines() if linea.strip()]
+        for inicio in range(0, len(filas), TAMANO_LOTE_REHIDRATAR):
+            lote = filas[inicio:inicio + TAMANO_LOTE_REHIDRATAR]
+            self.supabase.table(TABLA_CONVERSACIONES).upsert(lote, on_conflict='id,created_at').execute()
+
+        self.supabase.table('conversaciones_archivo')\
+            .update({'rehidratado_at': datetime.now().isoformat()})\
+            .eq('mes', mes.isoformat())\
+            .execute()
+        logger.info(f"🗄️ {registro['particion']} rehidratada ({len(filas)} filas)")
+        return len(filas)
+
+
+# Instancia global
+_retention_service = None
+
+
+def get_retention_service() -> RetentionService:
+    """Obtener instancia del servicio de retención"""
+    global _retention_service
+    if _retention_service is None:
+        _retention_service = RetentionService()
+    return _retention_service
@@ -0,0 +1,259 @@
+"""
+⏰ Programador de Tareas de Mantenimiento
+Ejecuta tareas periódicas en el proceso (sesiones expiradas, rollups, retención, conciliación) con jitter y una sola réplica por tarea
+"""
+
+import os
+import time
+import uuid
+import random
+import socket
+import asyncio
+import inspect
+import logging
+from typing import Any, Callable, Dict, List, Optional
+
+from app.config import Config
+from app.database.supabase import get_supabase_client
+from app.utils.metrics import get_registro_metricas
+
+logger = logging.getLogger(__name__)
+
+registro = get_registro_metricas()
+
+DURACION_TAREA = registro.histograma(
+    'aca_scheduler_job_duration_ms', 'Duración de las tareas programadas', ('tarea',),
+    buckets=(10, 50, 100, 500, 1000, 5000, 15000, 60000, 300000)
+)
+EJECUCIONES_TAREA = registro.contador(
+    'aca_scheduler_job_runs_total', 'Ejecuciones de tareas programadas por resultado (ok, error, omitida)',
+    ('tarea', 'resultado')
+)
+ULTIMO_EXITO_TAREA = registro.medidor(
+    'aca_scheduler_job_last_success_timestamp_seconds', 'Momento de la última ejecución exitosa', ('tarea',)
+)
+
+
+class Tarea:
+    """Una tarea periódica del programador"""
+
+    __slots__ = ('nombre', 'funcion', 'intervalo', 'exclusiva', 'timeout', 'ultima_duracion_ms',
+                 'ultimo_resultado', 'ultimo_error', 'ejecuciones')
+
+    def __init__(self, nombre: str, funcion: Callable, intervalo: float, exclusiva: bool, timeout: float):
+        self.nombre = nombre
+        self.funcion = funcion
+        self.intervalo = intervalo
+        self.exclusiva = exclusiva
+        self.timeout = timeout
+        self.ultima_duracion_ms: Optional[float] = None
+        self.ultimo_resultado: Optional[str] = None
+        self.ultimo_error: Optional[str] = None
+        self.ejecuciones = 0
+
+
+class Programador:
+    """
+    Programador de tareas en el event loop de la aplicación.
+
+    - Cada tarea corre en su propio ciclo con `intervalo ± jitter` (y un primer
+      retraso aleatorio) para que las réplicas no consulten la BD al unísono.
+    - Las tareas `exclusivas` se reservan con `tomar_tarea_programada`
+      (advisory lock + lease en tareas_programadas): entre todas las réplicas
+      se ejecutan una vez por intervalo. Las no exclusivas actúan sobre estado
+      del proceso (p. ej. rollups en memoria) y corren en cada réplica.
+    - Las funciones síncronas (cliente Supabase) corren en un hilo.
+    """
+
+    def __init__(self, jitter: float = None):
+        self.jitter = Config.SCHEDULER_JITTER if jitter is None else jitter
+        self.duenio = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._tareas: Dict[str, Tarea] = {}
+        self._ciclos: List[asyncio.Task] = []
+
+    def registrar(
+        self,
+        nombre: str,
+        funcion: Callable,
+        intervalo: float,
+        exclusiva: bool = True,
+        timeout: Optional[float] = None
+    ) -> Tarea:
+        """
+        Registrar una tarea periódica.
+
+        Args:
+            nombre: Identificador (también en métricas y en tareas_programadas)
+            funcion: Función síncrona o corrutina sin argumentos
+            intervalo: Segundos entre ejecuciones
+            exclusiva: Una sola réplica por intervalo
+            timeout: Segundos tras los que otra réplica puede retomar una ejecución colgada
+        """
+        tarea = Tarea(nombre, funcion, intervalo, exclusiva, timeout or max(intervalo, 60))
+        self._tareas[nombre] = tarea
+        return tarea
+
+    def _espera(self, intervalo: float) -> float:
+        return intervalo * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    # ============================================
+    # RESERVA ENTRE RÉPLICAS
+    # ============================================
+
+    def _tomar(self, tarea: Tarea) -> bool:
+        try:
+            result = get_supabase_client().client.rpc('tomar_tarea_programada', {
+                'p_tarea': tarea.nombre,
+                'p_duenio': self.duenio,
+                'p_espaciado_segundos': int(tarea.intervalo * (1 - self.jitter) * 0.9),
+                'p_timeout_segundos': int(tarea.timeout)
+            }).execute()
+            return bool(result.data)
+        except Exception as e:
+            logger.error(f"❌ No se pudo reservar la tarea {tarea.nombre}: {e}")
+            return False
+
+    def _finalizar(self, tarea: Tarea):
+        try:
+            get_supabase_client().client.rpc('finalizar_tarea_programada', {
+                'p_tarea': tarea.nombre,
+                'p_duenio': self.duenio,
+                'p_duracion_ms': int(tarea.ultima_duracion_ms or 0),
+                'p_resultado': tarea.ultimo_resultado,
+                'p_error': tarea.ultimo_error
+            }).execute()
+        except Exception as e:
+            logger.error(f"❌ No se pudo liberar la tarea {tarea.nombre}: {e}")
+
+    # ============================================
+    # EJECUCIÓN
+    # ============================================
+
+    async def ejecutar(self, nombre: str) -> Optional[Any]:
+        """Ejecutar una tarea ahora (respetando la reserva si es exclusiva)"""
+        tarea = self._tareas[nombre]
+        if tarea.exclusiva and not await asyncio.to_thread(self._tomar, tarea):
+            EJECUCIONES_TAREA.inc(tarea=nombre, resultado='omitida')
+            return None
+
+        inicio = time.perf_counter()
+        resultado = None
+        try:
+            if inspect.iscoroutinefunction(tarea.funcion):
+                resultado = await tarea.funcion()
+            else:
+                resultado = await asyncio.to_thread(tarea.funcion)
+            tarea.ultimo_resultado = 'ok'
+            tarea.ultimo_error = None
+            ULTIMO_EXITO_TAREA.set(time.time(), tarea=nombre)
+        except Exception as e:
+            tarea.ultimo_resultado = 'error'
+            tarea.ultimo_error = str(e)
+            logger.error(f"❌ Error en tarea programada {nombre}: {e}")
+        finally:
+            tarea.ultima_duracion_ms = (time.perf_counter() - inicio) * 1000
+            tarea.ejecuciones += 1
+            DURACION_TAREA.observar(tarea.ultima_duracion_ms, tarea=nombre)
+            EJECUCIONES_TAREA.inc(tarea=nombre, resultado=tarea.ultimo_resultado or 'error')
+            if tarea.exclusiva:
+                await asyncio.to_thread(self._finalizar, tarea)
+
+        if tarea.ultimo_resultado == 'ok':
+            logger.info(f"⏰ Tarea {nombre} completada en {tarea.ultima_duracion_ms:.0f}ms: {resultado}")
+        return resultado
+
+    async def _ciclo(self, tarea: Tarea):
+        # Primer retraso aleatorio: réplicas que arrancan juntas no coinciden
+        await asyncio.sleep(random.uniform(0, tarea.intervalo * max(self.jitter, 0.1)))
+        while True:
+            await self.ejecutar(tarea.nombre)
+            await asyncio.sleep(self._espera(tarea.intervalo))
+
+    def iniciar(self):
+        """Iniciar los ciclos de todas las tareas (idempotente)"""
+        if self._ciclos:
+            return
+        for tarea in self._tareas.values():
+            self._ciclos.append(asyncio.create_task(self._ciclo(tarea), name=f"tarea-{tarea.nombre}"))
+        logger.info(f"⏰ Programador iniciado ({len(self._ciclos)} tareas, réplica {self.duenio})")
+
+    async def detener(self):
+        """Cancelar los ciclos (una ejecución en curso se interrumpe en su próximo await)"""
+        for ciclo in self._ciclos:
+            ciclo.cancel()
+        for ciclo in self._ciclos:
+            try:
+                await ciclo
+            except asyncio.CancelledError:
+                pass
+        self._ciclos = []
+
+    def estado(self) -> List[Dict[str, Any]]:
+        """Estado local de cada tarea (para /api/metrics)"""
+        return [{
+            'tarea': t.nombre,
+            'intervalo_segundos': t.intervalo,
+            'exclusiva': t.exclusiva,
+            'ejecuciones': t.ejecuciones,
+            'ultimo_resultado': t.ultimo_resultado,
+            'ultima_duracion_ms': round(t.ultima_duracion_ms, 1) if t.ultima_duracion_ms is not None else None,
+            'ultimo_error': t.ultimo_error
+        } for t in self._tareas.values()]
+
+
+def registrar_tareas_mantenimiento(programador: Programador):
+    """
+    Tareas de mantenimiento estándar de ACA.
+
+    Los rollups y los intentos de acceso se registran siempre, la
+    reanudación de difusiones donde corre el bot de producción; el resto se
+    puede deshabilitar con
+    SCHEDULER_ENABLED=false (p. ej. en réplicas de desarrollo).
+    """
+    from app.services.session_manager import get_session_manager
+    from app.services.analytics_service import get_analytics_service
+    from app.services.retention_service import get_retention_service
+    from app.services.reconciliation_service import get_reconciliation_service
+    from app.services.broadcast_service import get_broadcast_service
+    from app.security.access_filter import get_filtro_acceso
+
+    def retencion_conversaciones():
+        servicio = get_retention_service()
+        creadas = servicio.asegurar_particiones()
+        archivadas = servicio.archivar_vencidas()
+        return {'particiones_creadas': creadas, 'archivadas': len(archivadas)}
+
+    # Los rollups pendientes están en memoria de cada réplica: no es exclusiva
+    programador.registrar('rollups_analytics', get_analytics_service().vaciar,
+                          Config.ANALYTICS_FLUSH_SECONDS, exclusiva=False)
+    # Los intentos de chats no registrados también se acumulan en memoria de cada réplica
+    programador.registrar('intentos_acceso', get_filtro_acceso().vaciar,
+                          Config.ACCESO_NEGADO_FLUSH_SECONDS, exclusiva=False)
+    # Cada difusión ya se reserva con su propio lease: cualquier réplica con el bot de producción puede retomarla
+    if "production" in Config.bots_del_proceso():
+        # Con procesos separados las difusiones se crean en otro proceso: revisar más seguido
+        intervalo = Config.DIFUSION_LEASE_SECONDS if Config.PROCESO_ROL == "todo" \
+            else min(10, Config.DIFUSION_LEASE_SECONDS)
+        programador.registrar('reanudar_difusiones', get_broadcast_service().reanudar,
+                              intervalo, exclusiva=False)
+    if not Config.SCHEDULER_ENABLED:
+        logger.info("⏰ Tareas de mantenimiento deshabilitadas (SCHEDULER_ENABLED=false)")
+        return
+    programador.registrar('sesiones_expiradas', get_session_manager().cleanup_expired_sessions,
+                          Config.SCHEDULER_SESIONES_SECONDS)
+    programador.registrar('retencion_conversaciones', retencion_conversaciones,
+                          Config.SCHEDULER_RETENCION_SECONDS, timeout=3600)
+    programador.registrar('conciliar_huerfanos', get_reconciliation_service().conciliar,
+                          Config.SCHEDULER_CONCILIACION_SECONDS, timeout=3600)
+
+
+# Instancia global
+_programador = None
+
+
+def get_programador() -> Programador:
+    """Obtener instancia del programador de tareas"""
+    global _programador
+    if _programador is None:
+        _programador = Programador()
+    return _programador
@@ -6,17 +6,51 @@ Maneja el estado de las conversaciones para flujos de subida/descarga de archivo
 import logging
 from typing import Optional, Dict, Any
 from datetime import datetime, timedelta
+from app.config import Config
 from app.database.supabase import get_supabase_client
+from app.database.projections import SESION_ACTIVA
+from app.services.cache_service import clave_cache, get_cache
+from app.services.metrics_service import registrar_cache
+from app.utils.tracing import trazar
 
 logger = logging.getLogger(__name__)
 
 class SessionManager:
-    """Gestor de sesiones conversacionales"""
+    """
+    Gestor de sesiones conversacionales
+    
+    La sesión activa de cada chat (o que no tiene) queda en la caché de
+    servicios hasta CACHE_SESIONES_TTL_SECONDS, sin pasar de su expires_at:
+    cada mensaje de texto la consulta y la mayoría de los chats no tiene
+    una. create/update/clear escriben la BD y luego la caché.
+    """
     
     def __init__(self):
         self.supabase = get_supabase_client()
+        self.cache = get_cache()
         self.default_expiry_hours = 1  # 1 hora por defecto
     
+    @staticmethod
+    def _segundos_restantes(expires_at: Any) -> float:
+        try:
+            vence = datetime.fromisoformat(str(expires_at).replace('Z', '+00:00'))
+        except ValueError:
+            return 0.0
+        ahora = datetime.now(vence.tzinfo) if vence.tzinfo else datetime.now()
+        return (vence - ahora).total_seconds()
+    
+    def _recordar(self, chat_id: int, session: Optional[Any]):
+        """Guardar en caché la sesión activa del chat (None: el chat no tiene sesión)"""
+        ttl = Config.CACHE_SESIONES_TTL_SECONDS
+        if session is not None:
+            ttl = min(ttl, self._segundos_restantes(session.get('expires_at')))
+        if ttl <= 0:
+            self.cache.borrar(clave_cache('sesion', chat_id))
+            return
+        fila = {columna: session.get(columna) for columna in SESION_ACTIVA.columnas} if session else None
+        self.cache.guardar(clave_cache('sesion', chat_id), {'sesion': fila}, ttl=ttl)
+    
+    @trazar()
     def get_session(self, chat_id: int) -> Optional[Dict[str, Any]]:
         """
         Obtener sesión activa de un usuario
@@ -27,10 +61,16 @@ class SessionManager:
         Returns:
             Diccionario con datos de la sesión o None si no existe o está expirada
         """
+        cacheada = self.cache.obtener(clave_cache('sesion', chat_id))
+        if cacheada is not None:
+            registrar_cache('sesiones', True)
+            return SESION_ACTIVA.fila(cacheada['sesion'])
+        registrar_cache('sesiones', False)
+        
         try:
             # Buscar sesión activa (no expirada)
             result = self.supabase.table('sesiones_conversacion')\
-                .select('*')\
+                .select(SESION_ACTIVA.select)\
                 .eq('chat_id', chat_id)\
                 .gt('expires_at', datetime.now().isoformat())\
                 .order('created_at', desc=True)\
@@ -38,12 +78,13 @@ class SessionManager:
                 .execute()
             
             if result.data and len(result.data) > 0:
-                session = result.data[0]
+                session = SESION_ACTIVA.fila(result.data[0])
                 logger.info(f"✅ Sesión encontrada para chat_id {chat_id}: estado={session.get('estado')}")
+                self._recordar(chat_id, session)
                 return session
             
-            # Si no hay sesión activa, limpiar cualquier sesión expirada
-            self._cleanup_expired_session(chat_id)
+            # Las sesiones expiradas las elimina en lote la tarea programada 'sesiones_expiradas'
+            self._recordar(chat_id, None)
             return None
             
         except Exception as e:
@@ -94,6 +135,7 @@ class SessionManager:
             
             if result.data:
                 logger.info(f"✅ Sesión creada para chat_id {chat_id}: intent={intent}, estado={estado}")
+                self._recordar(chat_id, result.data[0])
                 return result.data[0]
             
             return None
@@ -160,12 +202,15 @@ class SessionManager:
             
             if result.data:
                 logger.info(f"✅ Sesión actualizada para chat_id {chat_id}: estado={estado or session.get('estado')}")
+                self._recordar(chat_id, result.data[0])
                 return True
             
             return False
             
         except Exception as e:
             logger.error(f"❌ Error actualizando sesión para chat_id {chat_id}: {e}")
+            # Sin saber si la BD cambió, la próxima lectura va a la BD
+            self.cache.borrar(clave_cache('sesion', chat_id))
             return False
     
     def clear_session(self, chat_id: int) -> bool:
@@ -184,40 +229,15 @@ class SessionManager:
                 .eq('chat_id', chat_id)\
                 .execute()
             
+            self._recordar(chat_id, None)
             logger.info(f"✅ Sesión eliminada para chat_id {chat_id}")
             return True
             
         except Exception as e:
             logger.error(f"❌ Error eliminando sesión para chat_id {chat_id}: {e}")
+            self.cache.borrar(clave_cache('sesion', chat_id))
             return False
     
-    def _cleanup_expired_session(self, chat_id: int) -> int:
-        """
-        Limpiar sesiones expiradas de un usuario específico
-        
-        Args:
-            chat_id: ID del chat de Telegram
-            
-        Returns:
-            Número de sesiones eliminadas
-        """
-        try:
-            result = self.supabase.table('sesiones_conversacion')\
-                .delete()\
-                .eq('chat_id', chat_id)\
-                .lt('expires_at', datetime.now().isoformat())\
-                .execute()
-            
-            deleted_count = len(result.data) if result.data else 0
-            if deleted_count > 0:
-                logger.info(f"🧹 Limpiadas {deleted_count} sesiones expiradas para chat_id {chat_id}")
-            
-            return deleted_count
-            
-        except Exception as e:
-            logger.error(f"❌ Error limpiando sesiones expiradas para chat_id {chat_id}: {e}")
-            return 0
-    
     def cleanup_expired_sessions(self) -> int:
         """
         Limpiar todas las sesiones expiradas del sistema
@@ -229,7 +249,7 @@ class SessionManager:
             # Usar función SQL si está disponible
             result = self.supabase.client.rpc('limpiar_sesiones_expiradas').execute()
             
-            if result.data:
+            if result.data is not None:
                 deleted_count = result.data if isinstance(result.data, int) else result.data[0] if result.data else 0
                 logger.info(f"🧹 Limpiadas {deleted_count} sesiones expiradas del sistema")
                 return deleted_count
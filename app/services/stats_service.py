@@ -0,0 +1,116 @@
+"""
+📈 Servicio de Estadísticas
+Conteos para el bot admin y el dashboard con consultas head/count y rollups, cacheados por un TTL corto
+"""
+
+import time
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict
+
+from app.config import Config
+from app.database.supabase import get_supabase_client
+from app.services.analytics_service import get_analytics_service
+from app.services.metrics_service import registrar_cache
+
+logger = logging.getLogger(__name__)
+
+
+class StatsService:
+    """
+    Estadísticas del sistema cuyo costo no crece con el tamaño de las tablas.
+
+    - Empresas y usuarios activos: `count='exact', head=True` (solo el conteo, sin filas)
+    - Conversaciones totales: `count='estimated'` (estadísticas del planner en tablas grandes)
+    - Conversaciones del día/semana: filas diarias de bot_analytics (una por bot y día)
+    """
+
+    def __init__(self, ttl_segundos: int = None):
+        self.supabase = get_supabase_client()
+        self.ttl_segundos = ttl_segundos if ttl_segundos is not None else Config.STATS_CACHE_SECONDS
+        self._cache: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    def _cacheado(self, clave: str, calcular: Callable[[], Any]) -> Any:
+        ahora = time.time()
+        with self._lock:
+            entrada = self._cache.get(clave)
+        if entrada and ahora - entrada[0] < self.ttl_segundos:
+            registrar_cache('stats', True)
+            return entrada[1]
+
+        registrar_cache('stats', False)
+        valor = calcular()
+        with self._lock:
+            self._cache[clave] = (time.time(), valor)
+        return valor
+
+    def invalidar(self):
+        """Descartar los valores cacheados"""
+        with self._lock:
+            self._cache.clear()
+
+    def _contar(self, tabla: str, count: str = 'exact', **filtros_eq) -> int:
+        query = self.supabase.table(tabla).select('id', count=count, head=True)
+        for columna, valor in filtros_eq.items():
+            query = query.eq(columna, valor)
+        return query.execute().count or 0
+
+    def get_stats_sistema(self) -> Dict[str, Any]:
+        """Totales para el panel del bot admin"""
+        def calcular():
+            hoy = self.get_resumen_dia()
+            return {
+                'empresas_activas': self._contar('empresas', activo=True),
+                'usuarios_activos': self._contar('usuarios', activo=True),
+                'conversaciones_totales': self._contar('conversaciones', count='estimated'),
+                'conversaciones_hoy': hoy['total_conversaciones'],
+                'actualizado': datetime.now().isoformat()
+            }
+        return self._cacheado('sistema', calcular)
+
+    def get_resumen_dia(self) -> Dict[str, Any]:
+        """Conversaciones de hoy desde los rollups (se atrasan hasta ANALYTICS_FLUSH_SECONDS)"""
+        def calcular():
+            hoy = datetime.now().date()
+            filas = get_analytics_service().get_filas_diarias(hoy, hoy)
+            por_bot = {fila['bot_tipo']: fila for fila in filas}
+            return {
+                'total_conversaciones': sum(f.get('total_mensajes') or 0 for f in filas),
+                'usuarios_unicos': sum(f.get('usuarios_unicos') or 0 for f in filas),
+                # Mismos nombres que el resumen original (cuentan mensajes, no usuarios)
+                'usuarios_autorizados': sum(f.get('mensajes_autorizados') or 0 for f in filas),
+                'usuarios_no_autorizados': sum(f.get('mensajes_no_autorizados') or 0 for f in filas),
+                'bot_admin': (por_bot.get('admin') or {}).get('total_mensajes') or 0,
+                'bot_production': (por_bot.get('production') or {}).get('total_mensajes') or 0
+            }
+        return self._cacheado('dia', calcular)
+
+    def get_resumen_semana(self) -> Dict[str, Any]:
+        """Usuarios no autorizados activos e intentos de los últimos 7 días"""
+        def calcular():
+            desde = datetime.now() - timedelta(days=7)
+            usuarios = self.supabase.table('usuarios_detalle')\
+                .select('id', count='exact', head=True)\
+                .in_('tipo_acceso', ['no_autorizado', 'bloqueado'])\
+                .gte('ultima_interaccion', desde.isoformat())\
+                .execute()
+            filas = get_analytics_service().get_filas_diarias(desde.date())
+            return {
+                'usuarios_no_autorizados': usuarios.count or 0,
+                'intentos_totales': sum(f.get('mensajes_no_autorizados') or 0 for f in filas)
+            }
+        return self._cacheado('semana', calcular)
+
+
+# Instancia global
+_stats_service = None
+
+
+def get_stats_service() -> StatsService:
+    """Obtener instancia del servicio de estadísticas"""
+    global _stats_service
+    if _stats_service is None:
+        _stats_service = StatsService()
+    return _stats_service
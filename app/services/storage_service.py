@@ -6,16 +6,35 @@ Preparado para FASE 2 - Manejo de archivos desde bots de Telegram
 import logging
 from typing import Optional, Dict, Any, BinaryIO
 from app.database.supabase import get_supabase_client
+from app.database.projections import ARCHIVO_FIRMA, ARCHIVO_BORRADO
+from app.services.catalog_service import get_catalog_service
+from app.services.document_index_service import get_document_index_service
+from app.services.financial_metrics_service import get_financial_metrics_service
+from app.services.cache_service import clave_cache, get_cache
+from app.services.metrics_service import registrar_cache
+from app.utils.coalescencia import coalescer
 from app.config import Config
 
 logger = logging.getLogger(__name__)
 
+# Validez de las URLs firmadas; la caché solo entrega las que aún valen al menos media hora
+URL_FIRMADA_SEGUNDOS = 3600
+VIGENCIA_MINIMA_SEGUNDOS = 1800
+
 class StorageService:
     """Servicio para gestionar archivos en Supabase Storage"""
     
     def __init__(self):
         self.supabase = get_supabase_client().client
         self.bucket_name = Config.SUPABASE_STORAGE_BUCKET
+        self.cache = get_cache()
+    
+    def _recordar_url(self, file_id: str, url: str) -> str:
+        """Guardar la URL firmada en la caché de servicios (la comparten las réplicas con Redis)"""
+        ttl = min(Config.CACHE_URLS_TTL_SECONDS, URL_FIRMADA_SEGUNDOS - VIGENCIA_MINIMA_SEGUNDOS)
+        if ttl > 0:
+            self.cache.guardar(clave_cache('url_archivo', file_id), url, ttl=ttl)
+        return url
     
     async def upload_file(
         self,
@@ -107,6 +126,7 @@ class StorageService:
                 
                 if result.data:
                     logger.info(f"✅ Archivo {filename} subido exitosamente")
+                    get_catalog_service().registrar_subida(result.data[0])
                     return result.data[0]
             
             return None
@@ -127,7 +147,7 @@ class StorageService:
         """
         try:
             # Obtener información del archivo
-            file_info = self.supabase.table('archivos').select('*').eq('id', file_id).execute()
+            file_info = self.supabase.table('archivos').select(ARCHIVO_FIRMA.select).eq('id', file_id).execute()
             
             if not file_info.data:
                 return None
@@ -147,19 +167,26 @@ class StorageService:
             logger.error(f"❌ Error descargando archivo {file_id}: {e}")
             return None
     
+    @coalescer('url_firmada')
     async def get_file_url(self, file_id: str, regenerate: bool = False) -> Optional[str]:
         """
         Obtener URL de un archivo (pública o firmada)
         
         Args:
             file_id: ID del archivo
-            regenerate: Si True, regenera URL firmada incluso si existe
+            regenerate: Si True, firma una URL nueva aunque haya una vigente en caché
         
         Returns:
             URL del archivo o None
         """
+        if not regenerate:
+            url = self.cache.obtener(clave_cache('url_archivo', file_id))
+            registrar_cache('urls_firmadas', url is not None)
+            if url:
+                return url
+        
         try:
-            file_info = self.supabase.table('archivos').select('storage_path, url_archivo').eq('id', file_id).execute()
+            file_info = self.supabase.table('archivos').select(ARCHIVO_FIRMA.select).eq('id', file_id).execute()
             
             if not file_info.data:
                 return None
@@ -178,7 +205,7 @@ class StorageService:
                 if hasattr(self.supabase.storage.from_(self.bucket_name), 'create_signed_url'):
                     signed_response = self.supabase.storage.from_(self.bucket_name).create_signed_url(
                         path=storage_path,
-                        expires_in=3600  # 1 hora
+                        expires_in=URL_FIRMADA_SEGUNDOS  # 1 hora
                     )
                     logger.info(f"🔍 Respuesta de create_signed_url: tipo={type(signed_response)}, valor={signed_response}")
                     # El método puede retornar un dict con 'signedURL' o directamente la URL
@@ -187,12 +214,12 @@ class StorageService:
                             signed_url = signed_response.get('signedURL') or signed_response.get('signedUrl') or signed_response.get('url')
                             if signed_url:
                                 logger.info(f"✅ URL firmada generada correctamente: {signed_url[:100]}...")
-                                return signed_url
+                                return self._recordar_url(file_id, signed_url)
                             else:
                                 logger.warning(f"⚠️ Respuesta dict pero sin URL. Keys: {signed_response.keys()}")
                         elif isinstance(signed_response, str):
                             logger.info(f"✅ URL firmada generada correctamente (string): {signed_response[:100]}...")
-                            return signed_response
+                            return self._recordar_url(file_id, signed_response)
                 # Alternativa: usar create_signed_url con parámetros diferentes
                 elif hasattr(self.supabase.storage.from_(self.bucket_name), 'get_public_url'):
                     # Si no hay método de signed URL, usar pública
@@ -226,7 +253,7 @@ class StorageService:
         """
         try:
             # Obtener información del archivo
-            file_info = self.supabase.table('archivos').select('*').eq('id', file_id).execute()
+            file_info = self.supabase.table('archivos').select(ARCHIVO_BORRADO.select).eq('id', file_id).execute()
             
             if not file_info.data:
                 return False
@@ -255,6 +282,10 @@ class StorageService:
                 'activo': False,
                 'openai_file_id': None
             }).eq('id', file_id).execute()
+            self.cache.borrar(clave_cache('url_archivo', file_id))
+            get_catalog_service().registrar_baja(file_data.get('empresa_id'), file_id)
+            get_document_index_service().quitar_archivo(file_data.get('empresa_id'), file_id)
+            get_financial_metrics_service().quitar_archivo(file_data.get('empresa_id'), file_id)
             
             logger.info(f"✅ Archivo {file_id} eliminado exitosamente")
             return True
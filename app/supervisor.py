@@ -0,0 +1,289 @@
+"""
+🧭 Supervisor de Procesos
+Workers de API y un worker por bot en procesos separados, con reinicio ante caídas y RSS por proceso
+"""
+
+import os
+import sys
+import json
+import time
+import signal
+import socket
+import logging
+import subprocess
+from typing import Any, Dict, List, Optional, Sequence
+
+from app.config import Config
+
+logger = logging.getLogger(__name__)
+
+# Reinicio con espera exponencial entre caídas seguidas; la cuenta vuelve a cero
+# si el proceso alcanzó a correr EJECUCION_ESTABLE_SECONDS
+REINICIO_INICIAL_SECONDS = 1.0
+REINICIO_MAXIMO_SECONDS = 60.0
+EJECUCION_ESTABLE_SECONDS = 60.0
+
+# Cada cuánto revisa el supervisor a sus hijos
+INTERVALO_REVISION_SECONDS = 0.5
+
+
+class ProcesoHijo:
+    """Un proceso administrado por el supervisor"""
+
+    __slots__ = ('nombre', 'rol', 'comando', 'entorno', 'pass_fds', 'proceso', 'reinicios',
+                 'caidas_seguidas', 'iniciado', 'proximo_inicio', 'ultimo_codigo')
+
+    def __init__(self, nombre: str, rol: str, comando: List[str],
+                 entorno: Optional[Dict[str, str]] = None, pass_fds: Sequence[int] = ()):
+        self.nombre = nombre
+        self.rol = rol
+        self.comando = comando
+        self.entorno = entorno or {}
+        self.pass_fds = tuple(pass_fds)
+        self.proceso: Optional[subprocess.Popen] = None
+        self.reinicios = 0
+        self.caidas_seguidas = 0
+        self.iniciado = 0.0
+        self.proximo_inicio = 0.0
+        self.ultimo_codigo: Optional[int] = None
+
+    @property
+    def pid(self) -> Optional[int]:
+        return self.proceso.pid if self.proceso else None
+
+
+def rss_bytes(pid: int) -> Optional[int]:
+    """RSS actual de un proceso desde /proc (solo Linux)"""
+    try:
+        with open(f'/proc/{pid}/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except Exception:
+        return None
+
+
+class Supervisor:
+    """
+    Lanza y vigila los procesos de la aplicación.
+
+    - Cada hijo recibe el entorno del supervisor (misma configuración y
+      .env) más su rol: PROCESO_ROL=api o PROCESO_ROL=bots con PROCESO_BOTS.
+    - Un hijo que termina sin que se esté deteniendo el supervisor se
+      reinicia tras REINICIO_INICIAL_SECONDS, duplicando la espera con cada
+      caída seguida (hasta REINICIO_MAXIMO_SECONDS).
+    - Cada SUPERVISOR_REPORTE_SECONDS registra el RSS de cada proceso y lo
+      guarda en SUPERVISOR_ESTADO_PATH (lo muestra /status de la API).
+    - SIGTERM/SIGINT: SIGTERM a todos los hijos y SIGKILL a los que sigan
+      vivos después de SUPERVISOR_GRACIA_SECONDS.
+    """
+
+    def __init__(self, hijos: List[ProcesoHijo], gracia_segundos: float = None,
+                 reporte_segundos: float = None, ruta_estado: str = None):
+        self.hijos = hijos
+        self.gracia_segundos = gracia_segundos if gracia_segundos is not None else Config.SUPERVISOR_GRACIA_SECONDS
+        self.reporte_segundos = reporte_segundos if reporte_segundos is not None \
+            else Config.SUPERVISOR_REPORTE_SECONDS
+        self.ruta_estado = ruta_estado if ruta_estado is not None else Config.SUPERVISOR_ESTADO_PATH
+        self._deteniendo = False
+
+    # ============================================
+    # CICLO DE VIDA DE LOS HIJOS
+    # ============================================
+
+    def iniciar_hijo(self, hijo: ProcesoHijo):
+        entorno = dict(os.environ, **hijo.entorno)
+        hijo.proceso = subprocess.Popen(hijo.comando, env=entorno, pass_fds=hijo.pass_fds)
+        hijo.iniciado = time.monotonic()
+        logger.info(f"🧭 {hijo.nombre} iniciado (pid {hijo.pid})")
+
+    def iniciar(self):
+        for hijo in self.hijos:
+            self.iniciar_hijo(hijo)
+
+    def revisar(self) -> int:
+        """
+        Reiniciar los hijos caídos cuya espera ya pasó.
+
+        Returns:
+            Cantidad de hijos reiniciados en esta revisión
+        """
+        ahora = time.monotonic()
+        reiniciados = 0
+        for hijo in self.hijos:
+            if hijo.proceso is None:
+                if not self._deteniendo and ahora >= hijo.proximo_inicio:
+                    hijo.reinicios += 1
+                    self.iniciar_hijo(hijo)
+                    reiniciados += 1
+                continue
+
+            codigo = hijo.proceso.poll()
+            if codigo is None or self._deteniendo:
+                continue
+
+            duracion = ahora - hijo.iniciado
+            hijo.caidas_seguidas = 0 if duracion >= EJECUCION_ESTABLE_SECONDS else hijo.caidas_seguidas + 1
+            espera = min(REINICIO_MAXIMO_SECONDS, REINICIO_INICIAL_SECONDS * 2 ** max(0, hijo.caidas_seguidas - 1))
+            hijo.ultimo_codigo = codigo
+            hijo.proceso = None
+            hijo.proximo_inicio = ahora + espera
+            logger.error(
+                f"❌ {hijo.nombre} terminó con código {codigo} tras {duracion:.0f}s; "
+                f"se reinicia en {espera:.0f}s"
+            )
+        return reiniciados
+
+    def detener(self):
+        """Detener todos los hijos: SIGTERM y, pasada la gracia, SIGKILL"""
+        self._deteniendo = True
+        vivos = [h for h in self.hijos if h.proceso and h.proceso.poll() is None]
+        for hijo in vivos:
+            hijo.proceso.send_signal(signal.SIGTERM)
+
+        limite = time.monotonic() + self.gracia_segundos
+        for hijo in vivos:
+            try:
+                hijo.proceso.wait(timeout=max(0.0, limite - time.monotonic()))
+            except subprocess.TimeoutExpired:
+                logger.warning(f"⚠️ {hijo.nombre} no terminó en {self.gracia_segundos}s: SIGKILL")
+                hijo.proceso.kill()
+                hijo.proceso.wait()
+        self.guardar_estado()
+        logger.info("👋 Supervisor: procesos detenidos")
+
+    # ============================================
+    # ESTADO
+    # ============================================
+
+    def estado(self) -> List[Dict[str, Any]]:
+        """Estado, RSS y reinicios de cada hijo"""
+        ahora = time.monotonic()
+        filas = []
+        for hijo in self.hijos:
+            vivo = hijo.proceso is not None and hijo.proceso.poll() is None
+            rss = rss_bytes(hijo.pid) if vivo else None
+            filas.append({
+                'nombre': hijo.nombre,
+                'rol': hijo.rol,
+                'pid': hijo.pid if vivo else None,
+                'estado': 'corriendo' if vivo else ('detenido' if self._deteniendo else 'reiniciando'),
+                'rss_mb': round(rss / 1024 / 1024, 1) if rss is not None else None,
+                'activo_segundos': round(ahora - hijo.iniciado) if vivo else None,
+                'reinicios': hijo.reinicios,
+                'ultimo_codigo': hijo.ultimo_codigo
+            })
+        return filas
+
+    def guardar_estado(self) -> List[Dict[str, Any]]:
+        filas = self.estado()
+        if not self.ruta_estado:
+            return filas
+        try:
+            os.makedirs(os.path.dirname(self.ruta_estado) or '.', exist_ok=True)
+            temporal = f"{self.ruta_estado}.tmp"
+            with open(temporal, 'w', encoding='utf-8') as f:
+                json.dump({'supervisor_pid': os.getpid(), 'actualizado': time.time(), 'procesos': filas}, f)
+            # Reemplazo atómico: la API nunca lee un archivo a medio escribir
+            os.replace(temporal, self.ruta_estado)
+        except OSError as e:
+            logger.warning(f"⚠️ No se pudo guardar el estado del supervisor: {e}")
+        return filas
+
+    def reportar(self):
+        filas = self.guardar_estado()
+        total = sum(f['rss_mb'] or 0 for f in filas)
+        detalle = " | ".join(
+            f"{f['nombre']} {f['rss_mb'] if f['rss_mb'] is not None else '-'}MB"
+            + (f" ({f['reinicios']} reinicios)" if f['reinicios'] else "")
+            for f in filas
+        )
+        logger.info(f"🧭 RSS total {total:.0f}MB: {detalle}")
+
+    # ============================================
+    # EJECUCIÓN
+    # ============================================
+
+    def ejecutar(self):
+        """Iniciar los hijos y vigilarlos hasta recibir SIGTERM o SIGINT"""
+        def al_recibir_senal(signum, frame):
+            logger.info(f"🛑 Supervisor: señal {signal.Signals(signum).name}, deteniendo procesos...")
+            self._deteniendo = True
+
+        signal.signal(signal.SIGTERM, al_recibir_senal)
+        signal.signal(signal.SIGINT, al_recibir_senal)
+
+        self.iniciar()
+        self.guardar_estado()
+        proximo_reporte = time.monotonic() + self.reporte_segundos
+        while not self._deteniendo:
+            time.sleep(INTERVALO_REVISION_SECONDS)
+            if self.revisar():
+                self.guardar_estado()
+            if time.monotonic() >= proximo_reporte:
+                self.reportar()
+                proximo_reporte = time.monotonic() + self.reporte_segundos
+        self.detener()
+
+
+# ============================================
+# TOPOLOGÍA POR DEFECTO
+# ============================================
+
+def socket_api(host: str, puerto: int) -> socket.socket:
+    """Socket de escucha compartido por los workers de API (lo abre el supervisor una vez)"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, puerto))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def comando_uvicorn(*argumentos: str) -> List[str]:
+    return [sys.executable, '-m', 'uvicorn', 'app.main:app', '--log-level', 'info', *argumentos]
+
+
+def procesos_por_defecto(sock: socket.socket, api_workers: int = None, bots: Sequence[str] = None,
+                         puerto_bots: int = None) -> List[ProcesoHijo]:
+    """
+    N workers de API sobre el socket compartido y un worker por bot.
+
+    Los workers de bots también levantan la app (sin tráfico externo) en
+    127.0.0.1:puerto_bots+i, para que sus /health y /metrics sigan disponibles.
+    El feed en vivo de conversaciones y las métricas por bot y handler se
+    producen en esos procesos: los workers de API no los ven, así que
+    /conversation-logs/stream y /metrics del puerto público no los incluyen.
+    """
+    api_workers = Config.SUPERVISOR_API_WORKERS if api_workers is None else api_workers
+    bots = Config.PROCESO_BOTS if bots is None else bots
+    puerto_bots = Config.SUPERVISOR_PUERTO_BOTS if puerto_bots is None else puerto_bots
+
+    hijos = [
+        ProcesoHijo(
+            f"api-{i + 1}", "api",
+            comando_uvicorn('--fd', str(sock.fileno())),
+            {'PROCESO_ROL': 'api'},
+            pass_fds=(sock.fileno(),)
+        )
+        for i in range(api_workers)
+    ]
+    for i, bot in enumerate(bots):
+        hijos.append(ProcesoHijo(
+            f"bot-{bot}", "bots",
+            comando_uvicorn('--host', '127.0.0.1', '--port', str(puerto_bots + i)),
+            {'PROCESO_ROL': 'bots', 'PROCESO_BOTS': bot}
+        ))
+    return hijos
+
+
+def leer_estado(ruta: str = None) -> Optional[List[Dict[str, Any]]]:
+    """Último estado guardado por el supervisor (None si la app no corre bajo run_supervisor.py)"""
+    ruta = ruta or Config.SUPERVISOR_ESTADO_PATH
+    try:
+        with open(ruta, encoding='utf-8') as f:
+            datos = json.load(f)
+    except (OSError, ValueError):
+        return None
+    # Un archivo de una ejecución anterior no describe a este proceso
+    if datos.get('supervisor_pid') != os.getppid():
+        return None
+    return datos.get('procesos')
@@ -0,0 +1,163 @@
+"""
+🛬 Coalescencia de llamadas (single-flight)
+Llamadas idénticas concurrentes comparten una sola ejecución en vuelo en vez de repetir la consulta
+"""
+
+import copy
+import json
+import asyncio
+import hashlib
+import inspect
+import logging
+import threading
+from functools import wraps
+from typing import Any, Callable, Dict, Tuple
+
+from app.utils.metrics import get_registro_metricas
+
+logger = logging.getLogger(__name__)
+
+registro = get_registro_metricas()
+LLAMADAS_COALESCIDAS = registro.contador(
+    'aca_singleflight_calls_total',
+    'Llamadas por operación: ejecutadas (lider) o servidas por una idéntica en vuelo (coalescida)',
+    ('operacion', 'resultado')
+)
+
+
+def clave_llamada(operacion: str, args: tuple, kwargs: dict) -> str:
+    """Clave estable para operación + argumentos (los no serializables entran por su str())"""
+    texto = json.dumps([args, kwargs], sort_keys=True, default=str, ensure_ascii=False)
+    return f"{operacion}:{hashlib.sha256(texto.encode('utf-8')).hexdigest()}"
+
+
+class _Vuelo:
+    """Ejecución síncrona en curso que esperan las llamadas coalescidas"""
+
+    __slots__ = ('evento', 'resultado', 'error')
+
+    def __init__(self):
+        self.evento = threading.Event()
+        self.resultado = None
+        self.error = None
+
+
+class Coalescedor:
+    """
+    Single-flight para funciones síncronas (hilos) y corrutinas.
+
+    La primera llamada con una clave ejecuta la función; las que llegan con
+    la misma clave mientras sigue en vuelo esperan ese resultado. No es una
+    caché: al terminar la ejecución la clave se libera y la siguiente llamada
+    vuelve a consultar. Las coalescidas reciben una copia profunda del
+    resultado (o la misma excepción) para que ningún llamador vea las
+    mutaciones de otro.
+    """
+
+    def __init__(self):
+        self._vuelos: Dict[str, _Vuelo] = {}
+        # Las tareas pertenecen a un event loop: la clave incluye el loop
+        self._tareas: Dict[Tuple[int, str], asyncio.Future] = {}
+        self._lock = threading.Lock()
+
+    def en_vuelo(self) -> int:
+        with self._lock:
+            return len(self._vuelos) + len(self._tareas)
+
+    def ejecutar(self, operacion: str, clave: str, funcion: Callable, *args, **kwargs) -> Any:
+        """Ejecutar `funcion` o esperar la ejecución idéntica que ya está en vuelo (hilos)"""
+        with self._lock:
+            vuelo = self._vuelos.get(clave)
+            lider = vuelo is None
+            if lider:
+                vuelo = self._vuelos[clave] = _Vuelo()
+
+        if not lider:
+            LLAMADAS_COALESCIDAS.inc(operacion=operacion, resultado='coalescida')
+            vuelo.evento.wait()
+            if vuelo.error is not None:
+                raise vuelo.error
+            return copy.deepcopy(vuelo.resultado)
+
+        LLAMADAS_COALESCIDAS.inc(operacion=operacion, resultado='lider')
+        try:
+            vuelo.resultado = funcion(*args, **kwargs)
+            return vuelo.resultado
+        except BaseException as e:
+            vuelo.error = e
+            raise
+        finally:
+            with self._lock:
+                self._vuelos.pop(clave, None)
+            vuelo.evento.set()
+
+    async def ejecutar_async(self, operacion: str, clave: str, funcion: Callable, *args, **kwargs) -> Any:
+        """Ejecutar la corrutina o esperar la idéntica que ya está en vuelo en este event loop"""
+        loop = asyncio.get_running_loop()
+        indice = (id(loop), clave)
+        with self._lock:
+            tarea = self._tareas.get(indice)
+            lider = tarea is None
+            if lider:
+                tarea = self._tareas[indice] = loop.create_task(funcion(*args, **kwargs))
+                tarea.add_done_callback(lambda t: self._terminar(indice, t))
+
+        LLAMADAS_COALESCIDAS.inc(operacion=operacion, resultado='lider' if lider else 'coalescida')
+        # shield: si un llamador se cancela (timeout del handler) los demás siguen esperando
+        resultado = await asyncio.shield(tarea)
+        return resultado if lider else copy.deepcopy(resultado)
+
+    def _terminar(self, indice: Tuple[int, str], tarea: asyncio.Future):
+        with self._lock:
+            if self._tareas.get(indice) is tarea:
+                del self._tareas[indice]
+        # Si todos los llamadores se cancelaron, nadie lee la excepción: evitar el aviso de asyncio
+        if not tarea.cancelled() and tarea.exception() is not None:
+            logger.debug(f"🛬 Llamada coalescida falló: {tarea.exception()}")
+
+
+def coalescer(operacion: str, metodo: bool = True) -> Callable:
+    """
+    Decorador single-flight para funciones sync o async.
+
+    La clave es `operacion` más los argumentos normalizados con la firma
+    (posicionales, por nombre y valores por defecto dan la misma clave); con
+    `metodo=True` se omite el primero (self).
+    """
+    def decorador(funcion: Callable) -> Callable:
+        firma = inspect.signature(funcion)
+
+        def clave(args, kwargs) -> str:
+            enlazados = firma.bind(*args, **kwargs)
+            enlazados.apply_defaults()
+            argumentos = dict(enlazados.arguments)
+            if metodo:
+                argumentos.pop(next(iter(firma.parameters)), None)
+            return clave_llamada(operacion, (), argumentos)
+
+        if inspect.iscoroutinefunction(funcion):
+            @wraps(funcion)
+            async def wrapper_async(*args, **kwargs):
+                return await get_coalescedor().ejecutar_async(
+                    operacion, clave(args, kwargs), funcion, *args, **kwargs
+                )
+            return wrapper_async
+
+        @wraps(funcion)
+        def wrapper(*args, **kwargs):
+            return get_coalescedor().ejecutar(operacion, clave(args, kwargs), funcion, *args, **kwargs)
+        return wrapper
+
+    return decorador
+
+
+# Instancia global
+_coalescedor = None
+
+
+def get_coalescedor() -> Coalescedor:
+    """Obtener instancia del coalescedor de llamadas"""
+    global _coalescedor
+    if _coalescedor is None:
+        _coalescedor = Coalescedor()
+    return _coalescedor
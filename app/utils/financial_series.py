@@ -0,0 +1,162 @@
+"""
+📈 Series mensuales de cifras financieras
+Tendencia, variación anual y acumulados sobre arreglos mensuales (NumPy si está instalado)
+"""
+
+import math
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy es opcional
+    np = None
+
+
+def indice_mes(periodo: str) -> int:
+    """'2025-03' → meses desde el año 0 (posición en la serie densa)"""
+    anio, mes = periodo.split('-')[:2]
+    return int(anio) * 12 + int(mes) - 1
+
+
+def periodo_de_indice(indice: int) -> str:
+    return f"{indice // 12:04d}-{indice % 12 + 1:02d}"
+
+
+class Serie:
+    """
+    Montos mensuales de una cuenta en un arreglo denso, un elemento por mes
+    desde el primer período con datos; los meses sin dato son NaN. Así la
+    variación anual es un desplazamiento de 12 posiciones y los acumulados
+    son sumas sobre un rango, sin recorrer diccionarios.
+    """
+
+    __slots__ = ('cuenta', 'inicio', 'montos')
+
+    def __init__(self, cuenta: str, puntos: Iterable[Tuple[str, float]]):
+        self.cuenta = cuenta
+        puntos = [(indice_mes(p), float(m)) for p, m in puntos if p and m is not None]
+        if not puntos:
+            self.inicio = 0
+            self.montos = np.empty(0) if np is not None else []
+            return
+        self.inicio = min(i for i, _ in puntos)
+        largo = max(i for i, _ in puntos) - self.inicio + 1
+        if np is not None:
+            self.montos = np.full(largo, np.nan)
+            indices = np.fromiter((i - self.inicio for i, _ in puntos), dtype=np.int64, count=len(puntos))
+            self.montos[indices] = np.fromiter((m for _, m in puntos), dtype=np.float64, count=len(puntos))
+        else:
+            self.montos = [math.nan] * largo
+            for i, monto in puntos:
+                self.montos[i - self.inicio] = monto
+
+    def __len__(self) -> int:
+        return len(self.montos)
+
+    @property
+    def ultimo_periodo(self) -> Optional[str]:
+        return periodo_de_indice(self.inicio + len(self) - 1) if len(self) else None
+
+    def valor(self, periodo: str) -> Optional[float]:
+        posicion = indice_mes(periodo) - self.inicio
+        if not 0 <= posicion < len(self):
+            return None
+        monto = float(self.montos[posicion])
+        return None if math.isnan(monto) else monto
+
+    def ultimos(self, meses: int = 12) -> List[Tuple[str, float]]:
+        """(período, monto) de los últimos `meses` con dato"""
+        desde = max(0, len(self) - meses)
+        return [
+            (periodo_de_indice(self.inicio + i), float(self.montos[i]))
+            for i in range(desde, len(self))
+            if not math.isnan(self.montos[i])
+        ]
+
+    def _suma(self, desde: int, hasta: int) -> Tuple[float, int]:
+        """Suma y meses con dato en posiciones [desde, hasta)"""
+        desde, hasta = max(0, desde), min(len(self), hasta)
+        if desde >= hasta:
+            return 0.0, 0
+        tramo = self.montos[desde:hasta]
+        if np is not None:
+            return float(np.nansum(tramo)), int(np.count_nonzero(~np.isnan(tramo)))
+        valores = [m for m in tramo if not math.isnan(m)]
+        return sum(valores), len(valores)
+
+
+def _variacion(actual: Optional[float], anterior: Optional[float]) -> Optional[float]:
+    if actual is None or not anterior:
+        return None
+    return (actual - anterior) / abs(anterior) * 100
+
+
+def variacion_anual(serie: Serie, periodo: str = None) -> Dict[str, Optional[float]]:
+    """Monto del período contra el mismo mes del año anterior"""
+    periodo = periodo or serie.ultimo_periodo
+    if not periodo:
+        return {'periodo': None, 'actual': None, 'anterior': None, 'variacion_pct': None}
+    actual = serie.valor(periodo)
+    anterior = serie.valor(periodo_de_indice(indice_mes(periodo) - 12))
+    return {'periodo': periodo, 'actual': actual, 'anterior': anterior, 'variacion_pct': _variacion(actual, anterior)}
+
+
+def acumulado(serie: Serie, anio: int = None) -> Dict[str, Optional[float]]:
+    """
+    Acumulado del año (enero hasta el último mes con dato) contra los mismos
+    meses del año anterior.
+    """
+    if not len(serie):
+        return {'anio': anio, 'hasta': None, 'acumulado': None, 'anterior': None, 'variacion_pct': None}
+    ultimo = indice_mes(serie.ultimo_periodo)
+    anio = anio or ultimo // 12
+    hasta = min(ultimo, anio * 12 + 11)
+    enero = anio * 12
+    total, meses = serie._suma(enero - serie.inicio, hasta - serie.inicio + 1)
+    anterior, meses_anterior = serie._suma(enero - 12 - serie.inicio, hasta - 12 - serie.inicio + 1)
+    total = total if meses else None
+    anterior = anterior if meses_anterior else None
+    return {
+        'anio': anio,
+        'hasta': periodo_de_indice(hasta),
+        'acumulado': total,
+        'anterior': anterior,
+        'variacion_pct': _variacion(total, anterior),
+    }
+
+
+def tendencia(serie: Serie, meses: int = 12) -> Dict[str, Optional[float]]:
+    """
+    Pendiente mensual (mínimos cuadrados) y cambio entre el primer y el último
+    mes con dato de la ventana.
+    """
+    desde = max(0, len(serie) - meses)
+    tramo = serie.montos[desde:]
+    if np is not None:
+        con_dato = ~np.isnan(tramo)
+        x = np.flatnonzero(con_dato).astype(np.float64)
+        y = tramo[con_dato]
+        puntos = len(y)
+        if puntos < 2:
+            return {'meses': puntos, 'pendiente_mensual': None, 'cambio_pct': None, 'promedio': None}
+        pendiente = float(np.polyfit(x, y, 1)[0])
+        promedio = float(y.mean())
+        primero, ultimo = float(y[0]), float(y[-1])
+    else:
+        valores = [(i, m) for i, m in enumerate(tramo) if not math.isnan(m)]
+        puntos = len(valores)
+        if puntos < 2:
+            return {'meses': puntos, 'pendiente_mensual': None, 'cambio_pct': None, 'promedio': None}
+        media_x = sum(i for i, _ in valores) / puntos
+        promedio = sum(m for _, m in valores) / puntos
+        covarianza = sum((i - media_x) * (m - promedio) for i, m in valores)
+        varianza = sum((i - media_x) ** 2 for i, _ in valores)
+        pendiente = covarianza / varianza
+        primero, ultimo = valores[0][1], valores[-1][1]
+
+    return {
+        'meses': puntos,
+        'pendiente_mensual': pendiente,
+        'cambio_pct': _variacion(ultimo, primero),
+        'promedio': promedio,
+    }
@@ -0,0 +1,88 @@
+"""
+🧾 Cifras de tablas financieras
+Filas "cuenta ... monto" de reportes mensuales, estados financieros y F29 normalizadas a cuentas fijas
+"""
+
+import re
+import unicodedata
+from typing import Dict, Iterable, Optional, Tuple
+
+# Cuenta normalizada → etiquetas con que aparece en los documentos (sin tildes, en minúsculas)
+CUENTAS = {
+    'ventas': ('ventas', 'ventas netas', 'ingresos', 'ingresos por ventas', 'ingresos de explotacion',
+               'ingresos operacionales', 'ingresos de actividades ordinarias', 'ingresos ordinarios',
+               'total ingresos'),
+    'costo_ventas': ('costo de ventas', 'costo de venta', 'costos de explotacion', 'costo de ventas total'),
+    'margen_bruto': ('margen bruto', 'ganancia bruta', 'utilidad bruta', 'resultado bruto'),
+    'gastos_administracion': ('gastos de administracion', 'gastos de administracion y ventas', 'gav',
+                              'gastos operacionales', 'total gastos de administracion'),
+    'remuneraciones': ('remuneraciones', 'gastos de personal', 'sueldos y salarios'),
+    'resultado_operacional': ('resultado operacional', 'utilidad operacional', 'ebit'),
+    'ebitda': ('ebitda',),
+    'utilidad_neta': ('utilidad neta', 'resultado neto', 'resultado del ejercicio', 'utilidad del ejercicio',
+                      'ganancia del periodo', 'ganancia perdida', 'resultado del periodo'),
+    'caja': ('efectivo y equivalentes al efectivo', 'caja y bancos', 'disponible', 'efectivo'),
+    'total_activos': ('total activos', 'total activo', 'total de activos'),
+    'total_pasivos': ('total pasivos', 'total pasivo', 'total de pasivos'),
+    'patrimonio': ('total patrimonio', 'patrimonio total', 'patrimonio'),
+    'iva_debito': ('debito fiscal', 'iva debito fiscal', 'total debitos'),
+    'iva_credito': ('credito fiscal', 'iva credito fiscal', 'total creditos'),
+    'ppm': ('ppm', 'pagos provisionales mensuales', 'ppm neto determinado'),
+    'total_a_pagar': ('total a pagar', 'total a pagar dentro del plazo legal', 'total a pagar con recargo'),
+}
+
+_ETIQUETAS = {etiqueta: cuenta for cuenta, etiquetas in CUENTAS.items() for etiqueta in etiquetas}
+
+# Fila: código F29 opcional, etiqueta y luego uno o más montos ("1.234.567", "(12.300)", "-45,5", "$ 1.000")
+_FILA = re.compile(r'^\s*(?:\[?\d{2,4}\]?\s+)?(?P<etiqueta>[^\W\d][^\d$()]*?)[\s:.$]*(?P<montos>[-($]\s*\d.*|\d.*)$')
+_MONTO = re.compile(r'\(?-?\s?\$?\s?\d{1,3}(?:\.\d{3})+(?:,\d+)?\)?|\(?-?\s?\$?\s?\d+(?:,\d+)?\)?')
+_EN_MILES = re.compile(r'M\$|miles de pesos', re.IGNORECASE)
+
+
+def normalizar_etiqueta(texto: str) -> str:
+    """Minúsculas, sin tildes ni signos: 'Ingresos de Explotación:' → 'ingresos de explotacion'"""
+    texto = unicodedata.normalize('NFKD', texto).encode('ascii', 'ignore').decode('ascii')
+    return ' '.join(re.sub(r'[^a-z ]', ' ', texto.lower()).split())
+
+
+def parsear_monto(texto: str) -> Optional[float]:
+    """Monto en formato chileno (punto de miles, coma decimal, paréntesis o signo para negativos)"""
+    limpio = texto.strip()
+    negativo = limpio.startswith('(') and limpio.endswith(')') or '-' in limpio
+    digitos = re.sub(r'[^\d,]', '', limpio).replace(',', '.')
+    if not digitos or digitos == '.':
+        return None
+    try:
+        monto = float(digitos)
+    except ValueError:
+        return None
+    return -monto if negativo else monto
+
+
+def extraer_cifras(textos: Iterable[str]) -> Dict[str, Tuple[float, str]]:
+    """
+    Cifras por cuenta normalizada de un documento.
+
+    Se toma la primera fila de cada cuenta y su primer monto (en estados
+    comparativos, la columna del período actual). Si el documento declara
+    montos en M$ se multiplican por mil.
+
+    Returns:
+        {cuenta: (monto, etiqueta original)}
+    """
+    textos = list(textos)
+    factor = 1000.0 if any(_EN_MILES.search(t or '') for t in textos) else 1.0
+    cifras = {}
+    for texto in textos:
+        for linea in (texto or '').splitlines():
+            fila = _FILA.match(linea)
+            if not fila:
+                continue
+            cuenta = _ETIQUETAS.get(normalizar_etiqueta(fila.group('etiqueta')))
+            if not cuenta or cuenta in cifras:
+                continue
+            montos = _MONTO.findall(fila.group('montos'))
+            monto = parsear_monto(montos[0]) if montos else None
+            if monto is not None:
+                cifras[cuenta] = (monto * factor, fila.group('etiqueta').strip())
+    return cifras
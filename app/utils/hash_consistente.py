@@ -0,0 +1,60 @@
+"""
+🔗 Hash consistente
+Anillo con nodos virtuales para repartir chat_ids entre réplicas moviendo ~1/N de las claves al cambiar de tamaño
+"""
+
+import bisect
+import hashlib
+from typing import Iterable, List, Optional, Tuple
+
+NODOS_VIRTUALES_POR_DEFECTO = 64
+
+
+def hash_clave(clave: str) -> int:
+    """Hash estable entre procesos y versiones de Python (hash() cambia con PYTHONHASHSEED)"""
+    return int.from_bytes(hashlib.blake2b(clave.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+class AnilloHash:
+    """
+    Anillo de hash consistente.
+
+    Cada nodo ocupa `nodos_virtuales` puntos del anillo; una clave pertenece
+    al primer punto en sentido horario. El resultado depende solo del
+    conjunto de nodos (no del orden en que se agregaron), así que dos
+    réplicas con la misma lista de miembros asignan cada chat al mismo nodo.
+    """
+
+    def __init__(self, nodos: Iterable[str] = (), nodos_virtuales: int = NODOS_VIRTUALES_POR_DEFECTO):
+        self.nodos_virtuales = nodos_virtuales
+        self._puntos: List[Tuple[int, str]] = []
+        self._nodos = set()
+        for nodo in nodos:
+            self.agregar(nodo)
+
+    @property
+    def nodos(self) -> List[str]:
+        return sorted(self._nodos)
+
+    def __len__(self) -> int:
+        return len(self._nodos)
+
+    def agregar(self, nodo: str):
+        if nodo in self._nodos:
+            return
+        self._nodos.add(nodo)
+        for i in range(self.nodos_virtuales):
+            bisect.insort(self._puntos, (hash_clave(f"{nodo}#{i}"), nodo))
+
+    def quitar(self, nodo: str):
+        if nodo not in self._nodos:
+            return
+        self._nodos.discard(nodo)
+        self._puntos = [p for p in self._puntos if p[1] != nodo]
+
+    def nodo(self, clave) -> Optional[str]:
+        """Nodo dueño de la clave (None si el anillo está vacío)"""
+        if not self._puntos:
+            return None
+        indice = bisect.bisect(self._puntos, (hash_clave(str(clave)), ''))
+        return self._puntos[indice % len(self._puntos)][1]
@@ -0,0 +1,332 @@
+"""
+📈 Utilidades de métricas en memoria
+Histogramas, contadores y medidores seguros entre hilos, con exposición en formato Prometheus
+"""
+
+import threading
+from typing import Callable, Dict, Any, List, Optional, Sequence, Tuple
+
+# Buckets por defecto para latencias en milisegundos
+BUCKETS_LATENCIA_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+# Buckets por defecto para conteos pequeños (p. ej. llamadas por update)
+BUCKETS_CONTEO = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55)
+
+
+class Histograma:
+    """
+    Histograma acumulativo con buckets fijos.
+
+    Guarda solo conteos por bucket, suma y total, así que el uso de memoria
+    no crece con la cantidad de observaciones.
+    """
+
+    def __init__(self, buckets: Sequence[float] = BUCKETS_LATENCIA_MS):
+        self.buckets = tuple(sorted(buckets))
+        self._conteos = [0] * (len(self.buckets) + 1)  # último = +Inf
+        self._suma = 0.0
+        self._total = 0
+        self._maximo = 0.0
+        self._lock = threading.Lock()
+
+    def observar(self, valor: float):
+        """Registrar una observación"""
+        indice = len(self.buckets)
+        for i, limite in enumerate(self.buckets):
+            if valor <= limite:
+                indice = i
+                break
+
+        with self._lock:
+            self._conteos[indice] += 1
+            self._suma += valor
+            self._total += 1
+            if valor > self._maximo:
+                self._maximo = valor
+
+    @classmethod
+    def desde_conteos(cls, conteos: Sequence[int], suma: float = 0.0, buckets: Sequence[float] = BUCKETS_LATENCIA_MS) -> 'Histograma':
+        """Reconstruir un histograma a partir de conteos por bucket (p. ej. persistidos en la BD)"""
+        histograma = cls(buckets)
+        for i, conteo in enumerate(list(conteos)[:len(histograma._conteos)]):
+            histograma._conteos[i] = int(conteo or 0)
+        histograma._total = sum(histograma._conteos)
+        histograma._suma = float(suma or 0.0)
+        # Sin observaciones individuales el máximo se aproxima con el último bucket ocupado
+        ocupados = [i for i, conteo in enumerate(histograma._conteos) if conteo]
+        if ocupados:
+            ultimo = ocupados[-1]
+            histograma._maximo = float(histograma.buckets[ultimo] if ultimo < len(histograma.buckets) else histograma.buckets[-1])
+        return histograma
+
+    @property
+    def total(self) -> int:
+        return self._total
+
+    @property
+    def suma(self) -> float:
+        return self._suma
+
+    def conteos(self) -> List[int]:
+        """Conteos por bucket sin acumular (incluye +Inf al final)"""
+        with self._lock:
+            return list(self._conteos)
+
+    def acumulados(self) -> List[int]:
+        """Conteos acumulados por bucket (incluye +Inf al final), formato Prometheus"""
+        with self._lock:
+            conteos = list(self._conteos)
+
+        acumulado = 0
+        resultado = []
+        for conteo in conteos:
+            acumulado += conteo
+            resultado.append(acumulado)
+        return resultado
+
+    def percentil(self, p: float) -> float:
+        """
+        Estimar un percentil a partir de los buckets.
+
+        Args:
+            p: Percentil entre 0 y 100
+
+        Returns:
+            Límite superior del bucket que contiene el percentil
+            (el máximo observado si cae en +Inf)
+        """
+        with self._lock:
+            conteos = list(self._conteos)
+            total = self._total
+            maximo = self._maximo
+
+        if total == 0:
+            return 0.0
+
+        objetivo = p / 100 * total
+        acumulado = 0
+        for i, conteo in enumerate(conteos):
+            acumulado += conteo
+            if acumulado >= objetivo and conteo:
+                return float(self.buckets[i]) if i < len(self.buckets) else maximo
+        return maximo
+
+    def resumen(self) -> Dict[str, Any]:
+        """Resumen serializable (total, promedio, p50/p95/p99, máximo y buckets)"""
+        acumulados = self.acumulados()
+        etiquetas = [str(b) for b in self.buckets] + ["+Inf"]
+        return {
+            'total': self._total,
+            'promedio': round(self._suma / self._total, 2) if self._total else 0.0,
+            'p50': self.percentil(50),
+            'p95': self.percentil(95),
+            'p99': self.percentil(99),
+            'max': round(self._maximo, 2),
+            'buckets': dict(zip(etiquetas, acumulados))
+        }
+
+
+# ============================================
+# MÉTRICAS CON ETIQUETAS (formato Prometheus)
+# ============================================
+
+def _escapar(valor: Any) -> str:
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _formatear_numero(valor: float) -> str:
+    if valor == float('inf'):
+        return '+Inf'
+    if float(valor).is_integer():
+        return str(int(valor))
+    return repr(float(valor))
+
+
+def formatear_etiquetas(etiquetas: Dict[str, Any]) -> str:
+    """Formatear etiquetas como {a="1",b="2"} (vacío si no hay)"""
+    if not etiquetas:
+        return ''
+    pares = ','.join(f'{k}="{_escapar(v)}"' for k, v in etiquetas.items())
+    return '{' + pares + '}'
+
+
+def formatear_histograma(nombre: str, histograma: Histograma, etiquetas: Optional[Dict[str, Any]] = None) -> List[str]:
+    """Líneas _bucket/_sum/_count de un histograma"""
+    etiquetas = etiquetas or {}
+    lineas = []
+    limites = [_formatear_numero(b) for b in histograma.buckets] + ['+Inf']
+    for limite, acumulado in zip(limites, histograma.acumulados()):
+        lineas.append(f"{nombre}_bucket{formatear_etiquetas({**etiquetas, 'le': limite})} {acumulado}")
+    lineas.append(f"{nombre}_sum{formatear_etiquetas(etiquetas)} {_formatear_numero(round(histograma.suma, 3))}")
+    lineas.append(f"{nombre}_count{formatear_etiquetas(etiquetas)} {histograma.total}")
+    return lineas
+
+
+class _Familia:
+    """Base de una familia de métricas con etiquetas fijas"""
+
+    tipo = 'untyped'
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: Sequence[str] = ()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self._valores: Dict[Tuple, Any] = {}
+        self._lock = threading.Lock()
+
+    def _clave(self, etiquetas: Dict[str, Any]) -> Tuple:
+        return tuple(str(etiquetas.get(nombre, '')) for nombre in self.etiquetas)
+
+    def _etiquetas(self, clave: Tuple) -> Dict[str, str]:
+        return dict(zip(self.etiquetas, clave))
+
+    def valores(self) -> Dict[Tuple, Any]:
+        """Copia de los valores por combinación de etiquetas"""
+        with self._lock:
+            return dict(self._valores)
+
+    def encabezado(self) -> List[str]:
+        return [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} {self.tipo}"]
+
+    def exponer(self) -> List[str]:
+        with self._lock:
+            valores = dict(self._valores)
+        lineas = self.encabezado()
+        for clave, valor in sorted(valores.items()):
+            lineas.append(f"{self.nombre}{formatear_etiquetas(self._etiquetas(clave))} {_formatear_numero(valor)}")
+        return lineas
+
+
+class Contador(_Familia):
+    """Contador monótono"""
+
+    tipo = 'counter'
+
+    def inc(self, valor: float = 1, **etiquetas):
+        clave = self._clave(etiquetas)
+        with self._lock:
+            self._valores[clave] = self._valores.get(clave, 0) + valor
+
+    def valor(self, **etiquetas) -> float:
+        return self._valores.get(self._clave(etiquetas), 0)
+
+
+class Medidor(_Familia):
+    """Valor que sube y baja"""
+
+    tipo = 'gauge'
+
+    def set(self, valor: float, **etiquetas):
+        with self._lock:
+            self._valores[self._clave(etiquetas)] = valor
+
+    def inc(self, valor: float = 1, **etiquetas):
+        clave = self._clave(etiquetas)
+        with self._lock:
+            self._valores[clave] = self._valores.get(clave, 0) + valor
+
+    def dec(self, valor: float = 1, **etiquetas):
+        self.inc(-valor, **etiquetas)
+
+    def valor(self, **etiquetas) -> float:
+        return self._valores.get(self._clave(etiquetas), 0)
+
+
+class FamiliaHistogramas(_Familia):
+    """Un Histograma por combinación de etiquetas"""
+
+    tipo = 'histogram'
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: Sequence[str] = (), buckets: Sequence[float] = BUCKETS_LATENCIA_MS):
+        super().__init__(nombre, ayuda, etiquetas)
+        self.buckets = tuple(buckets)
+
+    def observar(self, valor: float, **etiquetas):
+        clave = self._clave(etiquetas)
+        histograma = self._valores.get(clave)
+        if histograma is None:
+            with self._lock:
+                histograma = self._valores.setdefault(clave, Histograma(self.buckets))
+        histograma.observar(valor)
+
+    def histograma(self, **etiquetas) -> Optional[Histograma]:
+        return self._valores.get(self._clave(etiquetas))
+
+    def exponer(self) -> List[str]:
+        with self._lock:
+            valores = dict(self._valores)
+        lineas = self.encabezado()
+        for clave, histograma in sorted(valores.items()):
+            lineas.extend(formatear_histograma(self.nombre, histograma, self._etiquetas(clave)))
+        return lineas
+
+
+class RegistroMetricas:
+    """
+    Registro de familias de métricas y colectores.
+
+    Los colectores son funciones que se ejecutan en cada exposición y
+    devuelven líneas ya formateadas (para valores que se calculan al vuelo).
+    """
+
+    def __init__(self):
+        self._familias: Dict[str, _Familia] = {}
+        self._colectores: List[Callable[[], List[str]]] = []
+        self._lock = threading.Lock()
+
+    def _registrar(self, familia: _Familia) -> _Familia:
+        with self._lock:
+            existente = self._familias.get(familia.nombre)
+            if existente is not None:
+                return existente
+            self._familias[familia.nombre] = familia
+            return familia
+
+    def contador(self, nombre: str, ayuda: str, etiquetas: Sequence[str] = ()) -> Contador:
+        return self._registrar(Contador(nombre, ayuda, etiquetas))
+
+    def medidor(self, nombre: str, ayuda: str, etiquetas: Sequence[str] = ()) -> Medidor:
+        return self._registrar(Medidor(nombre, ayuda, etiquetas))
+
+    def histograma(
+        self,
+        nombre: str,
+        ayuda: str,
+        etiquetas: Sequence[str] = (),
+        buckets: Sequence[float] = BUCKETS_LATENCIA_MS
+    ) -> FamiliaHistogramas:
+        return self._registrar(FamiliaHistogramas(nombre, ayuda, etiquetas, buckets))
+
+    def agregar_colector(self, colector: Callable[[], List[str]]):
+        """Registrar una función que devuelve líneas adicionales al exponer"""
+        with self._lock:
+            if colector not in self._colectores:
+                self._colectores.append(colector)
+
+    def exponer(self) -> str:
+        """Texto en formato de exposición de Prometheus (text/plain; version=0.0.4)"""
+        with self._lock:
+            familias = list(self._familias.values())
+            colectores = list(self._colectores)
+
+        lineas = []
+        for familia in familias:
+            lineas.extend(familia.exponer())
+        for colector in colectores:
+            try:
+                lineas.extend(colector())
+            except Exception as e:
+                lineas.append(f"# colector {getattr(colector, '__name__', colector)} falló: {_escapar(e)}")
+        return '\n'.join(lineas) + '\n'
+
+
+# Instancia global
+_registro_metricas = None
+
+
+def get_registro_metricas() -> RegistroMetricas:
+    """Obtener instancia del registro de métricas"""
+    global _registro_metricas
+    if _registro_metricas is None:
+        _registro_metricas = RegistroMetricas()
+    return _registro_metricas
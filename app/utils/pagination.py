@@ -0,0 +1,75 @@
+"""
+📑 Paginación por cursor (keyset)
+Cursores opacos sobre (columna de orden, id) para recorrer tablas grandes sin OFFSET
+"""
+
+import json
+import base64
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class CursorInvalido(ValueError):
+    """El cursor recibido no se puede decodificar"""
+
+
+def codificar_cursor(fila: Dict[str, Any], columna_orden: str = 'created_at', columna_id: str = 'id') -> str:
+    """Cursor opaco que apunta justo después de `fila`"""
+    crudo = json.dumps([fila[columna_orden], fila[columna_id]], default=str, separators=(',', ':'))
+    return base64.urlsafe_b64encode(crudo.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor: str) -> Tuple[Any, Any]:
+    """Valores (orden, id) de un cursor"""
+    try:
+        relleno = '=' * (-len(cursor) % 4)
+        valor_orden, valor_id = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+        return valor_orden, valor_id
+    except Exception as e:
+        raise CursorInvalido(f"Cursor inválido: {cursor}") from e
+
+
+def _literal(valor: Any) -> str:
+    # Entre comillas para que ':' '+' ',' de timestamps no rompan la sintaxis de or=()
+    texto = str(valor).replace('\\', '\\\\').replace('"', '\\"')
+    return f'"{texto}"'
+
+
+def aplicar_keyset(
+    query,
+    cursor: Optional[str],
+    columna_orden: str = 'created_at',
+    columna_id: str = 'id',
+    desc: bool = True
+):
+    """
+    Ordenar por (columna_orden, id) y filtrar las filas posteriores al cursor.
+
+    Equivale a `WHERE (orden, id) < (c_orden, c_id)` (o `>` si es ascendente),
+    que PostgreSQL resuelve con el índice sin recorrer las páginas previas.
+    """
+    if cursor:
+        valor_orden, valor_id = decodificar_cursor(cursor)
+        op = 'lt' if desc else 'gt'
+        query = query.or_(
+            f"{columna_orden}.{op}.{_literal(valor_orden)},"
+            f"and({columna_orden}.eq.{_literal(valor_orden)},{columna_id}.{op}.{_literal(valor_id)})"
+        )
+    return query.order(columna_orden, desc=desc).order(columna_id, desc=desc)
+
+
+def pagina(
+    filas: List[Dict[str, Any]],
+    limit: int,
+    columna_orden: str = 'created_at',
+    columna_id: str = 'id'
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Recortar una página pedida con `limit + 1` filas.
+
+    Returns:
+        (filas de la página, cursor siguiente o None si no hay más)
+    """
+    if len(filas) > limit:
+        filas = filas[:limit]
+        return filas, codificar_cursor(filas[-1], columna_orden, columna_id)
+    return filas, None
@@ -0,0 +1,52 @@
+"""
+🗂️ Particiones mensuales de conversaciones
+Nombres de partición por mes y ruteo de consultas recientes a las particiones calientes
+"""
+
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from app.config import Config
+
+TABLA_CONVERSACIONES = 'conversaciones'
+
+
+def inicio_mes(fecha: date) -> date:
+    """Primer día del mes de `fecha`"""
+    return date(fecha.year, fecha.month, 1)
+
+
+def sumar_meses(mes: date, meses: int) -> date:
+    """Primer día del mes desplazado `meses` (negativo hacia atrás)"""
+    indice = mes.year * 12 + mes.month - 1 + meses
+    return date(indice // 12, indice % 12 + 1, 1)
+
+
+def nombre_particion(mes: date) -> str:
+    """Partición de conversaciones de un mes (conversaciones_AAAA_MM)"""
+    return f"{TABLA_CONVERSACIONES}_{mes.year:04d}_{mes.month:02d}"
+
+
+def limite_caliente(dias: Optional[int] = None) -> datetime:
+    """Inicio de la ventana caliente: las consultas acotadas desde aquí tocan 1-2 particiones"""
+    return datetime.now() - timedelta(days=dias or Config.CONVERSACIONES_DIAS_CALIENTES)
+
+
+def caliente_primero(
+    construir: Callable[[Optional[datetime]], Any],
+    minimo: int = 1,
+    dias: Optional[int] = None
+) -> List[Dict[str, Any]]:
+    """
+    Ejecutar una consulta primero sobre las particiones calientes.
+
+    `construir(desde)` arma la consulta agregando `.gte('created_at', desde)`
+    cuando `desde` no es None; con esa cota PostgreSQL descarta las particiones
+    anteriores al planificar. Si la ventana no alcanza `minimo` filas se repite
+    sin cota (el caso raro de un chat inactivo hace semanas).
+    """
+    desde = limite_caliente(dias)
+    filas = construir(desde).execute().data or []
+    if len(filas) >= minimo:
+        return filas
+    return construir(None).execute().data or []
@@ -0,0 +1,60 @@
+"""
+📄 Extracción de texto de PDFs
+Texto por página dividido en pasajes para el índice local de documentos
+
+Se ejecuta en procesos del pool de DocumentIndexService: este módulo no importa
+nada de la aplicación para que los procesos hijos arranquen rápido.
+"""
+
+import io
+import re
+from typing import List, Tuple
+
+# Pasajes de este tamaño caben varios en un prompt y mantienen una tabla junta
+MAX_CARACTERES_PASAJE = 1200
+
+_ESPACIOS = re.compile(r'[ \t\f\v]+')
+_LINEAS_VACIAS = re.compile(r'\n\s*\n+')
+
+
+def _normalizar(texto: str) -> str:
+    texto = _ESPACIOS.sub(' ', texto or '')
+    return _LINEAS_VACIAS.sub('\n\n', texto).strip()
+
+
+def dividir_en_pasajes(
+    paginas: List[str],
+    max_caracteres: int = MAX_CARACTERES_PASAJE
+) -> List[Tuple[int, str]]:
+    """
+    Agrupar los párrafos de cada página en pasajes de hasta `max_caracteres`.
+
+    Returns:
+        Lista de (número de página desde 1, texto del pasaje)
+    """
+    pasajes = []
+    for numero, texto in enumerate(paginas, 1):
+        actual = ''
+        for parrafo in _normalizar(texto).split('\n\n'):
+            # Un párrafo más largo que el máximo se corta por líneas
+            trozos = [parrafo] if len(parrafo) <= max_caracteres else parrafo.split('\n')
+            for trozo in trozos:
+                trozo = trozo.strip()
+                if not trozo:
+                    continue
+                if actual and len(actual) + len(trozo) + 1 > max_caracteres:
+                    pasajes.append((numero, actual))
+                    actual = ''
+                actual = f"{actual}\n{trozo}" if actual else trozo[:max_caracteres * 2]
+        if actual:
+            pasajes.append((numero, actual))
+    return pasajes
+
+
+def extraer_pasajes(pdf_bytes: bytes, max_caracteres: int = MAX_CARACTERES_PASAJE) -> List[Tuple[int, str]]:
+    """Texto de un PDF en pasajes (página, texto). Requiere pypdf."""
+    from pypdf import PdfReader
+
+    lector = PdfReader(io.BytesIO(pdf_bytes))
+    paginas = [pagina.extract_text() or '' for pagina in lector.pages]
+    return dividir_en_pasajes(paginas, max_caracteres)
@@ -0,0 +1,427 @@
+"""
+🧵 Trazas por update
+Span raíz por update de Telegram con spans hijos para Supabase, Storage, OpenAI y la API de Telegram
+"""
+
+import os
+import json
+import time
+import random
+import inspect
+import logging
+import threading
+from collections import deque
+from contextvars import ContextVar
+from functools import wraps
+from typing import Any, Callable, Dict, List, Optional
+
+from app.config import Config
+
+logger = logging.getLogger(__name__)
+
+# Máximo de spans por traza (un update que entra en un loop no debe crecer sin límite)
+MAX_SPANS_POR_TRAZA = 500
+
+
+class Span:
+    """Un tramo con nombre, duración y atributos dentro de una traza"""
+
+    __slots__ = ('span_id', 'padre_id', 'nombre', 'inicio', '_inicio_perf', 'duracion_ms', 'atributos', 'error')
+
+    def __init__(self, nombre: str, padre_id: Optional[str] = None, atributos: Optional[Dict[str, Any]] = None):
+        self.span_id = os.urandom(8).hex()
+        self.padre_id = padre_id
+        self.nombre = nombre
+        self.inicio = time.time()
+        self._inicio_perf = time.perf_counter()
+        self.duracion_ms: Optional[float] = None
+        self.atributos = dict(atributos or {})
+        self.error: Optional[str] = None
+
+    def terminar(self, error: Optional[str] = None):
+        self.duracion_ms = (time.perf_counter() - self._inicio_perf) * 1000
+        if error:
+            self.error = error
+
+    def a_dict(self) -> Dict[str, Any]:
+        return {
+            'span_id': self.span_id,
+            'padre_id': self.padre_id,
+            'nombre': self.nombre,
+            'inicio': self.inicio,
+            'duracion_ms': round(self.duracion_ms or 0.0, 2),
+            'atributos': self.atributos,
+            'error': self.error
+        }
+
+
+class Traza:
+    """Spans de un update; se exporta completa cuando termina el span raíz"""
+
+    def __init__(self, nombre: str, atributos: Dict[str, Any]):
+        self.trace_id = os.urandom(16).hex()
+        self.raiz = Span(nombre, atributos=atributos)
+        self.spans: List[Span] = [self.raiz]
+        self.cerrada = False
+        self.descartados = 0
+
+    def agregar(self, span: Span) -> bool:
+        if self.cerrada or len(self.spans) >= MAX_SPANS_POR_TRAZA:
+            self.descartados += 1
+            return False
+        self.spans.append(span)
+        return True
+
+    def a_dict(self) -> Dict[str, Any]:
+        raiz = self.raiz
+        return {
+            'trace_id': self.trace_id,
+            'nombre': raiz.nombre,
+            'chat_id': raiz.atributos.get('chat_id'),
+            'update_id': raiz.atributos.get('update_id'),
+            'bot': raiz.atributos.get('bot'),
+            'handler': raiz.atributos.get('handler'),
+            'inicio': raiz.inicio,
+            'duracion_ms': round(raiz.duracion_ms or 0.0, 2),
+            'error': raiz.error,
+            'spans_descartados': self.descartados,
+            'spans': [span.a_dict() for span in self.spans]
+        }
+
+
+_traza_actual: ContextVar[Optional[Traza]] = ContextVar('traza_actual', default=None)
+_span_actual: ContextVar[Optional[Span]] = ContextVar('span_actual', default=None)
+
+
+# ============================================
+# EXPORTADORES
+# ============================================
+
+class ExportadorJSONL:
+    """Escribe una traza por línea en un archivo local"""
+
+    def __init__(self, ruta: str):
+        self.ruta = ruta
+
+    def exportar(self, trazas: List[Dict[str, Any]]):
+        directorio = os.path.dirname(self.ruta)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        with open(self.ruta, 'a', encoding='utf-8') as f:
+            for traza in trazas:
+                f.write(json.dumps(traza, ensure_ascii=False, default=str) + '\n')
+
+
+class ExportadorOTLP:
+    """
+    Envía las trazas a un colector compatible con OTLP/HTTP en JSON
+    (POST {endpoint}/v1/traces con resourceSpans).
+    """
+
+    def __init__(self, endpoint: str, servicio: str = 'aca-bots', timeout: float = 5.0):
+        self.url = endpoint.rstrip('/') + '/v1/traces'
+        self.servicio = servicio
+        self.timeout = timeout
+
+    @staticmethod
+    def _atributos(atributos: Dict[str, Any]) -> List[Dict[str, Any]]:
+        resultado = []
+        for clave, valor in atributos.items():
+            if isinstance(valor, bool):
+                resultado.append({'key': clave, 'value': {'boolValue': valor}})
+            elif isinstance(valor, int):
+                resultado.append({'key': clave, 'value': {'intValue': str(valor)}})
+            elif isinstance(valor, float):
+                resultado.append({'key': clave, 'value': {'doubleValue': valor}})
+            else:
+                resultado.append({'key': clave, 'value': {'stringValue': str(valor)}})
+        return resultado
+
+    def a_otlp(self, trazas: List[Dict[str, Any]]) -> Dict[str, Any]:
+        spans = []
+        for traza in trazas:
+            for span in traza['spans']:
+                inicio_ns = int(span['inicio'] * 1e9)
+                spans.append({
+                    'traceId': traza['trace_id'],
+                    'spanId': span['span_id'],
+                    'parentSpanId': span['padre_id'] or '',
+                    'name': span['nombre'],
+                    'kind': 1,
+                    'startTimeUnixNano': str(inicio_ns),
+                    'endTimeUnixNano': str(inicio_ns + int(span['duracion_ms'] * 1e6)),
+                    'attributes': self._atributos(span['atributos']),
+                    'status': {'code': 2, 'message': span['error']} if span['error'] else {'code': 1}
+                })
+        return {
+            'resourceSpans': [{
+                'resource': {'attributes': self._atributos({'service.name': self.servicio})},
+                'scopeSpans': [{'scope': {'name': 'aca.tracing'}, 'spans': spans}]
+            }]
+        }
+
+    def exportar(self, trazas: List[Dict[str, Any]]):
+        import httpx
+        respuesta = httpx.post(self.url, json=self.a_otlp(trazas), timeout=self.timeout)
+        respuesta.raise_for_status()
+
+
+# ============================================
+# TRAZADOR
+# ============================================
+
+class Trazador:
+    """
+    Decide qué trazas conservar y las exporta en lotes desde un hilo aparte.
+
+    Las trazas se arman completas en memoria y el muestreo se decide al cerrar
+    el span raíz: se conserva una fracción `tasa_muestreo` más todas las que
+    terminaron con error o superaron `umbral_lento_ms`.
+    """
+
+    def __init__(
+        self,
+        exportador=None,
+        tasa_muestreo: float = 0.1,
+        umbral_lento_ms: int = 2000,
+        tamano_buffer: int = 1000,
+        tamano_lote: int = 50,
+        intervalo_exportacion: float = 5.0
+    ):
+        self.exportador = exportador
+        self.tasa_muestreo = tasa_muestreo
+        self.umbral_lento_ms = umbral_lento_ms
+        self.tamano_lote = tamano_lote
+        self.intervalo_exportacion = intervalo_exportacion
+        self._buffer = deque(maxlen=tamano_buffer)
+        self._lock = threading.Lock()
+        self._despertar = threading.Event()
+        self._detener = threading.Event()
+        self._hilo: Optional[threading.Thread] = None
+        self.exportadas = 0
+        self.descartadas_por_buffer = 0
+        self.errores_exportacion = 0
+
+    @property
+    def habilitado(self) -> bool:
+        return self.exportador is not None
+
+    def conservar(self, traza: Traza) -> bool:
+        """Decisión de muestreo al cerrar la traza"""
+        raiz = traza.raiz
+        if raiz.error or any(span.error for span in traza.spans):
+            return True
+        if (raiz.duracion_ms or 0) >= self.umbral_lento_ms:
+            return True
+        return random.random() < self.tasa_muestreo
+
+    def encolar(self, traza: Traza):
+        if not self.conservar(traza):
+            return
+        with self._lock:
+            if len(self._buffer) == self._buffer.maxlen:
+                self.descartadas_por_buffer += 1
+            self._buffer.append(traza.a_dict())
+            lleno = len(self._buffer) >= self.tamano_lote
+        self._asegurar_hilo()
+        if lleno:
+            self._despertar.set()
+
+    def vaciar(self):
+        """Exportar todo lo que está en el buffer (bloqueante)"""
+        while True:
+            with self._lock:
+                lote = [self._buffer.popleft() for _ in range(min(self.tamano_lote, len(self._buffer)))]
+            if not lote:
+                return
+            try:
+                self.exportador.exportar(lote)
+                self.exportadas += len(lote)
+            except Exception as e:
+                self.errores_exportacion += 1
+                logger.error(f"❌ Error exportando {len(lote)} trazas: {e}")
+                return
+
+    def _asegurar_hilo(self):
+        if self._hilo is None or not self._hilo.is_alive():
+            self._detener.clear()
+            self._hilo = threading.Thread(target=self._ciclo, name='exportador-trazas', daemon=True)
+            self._hilo.start()
+
+    def _ciclo(self):
+        while not self._detener.is_set():
+            self._despertar.wait(self.intervalo_exportacion)
+            self._despertar.clear()
+            self.vaciar()
+
+    def detener(self):
+        """Detener el hilo exportador y vaciar el buffer"""
+        self._detener.set()
+        self._despertar.set()
+        if self._hilo is not None:
+            self._hilo.join(timeout=self.intervalo_exportacion + 1)
+            self._hilo = None
+        if self.habilitado:
+            self.vaciar()
+
+    def estadisticas(self) -> Dict[str, Any]:
+        with self._lock:
+            en_buffer = len(self._buffer)
+        return {
+            'habilitado': self.habilitado,
+            'tasa_muestreo': self.tasa_muestreo,
+            'umbral_lento_ms': self.umbral_lento_ms,
+            'en_buffer': en_buffer,
+            'exportadas': self.exportadas,
+            'descartadas_por_buffer': self.descartadas_por_buffer,
+            'errores_exportacion': self.errores_exportacion
+        }
+
+
+# ============================================
+# API DE SPANS
+# ============================================
+
+class _SpanActivo:
+    """Context manager de un span hijo; no hace nada si no hay traza en curso"""
+
+    __slots__ = ('_nombre', '_atributos', '_span', '_token')
+
+    def __init__(self, nombre: str, atributos: Dict[str, Any]):
+        self._nombre = nombre
+        self._atributos = atributos
+        self._span = None
+        self._token = None
+
+    def __enter__(self) -> Optional[Span]:
+        traza = _traza_actual.get()
+        if traza is None:
+            return None
+        padre = _span_actual.get() or traza.raiz
+        span = Span(self._nombre, padre.span_id, self._atributos)
+        if traza.agregar(span):
+            self._span = span
+            self._token = _span_actual.set(span)
+        return self._span
+
+    def __exit__(self, tipo, valor, tb):
+        if self._span is not None:
+            self._span.terminar(tipo.__name__ if tipo else None)
+            _span_actual.reset(self._token)
+        return False
+
+
+def span(nombre: str, **atributos) -> _SpanActivo:
+    """
+    Abrir un span hijo del span en curso.
+
+    Uso:
+        with span('supabase.select', tabla='archivos'):
+            ...
+    """
+    return _SpanActivo(nombre, atributos)
+
+
+def trazar(nombre: Optional[str] = None) -> Callable:
+    """Decorador que envuelve una función (sync o async) en un span"""
+    def decorador(funcion: Callable) -> Callable:
+        nombre_span = nombre or funcion.__qualname__
+
+        if inspect.iscoroutinefunction(funcion):
+            @wraps(funcion)
+            async def wrapper_async(*args, **kwargs):
+                with span(nombre_span):
+                    return await funcion(*args, **kwargs)
+            return wrapper_async
+
+        @wraps(funcion)
+        def wrapper(*args, **kwargs):
+            with span(nombre_span):
+                return funcion(*args, **kwargs)
+        return wrapper
+
+    return decorador
+
+
+def iniciar_traza(nombre: str, **atributos):
+    """
+    Abrir el span raíz de un update.
+
+    Returns:
+        Token para `terminar_traza`, o None si el trazado está deshabilitado
+    """
+    if not get_trazador().habilitado:
+        return None
+    traza = Traza(nombre, atributos)
+    return traza, _traza_actual.set(traza), _span_actual.set(None)
+
+
+def terminar_traza(token, error: Optional[str] = None):
+    """Cerrar el span raíz y encolar la traza para exportar"""
+    if token is None:
+        return
+    traza, token_traza, token_span = token
+    traza.raiz.terminar(error)
+    traza.cerrada = True
+    _span_actual.reset(token_span)
+    _traza_actual.reset(token_traza)
+    try:
+        get_trazador().encolar(traza)
+    except Exception as e:
+        logger.error(f"❌ Error encolando traza: {e}")
+
+
+def get_traza_actual() -> Optional[Traza]:
+    """Traza del update en curso (None fuera de un handler o con trazado deshabilitado)"""
+    return _traza_actual.get()
+
+
+def trazar_request_telegram(request):
+    """
+    Envolver `do_request` de un BaseRequest de python-telegram-bot para que
+    cada llamada a la API de Telegram sea un span (telegram.sendMessage, ...).
+    """
+    if request is None or getattr(request.do_request, '_trazado', False):
+        return request
+
+    original = request.do_request
+
+    @wraps(original)
+    async def do_request(url, method, *args, **kwargs):
+        with span(f"telegram.{url.rsplit('/', 1)[-1]}", metodo_http=method):
+            return await original(url, method, *args, **kwargs)
+
+    do_request._trazado = True
+    request.do_request = do_request
+    return request
+
+
+def _crear_exportador():
+    exportador = Config.TRACING_EXPORTER.lower()
+    if exportador == 'jsonl':
+        return ExportadorJSONL(Config.TRACING_JSONL_PATH)
+    if exportador == 'otlp':
+        if not Config.TRACING_OTLP_ENDPOINT:
+            logger.warning("⚠️ TRACING_EXPORTER=otlp sin TRACING_OTLP_ENDPOINT, trazado deshabilitado")
+            return None
+        return ExportadorOTLP(Config.TRACING_OTLP_ENDPOINT)
+    if exportador not in ('', 'none'):
+        logger.warning(f"⚠️ TRACING_EXPORTER desconocido: {exportador}")
+    return None
+
+
+# Instancia global
+_trazador = None
+
+
+def get_trazador() -> Trazador:
+    """Obtener instancia del trazador"""
+    global _trazador
+    if _trazador is None:
+        _trazador = Trazador(
+            exportador=_crear_exportador(),
+            tasa_muestreo=Config.TRACING_SAMPLE_RATE,
+            umbral_lento_ms=Config.TRACING_SLOW_MS,
+            tamano_buffer=Config.TRACING_BUFFER_SIZE
+        )
+    return _trazador
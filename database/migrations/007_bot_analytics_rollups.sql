@@ -0,0 +1,142 @@
+-- ============================================
+-- MIGRACIÓN 007: Rollups incrementales en bot_analytics
+-- Agregados por bot, día y hora que se acumulan a medida que se registran conversaciones
+-- ============================================
+
+-- Una fila por (fecha, bot_tipo, hora); hora = -1 es el total del día
+ALTER TABLE bot_analytics
+    ADD COLUMN IF NOT EXISTS hora SMALLINT NOT NULL DEFAULT -1,
+    ADD COLUMN IF NOT EXISTS mensajes_autorizados INTEGER DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS mensajes_no_autorizados INTEGER DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS usuarios_no_autorizados INTEGER DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS latencia_conteo INTEGER DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS latencia_suma_ms BIGINT DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS latencia_buckets INTEGER[] DEFAULT '{}',
+    ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ DEFAULT NOW();
+
+ALTER TABLE bot_analytics DROP CONSTRAINT IF EXISTS bot_analytics_fecha_bot_tipo_key;
+
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_constraint WHERE conname = 'bot_analytics_fecha_bot_tipo_hora_key'
+    ) THEN
+        ALTER TABLE bot_analytics
+            ADD CONSTRAINT bot_analytics_fecha_bot_tipo_hora_key UNIQUE (fecha, bot_tipo, hora);
+    END IF;
+END $$;
+
+DROP INDEX IF EXISTS idx_bot_analytics_fecha_bot;
+CREATE INDEX IF NOT EXISTS idx_bot_analytics_hora_fecha ON bot_analytics(hora, fecha);
+
+-- Usuarios ya contados por período (para usuarios únicos incrementales)
+CREATE TABLE IF NOT EXISTS bot_analytics_usuarios (
+    fecha DATE NOT NULL,
+    hora SMALLINT NOT NULL,
+    bot_tipo VARCHAR(20) NOT NULL,
+    tipo VARCHAR(20) NOT NULL,  -- 'total' o 'no_autorizado'
+    chat_id BIGINT NOT NULL,
+    PRIMARY KEY (fecha, hora, bot_tipo, tipo, chat_id)
+);
+
+-- Función: acumular_bot_analytics
+-- Suma un lote de eventos a la fila de la hora y a la del día.
+-- p_latencia_buckets son conteos por bucket (mismos límites que BUCKETS_LATENCIA_MS + Inf).
+CREATE OR REPLACE FUNCTION acumular_bot_analytics(
+    p_fecha DATE,
+    p_hora SMALLINT,
+    p_bot_tipo VARCHAR(20),
+    p_mensajes INTEGER,
+    p_autorizados INTEGER,
+    p_no_autorizados INTEGER,
+    p_comandos INTEGER,
+    p_errores INTEGER,
+    p_chat_ids BIGINT[],
+    p_chat_ids_no_autorizados BIGINT[],
+    p_latencia_conteo INTEGER DEFAULT 0,
+    p_latencia_suma_ms BIGINT DEFAULT 0,
+    p_latencia_buckets INTEGER[] DEFAULT '{}'
+) RETURNS VOID AS $$
+DECLARE
+    v_hora SMALLINT;
+    v_nuevos INTEGER;
+    v_nuevos_no_autorizados INTEGER;
+BEGIN
+    FOREACH v_hora IN ARRAY ARRAY[p_hora, -1]::SMALLINT[] LOOP
+        WITH insertados AS (
+            INSERT INTO bot_analytics_usuarios (fecha, hora, bot_tipo, tipo, chat_id)
+            SELECT p_fecha, v_hora, p_bot_tipo, 'total', unnest(p_chat_ids)
+            ON CONFLICT DO NOTHING
+            RETURNING 1
+        ) SELECT count(*) INTO v_nuevos FROM insertados;
+
+        WITH insertados AS (
+            INSERT INTO bot_analytics_usuarios (fecha, hora, bot_tipo, tipo, chat_id)
+            SELECT p_fecha, v_hora, p_bot_tipo, 'no_autorizado', unnest(p_chat_ids_no_autorizados)
+            ON CONFLICT DO NOTHING
+            RETURNING 1
+        ) SELECT count(*) INTO v_nuevos_no_autorizados FROM insertados;
+
+        INSERT INTO bot_analytics (
+            fecha, bot_tipo, hora, total_mensajes, mensajes_autorizados, mensajes_no_autorizados,
+            usuarios_unicos, usuarios_no_autorizados, comandos_ejecutados, errores_count,
+            latencia_conteo, latencia_suma_ms, latencia_buckets, tiempo_promedio_respuesta_ms, updated_at
+        ) VALUES (
+            p_fecha, p_bot_tipo, v_hora, p_mensajes, p_autorizados, p_no_autorizados,
+            v_nuevos, v_nuevos_no_autorizados, p_comandos, p_errores,
+            p_latencia_conteo, p_latencia_suma_ms, p_latencia_buckets,
+            p_latencia_suma_ms / NULLIF(p_latencia_conteo, 0), NOW()
+        )
+        ON CONFLICT (fecha, bot_tipo, hora) DO UPDATE SET
+            total_mensajes = bot_analytics.total_mensajes + EXCLUDED.total_mensajes,
+            mensajes_autorizados = bot_analytics.mensajes_autorizados + EXCLUDED.mensajes_autorizados,
+            mensajes_no_autorizados = bot_analytics.mensajes_no_autorizados + EXCLUDED.mensajes_no_autorizados,
+            usuarios_unicos = bot_analytics.usuarios_unicos + EXCLUDED.usuarios_unicos,
+            usuarios_no_autorizados = bot_analytics.usuarios_no_autorizados + EXCLUDED.usuarios_no_autorizados,
+            comandos_ejecutados = bot_analytics.comandos_ejecutados + EXCLUDED.comandos_ejecutados,
+            errores_count = bot_analytics.errores_count + EXCLUDED.errores_count,
+            latencia_conteo = bot_analytics.latencia_conteo + EXCLUDED.latencia_conteo,
+            latencia_suma_ms = bot_analytics.latencia_suma_ms + EXCLUDED.latencia_suma_ms,
+            latencia_buckets = ARRAY(
+                SELECT COALESCE(a, 0) + COALESCE(b, 0)
+                FROM unnest(bot_analytics.latencia_buckets, EXCLUDED.latencia_buckets) AS t(a, b)
+            ),
+            tiempo_promedio_respuesta_ms = (bot_analytics.latencia_suma_ms + EXCLUDED.latencia_suma_ms)
+                / NULLIF(bot_analytics.latencia_conteo + EXCLUDED.latencia_conteo, 0),
+            updated_at = NOW();
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Backfill desde conversaciones para días sin rollup (sin latencias: no se guardaban)
+DO $$
+DECLARE
+    r RECORD;
+BEGIN
+    FOR r IN
+        SELECT
+            created_at::date AS fecha,
+            EXTRACT(HOUR FROM created_at)::SMALLINT AS hora,
+            COALESCE(bot_tipo, 'production') AS bot_tipo,
+            count(*) AS mensajes,
+            count(*) FILTER (WHERE empresa_id IS NOT NULL) AS autorizados,
+            count(*) FILTER (WHERE empresa_id IS NULL) AS no_autorizados,
+            count(*) FILTER (WHERE comando IS NOT NULL) AS comandos,
+            array_agg(DISTINCT chat_id) AS chat_ids,
+            COALESCE(array_agg(DISTINCT chat_id) FILTER (WHERE empresa_id IS NULL), '{}') AS chat_ids_no_autorizados
+        FROM conversaciones
+        WHERE created_at::date NOT IN (SELECT DISTINCT fecha FROM bot_analytics)
+        GROUP BY 1, 2, 3
+    LOOP
+        PERFORM acumular_bot_analytics(
+            r.fecha, r.hora, r.bot_tipo, r.mensajes::INTEGER, r.autorizados::INTEGER,
+            r.no_autorizados::INTEGER, r.comandos::INTEGER, 0, r.chat_ids, r.chat_ids_no_autorizados
+        );
+    END LOOP;
+END $$;
+
+-- Comentarios
+COMMENT ON COLUMN bot_analytics.hora IS 'Hora del día (0-23); -1 = total del día';
+COMMENT ON COLUMN bot_analytics.latencia_buckets IS 'Conteos por bucket de latencia (BUCKETS_LATENCIA_MS + Inf)';
+COMMENT ON TABLE bot_analytics_usuarios IS 'Usuarios ya contados por período para usuarios únicos incrementales';
+COMMENT ON FUNCTION acumular_bot_analytics IS 'Acumula un lote de eventos en las filas por hora y por día de bot_analytics';
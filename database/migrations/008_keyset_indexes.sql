@@ -0,0 +1,25 @@
+-- ============================================
+-- MIGRACIÓN 008: Índices para paginación por cursor
+-- (orden, id) para que cada página sea un range scan sin OFFSET
+-- ============================================
+
+-- /recent y /export: conversaciones por (created_at, id)
+CREATE INDEX IF NOT EXISTS idx_conversaciones_created_at_id
+ON conversaciones(created_at, id);
+
+-- /user-history: historial de un chat
+CREATE INDEX IF NOT EXISTS idx_conversaciones_chat_created_at_id
+ON conversaciones(chat_id, created_at, id);
+
+-- /unauthorized: usuarios sin acceso por última interacción
+CREATE INDEX IF NOT EXISTS idx_usuarios_detalle_sin_acceso_ultima_id
+ON usuarios_detalle(ultima_interaccion, id)
+WHERE tipo_acceso IN ('no_autorizado', 'bloqueado');
+
+-- /attempts: intentos de un chat
+CREATE INDEX IF NOT EXISTS idx_intentos_acceso_chat_timestamp_id
+ON intentos_acceso_negado(chat_id, timestamp, id);
+
+-- Reemplazados por los compuestos
+DROP INDEX IF EXISTS idx_conversaciones_created_at;
+DROP INDEX IF EXISTS idx_conversaciones_chat_id;
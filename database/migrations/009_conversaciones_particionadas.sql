@@ -0,0 +1,222 @@
+-- ============================================
+-- MIGRACIÓN 009: conversaciones particionada por mes
+-- Particiones mensuales por created_at, catálogo de meses archivados en Storage
+-- y funciones para crear, listar y eliminar particiones
+-- ============================================
+
+BEGIN;
+
+-- 1. Función: crear_particion_conversaciones
+-- Crea conversaciones_AAAA_MM para el mes de p_mes. Si la partición por
+-- defecto ya tiene filas de ese mes, las mueve a la nueva partición.
+CREATE OR REPLACE FUNCTION crear_particion_conversaciones(p_mes DATE)
+RETURNS TEXT AS $$
+DECLARE
+    v_desde TIMESTAMPTZ := date_trunc('month', p_mes)::timestamptz;
+    v_hasta TIMESTAMPTZ := (date_trunc('month', p_mes) + INTERVAL '1 month')::timestamptz;
+    v_nombre TEXT := 'conversaciones_' || to_char(p_mes, 'YYYY_MM');
+BEGIN
+    IF to_regclass(v_nombre) IS NOT NULL THEN
+        RETURN v_nombre;
+    END IF;
+
+    IF EXISTS (SELECT 1 FROM conversaciones_default WHERE created_at >= v_desde AND created_at < v_hasta) THEN
+        ALTER TABLE conversaciones DETACH PARTITION conversaciones_default;
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF conversaciones FOR VALUES FROM (%L) TO (%L)',
+            v_nombre, v_desde, v_hasta
+        );
+        EXECUTE format(
+            'INSERT INTO %I SELECT * FROM conversaciones_default WHERE created_at >= %L AND created_at < %L',
+            v_nombre, v_desde, v_hasta
+        );
+        DELETE FROM conversaciones_default WHERE created_at >= v_desde AND created_at < v_hasta;
+        ALTER TABLE conversaciones ATTACH PARTITION conversaciones_default DEFAULT;
+    ELSE
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF conversaciones FOR VALUES FROM (%L) TO (%L)',
+            v_nombre, v_desde, v_hasta
+        );
+    END IF;
+
+    RETURN v_nombre;
+END;
+$$ LANGUAGE plpgsql;
+
+-- 2. Función: asegurar_particiones_conversaciones
+-- Crea las particiones del mes actual y de los próximos p_meses_adelante meses
+CREATE OR REPLACE FUNCTION asegurar_particiones_conversaciones(p_meses_adelante INTEGER DEFAULT 3)
+RETURNS INTEGER AS $$
+DECLARE
+    v_mes DATE;
+    v_creadas INTEGER := 0;
+BEGIN
+    FOR v_mes IN
+        SELECT generate_series(
+            date_trunc('month', NOW()),
+            date_trunc('month', NOW()) + make_interval(months => p_meses_adelante),
+            INTERVAL '1 month'
+        )::date
+    LOOP
+        IF to_regclass('conversaciones_' || to_char(v_mes, 'YYYY_MM')) IS NULL THEN
+            PERFORM crear_particion_conversaciones(v_mes);
+            v_creadas := v_creadas + 1;
+        END IF;
+    END LOOP;
+    RETURN v_creadas;
+END;
+$$ LANGUAGE plpgsql;
+
+-- 3. Reemplazar conversaciones por la tabla particionada y copiar las filas.
+-- Se omite si conversaciones ya está particionada (la migración se puede volver a aplicar)
+DO $$
+DECLARE
+    v_mes DATE;
+    v_primero DATE;
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'conversaciones'::regclass) THEN
+        RAISE NOTICE 'conversaciones ya está particionada: se omite la reconstrucción';
+        RETURN;
+    END IF;
+
+    -- La PK debe incluir la clave de partición
+    CREATE TABLE IF NOT EXISTS conversaciones_particionada (
+        id UUID NOT NULL DEFAULT uuid_generate_v4(),
+        chat_id BIGINT NOT NULL,
+        empresa_id UUID REFERENCES empresas(id) ON DELETE SET NULL,
+        mensaje TEXT NOT NULL,
+        respuesta TEXT,
+        usuario_nombre VARCHAR(255),
+        usuario_username VARCHAR(255),
+        bot_tipo VARCHAR(20) DEFAULT 'production',
+        comando VARCHAR(100),
+        parametros JSONB,
+        metadata JSONB DEFAULT '{}'::jsonb,
+        created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+        PRIMARY KEY (id, created_at)
+    ) PARTITION BY RANGE (created_at);
+
+    LOCK TABLE conversaciones IN ACCESS EXCLUSIVE MODE;
+    ALTER TABLE conversaciones RENAME TO conversaciones_sin_particionar;
+    ALTER TABLE conversaciones_particionada RENAME TO conversaciones;
+
+    -- Filas fuera de toda partición mensual (evita que un insert falle)
+    CREATE TABLE IF NOT EXISTS conversaciones_default PARTITION OF conversaciones DEFAULT;
+
+    -- Particiones para los datos existentes
+    SELECT COALESCE(date_trunc('month', min(created_at)), date_trunc('month', NOW()))::date
+    INTO v_primero
+    FROM conversaciones_sin_particionar;
+
+    FOR v_mes IN
+        SELECT generate_series(v_primero, date_trunc('month', NOW())::date, INTERVAL '1 month')::date
+    LOOP
+        PERFORM crear_particion_conversaciones(v_mes);
+    END LOOP;
+
+    INSERT INTO conversaciones (
+        id, chat_id, empresa_id, mensaje, respuesta, usuario_nombre, usuario_username,
+        bot_tipo, comando, parametros, metadata, created_at
+    )
+    SELECT
+        id, chat_id, empresa_id, mensaje, respuesta, usuario_nombre, usuario_username,
+        bot_tipo, comando, parametros, metadata, COALESCE(created_at, NOW())
+    FROM conversaciones_sin_particionar;
+
+    -- La vista depende de la tabla anterior: se elimina con ella y se recrea más abajo
+    DROP TABLE conversaciones_sin_particionar CASCADE;
+    ALTER TABLE conversaciones RENAME CONSTRAINT conversaciones_particionada_pkey TO conversaciones_pkey;
+END $$;
+
+-- 4. Particiones de los próximos meses
+SELECT asegurar_particiones_conversaciones(3);
+
+-- 5. Índices (se propagan a cada partición)
+CREATE INDEX IF NOT EXISTS idx_conversaciones_created_at_id ON conversaciones(created_at, id);
+CREATE INDEX IF NOT EXISTS idx_conversaciones_chat_created_at_id ON conversaciones(chat_id, created_at, id);
+CREATE INDEX IF NOT EXISTS idx_conversaciones_empresa_id ON conversaciones(empresa_id);
+CREATE INDEX IF NOT EXISTS idx_conversaciones_bot_tipo ON conversaciones(bot_tipo);
+
+CREATE OR REPLACE VIEW vista_conversaciones_recientes AS
+SELECT
+    c.id,
+    c.chat_id,
+    c.usuario_nombre,
+    c.usuario_username,
+    COALESCE(e.nombre, 'Usuario No Registrado') as empresa_nombre,
+    c.mensaje,
+    c.respuesta,
+    c.bot_tipo,
+    c.created_at,
+    CASE
+        WHEN c.empresa_id IS NOT NULL THEN 'Autorizado'
+        ELSE 'No Autorizado'
+    END as estado_usuario
+FROM conversaciones c
+LEFT JOIN empresas e ON c.empresa_id = e.id
+ORDER BY c.created_at DESC
+LIMIT 1000;
+
+-- 6. Catálogo de meses archivados (gzip NDJSON en Storage)
+CREATE TABLE IF NOT EXISTS conversaciones_archivo (
+    mes DATE PRIMARY KEY,
+    particion TEXT NOT NULL,
+    storage_path TEXT NOT NULL,
+    filas BIGINT NOT NULL,
+    bytes BIGINT NOT NULL,
+    sha256 TEXT NOT NULL,
+    archivado_at TIMESTAMPTZ DEFAULT NOW(),
+    rehidratado_at TIMESTAMPTZ
+);
+
+-- 7. Función: listar_particiones_conversaciones
+CREATE OR REPLACE FUNCTION listar_particiones_conversaciones()
+RETURNS TABLE (particion TEXT, mes DATE, filas_estimadas BIGINT, bytes BIGINT) AS $$
+    SELECT
+        c.relname::TEXT,
+        to_date(substring(c.relname FROM 'conversaciones_(\d{4}_\d{2})$'), 'YYYY_MM'),
+        GREATEST(c.reltuples, 0)::BIGINT,
+        pg_total_relation_size(c.oid)
+    FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = 'conversaciones'::regclass
+      AND c.relname ~ '^conversaciones_\d{4}_\d{2}$'
+    ORDER BY 2;
+$$ LANGUAGE sql STABLE;
+
+-- 8. Función: eliminar_particion_conversaciones
+-- Desprende y elimina una partición ya archivada. Solo procede si sigue
+-- teniendo exactamente las filas que se archivaron.
+CREATE OR REPLACE FUNCTION eliminar_particion_conversaciones(p_particion TEXT, p_filas_esperadas BIGINT)
+RETURNS BOOLEAN AS $$
+DECLARE
+    v_filas BIGINT;
+BEGIN
+    IF p_particion !~ '^conversaciones_\d{4}_\d{2}$' OR NOT EXISTS (
+        SELECT 1 FROM pg_inherits
+        WHERE inhparent = 'conversaciones'::regclass AND inhrelid = to_regclass(p_particion)
+    ) THEN
+        RAISE EXCEPTION 'No es una partición de conversaciones: %', p_particion;
+    END IF;
+
+    EXECUTE format('LOCK TABLE %I IN ACCESS EXCLUSIVE MODE', p_particion);
+    EXECUTE format('SELECT count(*) FROM %I', p_particion) INTO v_filas;
+    IF v_filas <> p_filas_esperadas THEN
+        RETURN FALSE;
+    END IF;
+
+    EXECUTE format('ALTER TABLE conversaciones DETACH PARTITION %I', p_particion);
+    EXECUTE format('DROP TABLE %I', p_particion);
+    RETURN TRUE;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Comentarios
+COMMENT ON TABLE conversaciones IS 'Registro de todas las conversaciones con los bots (particionada por mes de created_at)';
+COMMENT ON TABLE conversaciones_archivo IS 'Meses de conversaciones archivados como gzip NDJSON en Storage';
+COMMENT ON FUNCTION crear_particion_conversaciones IS 'Crea la partición mensual de conversaciones para un mes';
+COMMENT ON FUNCTION asegurar_particiones_conversaciones IS 'Crea las particiones del mes actual y los siguientes';
+COMMENT ON FUNCTION listar_particiones_conversaciones IS 'Particiones mensuales de conversaciones con filas estimadas y tamaño';
+COMMENT ON FUNCTION eliminar_particion_conversaciones IS 'Desprende y elimina una partición archivada si su conteo coincide';
+
+COMMIT;
@@ -0,0 +1,75 @@
+-- ============================================
+-- MIGRACIÓN 010: Tareas programadas de mantenimiento
+-- Una sola réplica ejecuta cada tarea por intervalo (lease protegido con advisory lock)
+-- ============================================
+
+CREATE TABLE IF NOT EXISTS tareas_programadas (
+    tarea VARCHAR(100) PRIMARY KEY,
+    duenio TEXT,                    -- réplica que la ejecuta o ejecutó (host:pid:id)
+    lease_hasta TIMESTAMPTZ,        -- NULL si no está en ejecución
+    ultima_ejecucion TIMESTAMPTZ,   -- inicio de la última ejecución
+    ultima_duracion_ms INTEGER,
+    ultimo_resultado VARCHAR(20),   -- 'ok' o 'error'
+    ultimo_error TEXT,
+    updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+-- Función: tomar_tarea_programada
+-- Devuelve TRUE si esta réplica debe ejecutar la tarea ahora: nadie la está
+-- ejecutando (o su lease venció) y la última ejecución fue hace al menos
+-- p_espaciado_segundos. El advisory lock de transacción serializa la decisión
+-- entre réplicas; PostgREST no mantiene la sesión entre llamadas, por eso el
+-- estado de la tarea vive en la tabla y no en un lock de sesión.
+CREATE OR REPLACE FUNCTION tomar_tarea_programada(
+    p_tarea TEXT,
+    p_duenio TEXT,
+    p_espaciado_segundos INTEGER,
+    p_timeout_segundos INTEGER
+) RETURNS BOOLEAN AS $$
+DECLARE
+    v_tomada BOOLEAN;
+BEGIN
+    IF NOT pg_try_advisory_xact_lock(hashtext('aca_tarea_programada:' || p_tarea)) THEN
+        RETURN FALSE;
+    END IF;
+
+    INSERT INTO tareas_programadas (tarea, duenio, lease_hasta, ultima_ejecucion, updated_at)
+    VALUES (p_tarea, p_duenio, NOW() + make_interval(secs => p_timeout_segundos), NOW(), NOW())
+    ON CONFLICT (tarea) DO UPDATE SET
+        duenio = EXCLUDED.duenio,
+        lease_hasta = EXCLUDED.lease_hasta,
+        ultima_ejecucion = EXCLUDED.ultima_ejecucion,
+        updated_at = NOW()
+    WHERE (tareas_programadas.lease_hasta IS NULL OR tareas_programadas.lease_hasta < NOW())
+      AND (tareas_programadas.ultima_ejecucion IS NULL
+           OR tareas_programadas.ultima_ejecucion <= NOW() - make_interval(secs => p_espaciado_segundos))
+    RETURNING TRUE INTO v_tomada;
+
+    RETURN COALESCE(v_tomada, FALSE);
+END;
+$$ LANGUAGE plpgsql;
+
+-- Función: finalizar_tarea_programada
+-- Libera el lease y guarda el resultado de la ejecución
+CREATE OR REPLACE FUNCTION finalizar_tarea_programada(
+    p_tarea TEXT,
+    p_duenio TEXT,
+    p_duracion_ms INTEGER,
+    p_resultado VARCHAR(20),
+    p_error TEXT DEFAULT NULL
+) RETURNS VOID AS $$
+BEGIN
+    UPDATE tareas_programadas SET
+        lease_hasta = NULL,
+        ultima_duracion_ms = p_duracion_ms,
+        ultimo_resultado = p_resultado,
+        ultimo_error = p_error,
+        updated_at = NOW()
+    WHERE tarea = p_tarea AND duenio = p_duenio;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Comentarios
+COMMENT ON TABLE tareas_programadas IS 'Estado de las tareas de mantenimiento del programador en proceso';
+COMMENT ON FUNCTION tomar_tarea_programada IS 'Reserva una tarea para una réplica si no corre en otra y ya le toca';
+COMMENT ON FUNCTION finalizar_tarea_programada IS 'Libera la reserva de una tarea y guarda su resultado';
@@ -0,0 +1,27 @@
+-- ============================================
+-- MIGRACIÓN 011: Cifras financieras por empresa y período
+-- Filas de tablas de reportes mensuales, estados financieros y F29 normalizadas
+-- (empresa, período, cuenta, monto) para responder preguntas numéricas sin el LLM
+-- ============================================
+
+CREATE TABLE IF NOT EXISTS metricas_financieras (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    empresa_id UUID REFERENCES empresas(id) ON DELETE CASCADE NOT NULL,
+    periodo VARCHAR(7) NOT NULL,            -- AAAA-MM, igual que archivos.periodo
+    cuenta VARCHAR(50) NOT NULL,            -- cuenta normalizada (ventas, utilidad_neta, iva_debito, ...)
+    monto NUMERIC(18, 2) NOT NULL,
+    archivo_id UUID REFERENCES archivos(id) ON DELETE CASCADE,
+    fuente VARCHAR(50),                     -- subtipo del documento de origen
+    etiqueta TEXT,                          -- texto de la fila en el documento
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    updated_at TIMESTAMPTZ DEFAULT NOW(),
+    -- El último documento subido para un período reemplaza la cifra
+    UNIQUE(empresa_id, cuenta, periodo)
+);
+
+-- La restricción UNIQUE cubre la carga de series por empresa; este índice, las bajas de archivos
+CREATE INDEX IF NOT EXISTS idx_metricas_financieras_archivo ON metricas_financieras(archivo_id);
+
+-- Comentarios
+COMMENT ON TABLE metricas_financieras IS 'Cifras de documentos financieros por empresa, período y cuenta normalizada';
+COMMENT ON COLUMN metricas_financieras.cuenta IS 'Clave de app/utils/financial_tables.py (CUENTAS)';
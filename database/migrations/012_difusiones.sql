@@ -0,0 +1,36 @@
+-- ============================================
+-- MIGRACIÓN 012: Difusiones del bot admin
+-- Mensajes enviados a todos los usuarios de un conjunto de empresas, con el
+-- avance guardado por página para reanudar tras un reinicio
+-- ============================================
+
+CREATE TABLE IF NOT EXISTS difusiones (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    mensaje TEXT NOT NULL,                  -- admite {nombre} y {empresa}
+    empresa_ids UUID[] NOT NULL,
+    creada_por BIGINT,                      -- chat_id del admin (NULL si vino por la API)
+    estado VARCHAR(20) NOT NULL DEFAULT 'pendiente',  -- pendiente, en_curso, completada, cancelada
+    cursor TEXT,                            -- último destinatario procesado (keyset sobre usuarios)
+    enviados INTEGER NOT NULL DEFAULT 0,
+    bloqueados INTEGER NOT NULL DEFAULT 0,  -- el usuario bloqueó el bot o borró su cuenta
+    fallidos INTEGER NOT NULL DEFAULT 0,
+    ultimos_errores JSONB NOT NULL DEFAULT '[]',
+    duenio TEXT,                            -- réplica que la envía (host:pid:id)
+    lease_hasta TIMESTAMPTZ,
+    iniciada_at TIMESTAMPTZ,
+    finalizada_at TIMESTAMPTZ,
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+-- Reanudación al arrancar y listado del bot admin
+CREATE INDEX IF NOT EXISTS idx_difusiones_estado ON difusiones(estado, created_at DESC);
+
+-- Audiencia: usuarios activos de las empresas recorridos por (chat_id, id)
+CREATE INDEX IF NOT EXISTS idx_usuarios_empresas_empresa_activo
+    ON usuarios_empresas(empresa_id, usuario_id) WHERE activo;
+
+-- Comentarios
+COMMENT ON TABLE difusiones IS 'Mensajes del bot admin a los usuarios de varias empresas y su avance';
+COMMENT ON COLUMN difusiones.cursor IS 'Cursor de app/utils/pagination.py: los destinatarios anteriores ya se procesaron';
+COMMENT ON COLUMN difusiones.lease_hasta IS 'Mientras no venza, ninguna otra réplica toma la difusión';
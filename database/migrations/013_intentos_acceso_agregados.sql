@@ -0,0 +1,67 @@
+-- ============================================
+-- MIGRACIÓN 013: Intentos de acceso negado agregados
+-- Los chats no registrados se acumulan en memoria y se guardan por lotes:
+-- una fila por chat y vaciado con la cantidad de mensajes, en vez de una por mensaje
+-- ============================================
+
+ALTER TABLE intentos_acceso_negado
+    ADD COLUMN IF NOT EXISTS cantidad INTEGER NOT NULL DEFAULT 1,
+    ADD COLUMN IF NOT EXISTS primer_intento TIMESTAMPTZ;
+
+-- Función: registrar_intentos_acceso
+-- p_intentos: [{chat_id, cantidad, primer_intento, ultimo_intento, mensaje, bot_tipo,
+--               user_id, first_name, last_name, username}, ...]
+-- Suma a usuarios_detalle y agrega una fila de intentos_acceso_negado por chat.
+CREATE OR REPLACE FUNCTION registrar_intentos_acceso(p_intentos JSONB)
+RETURNS INTEGER AS $$
+DECLARE
+    v_total INTEGER;
+BEGIN
+    WITH lote AS (
+        SELECT * FROM jsonb_to_recordset(p_intentos) AS x(
+            chat_id BIGINT, cantidad INTEGER, primer_intento TIMESTAMPTZ, ultimo_intento TIMESTAMPTZ,
+            mensaje TEXT, bot_tipo VARCHAR(20), user_id BIGINT,
+            first_name VARCHAR(255), last_name VARCHAR(255), username VARCHAR(255)
+        )
+    )
+    INSERT INTO usuarios_detalle (
+        chat_id, user_id, first_name, last_name, username,
+        primera_interaccion, ultima_interaccion, total_mensajes, intentos_acceso,
+        ultima_actividad, tipo_acceso
+    )
+    SELECT chat_id, user_id, first_name, last_name, username,
+           primer_intento, ultimo_intento, cantidad, cantidad,
+           mensaje, 'no_autorizado'
+    FROM lote
+    ON CONFLICT (chat_id)
+    DO UPDATE SET
+        user_id = COALESCE(EXCLUDED.user_id, usuarios_detalle.user_id),
+        first_name = COALESCE(EXCLUDED.first_name, usuarios_detalle.first_name),
+        last_name = COALESCE(EXCLUDED.last_name, usuarios_detalle.last_name),
+        username = COALESCE(EXCLUDED.username, usuarios_detalle.username),
+        ultima_interaccion = GREATEST(usuarios_detalle.ultima_interaccion, EXCLUDED.ultima_interaccion),
+        total_mensajes = usuarios_detalle.total_mensajes + EXCLUDED.total_mensajes,
+        intentos_acceso = usuarios_detalle.intentos_acceso + EXCLUDED.intentos_acceso,
+        ultima_actividad = EXCLUDED.ultima_actividad,
+        updated_at = NOW();
+
+    INSERT INTO intentos_acceso_negado (
+        chat_id, user_id, first_name, last_name, username,
+        mensaje_enviado, bot_tipo, timestamp, primer_intento, cantidad
+    )
+    SELECT chat_id, user_id, first_name, last_name, username,
+           mensaje, bot_tipo, ultimo_intento, primer_intento, cantidad
+    FROM jsonb_to_recordset(p_intentos) AS x(
+        chat_id BIGINT, cantidad INTEGER, primer_intento TIMESTAMPTZ, ultimo_intento TIMESTAMPTZ,
+        mensaje TEXT, bot_tipo VARCHAR(20), user_id BIGINT,
+        first_name VARCHAR(255), last_name VARCHAR(255), username VARCHAR(255)
+    );
+
+    GET DIAGNOSTICS v_total = ROW_COUNT;
+    RETURN v_total;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Comentarios
+COMMENT ON COLUMN intentos_acceso_negado.cantidad IS 'Mensajes del chat entre primer_intento y timestamp (último)';
+COMMENT ON FUNCTION registrar_intentos_acceso IS 'Guarda un lote de intentos agregados por chat (app/security/access_filter.py)';
@@ -0,0 +1,45 @@
+-- ============================================
+-- MIGRACIÓN 014: Versión de permisos
+-- Las réplicas guardan en memoria el rol y las empresas de cada usuario
+-- (app/security/permissions.py) y los descartan cuando cambia esta versión
+-- ============================================
+
+CREATE TABLE IF NOT EXISTS version_permisos (
+    id SMALLINT PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+    version BIGINT NOT NULL DEFAULT 1,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+INSERT INTO version_permisos (id, version) VALUES (1, 1)
+ON CONFLICT (id) DO NOTHING;
+
+-- Función: incrementar_version_permisos
+-- Un incremento por sentencia (no por fila) en usuarios, usuarios_empresas y empresas
+CREATE OR REPLACE FUNCTION incrementar_version_permisos()
+RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE version_permisos
+    SET version = version + 1,
+        updated_at = NOW()
+    WHERE id = 1;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_version_permisos_usuarios ON usuarios;
+CREATE TRIGGER trg_version_permisos_usuarios
+    AFTER INSERT OR UPDATE OR DELETE ON usuarios
+    FOR EACH STATEMENT EXECUTE FUNCTION incrementar_version_permisos();
+
+DROP TRIGGER IF EXISTS trg_version_permisos_usuarios_empresas ON usuarios_empresas;
+CREATE TRIGGER trg_version_permisos_usuarios_empresas
+    AFTER INSERT OR UPDATE OR DELETE ON usuarios_empresas
+    FOR EACH STATEMENT EXECUTE FUNCTION incrementar_version_permisos();
+
+DROP TRIGGER IF EXISTS trg_version_permisos_empresas ON empresas;
+CREATE TRIGGER trg_version_permisos_empresas
+    AFTER INSERT OR UPDATE OR DELETE ON empresas
+    FOR EACH STATEMENT EXECUTE FUNCTION incrementar_version_permisos();
+
+-- Comentarios
+COMMENT ON TABLE version_permisos IS 'Contador que invalida los snapshots de permisos en memoria (app/security/permissions.py)';
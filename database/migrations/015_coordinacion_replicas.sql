@@ -0,0 +1,99 @@
+-- ============================================
+-- MIGRACIÓN 015: Coordinación entre réplicas
+-- Latidos de cada réplica y un lease de liderazgo por bot: el líder hace
+-- polling y reparte los updates por chat_id (app/services/coordination_service.py)
+-- ============================================
+
+CREATE TABLE IF NOT EXISTS replicas (
+    replica TEXT PRIMARY KEY,           -- host:pid:id
+    url TEXT NOT NULL,                  -- base de /interno/updates alcanzable desde las demás réplicas
+    bots TEXT[] NOT NULL DEFAULT '{}',
+    ultimo_latido TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    iniciada_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS liderazgo (
+    recurso VARCHAR(100) PRIMARY KEY,   -- 'polling:<bot>'
+    lider TEXT NOT NULL,
+    epoca BIGINT NOT NULL DEFAULT 1,    -- sube con cada cambio de líder
+    lease_hasta TIMESTAMPTZ NOT NULL,
+    updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+-- Función: latido_replica
+-- Registra el latido de la réplica y devuelve las vivas (latido dentro de
+-- p_ttl_segundos), en orden estable. Las réplicas sin latido hace más de
+-- diez TTL se eliminan.
+CREATE OR REPLACE FUNCTION latido_replica(
+    p_replica TEXT,
+    p_url TEXT,
+    p_bots TEXT[],
+    p_ttl_segundos INTEGER
+) RETURNS SETOF replicas AS $$
+BEGIN
+    INSERT INTO replicas AS r (replica, url, bots, ultimo_latido)
+    VALUES (p_replica, p_url, p_bots, NOW())
+    ON CONFLICT (replica) DO UPDATE SET
+        url = EXCLUDED.url,
+        bots = EXCLUDED.bots,
+        ultimo_latido = NOW();
+
+    DELETE FROM replicas r
+    WHERE r.ultimo_latido < NOW() - make_interval(secs => p_ttl_segundos * 10);
+
+    RETURN QUERY
+    SELECT * FROM replicas r
+    WHERE r.ultimo_latido >= NOW() - make_interval(secs => p_ttl_segundos)
+    ORDER BY r.replica;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Función: tomar_liderazgo
+-- Renueva el lease si p_replica ya es líder o lo toma si el lease venció.
+-- Devuelve la época del líder (NULL si otra réplica lo tiene vigente). El
+-- advisory lock de transacción serializa la decisión entre réplicas; se
+-- espera (no try) para que una renovación no falle por un choque breve.
+CREATE OR REPLACE FUNCTION tomar_liderazgo(
+    p_recurso TEXT,
+    p_replica TEXT,
+    p_lease_segundos INTEGER
+) RETURNS BIGINT AS $$
+DECLARE
+    v_epoca BIGINT;
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext('aca_liderazgo:' || p_recurso));
+
+    INSERT INTO liderazgo (recurso, lider, epoca, lease_hasta, updated_at)
+    VALUES (p_recurso, p_replica, 1, NOW() + make_interval(secs => p_lease_segundos), NOW())
+    ON CONFLICT (recurso) DO UPDATE SET
+        epoca = CASE WHEN liderazgo.lider = EXCLUDED.lider THEN liderazgo.epoca ELSE liderazgo.epoca + 1 END,
+        lider = EXCLUDED.lider,
+        lease_hasta = EXCLUDED.lease_hasta,
+        updated_at = NOW()
+    WHERE liderazgo.lider = EXCLUDED.lider OR liderazgo.lease_hasta < NOW()
+    RETURNING epoca INTO v_epoca;
+
+    RETURN v_epoca;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Función: liberar_liderazgo
+-- Vence el lease de inmediato (cierre ordenado) para que otra réplica lo tome
+CREATE OR REPLACE FUNCTION liberar_liderazgo(
+    p_recurso TEXT,
+    p_replica TEXT
+) RETURNS VOID AS $$
+BEGIN
+    UPDATE liderazgo SET
+        lease_hasta = NOW() - INTERVAL '1 second',
+        updated_at = NOW()
+    WHERE recurso = p_recurso AND lider = p_replica;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Comentarios
+COMMENT ON TABLE replicas IS 'Réplicas vivas de los bots y su URL interna para reenviar updates';
+COMMENT ON TABLE liderazgo IS 'Lease de liderazgo por recurso (polling de cada bot)';
+COMMENT ON FUNCTION latido_replica IS 'Registra el latido de una réplica y devuelve las réplicas vivas';
+COMMENT ON FUNCTION tomar_liderazgo IS 'Toma o renueva el liderazgo de un recurso; devuelve la época o NULL';
+COMMENT ON FUNCTION liberar_liderazgo IS 'Libera el liderazgo de un recurso si lo tiene la réplica';
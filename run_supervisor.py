@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+🧭 Script de inicio para ACA 4.0 con procesos separados (Render)
+Workers de API sobre el puerto de Render y un worker por bot, vigilados por un supervisor
+"""
+
+import os
+import sys
+import logging
+from pathlib import Path
+
+# Agregar el directorio raíz al path
+sys.path.insert(0, str(Path(__file__).parent))
+
+def setup_environment():
+    """Configurar entorno de producción"""
+    # Configurar logging
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    return True
+
+def validate_config():
+    """Validar configuración (una vez: los workers heredan el mismo entorno)"""
+    try:
+        from app.config import Config
+        Config.validate()
+        print("✅ Configuración validada correctamente")
+        return True
+    except Exception as e:
+        print(f"❌ Error en configuración: {e}")
+        return False
+
+def main():
+    """Función principal del supervisor"""
+    print("🧭 Iniciando ACA 4.0 con supervisor de procesos...")
+    
+    if not setup_environment() or not validate_config():
+        sys.exit(1)
+    
+    from app.config import Config
+    from app.supervisor import Supervisor, socket_api, procesos_por_defecto
+    
+    # Obtener puerto de Render (variable de entorno PORT)
+    port = int(os.getenv("PORT", "8000"))
+    host = "0.0.0.0"
+    
+    try:
+        # El supervisor abre el puerto una vez y lo comparte con los workers de API
+        sock = socket_api(host, port)
+    except OSError as e:
+        print(f"❌ No se pudo abrir {host}:{port}: {e}")
+        sys.exit(1)
+    
+    hijos = procesos_por_defecto(sock)
+    print(f"🌐 API en {host}:{port} con {Config.SUPERVISOR_API_WORKERS} workers")
+    print(f"📱 Bots en procesos propios: {', '.join(Config.PROCESO_BOTS)}")
+    print(f"⚠️ Feed de conversaciones y métricas de bots: en 127.0.0.1:{Config.SUPERVISOR_PUERTO_BOTS}+i, "
+          f"no en el puerto {port}")
+    
+    Supervisor(hijos).ejecutar()
+
+if __name__ == "__main__":
+    main()
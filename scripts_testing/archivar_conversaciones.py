@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+🗄️ Retención de conversaciones: particiones, archivo y rehidratación
+
+Subcomandos:
+  estado              Particiones en BD y meses archivados en Storage
+  particiones         Crear las particiones del mes actual y los siguientes
+  archivar            Archivar (gzip NDJSON en Storage) y eliminar los meses vencidos
+  rehidratar AAAA-MM  Volver a cargar un mes archivado para una auditoría
+"""
+
+import sys
+import argparse
+from datetime import date, datetime
+from pathlib import Path
+
+# Agregar el directorio raíz al path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.services.retention_service import get_retention_service
+
+
+def formatear_bytes(bytes_: int) -> str:
+    valor = float(bytes_ or 0)
+    for unidad in ('B', 'KB', 'MB', 'GB'):
+        if valor < 1024 or unidad == 'GB':
+            return f"{valor:.1f} {unidad}"
+        valor /= 1024
+
+
+def parsear_mes(texto: str) -> date:
+    try:
+        return datetime.strptime(texto, '%Y-%m').date()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Mes inválido (AAAA-MM): {texto}")
+
+
+def mostrar_estado(servicio):
+    vencidas = {p['particion'] for p in servicio.particiones_vencidas()}
+
+    print(f"🗂️ Particiones en BD (retención: {servicio.retencion_meses} meses)")
+    print("-" * 70)
+    for p in servicio.listar_particiones():
+        marca = "  ⏳ vencida" if p['particion'] in vencidas else ""
+        print(f"  {p['particion']:<28} ~{p['filas_estimadas']:>10,} filas  {formatear_bytes(p['bytes']):>10}{marca}")
+    print()
+
+    print("🗄️ Meses archivados en Storage")
+    print("-" * 70)
+    archivados = servicio.get_archivados()
+    if not archivados:
+        print("  (ninguno)")
+    for a in archivados:
+        rehidratado = f"  🔁 rehidratado {a['rehidratado_at'][:10]}" if a.get('rehidratado_at') else ""
+        print(f"  {a['mes'][:7]}  {a['filas']:>10,} filas  {formatear_bytes(a['bytes']):>10}  {a['storage_path']}{rehidratado}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Retención de conversaciones por particiones mensuales")
+    subparsers = parser.add_subparsers(dest="comando", required=True)
+
+    subparsers.add_parser("estado", help="Particiones y meses archivados")
+
+    p_particiones = subparsers.add_parser("particiones", help="Crear particiones por adelantado")
+    p_particiones.add_argument("--meses", type=int, default=3, help="Meses hacia adelante")
+
+    p_archivar = subparsers.add_parser("archivar", help="Archivar los meses vencidos")
+    p_archivar.add_argument("--dry-run", action="store_true", help="Solo mostrar qué se archivaría")
+
+    p_rehidratar = subparsers.add_parser("rehidratar", help="Volver a cargar un mes archivado")
+    p_rehidratar.add_argument("mes", type=parsear_mes, help="Mes a rehidratar (AAAA-MM)")
+
+    args = parser.parse_args()
+    servicio = get_retention_service()
+
+    if args.comando == "estado":
+        mostrar_estado(servicio)
+
+    elif args.comando == "particiones":
+        creadas = servicio.asegurar_particiones(args.meses)
+        print(f"✅ Particiones creadas: {creadas}")
+
+    elif args.comando == "archivar":
+        if args.dry_run:
+            vencidas = servicio.archivar_vencidas(dry_run=True)
+            print(f"🔍 Se archivarían {len(vencidas)} particiones:")
+            for p in vencidas:
+                print(f"  • {p['particion']} (~{p['filas_estimadas']:,} filas, {formatear_bytes(p['bytes'])})")
+            return
+        archivadas = servicio.archivar_vencidas()
+        for a in archivadas:
+            print(f"✅ {a['particion']} → {a['storage_path']} ({a['filas']:,} filas, {formatear_bytes(a['bytes'])})")
+        print(f"🗄️ Particiones archivadas: {len(archivadas)}")
+
+    elif args.comando == "rehidratar":
+        try:
+            filas = servicio.rehidratar(args.mes)
+        except ValueError as e:
+            print(f"❌ {e}")
+            sys.exit(1)
+        print(f"✅ {args.mes.strftime('%Y-%m')} rehidratado: {filas:,} filas")
+        print("💡 Se volverá a archivar en el próximo ciclo de retención")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+🔎 Índice local de documentos del Asesor IA (SQLite FTS5 por empresa)
+
+Subcomandos:
+  indexar [--empresa ID]       Extraer e indexar los PDFs activos que falten o cambiaron
+  buscar EMPRESA "pregunta"    Mostrar los pasajes que recibiría el Asesor IA
+  metricas [--empresa ID]      Volver a extraer las cifras financieras desde el índice (sin descargar)
+  estado [--empresa ID]        Documentos, pasajes y tamaño de cada índice
+"""
+
+import sys
+import time
+import asyncio
+import argparse
+from pathlib import Path
+
+# Agregar el directorio raíz al path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.database.supabase import get_supabase_client
+from app.services.document_index_service import get_document_index_service
+from app.services.financial_metrics_service import SUBTIPOS_METRICAS, get_financial_metrics_service
+from app.services.storage_service import get_storage_service
+
+
+def pdfs_activos(empresa_id: str = None):
+    """PDFs activos agrupados por empresa"""
+    query = get_supabase_client().table('archivos')\
+        .select('id, empresa_id, nombre_original, nombre_archivo, periodo, subtipo')\
+        .eq('activo', True)
+    if empresa_id:
+        query = query.eq('empresa_id', empresa_id)
+    empresas = {}
+    for archivo in query.execute().data or []:
+        nombre = archivo.get('nombre_original') or archivo.get('nombre_archivo') or ''
+        if archivo.get('empresa_id') and nombre.lower().endswith('.pdf'):
+            empresas.setdefault(archivo['empresa_id'], []).append(archivo)
+    return empresas
+
+
+async def indexar(empresa_id: str = None):
+    servicio = get_document_index_service()
+    if not servicio.habilitado:
+        print("❌ Índice deshabilitado (INDICE_DOCUMENTOS_ENABLED=false o falta pypdf)")
+        return
+    storage_service = get_storage_service()
+
+    try:
+        for emp_id, archivos in pdfs_activos(empresa_id).items():
+            print(f"📂 Empresa {emp_id}: {len(archivos)} PDF(s)")
+            for archivo in archivos:
+                contenido = await storage_service.download_file(archivo['id'])
+                if not contenido:
+                    print(f"   ⚠️ No se pudo descargar {archivo['id']}")
+                    continue
+                pasajes = await servicio.indexar_archivo(emp_id, archivo, contenido)
+                nombre = archivo.get('nombre_original') or archivo.get('nombre_archivo')
+                print(f"   {'✅' if pasajes else '⏭️ '} {nombre}: {pasajes} pasajes")
+    finally:
+        servicio.cerrar()
+
+
+def buscar(empresa_id: str, pregunta: str, limite: int):
+    inicio = time.perf_counter()
+    pasajes = get_document_index_service().buscar(empresa_id, pregunta, limite)
+    print(f"🔎 {len(pasajes)} pasajes en {(time.perf_counter() - inicio) * 1000:.1f}ms")
+    print("-" * 70)
+    for p in pasajes:
+        print(f"📄 {p['nombre']} ({p['periodo'] or 'sin período'}) · página {p['pagina']}")
+        print(f"   {p['texto'][:300].replace(chr(10), ' ')}")
+        print()
+
+
+def metricas(empresa_id: str = None):
+    servicio = get_document_index_service()
+    metricas_service = get_financial_metrics_service()
+    for emp_id, archivos in pdfs_activos(empresa_id).items():
+        documentos = cifras = 0
+        for archivo in archivos:
+            if archivo.get('subtipo') not in SUBTIPOS_METRICAS:
+                continue
+            texto = servicio.texto_archivo(emp_id, archivo['id'])
+            if texto:
+                documentos += 1
+                cifras += metricas_service.registrar_documento(emp_id, archivo, [texto])
+        print(f"  {emp_id}  {documentos:>4} documentos indexados  {cifras:>5} cifras")
+
+
+def estado(empresa_id: str = None):
+    servicio = get_document_index_service()
+    empresas = [empresa_id] if empresa_id else sorted(pdfs_activos())
+    for emp_id in empresas:
+        e = servicio.estado(emp_id)
+        print(f"  {emp_id}  {e['documentos']:>5} documentos  {e['pasajes']:>7,} pasajes  {e['bytes'] / 1024:>9.1f} KB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Índice local de documentos del Asesor IA")
+    subparsers = parser.add_subparsers(dest="comando", required=True)
+
+    p_indexar = subparsers.add_parser("indexar", help="Indexar PDFs pendientes o modificados")
+    p_indexar.add_argument("--empresa", help="Solo esta empresa (UUID)")
+
+    p_buscar = subparsers.add_parser("buscar", help="Probar una búsqueda")
+    p_buscar.add_argument("empresa", help="Empresa (UUID)")
+    p_buscar.add_argument("pregunta", help="Pregunta en lenguaje natural")
+    p_buscar.add_argument("--limite", type=int, default=None, help="Pasajes a mostrar")
+
+    p_metricas = subparsers.add_parser("metricas", help="Recalcular cifras financieras desde el índice")
+    p_metricas.add_argument("--empresa", help="Solo esta empresa (UUID)")
+
+    p_estado = subparsers.add_parser("estado", help="Tamaño de los índices")
+    p_estado.add_argument("--empresa", help="Solo esta empresa (UUID)")
+
+    args = parser.parse_args()
+
+    if args.comando == "indexar":
+        asyncio.run(indexar(args.empresa))
+    elif args.comando == "buscar":
+        buscar(args.empresa, args.pregunta, args.limite)
+    elif args.comando == "metricas":
+        metricas(args.empresa)
+    elif args.comando == "estado":
+        estado(args.empresa)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+⏱️ Perfil de tiempo de importación
+
+Importa un módulo (por defecto app.main, lo mismo que hace uvicorn antes de
+abrir el puerto) en un proceso nuevo con `python -X importtime` y muestra el
+costo por módulo y por paquete: tiempo propio (el cuerpo del módulo) y
+acumulado (con todo lo que importa).
+
+Con --presupuesto-ms y --prohibidos sirve como verificación: sale con código 1
+si la importación supera el presupuesto o si carga un paquete que debería
+importarse recién en el primer uso (telegram, supabase, openai).
+"""
+
+import os
+import sys
+import json
+import argparse
+import subprocess
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, List
+
+RAIZ = Path(__file__).parent.parent
+
+ANCHO_NOMBRE = 56
+ANCHO_BARRA = 30
+
+# Paquetes que app.main no debe importar: se cargan en el arranque de los bots o en el primer uso
+PROHIBIDOS_POR_DEFECTO = "telegram,supabase,openai"
+
+
+# ============================================
+# MEDICIÓN
+# ============================================
+
+def medir_importacion(modulo: str) -> Dict[str, Any]:
+    """
+    Importar el módulo en un proceso nuevo con -X importtime.
+
+    Returns:
+        {'modulos': [{'modulo', 'propio_ms', 'acumulado_ms', 'nivel'}, ...], 'cargados': [...]}
+    """
+    codigo = (
+        f"import sys, json; import {modulo}; "
+        "print(json.dumps(sorted(sys.modules)))"
+    )
+    resultado = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", codigo],
+        cwd=RAIZ, capture_output=True, text=True, env=os.environ.copy()
+    )
+    if resultado.returncode != 0:
+        ultimas = "\n".join(resultado.stderr.strip().splitlines()[-10:])
+        raise RuntimeError(f"No se pudo importar {modulo}:\n{ultimas}")
+
+    return {
+        'modulos': parsear_importtime(resultado.stderr),
+        'cargados': json.loads(resultado.stdout.strip().splitlines()[-1])
+    }
+
+
+def parsear_importtime(salida: str) -> List[Dict[str, Any]]:
+    """Líneas 'import time: propio | acumulado | nombre' (µs) → filas en ms"""
+    filas = []
+    for linea in salida.splitlines():
+        if not linea.startswith("import time:"):
+            continue
+        partes = linea[len("import time:"):].split("|")
+        if len(partes) != 3 or not partes[0].strip().isdigit():
+            continue  # Encabezado
+        nombre = partes[2].rstrip()
+        filas.append({
+            'modulo': nombre.strip(),
+            'propio_ms': int(partes[0]) / 1000,
+            'acumulado_ms': int(partes[1]) / 1000,
+            # Dos espacios de sangría por nivel de anidación
+            'nivel': (len(nombre) - len(nombre.lstrip())) // 2
+        })
+    return filas
+
+
+def medir_mejor(modulo: str, repeticiones: int) -> Dict[str, Any]:
+    """La corrida más rápida de N (las demás tienen ruido de disco y CPU)"""
+    corridas = [medir_importacion(modulo) for _ in range(max(1, repeticiones))]
+    return min(corridas, key=lambda c: sum(f['propio_ms'] for f in c['modulos']))
+
+
+# ============================================
+# RESUMEN
+# ============================================
+
+def por_paquete(filas: List[Dict[str, Any]]) -> Dict[str, Dict[str, float]]:
+    """Tiempo propio sumado por paquete de primer nivel (app.* se separa por subpaquete)"""
+    paquetes: Dict[str, Dict[str, float]] = defaultdict(lambda: {'propio_ms': 0.0, 'modulos': 0})
+    for fila in filas:
+        partes = fila['modulo'].split(".")
+        clave = ".".join(partes[:2]) if partes[0] == "app" and len(partes) > 1 else partes[0]
+        paquetes[clave]['propio_ms'] += fila['propio_ms']
+        paquetes[clave]['modulos'] += 1
+    return dict(paquetes)
+
+
+def _barra(valor: float, maximo: float) -> str:
+    largo = int(ANCHO_BARRA * valor / maximo) if maximo else 0
+    return "█" * largo
+
+
+def imprimir_reporte(modulo: str, medicion: Dict[str, Any], top: int):
+    filas = medicion['modulos']
+    total = sum(f['propio_ms'] for f in filas)
+    print(f"\n⏱️ import {modulo}: {total:.0f} ms en {len(filas)} módulos\n")
+
+    print("📦 Por paquete (tiempo propio)")
+    paquetes = sorted(por_paquete(filas).items(), key=lambda p: p[1]['propio_ms'], reverse=True)[:top]
+    maximo = paquetes[0][1]['propio_ms'] if paquetes else 0
+    for nombre, datos in paquetes:
+        print(f"  {nombre[:ANCHO_NOMBRE]:<{ANCHO_NOMBRE}} {datos['propio_ms']:8.1f} ms "
+              f"{int(datos['modulos']):4d} mód  {_barra(datos['propio_ms'], maximo)}")
+
+    print("\n🧩 Módulos de la app (acumulado = con lo que importan)")
+    propios = sorted((f for f in filas if f['modulo'].startswith("app")),
+                     key=lambda f: f['acumulado_ms'], reverse=True)[:top]
+    for fila in propios:
+        print(f"  {fila['modulo'][:ANCHO_NOMBRE]:<{ANCHO_NOMBRE}} {fila['acumulado_ms']:8.1f} ms "
+              f"(propio {fila['propio_ms']:.1f})")
+
+    print("\n🐢 Módulos más caros (tiempo propio)")
+    for fila in sorted(filas, key=lambda f: f['propio_ms'], reverse=True)[:top]:
+        print(f"  {fila['modulo'][:ANCHO_NOMBRE]:<{ANCHO_NOMBRE}} {fila['propio_ms']:8.1f} ms")
+
+
+def verificar(medicion: Dict[str, Any], presupuesto_ms: float, prohibidos: List[str]) -> List[str]:
+    """Problemas encontrados (vacío si la importación cumple)"""
+    problemas = []
+    total = sum(f['propio_ms'] for f in medicion['modulos'])
+    if presupuesto_ms and total > presupuesto_ms:
+        problemas.append(f"importar tomó {total:.0f} ms (presupuesto {presupuesto_ms:.0f} ms)")
+    cargados = set(medicion['cargados'])
+    for paquete in prohibidos:
+        if paquete in cargados:
+            problemas.append(f"se importó {paquete} (debería cargarse en el primer uso)")
+    return problemas
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Costo de importación por módulo y paquete")
+    parser.add_argument("--modulo", default="app.main", help="Módulo a importar")
+    parser.add_argument("--top", type=int, default=20, help="Filas por tabla")
+    parser.add_argument("--repeticiones", type=int, default=3, help="Corridas (se reporta la más rápida)")
+    parser.add_argument("--presupuesto-ms", type=float, default=0, help="Fallar si la importación supera esto")
+    parser.add_argument("--prohibidos", default=None,
+                        help=f"Paquetes que no deben quedar importados, separados por coma "
+                             f"(con app.main: {PROHIBIDOS_POR_DEFECTO})")
+    parser.add_argument("--json", help="Guardar la medición en este archivo")
+    args = parser.parse_args()
+
+    try:
+        medicion = medir_mejor(args.modulo, args.repeticiones)
+    except RuntimeError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+    imprimir_reporte(args.modulo, medicion, args.top)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({'modulo': args.modulo, **medicion}, f, ensure_ascii=False, indent=2)
+        print(f"\n💾 Medición guardada en {args.json}")
+
+    if args.prohibidos is None:
+        args.prohibidos = PROHIBIDOS_POR_DEFECTO if args.modulo == "app.main" else ""
+    prohibidos = [p.strip() for p in args.prohibidos.split(",") if p.strip()]
+    problemas = verificar(medicion, args.presupuesto_ms, prohibidos)
+    if problemas:
+        print()
+        for problema in problemas:
+            print(f"❌ {problema}")
+        sys.exit(1)
+    print("\n✅ Importación dentro del presupuesto")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,861 @@
+#!/usr/bin/env python3
+"""
+🔥 Prueba de carga end-to-end de los flujos del bot de producción
+Simula usuarios concurrentes contra los handlers reales usando backends locales
+
+Los Updates de Telegram se sintetizan y se procesan con el mismo `Application`
+que arma `BotManager._setup_production_handlers`, de modo que se ejecutan los
+handlers, decoradores y servicios reales. Supabase (tablas, RPC y Storage),
+OpenAI y la API de Telegram se reemplazan por dobles en memoria con latencia
+configurable. Nada sale a la red.
+
+Nota: el cliente de supabase-py es síncrono, por eso la latencia simulada de
+base de datos y Storage bloquea el event loop (igual que en producción). La
+latencia de OpenAI y Telegram es asíncrona.
+
+Uso:
+    python3 scripts_testing/prueba_carga_bots.py --usuarios 50 --iteraciones 4
+    python3 scripts_testing/prueba_carga_bots.py --flujos subida,descarga --latencia-db-ms 40
+    python3 scripts_testing/prueba_carga_bots.py --json resultados_carga.json
+    python3 scripts_testing/prueba_carga_bots.py --usuarios 100 --limitador   (envíos con LimitadorEnvios)
+"""
+
+import os
+import sys
+import json
+import time
+import math
+import copy
+import uuid
+import random
+import asyncio
+import logging
+import argparse
+import resource
+from collections import Counter, defaultdict
+from contextvars import ContextVar
+from datetime import datetime
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Tuple
+
+# Agregar el directorio raíz al path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+# Variables mínimas para importar la app sin .env (no se usan para conectarse)
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_KEY", "carga-local")
+os.environ.setdefault("SUPABASE_SERVICE_KEY", "carga-local")
+os.environ.setdefault("OPENAI_API_KEY", "sk-carga-local")
+
+from telegram import Update
+from telegram.request import BaseRequest, RequestData
+
+logger = logging.getLogger("prueba_carga")
+
+# Flujo al que se atribuyen las llamadas a backends (se propaga a create_task)
+_flujo_actual: ContextVar[str] = ContextVar("flujo_actual", default="sin_flujo")
+
+BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+CHAT_ID_BASE = 910000000
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "ACA Carga", "username": "aca_carga_bot"}
+
+
+# ============================================
+# MÉTRICAS
+# ============================================
+
+class MetricasCarga:
+    """Acumula latencias, llamadas a backends, lag del event loop y errores"""
+
+    def __init__(self):
+        self.latencias_update: Dict[str, List[float]] = defaultdict(list)
+        self.latencias_flujo: Dict[str, List[float]] = defaultdict(list)
+        self.llamadas: Dict[str, Counter] = defaultdict(Counter)
+        self.ejecuciones: Counter = Counter()
+        self.errores: Counter = Counter()
+        self.lag_loop_ms: List[float] = []
+        self.inicio = None
+        self.fin = None
+
+    def registrar_llamada(self, backend: str):
+        """Registrar una llamada a backend atribuida al flujo actual"""
+        self.llamadas[_flujo_actual.get()][backend] += 1
+
+    def registrar_error(self, error: Exception):
+        """Registrar error de un handler atribuido al flujo actual"""
+        self.errores[f"{_flujo_actual.get()}:{type(error).__name__}"] += 1
+
+
+metricas = MetricasCarga()
+
+
+def percentil(valores: List[float], p: float) -> float:
+    """Percentil por rango más cercano (0 si no hay datos)"""
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    indice = max(0, math.ceil(p / 100 * len(ordenados)) - 1)
+    return ordenados[indice]
+
+
+def histograma(valores: List[float]) -> List[Tuple[str, int]]:
+    """Agrupar latencias (ms) en los buckets fijos"""
+    conteo = [0] * (len(BUCKETS_MS) + 1)
+    for valor in valores:
+        for i, limite in enumerate(BUCKETS_MS):
+            if valor <= limite:
+                conteo[i] += 1
+                break
+        else:
+            conteo[-1] += 1
+    etiquetas = [f"≤{limite:>5} ms" for limite in BUCKETS_MS] + [f">{BUCKETS_MS[-1]:>5} ms"]
+    return list(zip(etiquetas, conteo))
+
+
+def rss_maximo_mb() -> float:
+    """RSS máximo del proceso en MB (ru_maxrss es KB en Linux y bytes en macOS)"""
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        return maxrss / (1024 * 1024)
+    return maxrss / 1024
+
+
+# ============================================
+# DOBLE DE SUPABASE (PostgREST + Storage)
+# ============================================
+
+class RespuestaFalsa:
+    """Equivalente mínimo a APIResponse de postgrest"""
+
+    def __init__(self, data: Any, count: Optional[int] = None):
+        self.data = data
+        self.count = count
+
+
+class BaseDatosFalsa:
+    """Tablas en memoria compartidas por todos los clientes falsos"""
+
+    def __init__(self, latencia_ms: float):
+        self.tablas: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        self.latencia_ms = latencia_ms
+
+    def simular_latencia(self, backend: str):
+        """Bloquear como lo hace el cliente síncrono y contar la llamada"""
+        metricas.registrar_llamada(backend)
+        if self.latencia_ms:
+            time.sleep(self.latencia_ms / 1000)
+
+
+class ConsultaFalsa:
+    """Constructor de consultas compatible con el subconjunto de postgrest que usa la app"""
+
+    def __init__(self, db: BaseDatosFalsa, tabla: str):
+        self.db = db
+        self.tabla = tabla
+        self.operacion = "select"
+        self.columnas = "*"
+        self.contar = None
+        self.payload = None
+        self.filtros = []
+        self.ordenes = []
+        self.limite = None
+        self._negar = False
+
+    # Operaciones
+    def select(self, columnas: str = "*", count: Optional[str] = None):
+        self.columnas = columnas
+        self.contar = count
+        return self
+
+    def insert(self, payload):
+        self.operacion, self.payload = "insert", payload
+        return self
+
+    def update(self, payload: Dict[str, Any]):
+        self.operacion, self.payload = "update", payload
+        return self
+
+    def delete(self):
+        self.operacion = "delete"
+        return self
+
+    # Filtros
+    @property
+    def not_(self):
+        self._negar = True
+        return self
+
+    def _filtro(self, funcion):
+        negar, self._negar = self._negar, False
+        self.filtros.append((lambda fila: not funcion(fila)) if negar else funcion)
+        return self
+
+    def eq(self, columna, valor):
+        return self._filtro(lambda fila: fila.get(columna) == valor)
+
+    def neq(self, columna, valor):
+        return self._filtro(lambda fila: fila.get(columna) != valor)
+
+    def gt(self, columna, valor):
+        return self._filtro(lambda fila: fila.get(columna) is not None and fila.get(columna) > valor)
+
+    def gte(self, columna, valor):
+        return self._filtro(lambda fila: fila.get(columna) is not None and fila.get(columna) >= valor)
+
+    def lt(self, columna, valor):
+        return self._filtro(lambda fila: fila.get(columna) is not None and fila.get(columna) < valor)
+
+    def lte(self, columna, valor):
+        return self._filtro(lambda fila: fila.get(columna) is not None and fila.get(columna) <= valor)
+
+    def in_(self, columna, valores):
+        valores = list(valores)
+        return self._filtro(lambda fila: fila.get(columna) in valores)
+
+    def is_(self, columna, valor):
+        esperado = None if str(valor).lower() == "null" else valor
+        return self._filtro(lambda fila: fila.get(columna) is esperado or fila.get(columna) == esperado)
+
+    def match(self, condiciones: Dict[str, Any]):
+        return self._filtro(lambda fila: all(fila.get(k) == v for k, v in condiciones.items()))
+
+    def order(self, columna: str, desc: bool = False):
+        self.ordenes.append((columna, desc))
+        return self
+
+    def limit(self, cantidad: int):
+        self.limite = cantidad
+        return self
+
+    # Ejecución
+    def _filas(self) -> List[Dict[str, Any]]:
+        return [fila for fila in self.db.tablas[self.tabla] if all(f(fila) for f in self.filtros)]
+
+    def _proyectar(self, fila: Dict[str, Any]) -> Dict[str, Any]:
+        if self.columnas.strip() == "*":
+            return copy.deepcopy(fila)
+
+        resultado = {}
+        for columna in _separar_columnas(self.columnas):
+            if "(" in columna:
+                # Relación embebida: empresas(id, nombre) -> fila['empresa_id']
+                relacion, internas = columna.split("(", 1)
+                relacion = relacion.strip()
+                fk = fila.get(f"{relacion.rstrip('s')}_id")
+                relacionada = next((r for r in self.db.tablas[relacion] if r.get("id") == fk), None)
+                if relacionada is not None:
+                    sub = ConsultaFalsa(self.db, relacion).select(internas.rstrip(")"))
+                    relacionada = sub._proyectar(relacionada)
+                resultado[relacion] = relacionada
+            elif columna == "*":
+                resultado.update(copy.deepcopy(fila))
+            else:
+                resultado[columna] = copy.deepcopy(fila.get(columna))
+        return resultado
+
+    def execute(self) -> RespuestaFalsa:
+        self.db.simular_latencia("supabase")
+        tabla = self.db.tablas[self.tabla]
+
+        if self.operacion == "insert":
+            nuevas = self.payload if isinstance(self.payload, list) else [self.payload]
+            insertadas = []
+            for fila in nuevas:
+                fila = copy.deepcopy(fila)
+                fila.setdefault("id", str(uuid.uuid4()))
+                fila.setdefault("created_at", datetime.now().isoformat())
+                tabla.append(fila)
+                insertadas.append(copy.deepcopy(fila))
+            return RespuestaFalsa(insertadas)
+
+        filas = self._filas()
+
+        if self.operacion == "update":
+            for fila in filas:
+                fila.update(copy.deepcopy(self.payload))
+            return RespuestaFalsa([copy.deepcopy(f) for f in filas])
+
+        if self.operacion == "delete":
+            ids = {id(f) for f in filas}
+            self.db.tablas[self.tabla] = [f for f in tabla if id(f) not in ids]
+            return RespuestaFalsa([copy.deepcopy(f) for f in filas])
+
+        # Orden estable: aplicar el último criterio primero
+        for columna, desc in reversed(self.ordenes):
+            filas = sorted(
+                filas,
+                key=lambda f: (f.get(columna) is None, f.get(columna) if f.get(columna) is not None else ""),
+                reverse=desc
+            )
+        total = len(filas)
+        if self.limite is not None:
+            filas = filas[:self.limite]
+        return RespuestaFalsa([self._proyectar(f) for f in filas], total if self.contar else None)
+
+
+def _separar_columnas(columnas: str) -> List[str]:
+    """Separar 'a, b, rel(c, d)' respetando paréntesis"""
+    partes, actual, nivel = [], "", 0
+    for caracter in columnas:
+        if caracter == "," and nivel == 0:
+            partes.append(actual.strip())
+            actual = ""
+            continue
+        nivel += caracter == "("
+        nivel -= caracter == ")"
+        actual += caracter
+    if actual.strip():
+        partes.append(actual.strip())
+    return partes
+
+
+class RpcFalso:
+    """Funciones RPC usadas por la app"""
+
+    def __init__(self, db: BaseDatosFalsa, nombre: str, params: Optional[Dict[str, Any]]):
+        self.db = db
+        self.nombre = nombre
+        self.params = params or {}
+
+    def execute(self) -> RespuestaFalsa:
+        self.db.simular_latencia("supabase_rpc")
+
+        if self.nombre == "log_conversacion_simple":
+            fila = dict(self.params, id=str(uuid.uuid4()), created_at=datetime.now().isoformat())
+            self.db.tablas["conversaciones"].append(fila)
+            return RespuestaFalsa(fila["id"])
+
+        if self.nombre == "limpiar_sesiones_expiradas":
+            ahora = datetime.now().isoformat()
+            sesiones = self.db.tablas["sesiones_conversacion"]
+            vigentes = [s for s in sesiones if s.get("expires_at", "") >= ahora]
+            self.db.tablas["sesiones_conversacion"] = vigentes
+            return RespuestaFalsa(len(sesiones) - len(vigentes))
+
+        return RespuestaFalsa(None)
+
+
+class BucketFalso:
+    """Bucket de Storage en memoria"""
+
+    def __init__(self, storage: "StorageFalso", nombre: str):
+        self.storage = storage
+        self.nombre = nombre
+
+    def upload(self, path: str, file: bytes, file_options: Optional[Dict[str, Any]] = None):
+        self.storage.db.simular_latencia("storage")
+        self.storage.objetos[(self.nombre, path)] = bytes(file)
+        return SimpleNamespace(path=path, full_path=f"{self.nombre}/{path}")
+
+    def download(self, path: str) -> bytes:
+        self.storage.db.simular_latencia("storage")
+        return self.storage.objetos.get((self.nombre, path), b"")
+
+    def get_public_url(self, path: str) -> str:
+        return f"https://storage.local/{self.nombre}/{path}"
+
+    def create_signed_url(self, path: str, expires_in: int):
+        self.storage.db.simular_latencia("storage")
+        return {"signedURL": f"https://storage.local/{self.nombre}/{path}?token=carga&expires={expires_in}"}
+
+    def remove(self, paths: List[str]):
+        self.storage.db.simular_latencia("storage")
+        for path in paths:
+            self.storage.objetos.pop((self.nombre, path), None)
+        return [{"name": p} for p in paths]
+
+
+class StorageFalso:
+    """Cliente de Storage en memoria"""
+
+    def __init__(self, db: BaseDatosFalsa):
+        self.db = db
+        self.objetos: Dict[Tuple[str, str], bytes] = {}
+
+    def from_(self, bucket: str) -> BucketFalso:
+        return BucketFalso(self, bucket)
+
+
+class ClienteSupabaseFalso:
+    """Reemplazo del `Client` de supabase-py"""
+
+    def __init__(self, db: BaseDatosFalsa):
+        self.db = db
+        self.storage = StorageFalso(db)
+
+    def table(self, nombre: str) -> ConsultaFalsa:
+        return ConsultaFalsa(self.db, nombre)
+
+    from_ = table
+
+    def rpc(self, nombre: str, params: Optional[Dict[str, Any]] = None) -> RpcFalso:
+        return RpcFalso(self.db, nombre, params)
+
+
+# ============================================
+# DOBLE DE OPENAI
+# ============================================
+
+class _CompletionsFalsas:
+    def __init__(self, latencia_ms: float):
+        self.latencia_ms = latencia_ms
+
+    async def create(self, **kwargs):
+        metricas.registrar_llamada("openai")
+        await asyncio.sleep(self.latencia_ms / 1000)
+
+        if kwargs.get("response_format", {}).get("type") == "json_object":
+            contenido = json.dumps({
+                "categoria": None,
+                "subtipo": None,
+                "empresa": None,
+                "periodo": None,
+                "confianza": 0.0,
+                "respuesta": "Respuesta simulada para prueba de carga.",
+                "requiere_ticket": False
+            })
+        else:
+            contenido = "Respuesta simulada para prueba de carga."
+
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=contenido))],
+            usage=SimpleNamespace(prompt_tokens=0, completion_tokens=0, total_tokens=0)
+        )
+
+
+class OpenAIFalso:
+    """Reemplazo de AsyncOpenAI con solo chat.completions"""
+
+    def __init__(self, latencia_ms: float):
+        self.chat = SimpleNamespace(completions=_CompletionsFalsas(latencia_ms))
+
+
+# ============================================
+# DOBLE DE LA API DE TELEGRAM
+# ============================================
+
+class RequestTelegramLocal(BaseRequest):
+    """Responde localmente a la Bot API con latencia configurable"""
+
+    def __init__(self, latencia_ms: float):
+        self.latencia_ms = latencia_ms
+        self._message_id = 0
+
+    @property
+    def read_timeout(self) -> Optional[float]:
+        return None
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    def _mensaje(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        self._message_id += 1
+        chat_id = int(params.get("chat_id") or 0)
+        return {
+            "message_id": int(params.get("message_id") or self._message_id),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": BOT_USER,
+            "text": params.get("text") or params.get("caption") or ""
+        }
+
+    async def do_request(
+        self,
+        url: str,
+        method: str,
+        request_data: Optional[RequestData] = None,
+        read_timeout=None,
+        write_timeout=None,
+        connect_timeout=None,
+        pool_timeout=None
+    ) -> Tuple[int, bytes]:
+        # Descarga de archivos (File.download_as_bytearray)
+        if "/file/bot" in url:
+            metricas.registrar_llamada("telegram_file")
+            await asyncio.sleep(self.latencia_ms / 1000)
+            return 200, b"%PDF-1.4\n% prueba de carga\n" + b"0" * 4096
+
+        metodo = url.rsplit("/", 1)[-1]
+        params = request_data.parameters if request_data else {}
+
+        if metodo != "getMe":
+            metricas.registrar_llamada("telegram")
+            await asyncio.sleep(self.latencia_ms / 1000)
+
+        if metodo == "getMe":
+            resultado = BOT_USER
+        elif metodo == "getFile":
+            resultado = {
+                "file_id": params.get("file_id"),
+                "file_unique_id": f"u{params.get('file_id')}",
+                "file_size": 4120,
+                "file_path": "documents/reporte.pdf"
+            }
+        elif metodo in ("answerCallbackQuery", "deleteMessage", "setMyCommands"):
+            resultado = True
+        else:
+            resultado = self._mensaje(params)
+
+        return 200, json.dumps({"ok": True, "result": resultado}).encode()
+
+
+# ============================================
+# DATOS SEMILLA Y UPDATES SINTÉTICOS
+# ============================================
+
+def sembrar_datos(db: BaseDatosFalsa, usuarios: int):
+    """Crear empresas, usuarios, relaciones y un reporte por empresa"""
+    periodo_actual = datetime.now().strftime("%Y-%m")
+
+    for i in range(usuarios):
+        empresa_id = str(uuid.uuid4())
+        usuario_id = str(uuid.uuid4())
+        chat_id = CHAT_ID_BASE + i
+
+        db.tablas["empresas"].append({
+            "id": empresa_id, "nombre": f"Empresa Carga {i}", "rut": f"7600{i:04d}-K",
+            "activo": True, "openai_assistant_id": None
+        })
+        db.tablas["usuarios"].append({
+            "id": usuario_id, "chat_id": chat_id, "nombre": f"Usuario {i}",
+            "empresa_id": empresa_id, "rol": "usuario", "activo": True
+        })
+        db.tablas["usuarios_empresas"].append({
+            "id": str(uuid.uuid4()), "usuario_id": usuario_id, "empresa_id": empresa_id,
+            "rol": "user", "activo": True
+        })
+        db.tablas["archivos"].append({
+            "id": str(uuid.uuid4()), "chat_id": chat_id, "empresa_id": empresa_id,
+            "nombre_archivo": f"reporte_{i}.pdf", "nombre_original": f"reporte_{i}.pdf",
+            "categoria": "financiero", "tipo": "financiero", "subtipo": "reporte_mensual",
+            "periodo": periodo_actual, "storage_path": f"financiero/{chat_id}/reporte_{i}.pdf",
+            "url_archivo": "", "openai_file_id": None, "activo": True,
+            "created_at": datetime.now().isoformat()
+        })
+
+
+def _usuario_telegram(chat_id: int) -> Dict[str, Any]:
+    return {"id": chat_id, "is_bot": False, "first_name": "Carga", "username": f"carga_{chat_id}"}
+
+
+def crear_update(bot, chat_id: int, tipo: str, valor: str) -> Update:
+    """Sintetizar un Update de Telegram (comando, texto, callback o documento)"""
+    update_id = random.randint(1, 2**31)
+    usuario = _usuario_telegram(chat_id)
+    chat = {"id": chat_id, "type": "private"}
+    mensaje = {"message_id": random.randint(1, 2**31), "date": int(time.time()), "chat": chat, "from": usuario}
+
+    if tipo == "comando":
+        mensaje.update(text=valor, entities=[{"type": "bot_command", "offset": 0, "length": len(valor.split()[0])}])
+        datos = {"update_id": update_id, "message": mensaje}
+    elif tipo == "texto":
+        mensaje["text"] = valor
+        datos = {"update_id": update_id, "message": mensaje}
+    elif tipo == "documento":
+        mensaje["document"] = {
+            "file_id": f"doc-{uuid.uuid4().hex}", "file_unique_id": uuid.uuid4().hex[:16],
+            "file_name": valor, "mime_type": "application/pdf", "file_size": 4120
+        }
+        datos = {"update_id": update_id, "message": mensaje}
+    elif tipo == "callback":
+        mensaje_bot = dict(mensaje, **{"from": BOT_USER, "text": "menú"})
+        datos = {
+            "update_id": update_id,
+            "callback_query": {
+                "id": str(update_id), "from": usuario, "chat_instance": str(chat_id),
+                "data": valor, "message": mensaje_bot
+            }
+        }
+    else:
+        raise ValueError(f"Tipo de update desconocido: {tipo}")
+
+    return Update.de_json(datos, bot)
+
+
+# Pasos de cada flujo: (tipo de update, valor)
+FLUJOS: Dict[str, List[Tuple[str, str]]] = {
+    "start": [
+        ("comando", "/start"),
+    ],
+    "menu": [
+        ("comando", "/start"),
+        ("callback", "ayuda"),
+        ("callback", "back_main"),
+        ("callback", "reporte_cfo"),
+        ("callback", "back_main"),
+    ],
+    "subida": [
+        ("comando", "/start"),
+        ("documento", "reporte_mensual.pdf"),
+        ("callback", "upload_categoria_financiero"),
+        ("callback", "upload_subtipo_financiero_reporte_mensual"),
+        ("callback", "upload_periodo_actual"),
+    ],
+    "descarga": [
+        ("comando", "/start"),
+        ("callback", "informacion"),
+        ("callback", "download_categoria_financiero"),
+        ("callback", "download_subtipo_financiero_reporte_mensual"),
+        ("callback", "download_periodo_actual"),
+    ],
+    "asesor": [
+        ("comando", "/start"),
+        ("callback", "asesor_ia"),
+        ("texto", "¿Cómo le fue a la empresa este mes?"),
+    ],
+}
+
+
+# ============================================
+# ARMADO DEL ENTORNO Y EJECUCIÓN
+# ============================================
+
+async def preparar_aplicacion(args) -> Any:
+    """Conectar los dobles a los servicios reales y armar el Application de producción"""
+    from telegram.ext import Application
+    from app.bots.bot_manager import BotManager
+    from app.database.supabase import supabase as supabase_manager
+    from app.database.instrumentation import instrumentar_cliente, instrumentar_aplicacion
+    from app.services.conversation_logger import get_conversation_logger
+    from app.services.ai_service import get_ai_service
+    from app.services.openai_assistant_service import get_assistant_service
+
+    db = BaseDatosFalsa(args.latencia_db_ms)
+    sembrar_datos(db, args.usuarios)
+    cliente = ClienteSupabaseFalso(db)
+
+    supabase_manager._client = instrumentar_cliente(cliente)
+    get_conversation_logger().supabase = supabase_manager.client
+    get_ai_service().client = OpenAIFalso(args.latencia_openai_ms)
+    # Assistants API no se simula: el asesor usa el camino de chat.completions
+    get_assistant_service().client = None
+
+    request = RequestTelegramLocal(args.latencia_telegram_ms)
+    manager = BotManager()
+    builder = Application.builder()\
+        .token("123456:CARGA-LOCAL")\
+        .request(request)\
+        .get_updates_request(RequestTelegramLocal(0))
+    if args.limitador:
+        from app.bots.rate_limiter import LimitadorEnvios
+        builder = builder.rate_limiter(LimitadorEnvios("production"))
+    manager.production_app = builder.build()
+    manager._setup_production_handlers()
+    instrumentar_aplicacion(manager.production_app, "production")
+
+    async def registrar_error(update, context):
+        metricas.registrar_error(context.error)
+
+    manager.production_app.add_error_handler(registrar_error)
+    await manager.production_app.initialize()
+    return manager.production_app
+
+
+async def monitorear_loop(intervalo_ms: float, detener: asyncio.Event):
+    """Medir el retraso del event loop respecto a un sleep programado"""
+    intervalo = intervalo_ms / 1000
+    while not detener.is_set():
+        inicio = time.perf_counter()
+        await asyncio.sleep(intervalo)
+        metricas.lag_loop_ms.append(max(0.0, (time.perf_counter() - inicio - intervalo) * 1000))
+
+
+async def usuario_virtual(app, indice: int, flujos: List[str], args, rng: random.Random):
+    """Ejecutar flujos secuenciales para un chat_id"""
+    chat_id = CHAT_ID_BASE + indice
+    await asyncio.sleep(rng.uniform(0, args.ramp_up_s))
+
+    for iteracion in range(args.iteraciones):
+        nombre = flujos[(indice + iteracion) % len(flujos)]
+        token = _flujo_actual.set(nombre)
+        try:
+            inicio_flujo = time.perf_counter()
+            for tipo, valor in FLUJOS[nombre]:
+                update = crear_update(app.bot, chat_id, tipo, valor)
+                inicio = time.perf_counter()
+                await app.process_update(update)
+                metricas.latencias_update[nombre].append((time.perf_counter() - inicio) * 1000)
+                if args.pausa_ms:
+                    await asyncio.sleep(rng.uniform(0, args.pausa_ms) / 1000)
+            metricas.latencias_flujo[nombre].append((time.perf_counter() - inicio_flujo) * 1000)
+            metricas.ejecuciones[nombre] += 1
+        finally:
+            _flujo_actual.reset(token)
+
+
+async def ejecutar_carga(args) -> Dict[str, Any]:
+    """Ejecutar la prueba completa y devolver el resumen"""
+    flujos = [f.strip() for f in args.flujos.split(",") if f.strip()]
+    desconocidos = [f for f in flujos if f not in FLUJOS]
+    if desconocidos:
+        raise ValueError(f"Flujos desconocidos: {', '.join(desconocidos)}")
+
+    app = await preparar_aplicacion(args)
+    rng = random.Random(args.semilla)
+    detener = asyncio.Event()
+    monitor = asyncio.create_task(monitorear_loop(args.intervalo_lag_ms, detener))
+
+    metricas.inicio = time.perf_counter()
+    await asyncio.gather(*[
+        usuario_virtual(app, i, flujos, args, random.Random(rng.random()))
+        for i in range(args.usuarios)
+    ])
+
+    # Esperar tareas en segundo plano (logging de conversaciones)
+    pendientes = [t for t in asyncio.all_tasks() if t is not asyncio.current_task() and t is not monitor]
+    if pendientes:
+        await asyncio.gather(*pendientes, return_exceptions=True)
+    metricas.fin = time.perf_counter()
+
+    detener.set()
+    await monitor
+    await app.shutdown()
+
+    # Exportar trazas pendientes (si se corrió con TRACING_EXPORTER=jsonl)
+    from app.utils.tracing import get_trazador
+    get_trazador().detener()
+    return construir_resumen(args)
+
+
+def construir_resumen(args) -> Dict[str, Any]:
+    """Armar resumen serializable de la corrida"""
+    from app.database.instrumentation import get_registro_consultas
+
+    duracion = metricas.fin - metricas.inicio
+    total_updates = sum(len(v) for v in metricas.latencias_update.values())
+
+    flujos = {}
+    for nombre, latencias in metricas.latencias_update.items():
+        ejecuciones = metricas.ejecuciones[nombre] or 1
+        flujos[nombre] = {
+            "ejecuciones": metricas.ejecuciones[nombre],
+            "updates": len(latencias),
+            "update_ms": {
+                "p50": round(percentil(latencias, 50), 1),
+                "p95": round(percentil(latencias, 95), 1),
+                "p99": round(percentil(latencias, 99), 1),
+                "max": round(max(latencias), 1)
+            },
+            "flujo_ms": {
+                "p50": round(percentil(metricas.latencias_flujo[nombre], 50), 1),
+                "p95": round(percentil(metricas.latencias_flujo[nombre], 95), 1)
+            },
+            "histograma_update": histograma(latencias),
+            "llamadas_por_flujo": {
+                backend: round(cantidad / ejecuciones, 2)
+                for backend, cantidad in sorted(metricas.llamadas[nombre].items())
+            }
+        }
+
+    return {
+        "parametros": {
+            "usuarios": args.usuarios,
+            "iteraciones": args.iteraciones,
+            "latencia_db_ms": args.latencia_db_ms,
+            "latencia_openai_ms": args.latencia_openai_ms,
+            "latencia_telegram_ms": args.latencia_telegram_ms
+        },
+        "duracion_s": round(duracion, 2),
+        "updates_totales": total_updates,
+        "updates_por_segundo": round(total_updates / duracion, 1) if duracion else 0,
+        "flujos": flujos,
+        "lag_loop_ms": {
+            "p50": round(percentil(metricas.lag_loop_ms, 50), 1),
+            "p99": round(percentil(metricas.lag_loop_ms, 99), 1),
+            "max": round(max(metricas.lag_loop_ms, default=0), 1)
+        },
+        "supabase_por_handler": {
+            handler: datos["llamadas_por_update"]
+            for handler, datos in get_registro_consultas().resumen()["handlers"].items()
+        },
+        "rss_maximo_mb": round(rss_maximo_mb(), 1),
+        "errores": dict(metricas.errores)
+    }
+
+
+def imprimir_resumen(resumen: Dict[str, Any]):
+    """Imprimir reporte legible en consola"""
+    print("\n" + "=" * 70)
+    print("🔥 RESULTADOS DE LA PRUEBA DE CARGA")
+    print("=" * 70)
+    p = resumen["parametros"]
+    print(f"👥 Usuarios: {p['usuarios']}  🔁 Iteraciones: {p['iteraciones']}  "
+          f"⏱️ DB {p['latencia_db_ms']} ms / OpenAI {p['latencia_openai_ms']} ms / Telegram {p['latencia_telegram_ms']} ms")
+    print(f"📊 {resumen['updates_totales']} updates en {resumen['duracion_s']} s "
+          f"({resumen['updates_por_segundo']} updates/s)")
+
+    for nombre, datos in resumen["flujos"].items():
+        u, f = datos["update_ms"], datos["flujo_ms"]
+        print("\n" + "-" * 70)
+        print(f"📋 Flujo '{nombre}': {datos['ejecuciones']} ejecuciones, {datos['updates']} updates")
+        print(f"   Update  p50={u['p50']} ms  p95={u['p95']} ms  p99={u['p99']} ms  max={u['max']} ms")
+        print(f"   Flujo   p50={f['p50']} ms  p95={f['p95']} ms")
+
+        maximo = max((c for _, c in datos["histograma_update"]), default=0) or 1
+        for etiqueta, cantidad in datos["histograma_update"]:
+            if cantidad:
+                barra = "█" * max(1, round(cantidad / maximo * 40))
+                print(f"   {etiqueta} | {barra} {cantidad}")
+
+        llamadas = ", ".join(f"{k}={v}" for k, v in datos["llamadas_por_flujo"].items()) or "ninguna"
+        print(f"   🔌 Llamadas por flujo: {llamadas}")
+
+    print("\n" + "-" * 70)
+    print("🔬 Llamadas a Supabase por update (por handler):")
+    for handler, promedio in sorted(resumen["supabase_por_handler"].items()):
+        print(f"   • {handler}: {promedio if promedio is not None else '-'}")
+
+    lag = resumen["lag_loop_ms"]
+    print("\n" + "-" * 70)
+    print(f"⏳ Lag del event loop: p50={lag['p50']} ms  p99={lag['p99']} ms  max={lag['max']} ms")
+    print(f"💾 RSS máximo: {resumen['rss_maximo_mb']} MB")
+
+    if resumen["errores"]:
+        print("❌ Errores en handlers:")
+        for clave, cantidad in resumen["errores"].items():
+            print(f"   • {clave}: {cantidad}")
+    else:
+        print("✅ Sin errores en handlers")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga de los flujos del bot de producción")
+    parser.add_argument("--usuarios", type=int, default=20, help="Usuarios concurrentes (chat_id distintos)")
+    parser.add_argument("--iteraciones", type=int, default=5, help="Flujos que ejecuta cada usuario")
+    parser.add_argument("--flujos", default=",".join(FLUJOS), help=f"Flujos separados por coma ({', '.join(FLUJOS)})")
+    parser.add_argument("--latencia-db-ms", type=float, default=20, help="Latencia simulada de Supabase/Storage (bloqueante)")
+    parser.add_argument("--latencia-openai-ms", type=float, default=400, help="Latencia simulada de OpenAI")
+    parser.add_argument("--latencia-telegram-ms", type=float, default=30, help="Latencia simulada de la Bot API")
+    parser.add_argument("--pausa-ms", type=float, default=0, help="Pausa máxima aleatoria entre pasos de un flujo")
+    parser.add_argument("--ramp-up-s", type=float, default=1.0, help="Ventana de arranque escalonado de usuarios")
+    parser.add_argument("--intervalo-lag-ms", type=float, default=50, help="Intervalo del monitor de lag del loop")
+    parser.add_argument("--limitador", action="store_true", help="Encolar envíos con LimitadorEnvios (límites de Telegram)")
+    parser.add_argument("--semilla", type=int, default=42, help="Semilla aleatoria")
+    parser.add_argument("--json", help="Guardar resumen en este archivo JSON")
+    parser.add_argument("--verbose", action="store_true", help="Mostrar logs de la app")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO if args.verbose else logging.ERROR,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    if not args.verbose:
+        # Sin Assistants API cada subida de PDF registra un error esperado
+        logging.getLogger("app.services.openai_assistant_service").setLevel(logging.CRITICAL)
+
+    print(f"🚀 Iniciando prueba de carga: {args.usuarios} usuarios x {args.iteraciones} flujos...")
+    resumen = asyncio.run(ejecutar_carga(args))
+    imprimir_resumen(resumen)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(resumen, f, ensure_ascii=False, indent=2)
+        print(f"\n💾 Resumen guardado en {args.json}")
+
+
+if __name__ == "__main__":
+    main()
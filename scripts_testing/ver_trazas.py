@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+🧵 Ver trazas por update como cascada (waterfall)
+
+Lee el JSONL que escribe el exportador de trazas (TRACING_EXPORTER=jsonl) y
+muestra, para un chat_id y un rango de tiempo, cada update con sus spans
+anidados: validación de usuario, sesión, Supabase, Storage, OpenAI y Telegram.
+
+Con --colector levanta un receptor OTLP/HTTP mínimo (POST /v1/traces en JSON)
+que guarda las trazas recibidas en el mismo formato JSONL, para probar
+TRACING_EXPORTER=otlp sin un colector real.
+"""
+
+import os
+import sys
+import json
+import argparse
+from collections import defaultdict
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+# Agregar el directorio raíz al path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+ANCHO_BARRA = 40
+ANCHO_NOMBRE = 48
+
+
+# ============================================
+# LECTURA Y FILTRO
+# ============================================
+
+def leer_trazas(ruta: str) -> Iterator[Dict[str, Any]]:
+    """Trazas del archivo JSONL (ignora líneas corruptas)"""
+    with open(ruta, encoding='utf-8') as f:
+        for linea in f:
+            linea = linea.strip()
+            if not linea:
+                continue
+            try:
+                yield json.loads(linea)
+            except json.JSONDecodeError:
+                continue
+
+
+def parsear_fecha(valor: Optional[str]) -> Optional[float]:
+    """ISO 8601 ('2025-10-19T14:00') o relativo ('30m', '2h', '1d') → epoch"""
+    if not valor:
+        return None
+    unidades = {'m': 'minutes', 'h': 'hours', 'd': 'days'}
+    if valor[-1] in unidades and valor[:-1].isdigit():
+        return (datetime.now() - timedelta(**{unidades[valor[-1]]: int(valor[:-1])})).timestamp()
+    return datetime.fromisoformat(valor).timestamp()
+
+
+def filtrar_trazas(
+    trazas: Iterator[Dict[str, Any]],
+    chat_id: Optional[int] = None,
+    desde: Optional[float] = None,
+    hasta: Optional[float] = None,
+    min_ms: float = 0
+) -> List[Dict[str, Any]]:
+    resultado = []
+    for traza in trazas:
+        if chat_id is not None and traza.get('chat_id') != chat_id:
+            continue
+        inicio = traza.get('inicio', 0)
+        if desde is not None and inicio < desde:
+            continue
+        if hasta is not None and inicio > hasta:
+            continue
+        if traza.get('duracion_ms', 0) < min_ms:
+            continue
+        resultado.append(traza)
+    resultado.sort(key=lambda t: t.get('inicio', 0))
+    return resultado
+
+
+# ============================================
+# WATERFALL
+# ============================================
+
+def _ordenar_spans(spans: List[Dict[str, Any]]) -> List[tuple]:
+    """(profundidad, span) en orden de árbol, hijos por inicio"""
+    hijos = defaultdict(list)
+    ids = {span['span_id'] for span in spans}
+    raices = []
+    for span in spans:
+        if span.get('padre_id') in ids:
+            hijos[span['padre_id']].append(span)
+        else:
+            raices.append(span)
+
+    resultado = []
+
+    def visitar(span, profundidad):
+        resultado.append((profundidad, span))
+        for hijo in sorted(hijos[span['span_id']], key=lambda s: s['inicio']):
+            visitar(hijo, profundidad + 1)
+
+    for raiz in sorted(raices, key=lambda s: s['inicio']):
+        visitar(raiz, 0)
+    return resultado
+
+
+def _etiqueta_span(span: Dict[str, Any]) -> str:
+    atributos = span.get('atributos') or {}
+    detalle = atributos.get('tabla') or atributos.get('bucket') or ''
+    return f"{span['nombre']} {detalle}".strip()
+
+
+def imprimir_waterfall(traza: Dict[str, Any]):
+    duracion = max(traza.get('duracion_ms') or 0, 0.001)
+    inicio_traza = traza['inicio']
+    fecha = datetime.fromtimestamp(inicio_traza).strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
+    estado = f"  ❌ {traza['error']}" if traza.get('error') else ''
+
+    print(
+        f"\n🧵 {fecha}  chat {traza.get('chat_id')}  update {traza.get('update_id')}  "
+        f"{traza.get('bot')}/{traza.get('handler')}  {traza.get('duracion_ms', 0):.0f} ms  "
+        f"[{traza['trace_id'][:12]}]{estado}"
+    )
+
+    for profundidad, span in _ordenar_spans(traza.get('spans', [])):
+        desplazamiento = (span['inicio'] - inicio_traza) * 1000
+        inicio_col = min(ANCHO_BARRA - 1, max(0, int(desplazamiento / duracion * ANCHO_BARRA)))
+        largo = max(1, round(span['duracion_ms'] / duracion * ANCHO_BARRA))
+        largo = min(largo, ANCHO_BARRA - inicio_col)
+        barra = ' ' * inicio_col + '█' * largo + ' ' * (ANCHO_BARRA - inicio_col - largo)
+
+        nombre = ('  ' * profundidad + _etiqueta_span(span))[:ANCHO_NOMBRE]
+        marca = ' ❌' if span.get('error') else ''
+        print(f"  {nombre:<{ANCHO_NOMBRE}} |{barra}| {desplazamiento:8.1f} +{span['duracion_ms']:8.1f} ms{marca}")
+
+    if traza.get('spans_descartados'):
+        print(f"  ⚠️ {traza['spans_descartados']} spans descartados (límite por traza)")
+
+
+def imprimir_resumen(trazas: List[Dict[str, Any]]):
+    """Tiempo total por tipo de span en las trazas mostradas"""
+    por_nombre = defaultdict(lambda: [0, 0.0])
+    for traza in trazas:
+        for span in traza.get('spans', []):
+            if span.get('padre_id') is None:
+                continue
+            por_nombre[span['nombre']][0] += 1
+            por_nombre[span['nombre']][1] += span['duracion_ms']
+
+    print(f"\n📊 {len(trazas)} trazas — tiempo por tipo de span")
+    for nombre, (llamadas, total) in sorted(por_nombre.items(), key=lambda x: -x[1][1])[:15]:
+        print(f"  {nombre:<{ANCHO_NOMBRE}} {llamadas:6d} llamadas {total:10.1f} ms")
+
+
+# ============================================
+# COLECTOR OTLP DE PRUEBA
+# ============================================
+
+def _valor_otlp(valor: Dict[str, Any]) -> Any:
+    if 'intValue' in valor:
+        return int(valor['intValue'])
+    if 'doubleValue' in valor:
+        return valor['doubleValue']
+    if 'boolValue' in valor:
+        return valor['boolValue']
+    return valor.get('stringValue')
+
+
+def otlp_a_trazas(cuerpo: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Convertir un ExportTraceServiceRequest (JSON) al formato de traza del JSONL"""
+    spans_por_traza = defaultdict(list)
+    for recurso in cuerpo.get('resourceSpans', []):
+        for scope in recurso.get('scopeSpans', []):
+            for span in scope.get('spans', []):
+                inicio_ns = int(span['startTimeUnixNano'])
+                fin_ns = int(span['endTimeUnixNano'])
+                status = span.get('status') or {}
+                spans_por_traza[span['traceId']].append({
+                    'span_id': span['spanId'],
+                    'padre_id': span.get('parentSpanId') or None,
+                    'nombre': span['name'],
+                    'inicio': inicio_ns / 1e9,
+                    'duracion_ms': round((fin_ns - inicio_ns) / 1e6, 2),
+                    'atributos': {a['key']: _valor_otlp(a['value']) for a in span.get('attributes', [])},
+                    'error': status.get('message') if status.get('code') == 2 else None
+                })
+
+    trazas = []
+    for trace_id, spans in spans_por_traza.items():
+        raiz = next((s for s in spans if s['padre_id'] is None), spans[0])
+        atributos = raiz['atributos']
+        trazas.append({
+            'trace_id': trace_id,
+            'nombre': raiz['nombre'],
+            'chat_id': atributos.get('chat_id'),
+            'update_id': atributos.get('update_id'),
+            'bot': atributos.get('bot'),
+            'handler': atributos.get('handler'),
+            'inicio': raiz['inicio'],
+            'duracion_ms': raiz['duracion_ms'],
+            'error': raiz['error'],
+            'spans_descartados': 0,
+            'spans': spans
+        })
+    return trazas
+
+
+def ejecutar_colector(puerto: int, ruta: str):
+    from app.utils.tracing import ExportadorJSONL
+    exportador = ExportadorJSONL(ruta)
+
+    class ReceptorOTLP(BaseHTTPRequestHandler):
+        def do_POST(self):
+            if self.path != '/v1/traces':
+                self.send_response(404)
+                self.end_headers()
+                return
+            try:
+                largo = int(self.headers.get('Content-Length', 0))
+                trazas = otlp_a_trazas(json.loads(self.rfile.read(largo)))
+                exportador.exportar(trazas)
+                print(f"📥 {len(trazas)} trazas recibidas")
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.end_headers()
+                self.wfile.write(b'{}')
+            except Exception as e:
+                print(f"❌ Error procesando trazas: {e}")
+                self.send_response(400)
+                self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    print(f"🛰️ Colector OTLP de prueba en http://localhost:{puerto}/v1/traces → {ruta}")
+    HTTPServer(('0.0.0.0', puerto), ReceptorOTLP).serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Waterfall de trazas por update")
+    parser.add_argument("--archivo", default=os.getenv("TRACING_JSONL_PATH", "logs/trazas.jsonl"), help="JSONL de trazas")
+    parser.add_argument("--chat-id", type=int, help="Solo updates de este chat")
+    parser.add_argument("--desde", help="Inicio del rango (ISO 8601 o relativo: 30m, 2h, 1d)")
+    parser.add_argument("--hasta", help="Fin del rango (ISO 8601 o relativo)")
+    parser.add_argument("--min-ms", type=float, default=0, help="Solo updates que duraron al menos esto")
+    parser.add_argument("--limite", type=int, default=20, help="Máximo de trazas a mostrar (las más recientes)")
+    parser.add_argument("--colector", type=int, metavar="PUERTO", help="Levantar colector OTLP de prueba en este puerto")
+    args = parser.parse_args()
+
+    if args.colector:
+        ejecutar_colector(args.colector, args.archivo)
+        return
+
+    if not os.path.exists(args.archivo):
+        print(f"❌ No existe {args.archivo} (¿TRACING_EXPORTER=jsonl?)")
+        sys.exit(1)
+
+    trazas = filtrar_trazas(
+        leer_trazas(args.archivo),
+        chat_id=args.chat_id,
+        desde=parsear_fecha(args.desde),
+        hasta=parsear_fecha(args.hasta),
+        min_ms=args.min_ms
+    )
+    if not trazas:
+        print("⚠️ No hay trazas para ese filtro")
+        return
+
+    mostradas = trazas[-args.limite:]
+    for traza in mostradas:
+        imprimir_waterfall(traza)
+    imprimir_resumen(mostradas)
+
+
+if __name__ == "__main__":
+    main()
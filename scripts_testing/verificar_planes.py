@@ -0,0 +1,480 @@
+#!/usr/bin/env python3
+"""
+🔎 Verificación de planes de consulta contra un PostgreSQL local
+Carga las migraciones, genera datos sintéticos a escala de producción y
+ejecuta EXPLAIN ANALYZE sobre cada forma de consulta que emite la capa de datos
+
+Cada consulta del catálogo reproduce el SQL que PostgREST genera para una
+llamada concreta del código (el campo `origen` indica cuál). Falla si una
+consulta caliente (camino de cada update del bot) recorre con Seq Scan una
+tabla o partición grande, o si cualquier consulta supera su presupuesto de
+tiempo. Sirve para detectar que un índice de `database/migrations` ya no
+coincide con los filtros u orden que usa el código.
+
+Requiere un PostgreSQL local desechable (no Supabase) y psycopg 3:
+    pip install "psycopg[binary]"
+
+Uso:
+    python3 scripts_testing/verificar_planes.py --dsn postgresql://postgres@localhost/aca_planes --recrear
+    python3 scripts_testing/verificar_planes.py --dsn postgresql://postgres@localhost/aca_planes --solo archivos_menu,sesion_activa
+    python3 scripts_testing/verificar_planes.py --recrear --escala 0.1 --json planes.json   (usa PLANES_DATABASE_URL)
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+from pathlib import Path
+from typing import Any, Dict, List
+
+MIGRACIONES = Path(__file__).parent.parent / 'database' / 'migrations'
+
+# Volúmenes con --escala 1 (holgados respecto de producción)
+VOLUMENES = {
+    'empresas': 300,
+    'usuarios': 3000,
+    'archivos': 150_000,
+    'sesiones_conversacion': 30_000,
+    'conversaciones': 1_500_000,
+    'usuarios_detalle': 20_000,
+    'intentos_acceso_negado': 200_000,
+    'metricas_financieras': 150_000,
+}
+MESES_CONVERSACIONES = 12
+DIAS_CALIENTES = 31
+
+# Por debajo de estas filas un Seq Scan es la decisión correcta del planner
+MIN_FILAS_SEQ_SCAN = 5000
+
+COLUMNAS_MENU = 'id, nombre_original, nombre_archivo, categoria, subtipo, periodo, url_archivo'
+COLUMNAS_ASESOR = ('id, nombre_original, nombre_archivo, subtipo, periodo, descripcion, '
+                   'descripcion_personalizada, metadata')
+
+
+# ============================================
+# DATOS SINTÉTICOS
+# ============================================
+
+# (tabla, SQL) en orden de dependencias. La distribución es sesgada (power(random(), n))
+# para que existan empresas y chats "grandes": los valores de prueba se toman de ellos.
+DATOS = [
+    ('empresas', """
+        INSERT INTO empresas (rut, nombre)
+        SELECT 'R' || i, 'Empresa ' || i FROM generate_series(1, %(empresas)s) i
+    """),
+    ('usuarios', """
+        WITH e AS (SELECT id, row_number() OVER (ORDER BY rut) - 1 AS n FROM empresas)
+        INSERT INTO usuarios (chat_id, empresa_id, nombre, rol)
+        SELECT 100000 + i, e.id, 'Usuario ' || i,
+               CASE WHEN mod(i, 100) = 0 THEN 'admin' ELSE 'user' END
+        FROM generate_series(1, %(usuarios)s) i
+        JOIN e ON e.n = mod(i, %(empresas)s)
+    """),
+    ('usuarios_empresas', """
+        WITH e AS (SELECT id, row_number() OVER (ORDER BY rut) - 1 AS n FROM empresas)
+        INSERT INTO usuarios_empresas (usuario_id, empresa_id, rol)
+        SELECT u.id, u.empresa_id, u.rol FROM usuarios u
+        UNION ALL
+        SELECT u.id, e.id, 'user' FROM usuarios u
+        JOIN e ON e.n = mod(u.chat_id * 7, %(empresas)s)
+        WHERE mod(u.chat_id, 5) = 0
+        ON CONFLICT (usuario_id, empresa_id) DO NOTHING
+    """),
+    ('archivos', """
+        WITH e AS (SELECT id, row_number() OVER (ORDER BY rut) - 1 AS n FROM empresas)
+        INSERT INTO archivos (chat_id, empresa_id, nombre_archivo, nombre_original, url_archivo,
+                              storage_path, categoria, subtipo, periodo, descripcion, metadata,
+                              openai_file_id, activo, created_at)
+        SELECT 100001 + mod(s.i, %(usuarios)s), e.id,
+               'archivo_' || s.i || '.pdf', 'Reporte ' || s.i || '.pdf',
+               'https://storage.local/uploads/' || s.i || '.pdf', 'uploads/' || s.i || '.pdf',
+               (ARRAY['financiero', 'legal', 'tributario', 'laboral', 'otros'])[1 + mod(s.i, 5)],
+               (ARRAY['reporte_mensual', 'estados_financieros', 'f29', 'otros'])[1 + mod(s.i / 5, 4)],
+               to_char(date_trunc('month', now()) - make_interval(months => mod(s.i, 36)), 'YYYY-MM'),
+               'Descripción ' || s.i, jsonb_build_object('paginas', mod(s.i, 80)),
+               CASE WHEN mod(s.i, 3) = 0 THEN 'file-' || s.i END,
+               mod(s.i, 20) <> 0,
+               now() - random() * interval '1095 days'
+        FROM (SELECT i, floor(power(random(), 3) * %(empresas)s)::int AS n_empresa
+              FROM generate_series(1, %(archivos)s) i) s
+        JOIN e ON e.n = s.n_empresa
+    """),
+    ('metricas_financieras', """
+        INSERT INTO metricas_financieras (empresa_id, periodo, cuenta, monto, fuente)
+        SELECT e.id, to_char(date_trunc('month', now()) - make_interval(months => m), 'YYYY-MM'), c.cuenta,
+               round((random() * 1e9)::numeric, 2), 'reporte_mensual'
+        FROM empresas e
+        CROSS JOIN unnest(ARRAY['ventas', 'costo_ventas', 'margen_bruto', 'gastos_administracion',
+                                'utilidad_neta', 'iva_debito', 'iva_credito', 'ppm']) c(cuenta)
+        CROSS JOIN generate_series(0, 59) m
+        LIMIT %(metricas_financieras)s
+    """),
+    ('sesiones_conversacion', """
+        INSERT INTO sesiones_conversacion (chat_id, estado, intent, data, created_at, expires_at)
+        SELECT s.chat_id, 'esperando_periodo', 'descargar_archivo', '{"paso": 3}'::jsonb, s.t, s.t + interval '1 hour'
+        FROM (SELECT 100001 + floor(power(random(), 2) * %(usuarios)s)::int AS chat_id,
+                     now() - random() * interval '10 days' AS t
+              FROM generate_series(1, %(sesiones_conversacion)s) i) s
+    """),
+    ('particiones', """
+        SELECT crear_particion_conversaciones((date_trunc('month', now()) - make_interval(months => m))::date)
+        FROM generate_series(0, %(meses)s) m
+    """),
+    ('conversaciones', """
+        INSERT INTO conversaciones (chat_id, empresa_id, mensaje, respuesta, usuario_nombre, bot_tipo, comando, created_at)
+        SELECT s.chat_id, u.empresa_id, 'Mensaje ' || s.i, 'Respuesta ' || s.i, 'Usuario',
+               CASE WHEN mod(s.i, 10) = 0 THEN 'admin' ELSE 'production' END,
+               CASE WHEN mod(s.i, 4) = 0 THEN '/start' END,
+               now() - random() * make_interval(days => %(meses)s * 30)
+        FROM (SELECT i, CASE WHEN mod(i, 7) = 0 THEN 900001 + mod(i, %(usuarios_detalle)s)
+                             ELSE 100001 + floor(power(random(), 2) * %(usuarios)s)::int END AS chat_id
+              FROM generate_series(1, %(conversaciones)s) i) s
+        LEFT JOIN usuarios u ON u.chat_id = s.chat_id
+    """),
+    ('usuarios_detalle', """
+        INSERT INTO usuarios_detalle (chat_id, user_id, first_name, username, tipo_acceso,
+                                      intentos_acceso, total_mensajes, ultima_interaccion)
+        SELECT 900000 + i, 900000 + i, 'Nombre ' || i, 'user' || i,
+               (ARRAY['autorizado', 'no_autorizado', 'bloqueado'])[1 + mod(i, 3)],
+               mod(i, 12), mod(i, 300), now() - random() * interval '365 days'
+        FROM generate_series(1, %(usuarios_detalle)s) i
+    """),
+    ('intentos_acceso_negado', """
+        INSERT INTO intentos_acceso_negado (chat_id, user_id, first_name, mensaje_enviado,
+                                            accion_intentada, bot_tipo, timestamp)
+        SELECT s.chat_id, s.chat_id, 'Nombre', '/start', 'mensaje', 'production',
+               now() - random() * interval '365 days'
+        FROM (SELECT 900001 + floor(power(random(), 2) * %(usuarios_detalle)s)::int AS chat_id
+              FROM generate_series(1, %(intentos_acceso_negado)s) i) s
+    """),
+]
+
+# Valores de prueba: el peor caso realista (la empresa o el chat con más filas)
+MUESTRAS = {
+    'empresa_id': "SELECT empresa_id FROM archivos WHERE activo GROUP BY empresa_id ORDER BY count(*) DESC LIMIT 1",
+    'chat_id': """SELECT chat_id FROM conversaciones WHERE empresa_id IS NOT NULL
+                  GROUP BY chat_id ORDER BY count(*) DESC LIMIT 1""",
+    'usuario_id': "SELECT id FROM usuarios ORDER BY chat_id LIMIT 1",
+    'archivo_id': "SELECT id FROM archivos WHERE activo LIMIT 1",
+    'chat_id_sesion': "SELECT chat_id FROM sesiones_conversacion GROUP BY chat_id ORDER BY count(*) DESC LIMIT 1",
+    'chat_id_intentos': "SELECT chat_id FROM intentos_acceso_negado GROUP BY chat_id ORDER BY count(*) DESC LIMIT 1",
+    'mes_archivo': "SELECT (date_trunc('month', now()) - interval '6 months')::date",
+}
+
+
+# ============================================
+# CATÁLOGO DE CONSULTAS
+# ============================================
+
+class Consulta:
+    """Una forma de consulta de la capa de datos"""
+
+    __slots__ = ('nombre', 'origen', 'sql', 'caliente', 'presupuesto_ms', 'escritura')
+
+    def __init__(self, nombre: str, origen: str, sql: str, caliente: bool = True,
+                 presupuesto_ms: float = 25, escritura: bool = False):
+        self.nombre = nombre
+        self.origen = origen
+        self.sql = sql
+        self.caliente = caliente
+        self.presupuesto_ms = presupuesto_ms
+        self.escritura = escritura
+
+
+CONSULTAS = [
+    # Autenticación y sesión: en cada update
+    Consulta('usuario_por_chat_id', 'SupabaseManager.get_user_by_chat_id', """
+        SELECT id, chat_id, nombre, rol, empresa_id FROM usuarios
+        WHERE chat_id = %(chat_id)s AND activo = true
+    """, presupuesto_ms=5),
+    Consulta('empresas_de_usuario', 'SupabaseManager.get_user_empresas', """
+        SELECT ue.empresa_id, ue.rol, e.id, e.nombre, e.rut, e.activo
+        FROM usuarios_empresas ue LEFT JOIN empresas e ON e.id = ue.empresa_id
+        WHERE ue.usuario_id = %(usuario_id)s AND ue.activo = true
+    """, presupuesto_ms=5),
+    Consulta('sesion_activa', 'SessionManager.get_session', """
+        SELECT id, chat_id, intent, estado, data, archivo_temp_id, expires_at FROM sesiones_conversacion
+        WHERE chat_id = %(chat_id_sesion)s AND expires_at > now()
+        ORDER BY created_at DESC LIMIT 1
+    """, presupuesto_ms=5),
+
+    # Archivos: menú de descarga, asesor y Storage
+    Consulta('archivos_menu', 'FileDownloadHandler._buscar_archivos', f"""
+        SELECT {COLUMNAS_MENU} FROM archivos
+        WHERE empresa_id = %(empresa_id)s AND activo = true
+          AND categoria = 'financiero' AND subtipo = 'reporte_mensual'
+          AND periodo = to_char(now(), 'YYYY-MM')
+        ORDER BY created_at DESC
+    """),
+    Consulta('reportes_financieros', 'SupabaseManager.get_reportes_financieros', f"""
+        SELECT {COLUMNAS_ASESOR} FROM archivos
+        WHERE empresa_id = %(empresa_id)s AND categoria = 'financiero' AND activo = true
+          AND subtipo IN ('reporte_mensual', 'estados_financieros', 'f29', 'otros')
+        ORDER BY periodo DESC, created_at DESC LIMIT 20
+    """),
+    Consulta('reportes_cfo', 'SupabaseManager.get_reportes_cfo', f"""
+        SELECT {COLUMNAS_ASESOR} FROM archivos
+        WHERE empresa_id = %(empresa_id)s AND activo = true
+        ORDER BY periodo DESC, created_at DESC LIMIT 50
+    """),
+    Consulta('series_metricas', 'FinancialMetricsService._cargar', """
+        SELECT periodo, cuenta, monto FROM metricas_financieras
+        WHERE empresa_id = %(empresa_id)s ORDER BY periodo LIMIT 10000
+    """, presupuesto_ms=10),
+    Consulta('archivo_firma', 'StorageService.get_file_url / download_file / delete_file', """
+        SELECT storage_path, url_archivo FROM archivos WHERE id = %(archivo_id)s
+    """, presupuesto_ms=5),
+    Consulta('archivos_openai_empresa', 'OpenAIAssistantService (conteo de archivos procesados)', """
+        SELECT count(*) FROM archivos WHERE empresa_id = %(empresa_id)s AND openai_file_id IS NOT NULL
+    """),
+
+    # Conversaciones: particiones calientes primero
+    Consulta('historial_usuario', 'ConversationLogger.get_user_conversation_history', """
+        SELECT * FROM conversaciones
+        WHERE chat_id = %(chat_id)s AND created_at >= now() - make_interval(days => %(dias_calientes)s)
+        ORDER BY created_at DESC, id DESC LIMIT 51
+    """),
+    Consulta('ultima_conversacion', 'ConversationLogger.get_last_conversation', """
+        SELECT * FROM conversaciones
+        WHERE chat_id = %(chat_id)s AND created_at >= now() - make_interval(days => %(dias_calientes)s)
+        ORDER BY created_at DESC LIMIT 1
+    """, presupuesto_ms=10),
+    Consulta('conversaciones_recientes', 'GET /api/conversations/recent', """
+        SELECT c.id, c.chat_id, c.empresa_id, c.mensaje, c.respuesta, c.usuario_nombre,
+               c.usuario_username, c.bot_tipo, c.comando, c.created_at, e.nombre
+        FROM conversaciones c LEFT JOIN empresas e ON e.id = c.empresa_id
+        WHERE c.bot_tipo = 'production' AND c.created_at >= now() - make_interval(days => %(dias_calientes)s)
+        ORDER BY c.created_at DESC, c.id DESC LIMIT 51
+    """, presupuesto_ms=50),
+    Consulta('historial_usuario_completo', 'ConversationLogger.get_user_conversation_history (fallback)', """
+        SELECT * FROM conversaciones WHERE chat_id = %(chat_id)s
+        ORDER BY created_at DESC, id DESC LIMIT 51
+    """, caliente=False, presupuesto_ms=200),
+
+    # Administración y mantenimiento
+    Consulta('no_autorizados', 'ConversationLogger.get_unauthorized_users', """
+        SELECT id, chat_id, user_id, first_name, last_name, username, intentos_acceso,
+               total_mensajes, primera_interaccion, ultima_interaccion, tipo_acceso
+        FROM usuarios_detalle
+        WHERE tipo_acceso IN ('no_autorizado', 'bloqueado') AND ultima_interaccion >= now() - interval '7 days'
+        ORDER BY ultima_interaccion DESC, id DESC LIMIT 101
+    """, caliente=False, presupuesto_ms=50),
+    Consulta('intentos_por_chat', 'ConversationLogger.get_access_attempts', """
+        SELECT * FROM intentos_acceso_negado
+        WHERE timestamp >= now() - interval '7 days' AND chat_id = %(chat_id_intentos)s
+        ORDER BY timestamp DESC, id DESC LIMIT 101
+    """, caliente=False, presupuesto_ms=50),
+    Consulta('sesiones_activas_total', 'metrics_service (gauge de sesiones activas)', """
+        SELECT count(*) FROM sesiones_conversacion WHERE expires_at > now()
+    """, caliente=False, presupuesto_ms=50),
+    Consulta('sesiones_expiradas', 'limpiar_sesiones_expiradas (tarea sesiones_expiradas)', """
+        DELETE FROM sesiones_conversacion WHERE expires_at < now()
+    """, caliente=False, presupuesto_ms=2000, escritura=True),
+    Consulta('conciliacion_archivos', 'ReconciliationService._leer_archivos_activos', """
+        SELECT id, storage_path, openai_file_id, created_at FROM archivos
+        WHERE activo = true ORDER BY created_at, id LIMIT 1001
+    """, caliente=False, presupuesto_ms=500),
+    Consulta('exportar_mes', 'RetentionService._exportar_mes', """
+        SELECT * FROM conversaciones
+        WHERE created_at >= %(mes_archivo)s AND created_at < %(mes_archivo)s + interval '1 month'
+        ORDER BY created_at, id LIMIT 1001
+    """, caliente=False, presupuesto_ms=200),
+]
+
+
+# ============================================
+# CARGA
+# ============================================
+
+def _es_local(dsn: str) -> bool:
+    from psycopg.conninfo import conninfo_to_dict
+    host = conninfo_to_dict(dsn).get('host') or ''
+    return host in ('', 'localhost', '127.0.0.1', '::1') or host.startswith('/')
+
+
+def cargar_migraciones(conexion):
+    """Esquema vacío + schema_completo.sql + migraciones numeradas en orden"""
+    conexion.execute("DROP SCHEMA IF EXISTS public CASCADE")
+    conexion.execute("CREATE SCHEMA public")
+    archivos = [MIGRACIONES / 'schema_completo.sql'] + sorted(MIGRACIONES.glob('[0-9][0-9][0-9]_*.sql'))
+    for archivo in archivos:
+        inicio = time.perf_counter()
+        conexion.execute(archivo.read_text(encoding='utf-8'))
+        print(f"  📜 {archivo.name} ({(time.perf_counter() - inicio) * 1000:.0f}ms)")
+
+
+def generar_datos(conexion, escala: float):
+    volumenes = {tabla: max(1, int(n * escala)) for tabla, n in VOLUMENES.items()}
+    volumenes['meses'] = MESES_CONVERSACIONES
+    for tabla, sql in DATOS:
+        inicio = time.perf_counter()
+        with conexion.cursor() as cur:
+            cur.execute(sql, volumenes)
+        filas = f"{volumenes[tabla]:>10,} filas" if tabla in volumenes else " " * 16
+        print(f"  🌱 {tabla:<24} {filas}  {time.perf_counter() - inicio:6.1f}s")
+    inicio = time.perf_counter()
+    conexion.execute("VACUUM ANALYZE")
+    print(f"  📈 VACUUM ANALYZE {time.perf_counter() - inicio:6.1f}s")
+
+
+# ============================================
+# EXPLAIN ANALYZE
+# ============================================
+
+def _nodos(plan: Dict[str, Any]):
+    yield plan
+    for hijo in plan.get('Plans', []):
+        yield from _nodos(hijo)
+
+
+def _texto_plan(plan: Dict[str, Any], nivel: int = 0) -> List[str]:
+    detalle = plan['Node Type']
+    if plan.get('Relation Name'):
+        detalle += f" on {plan['Relation Name']}"
+    if plan.get('Index Name'):
+        detalle += f" using {plan['Index Name']}"
+    detalle += f"  (filas={plan.get('Actual Rows')}, {plan.get('Actual Total Time', 0):.2f}ms)"
+    lineas = [f"{'    ' * nivel}-> {detalle}"]
+    for hijo in plan.get('Plans', []):
+        lineas.extend(_texto_plan(hijo, nivel + 1))
+    return lineas
+
+
+def explicar(conexion, consulta: Consulta, parametros: Dict[str, Any]) -> Dict[str, Any]:
+    with conexion.cursor() as cur:
+        cur.execute(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {consulta.sql}", parametros)
+        resultado = cur.fetchone()[0][0]
+    if consulta.escritura:
+        conexion.rollback()
+    else:
+        conexion.commit()
+    return resultado
+
+
+def verificar(conexion, consulta: Consulta, parametros: Dict[str, Any], filas_por_tabla: Dict[str, float],
+              repeticiones: int, min_filas: int) -> Dict[str, Any]:
+    # Primera ejecución para calentar caché; se reporta la mediana del resto
+    explicar(conexion, consulta, parametros)
+    corridas = [explicar(conexion, consulta, parametros) for _ in range(repeticiones)]
+    tiempo_ms = statistics.median(c['Execution Time'] for c in corridas)
+    plan = corridas[-1]['Plan']
+
+    seq_scans = sorted({
+        n['Relation Name'] for n in _nodos(plan)
+        if n['Node Type'] == 'Seq Scan' and filas_por_tabla.get(n.get('Relation Name'), 0) >= min_filas
+    })
+    indices = sorted({n['Index Name'] for n in _nodos(plan) if n.get('Index Name')})
+
+    problemas = []
+    if consulta.caliente and seq_scans:
+        problemas.append(f"Seq Scan en {', '.join(seq_scans)}")
+    if tiempo_ms > consulta.presupuesto_ms:
+        problemas.append(f"{tiempo_ms:.1f}ms > presupuesto {consulta.presupuesto_ms:g}ms")
+
+    return {
+        'consulta': consulta.nombre,
+        'origen': consulta.origen,
+        'caliente': consulta.caliente,
+        'tiempo_ms': round(tiempo_ms, 2),
+        'presupuesto_ms': consulta.presupuesto_ms,
+        'indices': indices,
+        'seq_scans': seq_scans,
+        'problemas': problemas,
+        'plan': _texto_plan(plan),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="EXPLAIN ANALYZE de las consultas de la capa de datos")
+    parser.add_argument("--dsn", default=os.getenv('PLANES_DATABASE_URL'),
+                        help="PostgreSQL local desechable (default: PLANES_DATABASE_URL)")
+    parser.add_argument("--recrear", action="store_true",
+                        help="Borrar el schema public, cargar migraciones y generar datos")
+    parser.add_argument("--escala", type=float, default=1.0, help="Multiplicador de VOLUMENES")
+    parser.add_argument("--solo", help="Consultas a verificar, separadas por coma")
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--min-filas", type=int, default=MIN_FILAS_SEQ_SCAN,
+                        help="Filas a partir de las que un Seq Scan caliente es un error")
+    parser.add_argument("--dias-calientes", type=int, default=DIAS_CALIENTES)
+    parser.add_argument("--permitir-remoto", action="store_true",
+                        help="Permitir --recrear contra un host que no es local")
+    parser.add_argument("--json", help="Guardar el resultado en un archivo JSON")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Mostrar el plan de todas las consultas")
+    args = parser.parse_args()
+
+    try:
+        import psycopg
+    except ImportError:
+        print('❌ Falta psycopg 3: pip install "psycopg[binary]"')
+        sys.exit(2)
+
+    if not args.dsn:
+        parser.error("Indica --dsn o PLANES_DATABASE_URL")
+    if args.recrear and not args.permitir_remoto and not _es_local(args.dsn):
+        parser.error("--recrear borra el schema public: solo contra un PostgreSQL local (o --permitir-remoto)")
+
+    consultas = CONSULTAS
+    if args.solo:
+        nombres = set(args.solo.split(','))
+        desconocidas = nombres - {c.nombre for c in CONSULTAS}
+        if desconocidas:
+            parser.error(f"Consultas desconocidas: {', '.join(sorted(desconocidas))}")
+        consultas = [c for c in CONSULTAS if c.nombre in nombres]
+
+    # ClientCursor: los parámetros van como literales y EXPLAIN ve un plan personalizado
+    with psycopg.connect(args.dsn, autocommit=True, cursor_factory=psycopg.ClientCursor) as conexion:
+        if args.recrear:
+            print(f"🗄️ Cargando migraciones de {MIGRACIONES}")
+            cargar_migraciones(conexion)
+            print(f"🌱 Generando datos sintéticos (escala {args.escala:g})")
+            generar_datos(conexion, args.escala)
+            print()
+
+        parametros = {'dias_calientes': args.dias_calientes}
+        for nombre, sql in MUESTRAS.items():
+            fila = conexion.execute(sql).fetchone()
+            if not fila:
+                print(f"❌ Sin datos para {nombre}: ejecuta con --recrear")
+                sys.exit(2)
+            parametros[nombre] = fila[0]
+
+        filas_por_tabla = dict(conexion.execute(
+            "SELECT relname, reltuples FROM pg_class WHERE relkind = 'r' AND relnamespace = 'public'::regnamespace"
+        ).fetchall())
+
+        conexion.autocommit = False
+        resultados = [
+            verificar(conexion, c, parametros, filas_por_tabla, args.repeticiones, args.min_filas)
+            for c in consultas
+        ]
+
+    print(f"{'Consulta':<28} {'Tipo':<9} {'ms':>9} {'Presup.':>8}  Índices")
+    print("-" * 100)
+    for r in resultados:
+        marca = '❌' if r['problemas'] else '✅'
+        tipo = 'caliente' if r['caliente'] else 'mant.'
+        print(f"{marca} {r['consulta']:<26} {tipo:<9} {r['tiempo_ms']:>9.2f} {r['presupuesto_ms']:>8g}  "
+              f"{', '.join(r['indices']) or '-'}")
+        for problema in r['problemas']:
+            print(f"     ⚠️ {problema}  ({r['origen']})")
+        if r['problemas'] or args.verbose:
+            for linea in r['plan']:
+                print(f"       {linea}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'escala': args.escala, 'resultados': resultados}, f, ensure_ascii=False, indent=2)
+        print(f"\n💾 Resultado guardado en {args.json}")
+
+    fallidas = [r for r in resultados if r['problemas']]
+    print()
+    if fallidas:
+        print(f"❌ {len(fallidas)} de {len(resultados)} consultas con regresiones de plan")
+        sys.exit(1)
+    print(f"✅ {len(resultados)} consultas dentro del plan esperado")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+🧪 Tests para el filtro de accesos no autorizados
+Valida la caché negativa de chats desconocidos, el límite de respuestas y el guardado agregado de intentos
+"""
+
+import asyncio
+import pytest
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+import sys
+import os
+
+# Agregar el directorio raíz al path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _update(chat_id, texto="hola"):
+    return SimpleNamespace(
+        effective_chat=SimpleNamespace(id=chat_id),
+        effective_user=SimpleNamespace(id=chat_id, first_name="Spam", last_name=None, username="spam"),
+        effective_message=SimpleNamespace(text=texto, caption=None),
+        callback_query=None
+    )
+
+
+class TestFiltroAcceso:
+    """Tests para app.security.access_filter"""
+
+    # =========================================
+    # TEST 1: Caché negativa en validate_user
+    # =========================================
+    def test_unknown_chat_is_rejected_without_query(self, monkeypatch):
+        """Un chat sin usuario se consulta una vez; un error de BD no se recuerda como desconocido"""
+        from app.security import auth
+        from app.security.access_filter import AccessFilter
+
+        filtro = AccessFilter(ttl_segundos=300, respuesta_segundos=600)
+        monkeypatch.setattr(auth, 'get_filtro_acceso', lambda: filtro)
+        consultas = []
+
+        class Permisos:
+            def obtener(self, chat_id):
+                consultas.append(chat_id)
+                if chat_id == 99:
+                    raise ConnectionError("sin conexión")
+                return None
+
+        monkeypatch.setattr(auth, 'get_permisos', lambda: Permisos())
+
+        assert not auth.security.validate_user(555)['valid']
+        assert not auth.security.validate_user(555)['valid']
+        assert not auth.security.is_admin(555)
+        assert consultas == [555]
+
+        filtro.olvidar(555)
+        auth.security.validate_user(555)
+        assert consultas == [555, 555]
+
+        assert 'Error de validación' in auth.security.validate_user(99)['message']
+        assert not filtro.es_desconocido(99)
+
+    # =========================================
+    # TEST 2: Respuestas limitadas e intentos agregados
+    # =========================================
+    def test_attempts_are_throttled_and_flushed_in_one_batch(self, monkeypatch):
+        """Un aviso por ventana, el resto se descarta antes de los handlers y se guarda en un solo RPC"""
+        from telegram.ext import ApplicationHandlerStop
+        from app.security import access_filter as modulo
+
+        monkeypatch.setattr(modulo, 'get_analytics_service', lambda: MagicMock())
+        supabase = MagicMock()
+        monkeypatch.setattr(modulo, 'get_supabase_client', lambda: supabase)
+        filtro = modulo.AccessFilter(ttl_segundos=300, respuesta_segundos=600)
+
+        filtro.marcar_desconocido(7)
+        assert filtro.registrar_intento(_update(7), 'production') is True
+        with pytest.raises(ApplicationHandlerStop):
+            asyncio.run(filtro.descartar_desconocidos(_update(7, "otra vez"), None, 'production'))
+        assert filtro.registrar_intento(_update(8), 'admin') is True
+        assert filtro.estado() == {'desconocidos': 1, 'chats_pendientes': 2, 'intentos_pendientes': 3}
+
+        # Si el RPC falla, el lote vuelve a los pendientes y se suma a los nuevos intentos
+        supabase.client.rpc.return_value.execute.side_effect = [ConnectionError("caída"), MagicMock()]
+        assert filtro.vaciar() == 0
+        filtro.registrar_intento(_update(7, "tercera"), 'production')
+        assert filtro.vaciar() == 2
+
+        lote = {i['chat_id']: i for i in supabase.client.rpc.call_args.args[1]['p_intentos']}
+        assert supabase.client.rpc.call_args.args[0] == 'registrar_intentos_acceso'
+        assert lote[7]['cantidad'] == 3 and lote[7]['mensaje'] == "tercera"
+        assert lote[8]['bot_tipo'] == 'admin'
+        assert filtro.estado()['chats_pendientes'] == 0
+
+    # =========================================
+    # TEST 3: Decorador de logging con chats desconocidos
+    # =========================================
+    def test_logging_decorator_keeps_handler_result_for_unknown_chats(self, monkeypatch):
+        """Sin registrar la conversación del chat desconocido, el resultado y la excepción del handler llegan a PTB"""
+        from app.decorators import conversation_logging as modulo
+        from app.security.access_filter import AccessFilter
+
+        filtro = AccessFilter(ttl_segundos=300, respuesta_segundos=600)
+        filtro.marcar_desconocido(7)
+        monkeypatch.setattr(modulo, 'get_filtro_acceso', lambda: filtro)
+        registrados = []
+
+        class Registro:
+            async def log_message(self, update, **kwargs):
+                registrados.append(update.effective_chat.id)
+
+        monkeypatch.setattr(modulo, 'get_conversation_logger', lambda: Registro())
+
+        @modulo.log_conversation("production")
+        async def falla(update, context):
+            raise ValueError("handler roto")
+
+        @modulo.log_conversation("production")
+        async def siguiente_estado(update, context):
+            return 2
+
+        def update(chat_id):
+            actualizacion = _update(chat_id)
+            actualizacion.message = SimpleNamespace(text="hola")
+            return actualizacion
+
+        async def escenario():
+            with pytest.raises(ValueError, match="handler roto"):
+                await falla(update(7), None)
+            assert await siguiente_estado(update(7), None) == 2
+            # Un chat conocido sí se registra
+            assert await siguiente_estado(update(8), None) == 2
+            await asyncio.sleep(0)
+
+        asyncio.run(escenario())
+        assert registrados == [8]
+
+
+# =========================================
+# Ejecutar tests
+# =========================================
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
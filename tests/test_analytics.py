@@ -0,0 +1,124 @@
+"""
+🧪 Tests para los rollups de analíticas
+Valida la acumulación por (fecha, hora, bot) y el RPC acumular_bot_analytics que la vacía en bot_analytics
+"""
+
+import threading
+import pytest
+import sys
+import os
+from datetime import datetime
+from types import SimpleNamespace
+
+# Agregar el directorio raíz al path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.analytics_service import AnalyticsService
+from app.utils.metrics import BUCKETS_LATENCIA_MS
+
+
+class ClienteFalso:
+    """Cliente de Supabase que guarda los RPC y puede fallar las primeras llamadas"""
+
+    def __init__(self, fallos: int = 0):
+        self.llamadas = []
+        self.fallos = fallos
+
+    def rpc(self, funcion, parametros):
+        def execute():
+            if self.fallos:
+                self.fallos -= 1
+                raise RuntimeError('sin conexión')
+            self.llamadas.append((funcion, parametros))
+            return SimpleNamespace(data=None)
+        return SimpleNamespace(execute=execute)
+
+
+def servicio(cliente: ClienteFalso) -> AnalyticsService:
+    analytics = AnalyticsService.__new__(AnalyticsService)
+    analytics.supabase = SimpleNamespace(client=cliente)
+    analytics._pendientes = {}
+    analytics._lock = threading.Lock()
+    return analytics
+
+
+class TestAnalytics:
+    """Tests para AnalyticsService.registrar y vaciar"""
+
+    # =========================================
+    # TEST 1: Acumulación por período
+    # =========================================
+    def test_register_groups_by_date_hour_and_bot(self):
+        """Conteos, usuarios únicos y latencias por (fecha, hora, bot), sin tocar la BD"""
+        cliente = ClienteFalso()
+        analytics = servicio(cliente)
+        diez = datetime(2024, 3, 5, 10, 15)
+        once = datetime(2024, 3, 5, 11, 1)
+
+        analytics.registrar('production', 1, True, response_time_ms=40, command='start', momento=diez)
+        analytics.registrar('production', 1, True, response_time_ms=800, momento=diez)
+        analytics.registrar('production', 2, False, error='sin acceso', momento=diez)
+        analytics.registrar('production', None, True, response_time_ms=20000, momento=once)
+        analytics.registrar('admin', 9, True, momento=diez)
+
+        assert cliente.llamadas == []
+        assert set(analytics._pendientes) == {
+            ('2024-03-05', 10, 'production'), ('2024-03-05', 11, 'production'), ('2024-03-05', 10, 'admin')
+        }
+        diez_prod = analytics._pendientes[('2024-03-05', 10, 'production')]
+        assert (diez_prod.mensajes, diez_prod.autorizados, diez_prod.no_autorizados) == (3, 2, 1)
+        assert (diez_prod.comandos, diez_prod.errores) == (1, 1)
+        assert diez_prod.chat_ids == {1, 2} and diez_prod.chat_ids_no_autorizados == {2}
+        # Solo los mensajes con tiempo de respuesta entran al histograma
+        assert diez_prod.latencia.total == 2 and diez_prod.latencia.suma == 840
+        assert diez_prod.latencia.conteos()[BUCKETS_LATENCIA_MS.index(50)] == 1
+        assert diez_prod.latencia.conteos()[BUCKETS_LATENCIA_MS.index(1000)] == 1
+        # Sobre el último bucket cuenta en +Inf
+        assert analytics._pendientes[('2024-03-05', 11, 'production')].latencia.conteos()[-1] == 1
+
+    # =========================================
+    # TEST 2: Vaciado en bot_analytics
+    # =========================================
+    def test_flush_sends_rpc_payload_and_requeues_failures(self):
+        """Un RPC por período con el lote completo; si falla, el lote se suma al siguiente"""
+        cliente = ClienteFalso(fallos=1)
+        analytics = servicio(cliente)
+        momento = datetime(2024, 3, 5, 10, 15)
+        analytics.registrar('production', 7, True, response_time_ms=30, momento=momento)
+        analytics.registrar('production', 3, False, response_time_ms=200, momento=momento)
+
+        # Primer intento falla: nada guardado y el lote vuelve a pendientes
+        assert analytics.vaciar() == 0
+        analytics.registrar('production', 7, True, response_time_ms=30, command='start', momento=momento)
+
+        assert analytics.vaciar() == 1
+        assert analytics._pendientes == {}
+        funcion, parametros = cliente.llamadas[0]
+        buckets = [0] * (len(BUCKETS_LATENCIA_MS) + 1)
+        buckets[BUCKETS_LATENCIA_MS.index(50)] = 2
+        buckets[BUCKETS_LATENCIA_MS.index(250)] = 1
+        assert funcion == 'acumular_bot_analytics'
+        assert parametros == {
+            'p_fecha': '2024-03-05',
+            'p_hora': 10,
+            'p_bot_tipo': 'production',
+            'p_mensajes': 3,
+            'p_autorizados': 2,
+            'p_no_autorizados': 1,
+            'p_comandos': 1,
+            'p_errores': 0,
+            'p_chat_ids': [3, 7],
+            'p_chat_ids_no_autorizados': [3],
+            'p_latencia_conteo': 3,
+            'p_latencia_suma_ms': 260,
+            'p_latencia_buckets': buckets
+        }
+        # Sin pendientes no hay RPC
+        assert analytics.vaciar() == 0 and len(cliente.llamadas) == 1
+
+
+# =========================================
+# Ejecutar tests
+# =========================================
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
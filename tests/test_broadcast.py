@@ -0,0 +1,145 @@
+"""
+🧪 Tests para las difusiones del bot admin
+Valida la clasificación de resultados por destinatario y el recorrido paginado con avance persistido
+"""
+
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+import sys
+import os
+
+# Agregar el directorio raíz al path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _usuario(chat_id, nombre, *empresas):
+    return {
+        'id': f'u{chat_id}', 'chat_id': chat_id, 'nombre': nombre,
+        'usuarios_empresas': [{'empresa_id': e, 'empresas': {'nombre': e}} for e in empresas]
+    }
+
+
+class TestDifusiones:
+    """Tests para app.services.broadcast_service"""
+
+    # =========================================
+    # TEST 1: Una página con bloqueados y fallidos
+    # =========================================
+    def test_page_personalizes_and_classifies_results(self, monkeypatch):
+        """Cada destinatario recibe su texto y los errores se cuentan por tipo"""
+        from telegram.error import BadRequest, Forbidden, NetworkError
+        from app.services import broadcast_service as modulo
+
+        monkeypatch.setattr(modulo, 'get_supabase_client', lambda: MagicMock())
+        servicio = modulo.BroadcastService(por_segundo=1000, tamano_pagina=10)
+
+        errores = {
+            2: Forbidden("Forbidden: bot was blocked by the user"),
+            3: BadRequest("Chat not found"),
+            4: NetworkError("timeout"),
+        }
+
+        async def send_message(chat_id, text):
+            if chat_id in errores:
+                raise errores[chat_id]
+
+        bot = MagicMock()
+        bot.send_message = AsyncMock(side_effect=send_message)
+        destinatarios = [
+            _usuario(1, 'Ana Pérez', 'Beta', 'Acme'),
+            _usuario(2, 'Luis', 'Acme'),
+            _usuario(3, 'Sofía', 'Acme'),
+            _usuario(4, 'Pedro', 'Acme'),
+        ]
+
+        resultado = asyncio.run(servicio._enviar_pagina(bot, "Hola {nombre}: reporte de {empresa}", destinatarios))
+
+        assert (resultado['enviado'], resultado['bloqueado'], resultado['fallido']) == (1, 2, 1)
+        assert bot.send_message.await_args_list[0].kwargs == {'chat_id': 1, 'text': "Hola Ana: reporte de Acme, Beta"}
+        assert [e['chat_id'] for e in resultado['errores']] == [2, 3, 4]
+
+    # =========================================
+    # TEST 2: Recorrido paginado y avance guardado
+    # =========================================
+    def test_run_pages_audience_and_saves_progress(self, monkeypatch):
+        """La difusión avanza por cursor, guarda el avance por página y termina completada"""
+        from app.services import broadcast_service as modulo
+        from app.bots.bot_manager import bot_manager
+
+        supabase = MagicMock()
+        query = supabase.table.return_value
+        for metodo in ('select', 'insert', 'update', 'eq', 'in_', 'or_', 'order', 'limit'):
+            getattr(query, metodo).return_value = query
+        query.execute.side_effect = [
+            MagicMock(data=[{'id': 'd1'}]),                                 # iniciada_at
+            MagicMock(data=[_usuario(c, 'U', 'Acme') for c in (10, 20, 30)]),  # página 1 (+1 fila)
+            MagicMock(data=[{'id': 'd1'}]),                                 # avance
+            MagicMock(data=[_usuario(30, 'U', 'Acme')]),                    # página 2
+            MagicMock(data=[{'id': 'd1'}]),                                 # avance final
+        ]
+        monkeypatch.setattr(modulo, 'get_supabase_client', lambda: supabase)
+        bot = MagicMock()
+        bot.send_message = AsyncMock()
+        monkeypatch.setattr(bot_manager, 'production_app', MagicMock(bot=bot))
+        monkeypatch.setattr(bot_manager, 'admin_app', None)
+
+        servicio = modulo.BroadcastService(por_segundo=1000, tamano_pagina=2)
+        difusion = {'id': 'd1', 'mensaje': 'Hola', 'empresa_ids': ['Acme'], 'creada_por': None}
+        asyncio.run(servicio._ejecutar(difusion))
+
+        assert [c.kwargs['chat_id'] for c in bot.send_message.await_args_list] == [10, 20, 30]
+        avances = [c.args[0] for c in query.update.call_args_list if 'cursor' in c.args[0]]
+        assert [a['enviados'] for a in avances] == [2, 3]
+        assert avances[0]['lease_hasta'] and avances[-1]['estado'] == 'completada'
+        # La segunda página parte desde el cursor de la primera
+        assert avances[-1]['cursor'] == avances[0]['cursor']
+        assert query.or_.call_count == 1
+        query.eq.assert_any_call('duenio', servicio.duenio)
+
+    # =========================================
+    # TEST 3: Secreto de la API
+    # =========================================
+    def test_api_requires_configured_secret(self, monkeypatch):
+        """Crear y cancelar exigen X-Aca-Difusiones; sin DIFUSION_SECRETO la API no acepta difusiones"""
+        from fastapi import FastAPI
+        from fastapi.testclient import TestClient
+        from app.api import broadcasts as modulo
+        from app.config import Config
+
+        servicio = MagicMock()
+        servicio.crear.return_value = {'id': 'd1'}
+        servicio.obtener.return_value = {'id': 'd1', 'estado': 'en_curso'}
+        servicio.iniciar = AsyncMock()
+        servicio.cancelar.return_value = True
+        monkeypatch.setattr(modulo, 'get_broadcast_service', lambda: servicio)
+        app = FastAPI()
+        app.include_router(modulo.router)
+        cliente = TestClient(app)
+        cuerpo = {'empresa_ids': ['Acme'], 'mensaje': 'Hola'}
+
+        # Sin secreto configurado se rechaza incluso con cabecera
+        monkeypatch.setattr(Config, 'DIFUSION_SECRETO', '')
+        respuesta = cliente.post('/api/broadcasts', json=cuerpo, headers={modulo.CABECERA_SECRETO: ''})
+        assert respuesta.status_code == 403 and 'DIFUSION_SECRETO' in respuesta.json()['detail']
+
+        monkeypatch.setattr(Config, 'DIFUSION_SECRETO', 'secreto')
+        assert cliente.post('/api/broadcasts', json=cuerpo).status_code == 403
+        assert cliente.post('/api/broadcasts', json=cuerpo, headers={modulo.CABECERA_SECRETO: 'otro'}).status_code == 403
+        assert cliente.post('/api/broadcasts/d1/cancel', headers={modulo.CABECERA_SECRETO: 'otro'}).status_code == 403
+        servicio.crear.assert_not_called()
+        servicio.cancelar.assert_not_called()
+
+        respuesta = cliente.post('/api/broadcasts', json=cuerpo, headers={modulo.CABECERA_SECRETO: 'secreto'})
+        assert respuesta.status_code == 200 and respuesta.json()['estado'] == 'en_curso'
+        servicio.iniciar.assert_awaited_once_with('d1')
+        assert cliente.post('/api/broadcasts/d1/cancel', headers={modulo.CABECERA_SECRETO: 'secreto'}).status_code == 200
+        # La lectura del avance sigue abierta
+        assert cliente.get('/api/broadcasts/d1').status_code == 200
+
+
+# =========================================
+# Ejecutar tests
+# =========================================
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
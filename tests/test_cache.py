@@ -0,0 +1,226 @@
+"""
+🧪 Tests para la caché compartida
+Valida la semántica del LRU en memoria y el cliente del protocolo Redis contra un servidor local mínimo
+"""
+
+import time
+import socket
+import threading
+import pytest
+import sys
+import os
+
+# Agregar el directorio raíz al path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.cache_service import CacheLRU, CacheRedis
+
+
+class ServidorRESP:
+    """Servidor mínimo con protocolo Redis: lo justo para GET/SET/DEL/MGET/MSET/EVAL/PUBLISH/SUBSCRIBE"""
+
+    def __init__(self):
+        self.datos = {}
+        self.comandos = []
+        self.conexiones = 0
+        self.suscritos = []
+        self.errores = set()
+        self._lock = threading.Lock()
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind(('127.0.0.1', 0))
+        self.sock.listen()
+        self.puerto = self.sock.getsockname()[1]
+        threading.Thread(target=self._aceptar, daemon=True).start()
+
+    def _aceptar(self):
+        while True:
+            try:
+                cliente, _ = self.sock.accept()
+            except OSError:
+                return
+            self.conexiones += 1
+            threading.Thread(target=self._atender, args=(cliente,), daemon=True).start()
+
+    @staticmethod
+    def _bulk(valor) -> bytes:
+        if valor is None:
+            return b'$-1\r\n'
+        dato = valor.encode('utf-8')
+        return b'$%d\r\n%s\r\n' % (len(dato), dato)
+
+    def _vigente(self, clave):
+        entrada = self.datos.get(clave)
+        if entrada and entrada[1] is not None and entrada[1] <= time.monotonic():
+            del self.datos[clave]
+            return None
+        return entrada[0] if entrada else None
+
+    def _guardar(self, clave, valor, px=None):
+        self.datos[clave] = (valor, time.monotonic() + int(px) / 1000 if px else None)
+
+    def _ejecutar(self, cliente, argumentos) -> bytes:
+        comando = argumentos[0].upper()
+        with self._lock:
+            self.comandos.append(argumentos)
+            if comando in self.errores:
+                return b'-ERR forzado por el test\r\n'
+            if comando == 'GET':
+                return self._bulk(self._vigente(argumentos[1]))
+            if comando == 'SET':
+                self._guardar(argumentos[1], argumentos[2], argumentos[4] if len(argumentos) > 4 else None)
+                return b'+OK\r\n'
+            if comando == 'DEL':
+                return b':%d\r\n' % sum(self.datos.pop(c, None) is not None for c in argumentos[1:])
+            if comando == 'MGET':
+                valores = [self._bulk(self._vigente(c)) for c in argumentos[1:]]
+                return b'*%d\r\n' % len(valores) + b''.join(valores)
+            if comando == 'MSET':
+                for i in range(1, len(argumentos), 2):
+                    self._guardar(argumentos[i], argumentos[i + 1])
+                return b'+OK\r\n'
+            if comando == 'EVAL':
+                # Semántica de SCRIPT_CAS: KEYS[1], ARGV = esperado, nuevo, ttl en ms
+                clave, esperado, nuevo, px = argumentos[3:7]
+                actual = self._vigente(clave)
+                if (esperado == '' and actual is None) or actual == esperado:
+                    self._guardar(clave, nuevo, px if px != '0' else None)
+                    return b':1\r\n'
+                return b':0\r\n'
+            if comando == 'SUBSCRIBE':
+                respuesta = b''
+                for i, canal in enumerate(argumentos[1:], 1):
+                    self.suscritos.append((cliente, canal))
+                    respuesta += b'*3\r\n' + self._bulk('subscribe') + self._bulk(canal) + b':%d\r\n' % i
+                return respuesta
+            if comando == 'PUBLISH':
+                destinos = [c for c, canal in self.suscritos if canal == argumentos[1]]
+                mensaje = b'*3\r\n' + self._bulk('message') + self._bulk(argumentos[1]) + self._bulk(argumentos[2])
+                for destino in destinos:
+                    destino.sendall(mensaje)
+                return b':%d\r\n' % len(destinos)
+            return b'-ERR unknown command\r\n'
+
+    def _atender(self, cliente):
+        lector = cliente.makefile('rb')
+        try:
+            while True:
+                linea = lector.readline()
+                if not linea:
+                    return
+                argumentos = []
+                for _ in range(int(linea[1:-2])):
+                    largo = int(lector.readline()[1:-2])
+                    argumentos.append(lector.read(largo + 2)[:-2].decode('utf-8'))
+                cliente.sendall(self._ejecutar(cliente, argumentos))
+        except OSError:
+            return
+
+    def cerrar(self):
+        self.sock.close()
+
+
+def esperar(condicion, segundos: float = 3.0) -> bool:
+    limite = time.monotonic() + segundos
+    while time.monotonic() < limite:
+        if condicion():
+            return True
+        time.sleep(0.02)
+    return condicion()
+
+
+class TestCache:
+    """Tests para los backends de caché"""
+
+    # =========================================
+    # TEST 1: LRU en memoria
+    # =========================================
+    def test_lru_ttl_eviction_cas_and_pubsub(self):
+        """TTL, desalojo del menos usado, CAS, mget/mset y pub/sub entregando copias"""
+        cache = CacheLRU(max_entradas=3)
+
+        cache.guardar('a', {'n': 1})
+        cache.guardar('efimera', 1, ttl=0.05)
+        valor = cache.obtener('a')
+        valor['n'] = 99  # El lector recibe una copia: la caché no cambia
+        assert cache.obtener('a') == {'n': 1}
+        time.sleep(0.08)
+        assert cache.obtener('efimera') is None
+
+        # 'a' fue usada hace poco: al superar 3 entradas se desaloja 'b'
+        cache.guardar_varios({'b': 2, 'c': 3})
+        cache.obtener('a')
+        cache.guardar('d', 4)
+        assert cache.obtener_varios(['a', 'b', 'c', 'd']) == [{'n': 1}, None, 3, 4]
+        assert cache.estado()['desalojadas'] == 1
+
+        # CAS: None = solo si no existe; luego solo si el valor actual coincide
+        assert cache.comparar_y_guardar('contador', None, 1)
+        assert not cache.comparar_y_guardar('contador', None, 5)
+        assert not cache.comparar_y_guardar('contador', 7, 2)
+        assert cache.comparar_y_guardar('contador', 1, 2)
+        assert cache.obtener('contador') == 2
+        assert cache.borrar('contador', 'inexistente') == 1
+
+        recibidos = []
+        cache.suscribir('permisos', recibidos.append)
+        mensaje = {'chat_id': 123}
+        cache.publicar('permisos', mensaje)
+        recibidos[0]['chat_id'] = 0
+        assert mensaje == {'chat_id': 123}
+        assert recibidos == [{'chat_id': 0}]
+
+    # =========================================
+    # TEST 2: Cliente Redis
+    # =========================================
+    def test_redis_client_wire_format_errors_and_pubsub(self):
+        """Comandos RESP con prefijo y TTL en ms, errores como fallo de caché y conexión reutilizada"""
+        servidor = ServidorRESP()
+        cache = CacheRedis(url=f"redis://127.0.0.1:{servidor.puerto}/0", prefijo="test:", timeout=1.0)
+        try:
+            cache.guardar('sesion:1', {'estado': 'activa'}, ttl=2.5)
+            assert servidor.comandos[-1] == ['SET', 'test:sesion:1', '{"estado":"activa"}', 'PX', '2500']
+            assert cache.obtener('sesion:1') == {'estado': 'activa'}
+            assert cache.obtener('sesion:2') is None
+
+            cache.guardar_varios({'x': 1, 'y': [1, 2]})
+            assert cache.obtener_varios(['x', 'y', 'z']) == [1, [1, 2], None]
+            cache.guardar_varios({'t1': 1, 't2': 2}, ttl=1)
+            assert servidor.comandos[-1] == ['SET', 'test:t2', '2', 'PX', '1000']
+
+            assert cache.comparar_y_guardar('cas', None, 'v1')
+            assert not cache.comparar_y_guardar('cas', 'otro', 'v2')
+            assert cache.comparar_y_guardar('cas', 'v1', 'v2', ttl=1)
+            assert cache.obtener('cas') == 'v2'
+            assert cache.borrar('cas', 'x') == 2
+
+            # -ERR del servidor: se trata como fallo de caché y la conexión sigue en el pool
+            servidor.errores = {'GET', 'EVAL'}
+            assert cache.obtener('sesion:1') is None
+            assert not cache.comparar_y_guardar('cas', None, 'v3')
+            servidor.errores = set()
+            assert cache.obtener('sesion:1') == {'estado': 'activa'}
+            assert servidor.conexiones == 1
+
+            recibidos = []
+            cache.suscribir('permisos', recibidos.append)
+            assert esperar(lambda: any(canal == 'test:permisos' for _, canal in servidor.suscritos))
+            cache.publicar('permisos', {'chat_id': 42})
+            assert esperar(lambda: recibidos == [{'chat_id': 42}])
+
+            # Cerrar no se queda esperando al hilo bloqueado en la lectura de la suscripción
+            cierre = threading.Thread(target=cache.cerrar, daemon=True)
+            cierre.start()
+            cierre.join(timeout=5.0)
+            assert not cierre.is_alive()
+            assert not cache._hilo_suscripcion.is_alive()
+        finally:
+            cache._cerrado = True
+            servidor.cerrar()
+
+
+# =========================================
+# Ejecutar tests
+# =========================================
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
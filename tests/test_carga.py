@@ -0,0 +1,138 @@
+"""
+🧪 Tests para el control de carga
+Valida la activación y recuperación de los modos degradados y las respuestas reducidas bajo sobrecarga
+"""
+
+import time
+import asyncio
+import pytest
+import sys
+import os
+from types import SimpleNamespace
+from collections import deque
+
+# Agregar el directorio raíz al path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app.services.load_service as load_service
+from app.services.load_service import (
+    ControladorCarga, ColaUpdates, Senal, MODO_INTENCION, MODO_ASESOR, MODO_REGISTRO
+)
+
+
+def controlador_rapido(**kwargs) -> ControladorCarga:
+    """Controlador con señales que decaen en milisegundos para probar la recuperación"""
+    controlador = ControladorCarga(habilitado=True, max_en_curso=5, espera_max_ms=500, openai_max_ms=2000,
+                                   supabase_max_ms=300, recuperacion_segundos=0.1, **kwargs)
+    controlador.espera = Senal(vida_media=0.05, alfa=1.0)
+    controlador.latencias = {'openai': Senal(vida_media=0.05, alfa=1.0), 'supabase': Senal(vida_media=0.05, alfa=1.0)}
+    return controlador
+
+
+class TestCarga:
+    """Tests para ControladorCarga, ColaUpdates y los modos degradados"""
+
+    # =========================================
+    # TEST 1: Señales y modos
+    # =========================================
+    def test_signals_switch_modes_and_recover(self):
+        """Cola con espera alta degrada todo; OpenAI lento solo IA; Supabase lento solo el registro"""
+        controlador = controlador_rapido()
+        assert not any(controlador.degradado(m) for m in (MODO_INTENCION, MODO_ASESOR, MODO_REGISTRO))
+
+        async def escenario():
+            cola = ColaUpdates('production', controlador=controlador)
+            for i in range(8):
+                await cola.put(i)
+            # 8 updates esperando > max_en_curso: saturado
+            assert controlador.en_curso() == 8
+            assert controlador.degradado(MODO_REGISTRO)
+            await asyncio.sleep(0.6)
+            assert await cola.get() == 0
+            # La espera medida en la cola también es señal de saturación
+            assert controlador.espera.valor() > 500
+
+        asyncio.run(escenario())
+        assert controlador.degradado(MODO_INTENCION)
+        assert controlador.estado()['modos'] == [MODO_INTENCION, MODO_ASESOR, MODO_REGISTRO]
+
+        # Las señales decaen solas y, pasada la recuperación, se vuelve al modo normal
+        controlador._colas.clear()
+        time.sleep(0.35)
+        assert not controlador.degradado(MODO_ASESOR)
+
+        controlador.observar_dependencia('openai', 9000)
+        assert controlador.degradado(MODO_INTENCION) and controlador.degradado(MODO_ASESOR)
+        assert not controlador.degradado(MODO_REGISTRO)
+        time.sleep(0.35)
+
+        controlador.observar_dependencia('supabase', 2000)
+        assert controlador.degradado(MODO_REGISTRO) and not controlador.degradado(MODO_INTENCION)
+
+        # Deshabilitado nunca degrada
+        assert not ControladorCarga(habilitado=False, max_en_curso=0).degradado(MODO_REGISTRO)
+
+    # =========================================
+    # TEST 2: Respuestas degradadas
+    # =========================================
+    def test_degraded_intent_rules_and_deferred_logging(self, monkeypatch):
+        """Intención por reglas sin OpenAI y conversaciones diferidas que se escriben al recuperarse"""
+        from app.services.ai_service import AIService
+        from app.services.conversation_logger import ConversationLogger
+
+        controlador = controlador_rapido()
+        monkeypatch.setattr(load_service, '_controlador_carga', controlador)
+        controlador.observar_dependencia('openai', 9000)
+        controlador.observar_dependencia('supabase', 2000)
+
+        servicio = AIService.__new__(AIService)
+        servicio.client = None  # Si se llamara a OpenAI, el resultado sería confianza 0
+        empresas = [{'id': 'e1', 'nombre': 'Orbit'}, {'id': 'e2', 'nombre': 'Nova'}]
+        intent = asyncio.run(servicio.extract_file_intent('necesito el F29 de marzo 2024 de Nova', empresas))
+        assert intent['categoria'] == 'financiero' and intent['subtipo'] == 'f29'
+        assert intent['periodo'] == '2024-03' and intent['empresa'] == 'Nova'
+        assert intent['confianza'] >= 0.75
+        incompleto = servicio.extract_file_intent_reglas('quiero un documento legal', empresas)
+        assert incompleto['categoria'] == 'legal' and not incompleto['subtipo'] and incompleto['confianza'] < 0.75
+
+        escritos = []
+
+        class ClienteFalso:
+            def rpc(self, funcion, parametros):
+                escritos.append(parametros['p_mensaje'])
+                return SimpleNamespace(execute=lambda: SimpleNamespace(data=[len(escritos)]))
+
+        registro = ConversationLogger.__new__(ConversationLogger)
+        registro.supabase = ClienteFalso()
+        registro._diferidos = deque(maxlen=2)
+        registro.descartados = 0
+        registro._tarea_diferidos = None
+
+        def update(texto):
+            usuario = SimpleNamespace(id=1, first_name='Ana', last_name=None, username='ana', language_code='es',
+                                      is_bot=False, is_premium=False)
+            mensaje = SimpleNamespace(message_id=1, text=texto, caption=None, date=None)
+            return SimpleNamespace(effective_user=usuario, effective_message=mensaje,
+                                   effective_chat=SimpleNamespace(id=555, type='private'))
+
+        async def escenario():
+            for texto in ('uno', 'dos', 'tres'):
+                assert await registro.log_message(update(texto), 'ok', has_access=True) is None
+            # Se conservan los más recientes hasta el máximo
+            assert registro.pendientes() == 2 and registro.descartados == 1
+            assert escritos == []
+
+            await asyncio.sleep(0.35)
+            await registro.log_message(update('cuatro'), 'ok', has_access=True)
+            await registro._tarea_diferidos
+
+        asyncio.run(escenario())
+        assert sorted(escritos) == ['cuatro', 'dos', 'tres']
+        assert registro.pendientes() == 0
+
+
+# =========================================
+# Ejecutar tests
+# =========================================
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,87 @@
+"""
+🧪 Tests para el catálogo de documentos por empresa
+Valida el índice de períodos, la búsqueda en memoria y las altas/bajas
+"""
+
+import pytest
+from unittest.mock import MagicMock
+import sys
+import os
+
+# Agregar el directorio raíz al path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _archivo(id_, categoria, subtipo, periodo, created_at, empresa_id='e1'):
+    return {'id': id_, 'empresa_id': empresa_id, 'nombre_original': f'{id_}.pdf', 'categoria': categoria,
+            'subtipo': subtipo, 'periodo': periodo, 'url_archivo': f'https://x/{id_}', 'created_at': created_at}
+
+
+def _supabase_con_archivos(filas):
+    supabase = MagicMock()
+    query = supabase.table.return_value
+    for metodo in ('select', 'eq', 'order', 'limit', 'or_'):
+        getattr(query, metodo).return_value = query
+    query.execute.return_value = MagicMock(data=filas)
+    return supabase
+
+
+class TestCatalogo:
+    """Tests para app.services.catalog_service"""
+
+    # =========================================
+    # TEST 1: Períodos disponibles y búsqueda en memoria
+    # =========================================
+    def test_periods_and_search_from_memory(self, monkeypatch):
+        """Solo se ofrecen períodos con archivos y la búsqueda no vuelve a consultar la BD"""
+        from app.services import catalog_service as modulo
+
+        supabase = _supabase_con_archivos([
+            _archivo('a3', 'financiero', 'f29', '2025-03', '2025-04-02T10:00:00+00:00'),
+            _archivo('a2', 'financiero', 'f29', '2025-03', '2025-04-01T10:00:00+00:00'),
+            _archivo('a1', 'financiero', 'f29', '2025-01', '2025-02-01T10:00:00+00:00'),
+            _archivo('l1', 'legal', 'estatutos_empresa', None, '2025-01-01T10:00:00+00:00'),
+        ])
+        monkeypatch.setattr(modulo, 'get_supabase_client', lambda: supabase)
+        servicio = modulo.CatalogService(ttl_segundos=300)
+
+        assert servicio.periodos_disponibles(['e1'], 'financiero', 'f29') == ['2025-03', '2025-01']
+        assert servicio.periodos_disponibles(['e1'], 'legal', 'estatutos_empresa') == []
+        assert [a['id'] for a in servicio.buscar('e1', 'financiero', 'f29', '2025-03')] == ['a3', 'a2']
+        assert servicio.buscar('e1', 'financiero', 'f29', '2024-12') == []
+        assert [a['id'] for a in servicio.buscar('e1', 'legal')] == ['l1']
+        # Una sola carga (una página) para todas las consultas
+        assert supabase.table.return_value.execute.call_count == 1
+
+    # =========================================
+    # TEST 2: Subidas, bajas y catálogo no disponible
+    # =========================================
+    def test_upload_delete_and_unavailable(self, monkeypatch):
+        """Las altas y bajas se reflejan sin recargar; si la BD falla se devuelve None"""
+        from app.services import catalog_service as modulo
+
+        supabase = _supabase_con_archivos([_archivo('a1', 'financiero', 'f29', '2025-01', '2025-02-01T10:00:00+00:00')])
+        monkeypatch.setattr(modulo, 'get_supabase_client', lambda: supabase)
+        servicio = modulo.CatalogService(ttl_segundos=300)
+        servicio.get_catalogo('e1')
+
+        nuevo = _archivo('a2', 'financiero', 'f29', '2025-02', '2025-03-01T10:00:00+00:00')
+        nuevo['storage_path'] = 'uploads/1/a2.pdf'
+        servicio.registrar_subida(nuevo)
+        assert servicio.periodos_disponibles(['e1'], 'financiero', 'f29') == ['2025-02', '2025-01']
+        assert 'storage_path' not in servicio.buscar('e1', periodo='2025-02')[0]
+
+        servicio.registrar_baja('e1', 'a1')
+        assert servicio.periodos_disponibles(['e1'], 'financiero', 'f29') == ['2025-02']
+        assert supabase.table.return_value.execute.call_count == 1
+
+        supabase.table.return_value.execute.side_effect = RuntimeError('sin conexión')
+        assert servicio.buscar('e2', 'financiero') is None
+        assert servicio.periodos_disponibles(['e1', 'e2']) is None
+
+
+# =========================================
+# Ejecutar tests
+# =========================================
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,113 @@
+"""
+🧪 Tests para la coalescencia de llamadas (single-flight)
+Valida que llamadas idénticas concurrentes compartan una ejecución, en corrutinas y en hilos
+"""
+
+import time
+import asyncio
+import threading
+import pytest
+import sys
+import os
+
+# Agregar el directorio raíz al path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.coalescencia import coalescer, get_coalescedor, LLAMADAS_COALESCIDAS
+
+
+class TestCoalescencia:
+    """Tests para Coalescedor y el decorador coalescer"""
+
+    # =========================================
+    # TEST 1: Corrutinas
+    # =========================================
+    def test_async_identical_calls_share_one_execution(self):
+        """Diez consultas rápidas idénticas hacen una sola llamada; otra pregunta va aparte"""
+        ejecuciones = []
+
+        class Servicio:
+            @coalescer('prueba_async')
+            async def responder(self, pregunta: str, historial=None):
+                ejecuciones.append(pregunta)
+                await asyncio.sleep(0.05)
+                if pregunta == 'falla':
+                    raise RuntimeError('sin respuesta')
+                return {'respuesta': f"R: {pregunta}"}
+
+        antes = LLAMADAS_COALESCIDAS.valor(operacion='prueba_async', resultado='coalescida')
+
+        async def escenario():
+            servicio, otro = Servicio(), Servicio()
+            # Posicional, por nombre y con el valor por defecto explícito: misma clave
+            llamadas = [servicio.responder('ventas') for _ in range(7)]
+            llamadas += [otro.responder(pregunta='ventas'), servicio.responder('ventas', None)]
+            llamadas.append(servicio.responder('caja'))
+            resultados = await asyncio.gather(*llamadas)
+
+            # Cada llamador recibe su propia copia
+            resultados[0]['respuesta'] = 'modificada'
+            assert all(r == {'respuesta': 'R: ventas'} for r in resultados[1:9])
+            assert resultados[9] == {'respuesta': 'R: caja'}
+
+            # Las excepciones llegan a todos los que esperaban
+            fallidas = await asyncio.gather(*[servicio.responder('falla') for _ in range(3)],
+                                            return_exceptions=True)
+            assert all(isinstance(e, RuntimeError) for e in fallidas)
+
+            # No es una caché: terminada la ejecución, la siguiente vuelve a llamar
+            await servicio.responder('ventas')
+
+        asyncio.run(escenario())
+        assert ejecuciones == ['ventas', 'caja', 'falla', 'ventas']
+        assert LLAMADAS_COALESCIDAS.valor(operacion='prueba_async', resultado='coalescida') - antes == 10
+        assert get_coalescedor().en_vuelo() == 0
+
+    # =========================================
+    # TEST 2: Hilos
+    # =========================================
+    def test_threaded_calls_share_one_query_and_survive_cancelled_leader(self):
+        """Consultas síncronas desde varios hilos comparten la query; cancelar al líder async no corta a los demás"""
+        ejecuciones = []
+        bloqueo = threading.Event()
+
+        @coalescer('prueba_sync', metodo=False)
+        def reportes(empresa_id, anio=None):
+            ejecuciones.append(empresa_id)
+            bloqueo.wait(2.0)
+            return [{'empresa_id': empresa_id, 'anio': anio}]
+
+        resultados = []
+        hilos = [threading.Thread(target=lambda: resultados.append(reportes('e1', anio=2024))) for _ in range(5)]
+        for hilo in hilos:
+            hilo.start()
+        time.sleep(0.1)
+        bloqueo.set()
+        for hilo in hilos:
+            hilo.join(timeout=3.0)
+
+        assert ejecuciones == ['e1']
+        assert resultados == [[{'empresa_id': 'e1', 'anio': 2024}]] * 5
+        assert len({id(r) for r in resultados}) == 5
+
+        @coalescer('prueba_cancelada', metodo=False)
+        async def lenta(x):
+            await asyncio.sleep(0.05)
+            return x * 2
+
+        async def escenario():
+            lider = asyncio.ensure_future(lenta(21))
+            await asyncio.sleep(0)
+            seguidor = asyncio.ensure_future(lenta(21))
+            await asyncio.sleep(0)
+            lider.cancel()
+            assert await seguidor == 42
+
+        asyncio.run(escenario())
+
+
+# =========================================
+# Ejecutar tests
+# =========================================
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,130 @@
+"""
+🧪 Tests para la coordinación entre réplicas
+Valida el reparto de chats por hash consistente y el relevo del líder cuando su lease vence
+"""
+
+import time
+import asyncio
+import pytest
+import sys
+import os
+from collections import Counter
+
+# Agregar el directorio raíz al path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.hash_consistente import AnilloHash
+from types import SimpleNamespace
+from app.config import Config
+from app.services.coordination_service import BackendMemoria, ReplicaCoordinator
+
+
+def coordinador(backend, nombre: str, lease: float = 0.3) -> ReplicaCoordinator:
+    replica = ReplicaCoordinator(backend=backend, replica=nombre, url=f"http://{nombre}:8000",
+                                 latido_segundos=0.1, lease_segundos=lease)
+    replica.bots = ("production",)
+    return replica
+
+
+class TestCoordinacion:
+    """Tests para el liderazgo y el reparto entre réplicas"""
+
+    # =========================================
+    # TEST 1: Hash consistente
+    # =========================================
+    def test_ring_balances_chats_and_moves_only_new_share(self):
+        """Cada réplica recibe ~1/N de los chats y al sumar una solo se mueven los que pasan a la nueva"""
+        chats = range(100000, 120000)
+        tres = AnilloHash(["replica-a", "replica-b", "replica-c"])
+        # El dueño no depende del orden en que se agregaron los nodos
+        assert all(tres.nodo(c) == AnilloHash(["replica-c", "replica-a", "replica-b"]).nodo(c)
+                   for c in range(100000, 100200))
+
+        antes = {c: tres.nodo(c) for c in chats}
+        reparto = Counter(antes.values())
+        assert all(0.2 < n / len(chats) < 0.47 for n in reparto.values())
+
+        tres.agregar("replica-d")
+        movidos = [c for c in chats if tres.nodo(c) != antes[c]]
+        assert {tres.nodo(c) for c in movidos} == {"replica-d"}
+        assert 0.15 < len(movidos) / len(chats) < 0.35
+
+    # =========================================
+    # TEST 2: Relevo del líder
+    # =========================================
+    def test_follower_takes_polling_when_leader_lease_expires(self):
+        """Un solo líder a la vez; si deja de renovar, otra réplica toma el polling con una época mayor"""
+        backend = BackendMemoria()
+        a = coordinador(backend, "replica-a")
+        b = coordinador(backend, "replica-b")
+
+        assert a.revisar() == {"production": True}
+        assert b.revisar() == {}
+        a.revisar()
+        assert a.es_lider("production") and not b.es_lider("production")
+        epoca = a._epocas["production"]
+
+        # Ambas ven las mismas réplicas: cada chat tiene el mismo dueño en las dos
+        duenios = {a.duenio("production", c) for c in range(1000)}
+        assert duenios == {"replica-a", "replica-b"}
+        assert all(a.duenio("production", c) == b.duenio("production", c) for c in range(1000))
+
+        # replica-a deja de latir (cae); tras el lease replica-b es líder y dueña de todos los chats
+        time.sleep(0.35)
+        assert b.revisar() == {"production": True}
+        assert b._epocas["production"] == epoca + 1
+        assert {b.duenio("production", c) for c in range(1000)} == {"replica-b"}
+
+        # Si replica-a vuelve, se entera de que perdió el liderazgo y deja de hacer polling
+        assert a.revisar() == {"production": False}
+        assert b.revisar() == {} and b.es_lider("production")
+
+    # =========================================
+    # TEST 3: Reenvío en segundo plano
+    # =========================================
+    def test_forward_runs_in_background_and_falls_back_locally(self, monkeypatch):
+        """El handler no espera al dueño; si no responde, el update vuelve a la cola local; sin secreto no se reenvía"""
+        backend = BackendMemoria()
+        a = coordinador(backend, "replica-a")
+        b = coordinador(backend, "replica-b")
+        a.revisar(), b.revisar(), a.revisar()
+        chat_id = next(c for c in range(1000) if a.duenio("production", c) == "replica-b")
+        update = SimpleNamespace(update_id=7, effective_chat=SimpleNamespace(id=chat_id),
+                                 to_dict=lambda: {'update_id': 7})
+
+        reenviados, devueltos = [], []
+
+        async def reenviar_lento(url, bot, datos):
+            reenviados.append(url)
+            await asyncio.sleep(0.05)
+            return False
+
+        async def devolver(u):
+            devueltos.append(u.update_id)
+
+        monkeypatch.setattr(a, '_reenviar', reenviar_lento)
+
+        async def escenario():
+            # Sin secreto el dueño rechazaría el reenvío: se procesa aquí sin intentarlo
+            monkeypatch.setattr(Config, 'COORDINACION_SECRETO', '')
+            assert not await a.repartir("production", update, al_fallar=devolver)
+
+            monkeypatch.setattr(Config, 'COORDINACION_SECRETO', 'secreto')
+            inicio = time.monotonic()
+            assert await a.repartir("production", update, al_fallar=devolver)
+            assert time.monotonic() - inicio < 0.03 and devueltos == []
+            await asyncio.gather(*a._reenvios)
+
+            # De vuelta en la cola local, el update no se reparte otra vez
+            assert devueltos == [7]
+            assert not await a.repartir("production", update, al_fallar=devolver)
+
+        asyncio.run(escenario())
+        assert reenviados == ["http://replica-b:8000"]
+
+
+# =========================================
+# Ejecutar tests
+# =========================================
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,74 @@
+"""
+🧪 Tests para el índice local de documentos del Asesor IA
+Valida la división en pasajes, la consulta FTS y la búsqueda por empresa
+"""
+
+import pytest
+from unittest.mock import MagicMock
+import sys
+import os
+
+# Agregar el directorio raíz al path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class TestDocumentIndex:
+    """Tests para app.utils.pdf_text y app.services.document_index_service"""
+
+    # =========================================
+    # TEST 1: Pasajes por página y consulta FTS
+    # =========================================
+    def test_passages_and_query(self):
+        """Los párrafos se agrupan sin pasar el máximo y la pregunta se vuelve una consulta OR"""
+        from app.utils.pdf_text import dividir_en_pasajes
+        from app.services.document_index_service import consulta_fts
+
+        paginas = ["Estado de resultados\n\nIngresos  1.000\n\n" + "Detalle " * 40, "", "Balance general"]
+        pasajes = dividir_en_pasajes(paginas, max_caracteres=100)
+
+        assert pasajes[0] == (1, "Estado de resultados\nIngresos 1.000")
+        assert all(len(texto) <= 200 for _, texto in pasajes)
+        assert pasajes[-1] == (3, "Balance general")
+        assert not any(pagina == 2 for pagina, _ in pasajes)
+
+        assert consulta_fts("¿Cuánto fueron los ingresos de marzo?") == '"ingreso"* OR "marzo"*'
+        assert consulta_fts("¿y eso?") is None
+
+    # =========================================
+    # TEST 2: Indexar, buscar y quitar
+    # =========================================
+    def test_index_search_and_remove(self, monkeypatch, tmp_path):
+        """Los pasajes se buscan por empresa con bm25 y el índice se respalda en Storage"""
+        from app.services import document_index_service as modulo
+
+        supabase = MagicMock()
+        supabase.client.storage.from_.return_value.download.side_effect = RuntimeError('not found')
+        monkeypatch.setattr(modulo, 'get_supabase_client', lambda: supabase)
+        servicio = modulo.DocumentIndexService(directorio=str(tmp_path))
+        bucket = supabase.client.storage.from_.return_value
+
+        archivo = {'id': 'a1', 'nombre_original': 'eerr_marzo.pdf', 'periodo': '2025-03', 'subtipo': 'eerr'}
+        servicio.guardar_pasajes('e1', archivo, [
+            (1, "Estado de resultados marzo 2025. Ingresos por ventas 12.500.000"),
+            (2, "Gastos de administración y remuneraciones del período"),
+        ], sha256='x')
+
+        pasajes = servicio.buscar('e1', '¿Cuáles fueron los ingresos por ventas?')
+        assert pasajes[0]['archivo_id'] == 'a1' and pasajes[0]['pagina'] == 1
+        assert pasajes[0]['nombre'] == 'eerr_marzo.pdf'
+        assert servicio.buscar('e2', 'ingresos') == []
+        assert servicio._ya_indexado('e1', 'a1', 'x')
+        assert 'Gastos de administración' in servicio.texto_archivo('e1', 'a1')
+
+        assert bucket.upload.call_args[0][0].endswith('/e1.sqlite3')
+
+        servicio.quitar_archivo('e1', 'a1')
+        assert servicio.buscar('e1', 'ingresos') == []
+        assert servicio.estado('e1')['documentos'] == 0
+
+
+# =========================================
+# Ejecutar tests
+# =========================================
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,83 @@
+"""
+🧪 Tests para las cifras financieras del Asesor IA
+Valida la extracción desde tablas de documentos y las agregaciones de series mensuales
+"""
+
+import pytest
+from unittest.mock import MagicMock
+import sys
+import os
+
+# Agregar el directorio raíz al path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class TestMetricasFinancieras:
+    """Tests para app.utils.financial_tables, app.utils.financial_series y el servicio"""
+
+    # =========================================
+    # TEST 1: Extracción de cifras de tablas
+    # =========================================
+    def test_extract_figures_from_tables(self):
+        """Formato chileno, negativos entre paréntesis, códigos F29 y montos en M$"""
+        from app.utils.financial_tables import extraer_cifras
+
+        estado = extraer_cifras([
+            "ESTADO DE RESULTADOS (en M$)\nIngresos de explotación   1.250.300   1.100.000",
+            "Costo de ventas (800.000) (700.000)\nTotal pasivos y patrimonio 9.999\nUtilidad neta: -12.345,5",
+        ])
+        assert estado['ventas'] == (1_250_300_000.0, 'Ingresos de explotación')
+        assert estado['costo_ventas'][0] == -800_000_000.0
+        assert estado['utilidad_neta'][0] == -12_345_500.0
+        assert 'total_pasivos' not in estado and 'patrimonio' not in estado
+
+        f29 = extraer_cifras(["538 TOTAL DÉBITOS 1.234.567\n[062] PPM neto determinado 45.000\nAl 31 de diciembre"])
+        assert f29 == {'iva_debito': (1_234_567.0, 'TOTAL DÉBITOS'), 'ppm': (45_000.0, 'PPM neto determinado')}
+
+    # =========================================
+    # TEST 2: Series, agregaciones y resumen por empresa
+    # =========================================
+    def test_series_aggregations_and_summary(self, monkeypatch):
+        """Variación anual, acumulado y tendencia desde una sola lectura por empresa"""
+        from app.services import financial_metrics_service as modulo
+
+        filas = [{'periodo': p, 'cuenta': 'ventas', 'monto': m} for p, m in [
+            ('2024-01', 100), ('2024-02', 110), ('2024-03', 120),
+            ('2025-01', 150), ('2025-02', 160), ('2025-03', 200),
+        ]]
+        supabase = MagicMock()
+        query = supabase.table.return_value
+        for metodo in ('select', 'eq', 'order', 'limit'):
+            getattr(query, metodo).return_value = query
+        query.execute.return_value = MagicMock(data=filas)
+        monkeypatch.setattr(modulo, 'get_supabase_client', lambda: supabase)
+        servicio = modulo.FinancialMetricsService(ttl_segundos=300)
+
+        assert modulo.cuentas_en_pregunta("¿Cómo evolucionaron las ventas este año?") == ['ventas']
+        assert modulo.cuentas_en_pregunta("Explícame el informe de ventas") == []
+
+        resumen = servicio.resumen('e1', ['ventas', 'ebitda'])
+        ventas = resumen['ventas']
+        assert list(resumen) == ['ventas']
+        assert ventas['ultimo_periodo'] == '2025-03'
+        assert ventas['variacion_anual']['anterior'] == 120.0
+        assert round(ventas['variacion_anual']['variacion_pct'], 1) == 66.7
+        assert (ventas['acumulado']['acumulado'], ventas['acumulado']['anterior']) == (510.0, 330.0)
+        assert ventas['tendencia']['pendiente_mensual'] == pytest.approx(25.0)
+        assert ventas['ultimos_meses'] == [('2025-01', 150.0), ('2025-02', 160.0), ('2025-03', 200.0)]
+
+        servicio.resumen('e1', ['ventas'])
+        assert query.execute.call_count == 1
+
+        # Sin numpy se obtienen las mismas cifras
+        from app.utils import financial_series
+        monkeypatch.setattr(financial_series, 'np', None)
+        servicio.invalidar('e1')
+        assert servicio.resumen('e1', ['ventas'])['ventas']['acumulado']['acumulado'] == 510.0
+
+
+# =========================================
+# Ejecutar tests
+# =========================================
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,89 @@
+"""
+🧪 Tests para las métricas Prometheus
+Valida el formato de exposición y la instrumentación de OpenAI
+"""
+
+import pytest
+import asyncio
+import sys
+import os
+
+# Agregar el directorio raíz al path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class TestMetricas:
+    """Tests para RegistroMetricas e instrumentar_openai"""
+
+    # =========================================
+    # TEST 1: Formato de contadores e histogramas
+    # =========================================
+    def test_exposition_format(self):
+        """Contadores con etiquetas y buckets acumulados con +Inf, _sum y _count"""
+        from app.utils.metrics import RegistroMetricas
+
+        registro = RegistroMetricas()
+        contador = registro.contador('prueba_total', 'Contador de prueba', ('bot',))
+        histograma = registro.histograma('prueba_ms', 'Latencia de prueba', (), buckets=(10, 100))
+
+        contador.inc(bot='production')
+        contador.inc(2, bot='production')
+        histograma.observar(5)
+        histograma.observar(50)
+        histograma.observar(500)
+
+        texto = registro.exponer()
+        assert '# TYPE prueba_total counter' in texto
+        assert 'prueba_total{bot="production"} 3' in texto
+        assert 'prueba_ms_bucket{le="10"} 1' in texto
+        assert 'prueba_ms_bucket{le="100"} 2' in texto
+        assert 'prueba_ms_bucket{le="+Inf"} 3' in texto
+        assert 'prueba_ms_sum 555' in texto
+        assert 'prueba_ms_count 3' in texto
+
+    # =========================================
+    # TEST 2: Un colector que falla no rompe la exposición
+    # =========================================
+    def test_failing_collector_does_not_break_exposition(self):
+        """El error del colector queda como comentario y el resto se expone"""
+        from app.utils.metrics import RegistroMetricas
+
+        registro = RegistroMetricas()
+        registro.medidor('prueba_gauge', 'Medidor de prueba').set(7)
+
+        def colector_roto():
+            raise RuntimeError("sin conexión")
+
+        registro.agregar_colector(colector_roto)
+        texto = registro.exponer()
+        assert 'prueba_gauge 7' in texto
+        assert '# colector colector_roto falló' in texto
+
+    # =========================================
+    # TEST 3: Llamadas a OpenAI medidas por ruta del recurso
+    # =========================================
+    def test_openai_calls_labeled_by_resource_path(self):
+        """chat.completions.create se mide con su ruta como operación"""
+        from openai import AsyncOpenAI
+        from app.services.metrics_service import instrumentar_openai, LATENCIA_OPENAI
+
+        async def create(**kwargs):
+            return 'respuesta'
+
+        cliente = AsyncOpenAI(api_key='sk-prueba')
+        cliente.chat.completions.create = create
+        instrumentado = instrumentar_openai(cliente)
+
+        antes = LATENCIA_OPENAI.histograma(operacion='chat.completions.create')
+        total_antes = antes.total if antes else 0
+
+        assert asyncio.run(instrumentado.chat.completions.create(model='x')) == 'respuesta'
+        assert LATENCIA_OPENAI.histograma(operacion='chat.completions.create').total == total_antes + 1
+        assert instrumentar_openai(instrumentado) is instrumentado
+
+
+# =========================================
+# Ejecutar tests
+# =========================================
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,74 @@
+"""
+🧪 Tests para la paginación por cursor
+Valida codificación de cursores, filtro keyset y recorte de páginas
+"""
+
+import pytest
+from unittest.mock import MagicMock
+import sys
+import os
+
+# Agregar el directorio raíz al path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class TestPaginacion:
+    """Tests para app.utils.pagination"""
+
+    # =========================================
+    # TEST 1: Cursor ida y vuelta
+    # =========================================
+    def test_cursor_roundtrip(self):
+        """El cursor conserva (created_at, id) y rechaza basura"""
+        from app.utils.pagination import codificar_cursor, decodificar_cursor, CursorInvalido
+
+        fila = {'created_at': '2025-10-01T12:00:00.123+00:00', 'id': 'abc'}
+        assert decodificar_cursor(codificar_cursor(fila)) == ('2025-10-01T12:00:00.123+00:00', 'abc')
+
+        with pytest.raises(CursorInvalido):
+            decodificar_cursor('no-es-un-cursor')
+
+    # =========================================
+    # TEST 2: Filtro keyset descendente
+    # =========================================
+    def test_keyset_filter_and_order(self):
+        """Con cursor se filtra (orden, id) < cursor y se ordena por ambas columnas"""
+        from app.utils.pagination import aplicar_keyset, codificar_cursor
+
+        query = MagicMock()
+        query.or_.return_value = query
+        query.order.return_value = query
+
+        cursor = codificar_cursor({'created_at': '2025-10-01T12:00:00+00:00', 'id': 'abc'})
+        aplicar_keyset(query, cursor)
+
+        filtro = query.or_.call_args[0][0]
+        assert filtro == (
+            'created_at.lt."2025-10-01T12:00:00+00:00",'
+            'and(created_at.eq."2025-10-01T12:00:00+00:00",id.lt."abc")'
+        )
+        assert query.order.call_args_list[0][0] == ('created_at',)
+        assert query.order.call_args_list[1][0] == ('id',)
+
+    # =========================================
+    # TEST 3: Página con y sin siguiente
+    # =========================================
+    def test_page_trims_extra_row(self):
+        """Con limit + 1 filas hay cursor siguiente; con menos no"""
+        from app.utils.pagination import pagina, decodificar_cursor
+
+        filas = [{'created_at': f't{i}', 'id': i} for i in range(4)]
+        recortadas, siguiente = pagina(filas, 3)
+        assert len(recortadas) == 3
+        assert decodificar_cursor(siguiente) == ('t2', 2)
+
+        recortadas, siguiente = pagina(filas[:2], 3)
+        assert len(recortadas) == 2
+        assert siguiente is None
+
+
+# =========================================
+# Ejecutar tests
+# =========================================
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
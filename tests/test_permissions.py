@@ -0,0 +1,120 @@
+"""
+🧪 Tests para los permisos por usuario
+Valida que las verificaciones de rol salgan de un snapshot en memoria y que un cambio de versión lo invalide
+"""
+
+import pytest
+from types import SimpleNamespace
+import sys
+import os
+
+# Agregar el directorio raíz al path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class _Consulta:
+    """Consulta PostgREST mínima: registra la tabla y devuelve filas fijas"""
+
+    def __init__(self, bd, tabla):
+        self.bd = bd
+        self.tabla = tabla
+
+    def select(self, *args, **kwargs):
+        return self
+
+    def eq(self, *args):
+        return self
+
+    def limit(self, *args):
+        return self
+
+    def execute(self):
+        self.bd.consultas.append(self.tabla)
+        return SimpleNamespace(data=self.bd.filas[self.tabla])
+
+
+class _BD:
+    def __init__(self, filas):
+        self.filas = filas
+        self.consultas = []
+
+    def table(self, tabla):
+        return _Consulta(self, tabla)
+
+
+def _usuario(rol_empresa_a='gestor', rol='user'):
+    return [{
+        'id': 'u-1', 'chat_id': 4242, 'nombre': 'Ana', 'rol': rol, 'empresa_id': None,
+        'usuarios_empresas': [
+            {'empresa_id': 'e-a', 'rol': rol_empresa_a, 'activo': True,
+             'empresas': {'id': 'e-a', 'nombre': 'Alfa', 'rut': '1-9', 'activo': True}},
+            {'empresa_id': 'e-b', 'rol': 'user', 'activo': True,
+             'empresas': {'id': 'e-b', 'nombre': 'Beta', 'rut': '2-7', 'activo': True}},
+            {'empresa_id': 'e-c', 'rol': 'gestor', 'activo': True,
+             'empresas': {'id': 'e-c', 'nombre': 'Inactiva', 'rut': '3-5', 'activo': False}},
+        ]
+    }]
+
+
+def _instalar(monkeypatch, bd):
+    from app.security import auth, permissions
+    from app.security.access_filter import AccessFilter
+
+    filtro = AccessFilter(ttl_segundos=300, respuesta_segundos=600)
+    monkeypatch.setattr(permissions, 'get_supabase_client', lambda: bd)
+    monkeypatch.setattr(permissions, 'get_filtro_acceso', lambda: filtro)
+    monkeypatch.setattr(auth, 'get_filtro_acceso', lambda: filtro)
+    from app.services.cache_service import CacheLRU
+    cache = permissions.PermissionCache(ttl_segundos=300, intervalo_version=0, cache=CacheLRU())
+    monkeypatch.setattr(auth, 'get_permisos', lambda: cache)
+    return auth.security, cache, filtro
+
+
+class TestPermisos:
+    """Tests para app.security.permissions"""
+
+    # =========================================
+    # TEST 1: Una consulta responde todas las verificaciones
+    # =========================================
+    def test_role_checks_use_one_snapshot(self, monkeypatch):
+        """validate_user y las verificaciones de rol leen el mismo snapshot; empresas inactivas no cuentan"""
+        bd = _BD({'version_permisos': [{'version': 1}], 'usuarios': _usuario()})
+        security, _, _ = _instalar(monkeypatch, bd)
+
+        resultado = security.validate_user(4242)
+        assert resultado['valid'] and resultado['user_data']['empresa_id'] == 'e-a'
+        assert [e['id'] for e in resultado['user_data']['empresas']] == ['e-a', 'e-b']
+        assert security.get_user_role_in_empresa(4242, 'e-a') == 'gestor'
+        assert security.can_upload_files(4242) and not security.can_upload_files(4242, 'e-b')
+        assert security.can_download_files(4242, 'e-b') and not security.can_download_files(4242, 'e-c')
+        assert security.can_manage_empresas(4242) and not security.is_super_admin(4242)
+
+        assert bd.consultas.count('usuarios') == 1
+
+    # =========================================
+    # TEST 2: Cambio de versión
+    # =========================================
+    def test_version_change_discards_snapshots(self, monkeypatch):
+        """Un cambio de version_permisos recarga el rol y vence la caché de chats desconocidos"""
+        bd = _BD({'version_permisos': [{'version': 1}], 'usuarios': _usuario()})
+        security, _, filtro = _instalar(monkeypatch, bd)
+
+        assert security.can_upload_files(4242, 'e-a')
+        filtro.marcar_desconocido(777)
+
+        # Cambio en la BD sin subir la versión: se sigue usando el snapshot
+        bd.filas['usuarios'] = _usuario(rol_empresa_a='user', rol='super_admin')
+        assert security.get_user_role_in_empresa(4242, 'e-a') == 'gestor'
+
+        bd.filas['version_permisos'] = [{'version': 2}]
+        assert security.get_user_role_in_empresa(4242, 'e-a') == 'user'
+        assert security.is_super_admin(4242)
+        assert bd.consultas.count('usuarios') == 2
+        assert not filtro.es_desconocido(777)
+
+
+# =========================================
+# Ejecutar tests
+# =========================================
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
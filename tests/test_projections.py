@@ -0,0 +1,63 @@
+"""
+🧪 Tests para las proyecciones de lectura
+Valida las columnas pedidas a PostgREST y que las filas compactas se lean como dict
+"""
+
+import pytest
+from unittest.mock import MagicMock
+import sys
+import os
+
+# Agregar el directorio raíz al path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class TestProyecciones:
+    """Tests para app.database.projections"""
+
+    # =========================================
+    # TEST 1: Fila compacta con acceso tipo dict
+    # =========================================
+    def test_compact_row_reads_like_dict(self):
+        """Las columnas fuera de la proyección se descartan y se comportan como claves ausentes"""
+        from app.database.projections import ARCHIVO_MENU
+
+        fila = ARCHIVO_MENU.fila({'id': 'a1', 'nombre_original': 'balance.pdf', 'periodo': '2025-01',
+                                  'metadata': {'paginas': 40}, 'storage_path': 'uploads/1/x.pdf'})
+
+        assert not hasattr(fila, '__dict__')
+        assert fila['id'] == 'a1' and fila.get('periodo') == '2025-01'
+        # Columna proyectada pero ausente en la respuesta: None, como en PostgREST
+        assert fila.get('subtipo', 'otro') is None
+        assert fila.get('metadata', {}) == {} and 'storage_path' not in fila
+        with pytest.raises(KeyError):
+            fila['storage_path']
+        assert dict(fila)['nombre_original'] == 'balance.pdf'
+        assert ARCHIVO_MENU.fila(None) is None and ARCHIVO_MENU.filas(None) == []
+
+    # =========================================
+    # TEST 2: Select por caso de uso
+    # =========================================
+    def test_auth_lookup_selects_projection(self, monkeypatch):
+        """get_user_by_chat_id pide solo las columnas de autenticación"""
+        from app.database import supabase as modulo
+        from app.database.projections import USUARIO_AUTH
+
+        cliente = MagicMock()
+        query = cliente.table.return_value.select.return_value
+        query.eq.return_value = query
+        query.execute.return_value = MagicMock(data=[{'id': 'u1', 'chat_id': 7, 'nombre': 'Ana',
+                                                      'rol': 'user', 'empresa_id': 'e1'}])
+        monkeypatch.setattr(modulo.supabase, '_client', cliente)
+
+        usuario = modulo.supabase.get_user_by_chat_id(7)
+
+        cliente.table.return_value.select.assert_called_once_with('id, chat_id, nombre, rol, empresa_id')
+        assert usuario['rol'] == 'user' and usuario == USUARIO_AUTH.fila(query.execute.return_value.data[0])
+
+
+# =========================================
+# Ejecutar tests
+# =========================================
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
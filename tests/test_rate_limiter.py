@@ -0,0 +1,241 @@
+"""
+🧪 Tests para el limitador de envíos a Telegram
+Valida el orden por chat, la fusión de ediciones, las pausas por flood wait y los métodos que no pasan por las colas
+"""
+
+import time
+import asyncio
+import pytest
+import sys
+import os
+from datetime import timedelta
+
+# Agregar el directorio raíz al path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class TestLimitadorEnvios:
+    """Tests para app.bots.rate_limiter"""
+
+    # =========================================
+    # TEST 1: Orden por chat y fusión de ediciones
+    # =========================================
+    def test_chat_order_and_edit_coalescing(self, monkeypatch):
+        """Los envíos de un chat salen en orden y las ediciones pendientes del mismo mensaje se fusionan"""
+        from app.bots import rate_limiter as modulo
+
+        monkeypatch.setattr(modulo.Config, 'ENVIOS_CHAT_POR_SEGUNDO', 1000.0)
+        monkeypatch.setattr(modulo.Config, 'ENVIOS_CHAT_RAFAGA', 1)
+        enviados = []
+
+        def llamada(nombre):
+            async def callback():
+                await asyncio.sleep(0.01)
+                enviados.append(nombre)
+                return {'texto': nombre}
+            return callback
+
+        async def escenario():
+            limitador = modulo.LimitadorEnvios('test')
+
+            def enviar(nombre, endpoint='sendMessage', message_id=None):
+                data = {'chat_id': 10, 'message_id': message_id} if message_id else {'chat_id': 10}
+                return asyncio.create_task(
+                    limitador.process_request(llamada(nombre), (), {}, endpoint, data, None)
+                )
+
+            tareas = [
+                enviar('mensaje'),
+                enviar('edicion_1', 'editMessageText', 5),
+                enviar('otro'),
+                enviar('edicion_2', 'editMessageText', 5),
+                enviar('edicion_3', 'editMessageText', 5),
+            ]
+            return await asyncio.gather(*tareas), limitador
+
+        resultados, limitador = asyncio.run(escenario())
+
+        # La última edición toma el lugar de la primera, antes de "otro"
+        assert enviados == ['mensaje', 'edicion_3', 'otro']
+        assert [r['texto'] for r in resultados] == ['mensaje', 'edicion_3', 'otro', 'edicion_3', 'edicion_3']
+        assert limitador._en_cola == 0
+        assert not limitador._colas[10].ocupada
+
+    # =========================================
+    # TEST 2: Flood wait
+    # =========================================
+    def test_flood_wait_pauses_and_retries(self, monkeypatch):
+        """Un 429 pausa el bot durante retry_after y el envío se reintenta"""
+        from telegram.error import RetryAfter
+        from app.bots import rate_limiter as modulo
+
+        intentos = []
+
+        async def callback():
+            intentos.append(asyncio.get_running_loop().time())
+            if len(intentos) == 1:
+                raise RetryAfter(timedelta(seconds=0.05))
+            return True
+
+        async def escenario():
+            limitador = modulo.LimitadorEnvios('test')
+            return await limitador.process_request(callback, (), {}, 'sendMessage', {'chat_id': 7}, 2)
+
+        assert asyncio.run(escenario()) is True
+        assert len(intentos) == 2
+        assert intentos[1] - intentos[0] >= 0.1
+
+        async def siempre_429():
+            raise RetryAfter(timedelta(seconds=0.01))
+
+        async def sin_reintentos():
+            limitador = modulo.LimitadorEnvios('test')
+            await limitador.process_request(siempre_429, (), {}, 'sendMessage', {'chat_id': 7}, 0)
+
+        with pytest.raises(RetryAfter):
+            asyncio.run(sin_reintentos())
+
+    # =========================================
+    # TEST 3: Pausa por flood wait en todo el bot
+    # =========================================
+    def test_flood_wait_pauses_other_chats_and_resumes(self):
+        """Mientras dura el retry_after ningún chat envía; al terminar la pausa todos siguen sin esperar de más"""
+        from telegram.error import RetryAfter
+        from app.bots import rate_limiter as modulo
+
+        salidas = []
+        antes = modulo.FLOOD_WAITS.valor(bot='pausa')
+
+        def llamada(nombre, falla_una_vez=False):
+            intentos = []
+
+            async def callback():
+                intentos.append(1)
+                if falla_una_vez and len(intentos) == 1:
+                    raise RetryAfter(timedelta(seconds=0.15))
+                salidas.append((nombre, asyncio.get_running_loop().time()))
+                return nombre
+            return callback
+
+        async def escenario():
+            limitador = modulo.LimitadorEnvios('pausa')
+            inicio = asyncio.get_running_loop().time()
+            primero = asyncio.create_task(limitador.process_request(
+                llamada('chat_1', falla_una_vez=True), (), {}, 'sendMessage', {'chat_id': 1}, 2))
+            await asyncio.sleep(0.02)
+            # La pausa ya está activa: el chat 2 espera aunque su cola esté libre
+            assert limitador._pausa_hasta > time.monotonic()
+            otro = asyncio.create_task(limitador.process_request(
+                llamada('chat_2'), (), {}, 'sendMessage', {'chat_id': 2}, 2))
+            assert await asyncio.gather(primero, otro) == ['chat_1', 'chat_2']
+
+            # Pasada la pausa, el siguiente envío sale de inmediato
+            despues = asyncio.get_running_loop().time()
+            assert await limitador.process_request(llamada('chat_3'), (), {}, 'sendMessage', {'chat_id': 3}, 2) == 'chat_3'
+            return inicio, despues, asyncio.get_running_loop().time()
+
+        inicio, despues, fin = asyncio.run(escenario())
+        assert all(momento - inicio >= 0.15 for nombre, momento in salidas if nombre != 'chat_3')
+        assert fin - despues < 0.05
+        assert modulo.FLOOD_WAITS.valor(bot='pausa') - antes == 1
+
+    # =========================================
+    # TEST 4: Fusión de ediciones por message_id
+    # =========================================
+    def test_edits_coalesce_only_for_same_message(self, monkeypatch):
+        """Solo se fusionan ediciones pendientes del mismo método y message_id en el mismo chat"""
+        from app.bots import rate_limiter as modulo
+
+        monkeypatch.setattr(modulo.Config, 'ENVIOS_CHAT_POR_SEGUNDO', 1000.0)
+        monkeypatch.setattr(modulo.Config, 'ENVIOS_CHAT_RAFAGA', 1)
+        enviados = []
+        antes = modulo.EDICIONES_FUSIONADAS.valor(bot='fusion')
+
+        def llamada(nombre):
+            async def callback():
+                await asyncio.sleep(0.01)
+                enviados.append(nombre)
+                return nombre
+            return callback
+
+        async def escenario():
+            limitador = modulo.LimitadorEnvios('fusion')
+
+            def enviar(nombre, endpoint, chat_id=10, message_id=None):
+                data = {'chat_id': chat_id}
+                if message_id:
+                    data['message_id'] = message_id
+                return asyncio.create_task(
+                    limitador.process_request(llamada(nombre), (), {}, endpoint, data, None)
+                )
+
+            tareas = [
+                enviar('inicio', 'sendMessage'),
+                enviar('progreso_10', 'editMessageText', message_id=5),
+                enviar('otro_mensaje', 'editMessageText', message_id=6),
+                enviar('teclado', 'editMessageReplyMarkup', message_id=5),
+                enviar('progreso_50', 'editMessageText', message_id=5),
+                enviar('otro_chat', 'editMessageText', chat_id=11, message_id=5),
+                enviar('progreso_100', 'editMessageText', message_id=5),
+            ]
+            return await asyncio.gather(*tareas)
+
+        resultados = asyncio.run(escenario())
+
+        # Las tres ediciones de texto del mensaje 5 salen una vez, en el lugar de la primera
+        assert [e for e in enviados if e != 'otro_chat'] == ['inicio', 'progreso_100', 'otro_mensaje', 'teclado']
+        assert 'otro_chat' in enviados
+        assert resultados[1] == resultados[4] == resultados[6] == 'progreso_100'
+        assert resultados[3] == 'teclado' and resultados[5] == 'otro_chat'
+        assert modulo.EDICIONES_FUSIONADAS.valor(bot='fusion') - antes == 2
+
+    # =========================================
+    # TEST 5: Métodos sin cola
+    # =========================================
+    def test_get_updates_bypasses_queues_and_pauses(self):
+        """getUpdates no espera la pausa por 429 ni pasa por colas o reintentos; sin chat_id solo respeta la pausa"""
+        from telegram.error import RetryAfter
+        from app.bots import rate_limiter as modulo
+
+        assert 'getUpdates' in modulo.METODOS_SIN_COLA
+        llamadas = []
+
+        async def get_updates():
+            llamadas.append('getUpdates')
+            return []
+
+        async def get_updates_429():
+            llamadas.append('getUpdates_429')
+            raise RetryAfter(timedelta(seconds=0.01))
+
+        async def responder_callback():
+            return True
+
+        async def escenario():
+            limitador = modulo.LimitadorEnvios('sin_cola')
+            limitador._pausa_hasta = time.monotonic() + 0.2
+            loop = asyncio.get_running_loop()
+
+            inicio = loop.time()
+            assert await limitador.process_request(get_updates, (), {}, 'getUpdates', {'timeout': 10}, 3) == []
+            assert loop.time() - inicio < 0.05
+            assert limitador._colas == {} and limitador._en_cola == 0
+
+            # Sin reintentos: el 429 de getUpdates lo maneja el Updater
+            with pytest.raises(RetryAfter):
+                await limitador.process_request(get_updates_429, (), {}, 'getUpdates', {}, 3)
+
+            # answerCallbackQuery (sin chat_id) no usa colas pero sí espera la pausa
+            assert await limitador.process_request(responder_callback, (), {}, 'answerCallbackQuery', {}, 3)
+            assert loop.time() - inicio >= 0.15
+            assert limitador._colas == {}
+
+        asyncio.run(escenario())
+        assert llamadas == ['getUpdates', 'getUpdates_429']
+
+
+# =========================================
+# Ejecutar tests
+# =========================================
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,116 @@
+"""
+🧪 Tests para la retención de conversaciones
+Valida el ruteo a particiones calientes y el ciclo archivar/rehidratar
+"""
+
+import gzip
+import json
+import pytest
+from datetime import date
+from unittest.mock import MagicMock
+import sys
+import os
+
+# Agregar el directorio raíz al path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _resultado(data):
+    result = MagicMock()
+    result.data = data
+    return result
+
+
+class TestRetencion:
+    """Tests para app.utils.particiones y RetentionService"""
+
+    # =========================================
+    # TEST 1: Meses y nombres de partición
+    # =========================================
+    def test_months_and_partition_names(self):
+        """sumar_meses cruza años y el nombre sigue conversaciones_AAAA_MM"""
+        from app.utils.particiones import sumar_meses, nombre_particion
+
+        assert sumar_meses(date(2025, 1, 1), -1) == date(2024, 12, 1)
+        assert sumar_meses(date(2025, 11, 1), 3) == date(2026, 2, 1)
+        assert nombre_particion(date(2025, 3, 1)) == 'conversaciones_2025_03'
+
+    # =========================================
+    # TEST 2: Ventana caliente primero
+    # =========================================
+    def test_hot_window_first(self):
+        """Si la ventana caliente alcanza no se consulta sin cota; si no, sí"""
+        from app.utils.particiones import caliente_primero
+
+        llamadas = []
+
+        def construir(filas_calientes, filas_todas):
+            def _construir(desde):
+                llamadas.append(desde)
+                query = MagicMock()
+                query.execute.return_value = _resultado(filas_calientes if desde else filas_todas)
+                return query
+            return _construir
+
+        assert caliente_primero(construir([{'id': 1}], []), minimo=1) == [{'id': 1}]
+        assert len(llamadas) == 1 and llamadas[0] is not None
+
+        llamadas.clear()
+        assert caliente_primero(construir([], [{'id': 2}]), minimo=1) == [{'id': 2}]
+        assert llamadas[1] is None
+
+    # =========================================
+    # TEST 3: Archivar y rehidratar un mes
+    # =========================================
+    def test_archive_and_rehydrate_roundtrip(self, monkeypatch):
+        """El mes se sube como gzip NDJSON, se elimina la partición y vuelve igual al rehidratar"""
+        from app.services import retention_service as modulo
+
+        filas = [{'id': f'id{i}', 'created_at': f'2025-01-0{i + 1}T00:00:00+00:00', 'mensaje': f'm{i}'}
+                 for i in range(3)]
+        almacen = {}
+        catalogo = []
+        rehidratadas = []
+
+        supabase = MagicMock()
+        bucket = supabase.client.storage.from_.return_value
+        bucket.upload.side_effect = lambda path, file, file_options: almacen.__setitem__(path, file)
+        bucket.download.side_effect = lambda path: almacen[path]
+        supabase.client.rpc.return_value.execute.return_value = _resultado(True)
+
+        def tabla(nombre):
+            query = MagicMock()
+            for metodo in ('select', 'gte', 'lt', 'eq', 'or_', 'order', 'limit', 'update'):
+                getattr(query, metodo).return_value = query
+            if nombre == 'conversaciones':
+                query.execute.return_value = _resultado(list(filas))
+                query.upsert.side_effect = lambda lote, on_conflict: rehidratadas.extend(lote) or query
+            else:
+                query.upsert.side_effect = lambda registro, on_conflict: catalogo.append(registro) or query
+                query.execute.side_effect = lambda: _resultado(catalogo)
+            return query
+
+        supabase.table.side_effect = tabla
+        monkeypatch.setattr(modulo, 'get_supabase_client', lambda: supabase)
+
+        servicio = modulo.RetentionService(retencion_meses=6, carpeta='archivo/conversaciones')
+        registro = servicio.archivar_particion({'particion': 'conversaciones_2025_01', 'mes': date(2025, 1, 1)})
+
+        ruta = 'archivo/conversaciones/2025/conversaciones_2025_01.ndjson.gz'
+        assert registro['filas'] == 3 and registro['storage_path'] == ruta
+        lineas = gzip.decompress(almacen[ruta]).decode().splitlines()
+        assert [json.loads(linea) for linea in lineas] == filas
+        supabase.client.rpc.assert_called_with(
+            'eliminar_particion_conversaciones',
+            {'p_particion': 'conversaciones_2025_01', 'p_filas_esperadas': 3}
+        )
+
+        assert servicio.rehidratar(date(2025, 1, 15)) == 3
+        assert rehidratadas == filas
+
+
+# =========================================
+# Ejecutar tests
+# =========================================
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,83 @@
+"""
+🧪 Tests para el programador de tareas de mantenimiento
+Valida la reserva entre réplicas, el registro de resultados y las métricas por tarea
+"""
+
+import asyncio
+import pytest
+from unittest.mock import MagicMock
+import sys
+import os
+
+# Agregar el directorio raíz al path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _supabase_con_reserva(tomada: bool):
+    supabase = MagicMock()
+    supabase.client.rpc.return_value.execute.return_value = MagicMock(data=tomada)
+    return supabase
+
+
+class TestProgramador:
+    """Tests para app.services.scheduler_service"""
+
+    # =========================================
+    # TEST 1: Tarea exclusiva reservada por otra réplica
+    # =========================================
+    def test_exclusive_task_skipped_when_not_acquired(self, monkeypatch):
+        """Si tomar_tarea_programada devuelve FALSE la tarea no corre y cuenta como omitida"""
+        from app.services import scheduler_service as modulo
+
+        supabase = _supabase_con_reserva(False)
+        monkeypatch.setattr(modulo, 'get_supabase_client', lambda: supabase)
+
+        programador = modulo.Programador(jitter=0.1)
+        funcion = MagicMock(return_value=3)
+        programador.registrar('prueba_omitida', funcion, 300)
+
+        assert asyncio.run(programador.ejecutar('prueba_omitida')) is None
+        funcion.assert_not_called()
+        assert modulo.EJECUCIONES_TAREA.valor(tarea='prueba_omitida', resultado='omitida') == 1
+
+        nombre, params = supabase.client.rpc.call_args[0]
+        assert nombre == 'tomar_tarea_programada'
+        assert params['p_espaciado_segundos'] < 300
+
+    # =========================================
+    # TEST 2: Ejecución con error y liberación de la reserva
+    # =========================================
+    def test_error_recorded_and_lease_released(self, monkeypatch):
+        """Un error no rompe el ciclo: se registra, se mide y se libera la reserva"""
+        from app.services import scheduler_service as modulo
+
+        supabase = _supabase_con_reserva(True)
+        monkeypatch.setattr(modulo, 'get_supabase_client', lambda: supabase)
+
+        async def fallar():
+            raise RuntimeError('sin conexión')
+
+        programador = modulo.Programador(jitter=0.1)
+        programador.registrar('prueba_error', fallar, 60)
+        programador.registrar('prueba_local', lambda: 'ok', 60, exclusiva=False)
+
+        asyncio.run(programador.ejecutar('prueba_error'))
+        assert asyncio.run(programador.ejecutar('prueba_local')) == 'ok'
+
+        nombre, params = supabase.client.rpc.call_args_list[1][0]
+        assert nombre == 'finalizar_tarea_programada'
+        assert params['p_resultado'] == 'error' and params['p_error'] == 'sin conexión'
+        # La tarea local no toca la BD
+        assert supabase.client.rpc.call_count == 2
+
+        estado = {t['tarea']: t for t in programador.estado()}
+        assert estado['prueba_error']['ultimo_resultado'] == 'error'
+        assert estado['prueba_local']['ejecuciones'] == 1
+        assert modulo.DURACION_TAREA.histograma(tarea='prueba_local').total == 1
+
+
+# =========================================
+# Ejecutar tests
+# =========================================
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
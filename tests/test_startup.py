@@ -0,0 +1,73 @@
+"""
+🧪 Tests para el arranque perezoso
+Valida que importar app.main no cargue telegram, supabase ni openai y que el cliente de Supabase se cree una vez en el primer uso
+"""
+
+import json
+import subprocess
+import pytest
+from unittest.mock import MagicMock
+import sys
+import os
+
+# Agregar el directorio raíz al path
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+
+class TestArranquePerezoso:
+    """Tests para la construcción perezosa de servicios"""
+
+    # =========================================
+    # TEST 1: Importar app.main
+    # =========================================
+    def test_importing_main_defers_heavy_packages(self):
+        """En un proceso nuevo, app.main queda importado sin clientes ni paquetes pesados"""
+        codigo = (
+            "import sys, json, app.main\n"
+            "from app.database.supabase import get_supabase_client\n"
+            "from app.services import conversation_logger\n"
+            "print(json.dumps({\n"
+            "    'paquetes': [p for p in ('telegram', 'supabase', 'openai') if p in sys.modules],\n"
+            "    'cliente': get_supabase_client()._client is not None,\n"
+            "    'logger': conversation_logger._conversation_logger is not None,\n"
+            "}))\n"
+        )
+        resultado = subprocess.run([sys.executable, "-c", codigo], cwd=RAIZ, capture_output=True, text=True)
+        assert resultado.returncode == 0, resultado.stderr
+
+        estado = json.loads(resultado.stdout.strip().splitlines()[-1])
+        assert estado == {'paquetes': [], 'cliente': False, 'logger': False}
+
+    # =========================================
+    # TEST 2: Cliente compartido en el primer uso
+    # =========================================
+    def test_supabase_client_is_built_once_on_first_use(self, monkeypatch):
+        """El primer .table() crea el cliente; el logger de conversaciones reutiliza el mismo"""
+        import supabase as paquete
+        from app.database import supabase as modulo
+        from app.services import conversation_logger
+
+        manager = modulo.get_supabase_client()
+        creados = []
+
+        def create_client(url, key):
+            creados.append(url)
+            return MagicMock()
+
+        monkeypatch.setattr(manager, '_client', None)
+        monkeypatch.setattr(paquete, 'create_client', create_client)
+        monkeypatch.setattr(conversation_logger, '_conversation_logger', None)
+
+        manager.table('empresas')
+        manager.table('usuarios')
+        assert len(creados) == 1
+        assert conversation_logger.get_conversation_logger().supabase is manager.client
+        assert conversation_logger.get_conversation_logger() is conversation_logger.get_conversation_logger()
+
+
+# =========================================
+# Ejecutar tests
+# =========================================
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
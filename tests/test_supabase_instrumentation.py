@@ -0,0 +1,140 @@
+"""
+🧪 Tests para la instrumentación de Supabase
+Valida el registro de llamadas, la atribución por handler y las consultas lentas
+"""
+
+import pytest
+import asyncio
+from unittest.mock import MagicMock
+from types import SimpleNamespace
+import sys
+import os
+
+# Agregar el directorio raíz al path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class BuilderFalso:
+    """Query builder mínimo: los filtros devuelven el mismo builder"""
+
+    def __init__(self, data=None, error=None):
+        self.data = data if data is not None else []
+        self.error = error
+
+    def select(self, *args, **kwargs):
+        return self
+
+    def insert(self, payload):
+        return self
+
+    def eq(self, columna, valor):
+        return self
+
+    @property
+    def not_(self):
+        return self
+
+    def is_(self, columna, valor):
+        return self
+
+    def execute(self):
+        if self.error:
+            raise self.error
+        return SimpleNamespace(data=self.data, count=None)
+
+
+class TestInstrumentacionSupabase:
+    """Tests para ClienteInstrumentado y RegistroConsultas"""
+
+    @pytest.fixture
+    def registro(self):
+        """Registro limpio para cada test"""
+        import app.database.instrumentation as instrumentation
+        registro = instrumentation.RegistroConsultas(umbral_lento_ms=10_000)
+        instrumentation._registro_consultas = registro
+        yield registro
+        instrumentation._registro_consultas = None
+
+    # =========================================
+    # TEST 1: Se registran tabla, operación, filtros y filas
+    # =========================================
+    def test_select_records_table_operation_and_filters(self, registro):
+        """Un select con filtros registra columnas (no valores) y filas devueltas"""
+        from app.database.instrumentation import instrumentar_cliente
+
+        cliente = MagicMock()
+        cliente.table.return_value = BuilderFalso(data=[{'id': 1}, {'id': 2}])
+        instrumentado = instrumentar_cliente(cliente)
+
+        result = instrumentado.table('usuarios').select('*').eq('chat_id', 123).not_.is_('empresa_id', 'null').execute()
+
+        assert len(result.data) == 2
+        resumen = registro.resumen()
+        assert resumen['total_llamadas'] == 1
+        consulta = resumen['consultas'][0]
+        assert consulta['tabla'] == 'usuarios'
+        assert consulta['operacion'] == 'select'
+        assert consulta['filas'] == 2
+
+    # =========================================
+    # TEST 2: Llamadas atribuidas al handler y contadas por update
+    # =========================================
+    def test_calls_attributed_to_handler_per_update(self, registro):
+        """Las llamadas dentro de un handler instrumentado cuentan como llamadas por update"""
+        from app.database.instrumentation import instrumentar_cliente, _envolver_callback
+
+        cliente = MagicMock()
+        cliente.table.side_effect = lambda nombre: BuilderFalso(data=[{'id': 1}])
+        instrumentado = instrumentar_cliente(cliente)
+
+        async def mi_handler(update, context):
+            instrumentado.table('usuarios').select('*').execute()
+            instrumentado.table('empresas').select('*').execute()
+
+        envuelto = _envolver_callback(mi_handler, 'production')
+        asyncio.run(envuelto(SimpleNamespace(update_id=7), None))
+
+        handler = registro.resumen()['handlers']['mi_handler']
+        assert handler['llamadas'] == 2
+        assert handler['updates'] == 1
+        assert handler['llamadas_por_update'] == 2
+
+    # =========================================
+    # TEST 3: Consultas lentas y errores
+    # =========================================
+    def test_slow_and_failed_queries_are_recorded(self, registro):
+        """Una consulta sobre el umbral queda en la lista de lentas; los errores se propagan y se cuentan"""
+        from app.database.instrumentation import instrumentar_cliente
+
+        registro.umbral_lento_ms = 0
+        cliente = MagicMock()
+        cliente.table.return_value = BuilderFalso(error=RuntimeError("caída"))
+        instrumentado = instrumentar_cliente(cliente)
+
+        with pytest.raises(RuntimeError):
+            instrumentado.table('archivos').select('*').eq('empresa_id', 'x').execute()
+
+        assert registro.total_errores == 1
+        lentas = registro.consultas_lentas()
+        assert len(lentas) == 1
+        assert lentas[0]['tabla'] == 'archivos'
+        assert lentas[0]['filtros'] == ['eq:empresa_id']
+        assert lentas[0]['error'] == 'RuntimeError'
+        assert lentas[0]['handler'] == 'sin_update'
+
+    # =========================================
+    # TEST 4: Instrumentar dos veces no anida proxies
+    # =========================================
+    def test_instrumentar_cliente_is_idempotent(self, registro):
+        """instrumentar_cliente sobre un cliente ya instrumentado devuelve el mismo objeto"""
+        from app.database.instrumentation import instrumentar_cliente
+
+        instrumentado = instrumentar_cliente(MagicMock())
+        assert instrumentar_cliente(instrumentado) is instrumentado
+
+
+# =========================================
+# Ejecutar tests
+# =========================================
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
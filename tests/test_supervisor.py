@@ -0,0 +1,216 @@
+"""
+🧪 Tests para el supervisor de procesos
+Valida el reinicio con espera de un worker caído, la detención de todos los workers y el estado con RSS para /status
+"""
+
+import json
+import time
+import signal
+import subprocess
+import textwrap
+import pytest
+import sys
+import os
+
+# Agregar el directorio raíz al path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import supervisor as modulo
+from app.supervisor import ProcesoHijo, Supervisor
+
+
+# Worker de prueba: escribe en el registro al recibir SIGTERM; con 'falla' termina con código 3
+# la primera vez; con 'terco' ignora SIGTERM
+WORKER = textwrap.dedent("""
+    import os, sys, time, signal
+    nombre, registro, modo = sys.argv[1:4]
+    marca = registro + '.' + nombre
+    if modo == 'falla' and not os.path.exists(marca):
+        open(marca, 'w').close()
+        sys.exit(3)
+    def al_terminar(signum, frame):
+        with open(registro, 'a') as f:
+            f.write(nombre + '\\n')
+        if modo != 'terco':
+            sys.exit(0)
+    signal.signal(signal.SIGTERM, al_terminar)
+    with open(registro, 'a') as f:
+        f.write(nombre + ' iniciado\\n')
+    while True:
+        time.sleep(0.05)
+""")
+
+# Supervisor real (ejecutar() instala manejadores de señales: necesita su propio proceso)
+SUPERVISOR = textwrap.dedent("""
+    import sys
+    sys.path.insert(0, {raiz!r})
+    from app import supervisor as modulo
+    modulo.REINICIO_INICIAL_SECONDS = 0.2
+    modulo.INTERVALO_REVISION_SECONDS = 0.05
+    hijos = [
+        modulo.ProcesoHijo(nombre, rol, [sys.executable, '-c', {worker!r}, nombre, {registro!r}, modo])
+        for nombre, rol, modo in {hijos!r}
+    ]
+    modulo.Supervisor(hijos, gracia_segundos={gracia}, reporte_segundos=60, ruta_estado={estado!r}).ejecutar()
+""")
+
+
+def lanzar_supervisor(tmp_path, hijos, gracia: float = 5):
+    """Supervisor en un proceso aparte; devuelve el proceso y las rutas del estado y del registro de señales"""
+    estado, registro = tmp_path / "estado.json", tmp_path / "senales.log"
+    script = SUPERVISOR.format(
+        raiz=os.path.dirname(os.path.dirname(os.path.abspath(__file__))), worker=WORKER,
+        registro=str(registro), hijos=hijos, gracia=gracia, estado=str(estado)
+    )
+    return subprocess.Popen([sys.executable, '-c', script]), estado, registro
+
+
+def leer(ruta) -> str:
+    return ruta.read_text(encoding='utf-8') if ruta.exists() else ''
+
+
+def estado_procesos(ruta) -> dict:
+    try:
+        return {p['nombre']: p for p in json.loads(ruta.read_text(encoding='utf-8'))['procesos']}
+    except (OSError, ValueError):
+        return {}
+
+
+def vivo(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+
+
+def esperar(condicion, limite: float = 10.0) -> bool:
+    fin = time.monotonic() + limite
+    while time.monotonic() < fin:
+        if condicion():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+class TestSupervisor:
+    """Tests para el supervisor de workers"""
+
+    # =========================================
+    # TEST 1: Reinicio de un worker caído
+    # =========================================
+    def test_crashed_worker_is_restarted_after_backoff(self, monkeypatch, tmp_path):
+        """Un hijo que termina con error se reinicia pasada la espera, que se duplica con cada caída seguida"""
+        monkeypatch.setattr(modulo, 'REINICIO_INICIAL_SECONDS', 0.2)
+        hijo = ProcesoHijo("bot-prueba", "bots", [sys.executable, "-c", "import sys; sys.exit(3)"])
+        sup = Supervisor([hijo], gracia_segundos=1, reporte_segundos=60, ruta_estado=str(tmp_path / "estado.json"))
+
+        sup.iniciar()
+        hijo.proceso.wait()
+        assert sup.revisar() == 0
+        assert hijo.proceso is None and hijo.ultimo_codigo == 3
+        # Todavía dentro de la espera: no se reinicia
+        assert sup.revisar() == 0
+        assert sup.estado()[0]['estado'] == 'reiniciando'
+
+        assert esperar(lambda: sup.revisar() == 1)
+        assert hijo.reinicios == 1 and hijo.proceso is not None
+
+        # Segunda caída seguida: la espera se duplica
+        hijo.proceso.wait()
+        antes = time.monotonic()
+        sup.revisar()
+        assert hijo.proximo_inicio - antes == pytest.approx(0.4, abs=0.1)
+        sup.detener()
+
+    # =========================================
+    # TEST 2: Estado con RSS y detención
+    # =========================================
+    def test_state_file_reports_rss_and_stop_terminates_children(self, tmp_path):
+        """El estado guardado trae pid y RSS de cada hijo vivo; detener() les envía SIGTERM y los espera"""
+        ruta = tmp_path / "estado.json"
+        hijos = [
+            ProcesoHijo(f"api-{i}", "api", [sys.executable, "-c", "import time; time.sleep(30)"])
+            for i in (1, 2)
+        ]
+        sup = Supervisor(hijos, gracia_segundos=5, reporte_segundos=60, ruta_estado=str(ruta))
+        sup.iniciar()
+        # Recién creado tras fork el hijo casi no tiene páginas propias
+        assert esperar(lambda: all((modulo.rss_bytes(h.pid) or 0) > 1024 * 1024 for h in hijos))
+
+        sup.reportar()
+        datos = json.loads(ruta.read_text(encoding='utf-8'))
+        assert datos['supervisor_pid'] == os.getpid()
+        assert [p['nombre'] for p in datos['procesos']] == ['api-1', 'api-2']
+        for fila, hijo in zip(datos['procesos'], hijos):
+            assert fila['estado'] == 'corriendo'
+            assert fila['pid'] == hijo.pid
+            assert fila['rss_mb'] > 0
+
+        sup.detener()
+        assert all(h.proceso.returncode is not None for h in hijos)
+        # Detenidos por el supervisor: no se reinician
+        assert sup.revisar() == 0
+        estado = json.loads(ruta.read_text(encoding='utf-8'))['procesos']
+        assert {p['estado'] for p in estado} == {'detenido'}
+
+    # =========================================
+    # TEST 3: Reinicio dentro del ciclo del supervisor
+    # =========================================
+    def test_run_loop_restarts_failed_bot_worker_only(self, tmp_path):
+        """ejecutar() reinicia al worker de bot que terminó con código 3 sin tocar a los de API"""
+        proceso, estado, registro = lanzar_supervisor(tmp_path, [
+            ("api-1", "api", "normal"),
+            ("bot-production", "bots", "falla"),
+        ])
+        try:
+            # El estado se guarda tras cada reinicio
+            assert esperar(lambda: estado_procesos(estado).get('bot-production', {}).get('reinicios') == 1)
+            assert esperar(lambda: leer(registro).count('bot-production iniciado') == 1)
+            filas = estado_procesos(estado)
+            assert filas['bot-production']['ultimo_codigo'] == 3
+            assert filas['bot-production']['estado'] == 'corriendo'
+            assert filas['api-1']['reinicios'] == 0 and filas['api-1']['ultimo_codigo'] is None
+            assert leer(registro).count('api-1 iniciado') == 1
+        finally:
+            proceso.send_signal(signal.SIGTERM)
+            proceso.wait(timeout=15)
+
+    # =========================================
+    # TEST 4: SIGTERM llega a todos los workers
+    # =========================================
+    def test_sigterm_propagates_to_bot_and_api_workers(self, tmp_path):
+        """SIGTERM al supervisor se reenvía a los workers de API y de bots; el que lo ignora recibe SIGKILL"""
+        proceso, estado, registro = lanzar_supervisor(tmp_path, [
+            ("api-1", "api", "normal"),
+            ("api-2", "api", "normal"),
+            ("bot-admin", "bots", "normal"),
+            ("bot-production", "bots", "terco"),
+        ], gracia=1)
+        try:
+            assert esperar(lambda: leer(registro).count(' iniciado') == 4)
+            assert esperar(lambda: len([p for p in estado_procesos(estado).values() if p['pid']]) == 4)
+            pids = {nombre: fila['pid'] for nombre, fila in estado_procesos(estado).items()}
+
+            inicio = time.monotonic()
+            proceso.send_signal(signal.SIGTERM)
+            assert proceso.wait(timeout=15) == 0
+        finally:
+            if proceso.poll() is None:
+                proceso.kill()
+
+        recibidos = {linea for linea in leer(registro).splitlines() if not linea.endswith(' iniciado')}
+        assert recibidos == {'api-1', 'api-2', 'bot-admin', 'bot-production'}
+        # El worker que ignora SIGTERM se mata pasada la gracia
+        assert time.monotonic() - inicio >= 1
+        assert not any(vivo(pid) for pid in pids.values())
+        filas = estado_procesos(estado)
+        assert {fila['estado'] for fila in filas.values()} == {'detenido'}
+        assert all(fila['reinicios'] == 0 for fila in filas.values())
+
+
+# =========================================
+# Ejecutar tests
+# =========================================
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])